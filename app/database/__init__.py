@@ -1,11 +1,27 @@
 # app/database/__init__.py
 # Módulo de persistência - SQLite/PostgreSQL
 
-from .connection import get_db, init_db, engine, SessionLocal
+from .connection import (
+    get_db,
+    get_read_db,
+    get_async_db,
+    get_async_read_db,
+    get_async_engine,
+    get_async_sessionmaker,
+    init_db,
+    engine,
+    read_engine,
+    SessionLocal,
+    ReadSessionLocal
+)
 from .models import (
     Base,
     Device,
+    DeviceSnapshot,
+    DeviceLookup,
     DeviceMetric,
+    MetricPartition,
+    DeviceHealth,
     DiagnosticLog,
     WifiSnapshot,
     ClientSession,
@@ -17,12 +33,23 @@ from .models import (
 
 __all__ = [
     "get_db",
+    "get_read_db",
+    "get_async_db",
+    "get_async_read_db",
+    "get_async_engine",
+    "get_async_sessionmaker",
     "init_db", 
     "engine",
+    "read_engine",
     "SessionLocal",
+    "ReadSessionLocal",
     "Base",
     "Device",
+    "DeviceSnapshot",
+    "DeviceLookup",
     "DeviceMetric",
+    "MetricPartition",
+    "DeviceHealth",
     "DiagnosticLog",
     "WifiSnapshot",
     "ClientSession",
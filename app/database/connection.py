@@ -2,42 +2,130 @@
 # Configuração de conexão com banco de dados
 
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, Session
-from sqlalchemy.pool import StaticPool
-from typing import Generator
+from sqlalchemy.pool import QueuePool, StaticPool
+from typing import TYPE_CHECKING, Any, AsyncGenerator, Dict, Generator, List, Tuple
+
+from app.settings import settings
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
 
 # Suporte para SQLite (dev) ou PostgreSQL (prod)
 DATABASE_URL = os.getenv(
     "DATABASE_URL",
     "sqlite:///./data/semppre_acs.db"
 )
+# Réplica de leitura opcional (PostgreSQL); vazio = mesmo banco
+DATABASE_READ_URL = settings.DATABASE_READ_URL or DATABASE_URL
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_memory(url: str) -> bool:
+    return _is_sqlite(url) and (":memory:" in url or url.rstrip("/").endswith("sqlite:"))
+
+
+# ============ Perfil SQLite ============
+# Aplicado em cada conexão nova (evento "connect"):
+# - WAL: leitores não bloqueiam o escritor e vice-versa
+# - synchronous=NORMAL: fsync só no checkpoint (seguro com WAL)
+# - busy_timeout: espera o lock em vez de falhar com "database is locked"
+# - cache_size / mmap_size: páginas quentes em memória
+# Conexões do engine de leitura abrem com query_only.
+
+def sqlite_pragmas(readonly: bool = False) -> List[Tuple[str, Any]]:
+    """Lista (pragma, valor) aplicada nas conexões SQLite."""
+    pragmas: List[Tuple[str, Any]] = [
+        ("busy_timeout", settings.SQLITE_BUSY_TIMEOUT_MS),
+        ("journal_mode", settings.SQLITE_JOURNAL_MODE),
+        ("synchronous", settings.SQLITE_SYNCHRONOUS),
+        ("cache_size", -settings.SQLITE_CACHE_SIZE_KB),  # negativo = KiB
+        ("mmap_size", settings.SQLITE_MMAP_SIZE_MB * 1024 * 1024),
+        ("temp_store", "MEMORY"),
+    ]
+    if readonly:
+        pragmas.append(("query_only", "ON"))
+    return pragmas
+
+
+def _install_sqlite_pragmas(sync_engine: Engine, readonly: bool = False) -> None:
+    pragmas = sqlite_pragmas(readonly)
+
+    @event.listens_for(sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+
+def _engine_kwargs(url: str, readonly: bool, async_: bool = False) -> Dict[str, Any]:
+    """Argumentos de create_engine / create_async_engine por tipo de banco."""
+    if _is_memory(url):
+        # Banco em memória só existe numa conexão: compartilhar a mesma
+        return {"connect_args": {"check_same_thread": False}, "poolclass": StaticPool}
+
+    pool_size = settings.DB_READ_POOL_SIZE if readonly else settings.DB_POOL_SIZE
+    kwargs: Dict[str, Any] = {
+        "pool_size": pool_size,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+    }
+    if _is_sqlite(url):
+        # Uma conexão por sessão (nunca duas threads/requisições na mesma transação);
+        # o timeout do driver é o mesmo busy_timeout do pragma
+        kwargs["connect_args"] = {
+            "check_same_thread": False,
+            "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+        }
+        if async_:
+            from sqlalchemy.pool import AsyncAdaptedQueuePool
+            kwargs["poolclass"] = AsyncAdaptedQueuePool
+        else:
+            kwargs["poolclass"] = QueuePool
+    else:
+        # PostgreSQL ou outros
+        kwargs["pool_pre_ping"] = True
+        kwargs["pool_recycle"] = settings.DB_POOL_RECYCLE
+    return kwargs
+
+
+def make_engine(url: str, readonly: bool = False) -> Engine:
+    """Engine síncrono com o pool e (no SQLite) os pragmas desta configuração."""
+    new_engine = create_engine(url, echo=False, **_engine_kwargs(url, readonly))  # echo=True para debug SQL
+    if _is_sqlite(url) and not _is_memory(url):
+        _install_sqlite_pragmas(new_engine, readonly)
+    return new_engine
 
-# Configuração do engine
-if DATABASE_URL.startswith("sqlite"):
-    # SQLite precisa de configuração especial para threads
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False},
-        poolclass=StaticPool,
-        echo=False  # True para debug SQL
-    )
+
+# Engine de escrita (e leituras que fazem parte de uma escrita)
+engine = make_engine(DATABASE_URL)
+
+# Engine de leitura: pool próprio (e query_only no SQLite) para dashboards
+# e listagens não disputarem conexões com o coletor e o ingest
+if _is_memory(DATABASE_URL):
+    read_engine = engine
 else:
-    # PostgreSQL ou outros
-    engine = create_engine(
-        DATABASE_URL,
-        pool_size=10,
-        max_overflow=20,
-        pool_pre_ping=True,
-        echo=False
-    )
-
-# Session factory
+    read_engine = make_engine(DATABASE_READ_URL, readonly=True)
+
+# Session factories
 SessionLocal = sessionmaker(
     autocommit=False,
     autoflush=False,
     bind=engine
 )
+ReadSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    bind=read_engine
+)
 
 
 def get_db() -> Generator[Session, None, None]:
@@ -55,18 +143,138 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+def get_read_db() -> Generator[Session, None, None]:
+    """Como get_db, mas no engine de leitura (rotas que só consultam)."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def pool_info() -> Dict[str, Any]:
+    """Estado dos pools de conexão (para /health e diagnóstico)."""
+    return {
+        "writer": engine.pool.status(),
+        "reader": read_engine.pool.status() if read_engine is not engine else "shared",
+        "sqlite_pragmas": dict(sqlite_pragmas()) if _is_sqlite(DATABASE_URL) else None,
+    }
+
+
+# ============ Engine assíncrono ============
+# Rotas async usam AsyncSession (aiosqlite / asyncpg) para não bloquear o
+# event loop com I/O de banco. Scripts e serviços síncronos continuam com
+# engine/SessionLocal acima.
+
+_ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+
+def _async_url(url: str) -> str:
+    """URL equivalente com driver assíncrono (sqlite:// -> sqlite+aiosqlite://)."""
+    scheme, sep, rest = url.partition("://")
+    return f"{_ASYNC_DRIVERS.get(scheme, scheme)}{sep}{rest}"
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _async_url(DATABASE_URL)
+ASYNC_DATABASE_READ_URL = _async_url(DATABASE_READ_URL) if settings.DATABASE_READ_URL else ASYNC_DATABASE_URL
+
+_async_engines: Dict[bool, Any] = {}
+_async_sessionmakers: Dict[bool, Any] = {}
+
+
+def get_async_engine(readonly: bool = False):
+    """
+    AsyncEngine (escrita ou leitura) criado sob demanda: scripts que só usam
+    a sessão síncrona não precisam ter aiosqlite/asyncpg instalados.
+    """
+    if _is_memory(ASYNC_DATABASE_URL):
+        readonly = False  # banco em memória: uma conexão só
+    if readonly not in _async_engines:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        url = ASYNC_DATABASE_READ_URL if readonly else ASYNC_DATABASE_URL
+        try:
+            new_engine = create_async_engine(url, echo=False, **_engine_kwargs(url, readonly, async_=True))
+        except ImportError as e:
+            driver = url.partition("://")[0]
+            raise RuntimeError(
+                f"Driver assíncrono de {driver} não instalado ({e.name}); "
+                "instale as dependências de requirements.txt ou defina ASYNC_DATABASE_URL"
+            ) from e
+        if _is_sqlite(url) and not _is_memory(url):
+            _install_sqlite_pragmas(new_engine.sync_engine, readonly)
+        _async_engines[readonly] = new_engine
+    return _async_engines[readonly]
+
+
+def get_async_sessionmaker(readonly: bool = False):
+    """async_sessionmaker ligado ao AsyncEngine (expire_on_commit=False)."""
+    if readonly not in _async_sessionmakers:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_sessionmakers[readonly] = async_sessionmaker(
+            get_async_engine(readonly),
+            autoflush=False,
+            expire_on_commit=False
+        )
+    return _async_sessionmakers[readonly]
+
+
+async def get_async_db() -> AsyncGenerator["AsyncSession", None]:
+    """
+    Dependency assíncrona para rotas `async def`.
+    Uso:
+        @router.get("/items")
+        async def get_items(db: AsyncSession = Depends(get_async_db)):
+            rows = (await db.execute(select(Item))).scalars().all()
+    Serviços síncronos podem ser reaproveitados com `await db.run_sync(...)`.
+    """
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+
+async def get_async_read_db() -> AsyncGenerator["AsyncSession", None]:
+    """Como get_async_db, mas no engine de leitura."""
+    async with get_async_sessionmaker(readonly=True)() as db:
+        yield db
+
+
+async def dispose_async_engine() -> None:
+    """Fecha as conexões dos AsyncEngines (shutdown da aplicação)."""
+    for async_engine in {id(e): e for e in _async_engines.values()}.values():
+        await async_engine.dispose()
+    _async_engines.clear()
+    _async_sessionmakers.clear()
+
+
 def init_db():
     """
     Inicializa o banco de dados criando todas as tabelas.
     Chamado na inicialização da aplicação.
     """
     from .models import Base
-    
+
     # Criar diretório data se não existir (para SQLite)
-    if DATABASE_URL.startswith("sqlite"):
+    if _is_sqlite(DATABASE_URL) and not _is_memory(DATABASE_URL):
         import pathlib
         db_path = DATABASE_URL.replace("sqlite:///", "")
         pathlib.Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-    
+
+    # PostgreSQL: device_metrics particionada por mês (antes do create_all)
+    from app.services.metric_partitions import create_partitioned_table, metric_partitions
+    create_partitioned_table(engine)
+
     Base.metadata.create_all(bind=engine)
+
+    # Partições do mês corrente e seguintes: inserts não dependem do coletor
+    db = SessionLocal()
+    try:
+        metric_partitions.ensure(db)
+    finally:
+        db.close()
     print(f"✅ Database initialized: {DATABASE_URL}")
@@ -4,7 +4,7 @@
 from datetime import datetime
 from typing import Optional, List
 from sqlalchemy import (
-    Column, Integer, String, Float, Boolean, DateTime, Text, JSON,
+    Column, Integer, String, Float, Boolean, DateTime, Text, JSON, LargeBinary,
     ForeignKey, Index, UniqueConstraint
 )
 from sqlalchemy.orm import declarative_base, relationship
@@ -69,6 +69,54 @@ class Device(Base):
         return f"<Device {self.device_id} ({self.manufacturer} {self.product_class})>"
 
 
+class DeviceSnapshot(Base):
+    """
+    Último documento do GenieACS visto para cada dispositivo.
+    Renovado pelo coletor; permite responder leituras sem ir ao NBI.
+    """
+    __tablename__ = "device_snapshots"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    device_id = Column(String(255), unique=True, nullable=False, index=True)  # _id do GenieACS
+    last_inform = Column(DateTime)  # _lastInform do documento
+    
+    # Conteúdo: JSON compactado (zlib) + hash do JSON para detectar mudanças
+    view = Column(String(50))  # view de projeção com que o documento foi buscado
+    data = Column(LargeBinary, nullable=False)
+    content_hash = Column(String(40))
+    raw_size = Column(Integer)  # tamanho do JSON descompactado (bytes)
+    version = Column(Integer, default=1)  # incrementa quando o conteúdo muda
+    
+    # Quando o documento foi obtido do GenieACS (base do max_staleness)
+    fetched_at = Column(DateTime, default=datetime.utcnow, index=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<DeviceSnapshot {self.device_id} v{self.version}>"
+
+
+class DeviceLookup(Base):
+    """
+    Índice local login PPPoE / serial / MAC -> _id do GenieACS.
+    Alimentado pelo coletor e pelas colunas de Device; evita buscas sem índice no NBI.
+    """
+    __tablename__ = "device_lookups"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(10), nullable=False)  # login, serial, mac, id
+    value = Column(String(255), nullable=False)  # normalizado (minúsculas; MAC aa:bb:cc:dd:ee:ff)
+    device_id = Column(String(255), nullable=False, index=True)  # _id do GenieACS
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint("kind", "value", name="uq_device_lookup_kind_value"),
+        Index("ix_device_lookups_value", "value"),
+    )
+    
+    def __repr__(self):
+        return f"<DeviceLookup {self.kind}={self.value} -> {self.device_id}>"
+
+
 class DeviceMetric(Base):
     """
     Métricas coletadas periodicamente de cada dispositivo.
@@ -125,6 +173,31 @@ class DeviceMetric(Base):
         return f"<DeviceMetric device={self.device_id} at {self.collected_at}>"
 
 
+class MetricPartition(Base):
+    """
+    Registro das partições mensais de device_metrics.
+    - native: partição do PostgreSQL (PARTITION OF device_metrics)
+    - hot: linhas ainda na tabela device_metrics (SQLite / tabela não particionada)
+    - archive: mês fechado movido para uma tabela própria (device_metrics_AAAA_MM)
+    """
+    __tablename__ = "metric_partitions"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    name = Column(String(64), unique=True, nullable=False)  # device_metrics_2025_01
+    period_start = Column(DateTime, nullable=False, index=True)
+    period_end = Column(DateTime, nullable=False)
+    storage = Column(String(10), nullable=False)  # native, hot, archive
+    status = Column(String(10), default="open", index=True)  # open, closed, dropped
+    row_count = Column(Integer)  # conhecido a partir do fechamento
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    closed_at = Column(DateTime)  # rollup feito
+    dropped_at = Column(DateTime)
+    
+    def __repr__(self):
+        return f"<MetricPartition {self.name} {self.storage}/{self.status}>"
+
+
 class DiagnosticLog(Base):
     """
     Log de diagnósticos executados (ping, traceroute, speedtest).
@@ -392,6 +465,41 @@ class MetricAggregation(Base):
         return f"<MetricAggregation {self.period_type} device={self.device_id}>"
 
 
+class DeviceHealth(Base):
+    """
+    Saúde de cada dispositivo calculada em lote (app/services/health_scoring.py).
+    Uma linha por dispositivo, sobrescrita a cada rodada; lida pelos dashboards.
+    """
+    __tablename__ = "device_health"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    device_id = Column(Integer, ForeignKey("devices.id", ondelete="CASCADE"), nullable=False, unique=True)
+    manufacturer = Column(String(100))  # cópia de Device.manufacturer (filtros do dashboard)
+    
+    # Saúde (janela curta) - None quando não há amostras suficientes
+    health_score = Column(Float)  # 0-100
+    anomaly_count = Column(Integer, default=0)
+    anomalies = Column(JSON, default=list)
+    
+    # Risco de falha (janela longa)
+    risk_score = Column(Integer, default=0)
+    risk_level = Column(String(10))  # minimal, low, medium, high, unknown
+    trend = Column(String(12))  # tendência de latência: increasing, decreasing, stable
+    
+    # Controle
+    samples = Column(Integer, default=0)  # amostras na janela de saúde
+    last_sample_at = Column(DateTime)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_device_health_score", "health_score"),
+        Index("ix_device_health_manufacturer_score", "manufacturer", "health_score"),
+    )
+    
+    def __repr__(self):
+        return f"<DeviceHealth device={self.device_id} score={self.health_score}>"
+
+
 class Conversation(Base):
     """
     Conversas com o serviço de LLM (ChatGPT).
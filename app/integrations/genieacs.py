@@ -0,0 +1,184 @@
+# app/integrations/genieacs.py
+"""
+Cliente NBI do GenieACS compartilhado pela aplicação.
+
+Um único httpx.AsyncClient com pool keep-alive (e HTTP/2 opcional) é criado
+no startup e fechado no shutdown. Routers, serviços e scripts usam
+get_nbi_client() em vez de abrir um AsyncClient por requisição, evitando
+um novo handshake TCP/TLS a cada chamada ao NBI.
+"""
+from __future__ import annotations
+
+import json
+import logging
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from app.settings import settings
+from app.integrations.json_stream import JSONArrayStream
+
+log = logging.getLogger("semppre-bridge.genieacs")
+
+_client: Optional[httpx.AsyncClient] = None
+
+# ---------------------- Helpers ----------------------
+def nbi_base_url() -> str:
+    return settings.GENIE_NBI.rstrip("/")
+
+
+def nbi_timeout(operation: str = "read") -> httpx.Timeout:
+    """
+    Timeout por tipo de operação:
+    - read: consultas pontuais (/devices?query=...)
+    - task: criação de tasks com connection_request (o CPE precisa responder)
+    - bulk: listagens grandes e proxy reverso
+    """
+    read = {
+        "read": settings.GENIE_NBI_READ_TIMEOUT,
+        "task": settings.GENIE_NBI_TASK_TIMEOUT,
+        "bulk": settings.GENIE_NBI_BULK_TIMEOUT,
+    }.get(operation, settings.GENIE_NBI_READ_TIMEOUT)
+    return httpx.Timeout(read, connect=settings.GENIE_NBI_CONNECT_TIMEOUT)
+
+
+def _mk_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.GENIE_NBI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.GENIE_NBI_MAX_KEEPALIVE,
+        keepalive_expiry=settings.GENIE_NBI_KEEPALIVE_EXPIRY,
+    )
+
+
+@lru_cache(maxsize=1)
+def _http2_available() -> bool:
+    if not settings.GENIE_NBI_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        log.warning("[NBI] GENIE_NBI_HTTP2=true mas o pacote 'h2' não está instalado; usando HTTP/1.1")
+        return False
+
+
+def _build_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=nbi_base_url(),
+        timeout=nbi_timeout("read"),
+        limits=_mk_limits(),
+        http2=_http2_available(),
+        verify=settings.GENIE_NBI_VERIFY_SSL,
+    )
+
+# ---------------------- Ciclo de vida ----------------------
+__all__ = [
+    "get_nbi_client",
+    "start_nbi_client",
+    "close_nbi_client",
+    "nbi_timeout",
+    "nbi_base_url",
+    "nbi_pool_info",
+    "iter_device_pages",
+]
+
+
+def get_nbi_client() -> httpx.AsyncClient:
+    """
+    Retorna o cliente NBI compartilhado.
+    Criado sob demanda quando usado fora da aplicação FastAPI (scripts).
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+
+async def start_nbi_client() -> httpx.AsyncClient:
+    """Cria o cliente no startup da aplicação."""
+    client = get_nbi_client()
+    log.info(
+        f"[NBI] pool iniciado base={nbi_base_url()} "
+        f"max_conn={settings.GENIE_NBI_MAX_CONNECTIONS} keepalive={settings.GENIE_NBI_MAX_KEEPALIVE} "
+        f"http2={_http2_available()}"
+    )
+    return client
+
+
+async def close_nbi_client() -> None:
+    """Fecha o pool no shutdown da aplicação (ou ao final de um script)."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        log.info("[NBI] pool encerrado")
+    _client = None
+
+
+def nbi_pool_info() -> Dict[str, object]:
+    return {
+        "base_url": nbi_base_url(),
+        "open": _client is not None and not _client.is_closed,
+        "http2": _http2_available(),
+        "max_connections": settings.GENIE_NBI_MAX_CONNECTIONS,
+        "max_keepalive_connections": settings.GENIE_NBI_MAX_KEEPALIVE,
+        "keepalive_expiry": settings.GENIE_NBI_KEEPALIVE_EXPIRY,
+    }
+
+
+# ---------------------- Iteração paginada ----------------------
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, separators=(",", ":"))
+
+
+async def iter_device_pages(
+    query: Optional[Dict[str, Any]] = None,
+    projection: Optional[str] = None,
+    page_size: Optional[int] = None,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """
+    Itera o inventário do NBI em páginas, com memória limitada ao tamanho da página.
+
+    Paginação por cursor em _id (sort _id + "_id > último visto"), que não
+    degrada como skip em frotas grandes. O corpo de cada página é decodificado
+    incrementalmente (JSONArrayStream) enquanto chega.
+
+    Args:
+        query: Filtro do GenieACS (ex: {"_tags": "cliente"})
+        projection: Valor de projection= (ver device_projection.get_projection)
+        page_size: Dispositivos por página (padrão GENIE_NBI_PAGE_SIZE)
+    """
+    client = get_nbi_client()
+    size = page_size or settings.GENIE_NBI_PAGE_SIZE
+    last_id: Optional[str] = None
+
+    while True:
+        page_query: Dict[str, Any] = dict(query or {})
+        if last_id is not None:
+            cursor = {"_id": {"$gt": last_id}}
+            page_query = {"$and": [page_query, cursor]} if page_query else cursor
+
+        params: Dict[str, Any] = {
+            "query": _dumps(page_query),
+            "sort": _dumps({"_id": 1}),
+            "limit": size,
+        }
+        if projection:
+            params["projection"] = projection
+
+        page: List[Dict[str, Any]] = []
+        parser = JSONArrayStream()
+        async with client.stream("GET", "/devices/", params=params, timeout=nbi_timeout("bulk")) as r:
+            r.raise_for_status()
+            async for chunk in r.aiter_bytes():
+                page.extend(parser.feed(chunk))
+        page.extend(parser.close())
+
+        if not page:
+            return
+        yield page
+        if len(page) < size:
+            return
+        last_id = page[-1].get("_id")
+        if last_id is None:
+            log.warning("[NBI] página sem _id; paginação interrompida")
+            return
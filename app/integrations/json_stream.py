@@ -0,0 +1,102 @@
+# app/integrations/json_stream.py
+"""
+Parser incremental para respostas JSON em array ([{...}, {...}, ...]).
+
+O NBI do GenieACS devolve listas de dispositivos como um único array JSON.
+Em vez de acumular o corpo inteiro e chamar response.json(), os chunks são
+alimentados em JSONArrayStream.feed() conforme chegam, e cada elemento
+completo é devolvido (e o texto dele descartado) imediatamente.
+
+Cada elemento é decodificado pelo scanner C do módulo json (raw_decode).
+Um elemento ainda incompleto só é re-tentado quando o buffer dobra de
+tamanho, o que mantém o custo total linear no tamanho do corpo.
+"""
+from __future__ import annotations
+
+import codecs
+import json
+import re
+from typing import Any, List
+
+_WS = re.compile(r"[ \t\n\r]*")
+
+
+class JSONArrayStream:
+    """Decodifica um array JSON de topo em elementos, chunk a chunk."""
+
+    def __init__(self) -> None:
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._retry_at = 0
+        self.started = False
+        self.finished = False
+        self.count = 0
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        """Adiciona bytes recebidos e retorna os elementos completos."""
+        self._buf += self._utf8.decode(chunk)
+        if len(self._buf) < self._retry_at:
+            return []
+        return self._drain(final=False)
+
+    def close(self) -> List[Any]:
+        """Fim do corpo: retorna o que restou e valida que o array fechou."""
+        self._buf += self._utf8.decode(b"", final=True)
+        items = self._drain(final=True)
+        if not self.finished:
+            raise ValueError("Array JSON incompleto")
+        return items
+
+    def _drain(self, final: bool) -> List[Any]:
+        items: List[Any] = []
+        buf = self._buf
+        n = len(buf)
+        pos = 0
+        retry_at = 0
+
+        while True:
+            pos = _WS.match(buf, pos).end()
+            if pos >= n:
+                break
+            ch = buf[pos]
+
+            if not self.started:
+                if ch != "[":
+                    raise ValueError(f"Esperado array JSON, recebido {ch!r}")
+                self.started = True
+                pos += 1
+                continue
+            if self.finished:
+                raise ValueError("Dados após o fim do array JSON")
+            if ch == "]":
+                self.finished = True
+                pos += 1
+                continue
+            if ch == ",":
+                pos += 1
+                continue
+
+            try:
+                item, end = self._decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if final:
+                    raise
+                # Elemento incompleto: espera o buffer dobrar antes de tentar de novo
+                retry_at = pos + 2 * (n - pos)
+                break
+            if not final and not isinstance(item, (dict, list)):
+                # Número no fim do buffer ("2" ou "2.") pode continuar no próximo chunk
+                nxt = _WS.match(buf, end).end()
+                if nxt >= n or buf[nxt] not in ",]":
+                    break
+            items.append(item)
+            pos = end
+
+        self._buf = buf[pos:]
+        self._retry_at = max(0, retry_at - pos)
+        self.count += len(items)
+        return items
+
+
+__all__ = ["JSONArrayStream"]
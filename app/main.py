@@ -8,7 +8,8 @@ from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
 from app.settings import settings
-from app.proxy import stream_proxy
+from app.proxy import stream_proxy, stream_upstream, get_proxy_stats
+from app.integrations.genieacs import get_nbi_client, nbi_timeout, start_nbi_client, close_nbi_client, nbi_pool_info
 from app.services.ixc_service import find_cliente_by_pppoe_login, find_cliente_full_by_pppoe_login  # integra com integrations/ixc.py
 from app.routers.tr069_router import router as tr069_router  # normalização TR-069
 from app.routers.metrics_router import router as metrics_router  # métricas e histórico
@@ -25,6 +26,10 @@ from app.routers.mobile_api_router import router as mobile_api_router  # API par
 from app.routers.update_router import router as update_router  # sistema de atualizações
 from app.routers.users_router import router as users_router  # gerenciamento de usuários e grupos
 from app.database import init_db  # inicialização do banco
+from app.database.connection import dispose_async_engine, get_async_engine, pool_info as db_pool_info
+from app.services.device_snapshot_service import fetch_device, snapshot_store  # snapshots locais do GenieACS
+from app.services.analytics_pipeline import analytics_pipeline  # análise do ingest fora da requisição
+from app.services.device_lookup_service import device_lookup  # índice login/serial/MAC -> _id
 
 import base64
 import httpx
@@ -125,6 +130,16 @@ def _list_routes():
 async def debug_routes():
     return _list_routes()
 
+@app.get("/__debug/proxy")
+async def debug_proxy_stats():
+    """Contadores do proxy NBI (bytes, TTFB) e estado do pool."""
+    return {"proxy": get_proxy_stats(), "pool": nbi_pool_info()}
+
+@app.get("/__debug/snapshots")
+async def debug_snapshot_stats():
+    """Acertos do LRU/banco de snapshots de dispositivos."""
+    return snapshot_store.stats()
+
 @app.on_event("startup")
 async def _debug_startup_routes():
     routes = _list_routes()
@@ -255,6 +270,8 @@ async def health():
         "version": APP_VERSION,
         "genie_nbi": settings.GENIE_NBI,
         "genie_fs": settings.GENIE_FS,
+        "genie_nbi_pool": nbi_pool_info(),
+        "db_pool": db_pool_info(),
         "ixc_enabled": bool(getattr(settings, "IXC_BASE_URL", "")),
     }
 
@@ -281,49 +298,30 @@ async def proxy_api_genie(path: str, request: Request):
     if request.url.query:
         url = f"{url}?{request.url.query}"
     
-    method = request.method.upper()
-    headers = dict(request.headers)
-    # remove hop-by-hop headers
-    for h in ["host", "content-length", "connection", "keep-alive", "transfer-encoding", "upgrade"]:
-        headers.pop(h, None)
-    
-    body = await request.body()
-    timeout = httpx.Timeout(60.0, read=120.0, write=60.0, connect=30.0)
-    
-    async with httpx.AsyncClient(timeout=timeout, verify=False) as client:
-        try:
-            r = await client.request(method, url, headers=headers, content=body)
-        except httpx.HTTPError as e:
-            raise HTTPException(status_code=502, detail=f"GenieACS NBI error: {e}")
-    
-    resp_headers = {k: v for k, v in r.headers.items() 
-                    if k.lower() not in {"content-encoding", "transfer-encoding", "connection"}}
-    return Response(content=r.content, status_code=r.status_code, 
-                   headers=resp_headers, media_type=r.headers.get("content-type"))
+    return await stream_upstream(request, url, error_prefix="GenieACS NBI error")
 
 @app.get("/genie/devices/{device_id}")
-async def genie_device(device_id: str):
+async def genie_device(
+    device_id: str,
+    view: Optional[str] = Query(None, description="View de projeção (ex: identity, wifi, mobile); vazio = documento completo"),
+    max_staleness: Optional[int] = Query(None, ge=0, description="Aceita o snapshot local com até N segundos (só com view; o documento completo vem sempre do NBI)"),
+):
     # GenieACS doesn't support /devices/{id} directly, need to use query
-    import json
-    url = f"{settings.GENIE_NBI.rstrip('/')}/devices"
-    query = json.dumps({"_id": device_id})
     try:
-        async with httpx.AsyncClient(timeout=30, verify=False) as c:
-            r = await c.get(url, params={"query": query})
-        data = r.json()
-        if data and len(data) > 0:
-            return data[0]
+        device = await fetch_device(device_id, view, max_staleness)
+        if device:
+            return device
         raise HTTPException(status_code=404, detail=f"Device {device_id} not found")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Genie NBI upstream error: {e!s}")
 
 @app.get("/genie/devices")
 async def genie_devices(query: str = ""):
-    url = f"{settings.GENIE_NBI.rstrip('/')}/devices"
     params = {"query": query} if query else {}
     try:
-        async with httpx.AsyncClient(timeout=30, verify=False) as c:
-            r = await c.get(url, params=params)
+        r = await get_nbi_client().get("/devices", params=params, timeout=nbi_timeout("bulk"))
         return r.json()
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Genie NBI upstream error: {e!s}")
@@ -521,8 +519,20 @@ app.include_router(users_router)
 async def startup_event():
     """Inicializa o banco de dados na inicialização."""
     init_db()
+    get_async_engine()  # falha já na subida se o driver assíncrono faltar
+    await asyncio.to_thread(device_lookup.sync)  # índice login/serial/MAC fora das requisições
+    await start_nbi_client()
+    analytics_pipeline.start()
     log.info("🚀 Semppre Bridge started successfully")
 
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Drena o pipeline de análise e fecha o pool do GenieACS NBI e o engine assíncrono."""
+    await analytics_pipeline.stop()
+    await close_nbi_client()
+    await dispose_async_engine()
+
 # =========================
 # DIAGNÓSTICO (ferramentas locais)
 # =========================
@@ -7,6 +7,7 @@ Componentes:
 - DropoutClassifier: classificação de risco de queda de conexão
 - WifiQualityScorer: scoring de qualidade de WiFi
 - NetworkAnalyzer: análise avançada de rede com detecção de anomalias
+- StreamingDetector: estado por dispositivo/métrica para detecção amostra a amostra
 - LearningEngine: motor de aprendizado contínuo com feedback
 """
 
@@ -14,6 +15,7 @@ from app.ml.latency_predictor import LatencyPredictor
 from app.ml.dropout_classifier import DropoutClassifier
 from app.ml.wifi_quality_scorer import WifiQualityScorer
 from app.ml.network_analyzer import NetworkAnalyzer, network_analyzer
+from app.ml.streaming_detector import StreamingDetector
 from app.ml.learning_engine import LearningEngine, learning_engine
 
 __all__ = [
@@ -22,6 +24,7 @@ __all__ = [
     "WifiQualityScorer",
     "NetworkAnalyzer",
     "network_analyzer",
+    "StreamingDetector",
     "LearningEngine",
     "learning_engine",
 ]
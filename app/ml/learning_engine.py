@@ -12,9 +12,11 @@ Este módulo fornece:
 
 from __future__ import annotations
 
+import functools
 import json
 import logging
 import os
+import threading
 from collections import defaultdict
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
@@ -63,6 +65,15 @@ class ThresholdConfig:
     adjustment_history: List[Tuple[datetime, float, str]] = field(default_factory=list)
 
 
+def _synchronized(method):
+    """Executa o método segurando o lock da instância."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
 class LearningEngine:
     """
     Motor de aprendizado contínuo para o sistema de IA.
@@ -73,11 +84,16 @@ class LearningEngine:
     - Memoriza padrões conhecidos
     - Detecta drift de conceito
     - Persiste conhecimento em disco
+    
+    Thread-safe: o pipeline de análise do ingest atualiza baselines numa
+    thread enquanto as rotas leem e gravam no event loop; os métodos
+    públicos (e _save_state) serializam pelo mesmo RLock.
     """
     
     def __init__(self, data_dir: str = "data/ml"):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
         
         # Memórias
         self._patterns: Dict[str, PatternMemory] = {}
@@ -145,6 +161,7 @@ class LearningEngine:
         except Exception as e:
             log.warning("Erro ao carregar estado: %s", e)
     
+    @_synchronized
     def _save_state(self):
         """Salva estado no disco."""
         try:
@@ -192,6 +209,7 @@ class LearningEngine:
     
     # ============ Gerenciamento de Thresholds ============
     
+    @_synchronized
     def get_threshold(self, metric_name: str) -> float:
         """Obtém threshold atual para uma métrica."""
         if metric_name in self._thresholds:
@@ -214,6 +232,7 @@ class LearningEngine:
         
         return 100.0  # Default genérico
     
+    @_synchronized
     def adjust_threshold(
         self,
         metric_name: str,
@@ -271,6 +290,7 @@ class LearningEngine:
         
         return config
     
+    @_synchronized
     def auto_calibrate_thresholds(
         self,
         recent_metrics: Dict[str, List[float]],
@@ -314,6 +334,7 @@ class LearningEngine:
     
     # ============ Gerenciamento de Baselines ============
     
+    @_synchronized
     def update_baseline(
         self,
         device_id: str,
@@ -341,6 +362,7 @@ class LearningEngine:
         
         self._metric_baselines[device_id] = current
     
+    @_synchronized
     def get_baseline(
         self,
         device_id: str,
@@ -354,6 +376,7 @@ class LearningEngine:
         
         return baseline
     
+    @_synchronized
     def detect_baseline_drift(
         self,
         device_id: str,
@@ -396,6 +419,7 @@ class LearningEngine:
     
     # ============ Gerenciamento de Padrões ============
     
+    @_synchronized
     def record_pattern(
         self,
         pattern_type: str,
@@ -440,6 +464,7 @@ class LearningEngine:
         
         return pattern
     
+    @_synchronized
     def find_similar_patterns(
         self,
         signature: Dict[str, Any],
@@ -498,6 +523,7 @@ class LearningEngine:
         
         return matching / len(all_keys)
     
+    @_synchronized
     def record_pattern_outcome(
         self,
         pattern_id: str,
@@ -531,6 +557,7 @@ class LearningEngine:
         
         self._save_state()
     
+    @_synchronized
     def get_recommended_action(
         self,
         pattern_type: str,
@@ -555,6 +582,7 @@ class LearningEngine:
     
     # ============ Feedback Loop ============
     
+    @_synchronized
     def record_feedback(
         self,
         event_type: str,
@@ -625,6 +653,7 @@ class LearningEngine:
         # Reset contador
         self._false_positives = 0
     
+    @_synchronized
     def get_learning_stats(self) -> Dict[str, Any]:
         """Retorna estatísticas de aprendizado."""
         total_events = len(self._learning_events)
@@ -14,12 +14,17 @@ from __future__ import annotations
 
 import logging
 import math
-from collections import defaultdict
+import threading
+from bisect import bisect_right
+from collections import defaultdict, deque
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 from enum import Enum
 from typing import Any, Dict, List, Optional, Tuple
-import statistics
+
+import numpy as np
+
+from app.ml.streaming_detector import StreamingDetector
 
 log = logging.getLogger("semppre-bridge.ml.network_analyzer")
 
@@ -156,7 +161,7 @@ class NetworkAnalyzer:
     Analisador avançado de rede com capacidades de ML.
     
     Funcionalidades:
-    - Detecção de anomalias usando Z-score e IQR
+    - Detecção de anomalias usando Z-score e IQR (em lote ou amostra a amostra)
     - Correlação de eventos entre dispositivos
     - Análise de tendências com regressão linear
     - Segmentação de rede por comportamento
@@ -168,14 +173,27 @@ class NetworkAnalyzer:
         anomaly_threshold: float = 2.5,  # Desvios padrão para anomalia
         correlation_window_minutes: int = 30,
         min_samples_for_trend: int = 10,
+        stream_window: int = 60,  # amostras por série em observe()
+        stream_min_samples: int = 10,
+        max_anomaly_history: int = 10_000,  # anomalias recentes mantidas em memória
     ):
         self.anomaly_threshold = anomaly_threshold
         self.correlation_window = timedelta(minutes=correlation_window_minutes)
         self.min_samples_for_trend = min_samples_for_trend
         
+        # Estado por (dispositivo, métrica) para detecção amostra a amostra
+        self.stream = StreamingDetector(
+            window=stream_window,
+            min_samples=stream_min_samples,
+            z_threshold=anomaly_threshold,
+        )
+        
         # Histórico para análise
         self._device_history: Dict[str, List[Dict]] = defaultdict(list)
-        self._anomaly_history: List[AnomalyEvent] = []
+        # Limitado: observe() registra anomalias de cada amostra do ingest
+        self._anomaly_history: "deque[AnomalyEvent]" = deque(maxlen=max_anomaly_history)
+        # observe() roda na thread do pipeline de análise; as rotas, no event loop
+        self._history_lock = threading.Lock()
         self._baseline_metrics: Dict[str, Dict[str, float]] = {}
         
         log.info("NetworkAnalyzer inicializado com threshold=%.2f", anomaly_threshold)
@@ -214,14 +232,22 @@ class NetworkAnalyzer:
             if len(values) < 3:
                 continue
             
+            arr = np.asarray(values, dtype=float)
+            
             # Z-Score detection
-            z_anomalies = self._detect_zscore_anomalies(values)
+            z_anomalies = self._detect_zscore_anomalies(arr)
             
             # IQR detection
-            iqr_anomalies = self._detect_iqr_anomalies(values)
+            iqr_anomalies = self._detect_iqr_anomalies(arr)
             
             # Combinar e deduplicar
             all_anomaly_indices = set(z_anomalies) | set(iqr_anomalies)
+            if not all_anomaly_indices:
+                continue
+            
+            # Média e desvio da série: uma vez por métrica, não por anomalia
+            stats = self._series_stats(arr)
+            z_set, iqr_set = set(z_anomalies), set(iqr_anomalies)
             
             for idx in all_anomaly_indices:
                 if idx >= len(timestamps):
@@ -230,8 +256,9 @@ class NetworkAnalyzer:
                 severity = self._calculate_anomaly_severity(
                     values[idx], 
                     values,
-                    in_zscore=idx in z_anomalies,
-                    in_iqr=idx in iqr_anomalies,
+                    in_zscore=idx in z_set,
+                    in_iqr=idx in iqr_set,
+                    stats=stats,
                 )
                 
                 anomaly_type = self._classify_anomaly_type(metric_name, values, idx)
@@ -242,7 +269,7 @@ class NetworkAnalyzer:
                     timestamp=timestamps[idx],
                     severity=severity,
                     description=self._generate_anomaly_description(
-                        metric_name, values[idx], values, anomaly_type
+                        metric_name, values[idx], values, anomaly_type, mean=stats[0]
                     ),
                     affected_metrics=[metric_name],
                     root_cause_probability=self._estimate_root_causes(
@@ -256,50 +283,109 @@ class NetworkAnalyzer:
                 anomalies.append(anomaly)
         
         # Armazenar para correlação futura
-        self._anomaly_history.extend(anomalies)
+        with self._history_lock:
+            self._anomaly_history.extend(anomalies)
         
         return anomalies
     
-    def _detect_zscore_anomalies(self, values: List[float]) -> List[int]:
+    def observe(
+        self,
+        device_id: str,
+        metrics: Dict[str, float],
+        timestamp: Optional[datetime] = None,
+    ) -> List[AnomalyEvent]:
+        """
+        Detecta anomalias em uma amostra nova (uma por métrica), contra o
+        histórico em memória do dispositivo.
+        
+        Diferente de detect_anomalies, que precisa da série inteira a cada
+        chamada, aqui cada valor custa O(1) (ver StreamingDetector). Cada
+        série só produz veredito após `stream_min_samples` amostras.
+        Pode ser chamado de outra thread (o estado por série e o histórico
+        de anomalias têm lock próprio).
+        
+        Args:
+            device_id: ID do dispositivo
+            metrics: Dicionário com nome_metrica -> valor da amostra
+            timestamp: Instante da amostra (padrão: agora)
+            
+        Returns:
+            Lista de anomalias detectadas nesta amostra
+        """
+        anomalies: List[AnomalyEvent] = []
+        timestamp = timestamp or datetime.utcnow()
+        
+        for metric_name, value in metrics.items():
+            if value is None or isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            verdict = self.stream.update(device_id, metric_name, value)
+            if verdict is None or not verdict.is_anomaly:
+                continue
+            
+            # Só em anomalias: a janela vira lista para descrição e causas
+            window = self.stream.window_values(device_id, metric_name)
+            idx = len(window) - 1
+            anomaly_type = self._classify_anomaly_type(metric_name, window, idx)
+            
+            anomalies.append(AnomalyEvent(
+                anomaly_type=anomaly_type,
+                device_id=device_id,
+                timestamp=timestamp,
+                severity=verdict.severity,
+                description=self._generate_anomaly_description(
+                    metric_name, verdict.value, window, anomaly_type
+                ),
+                affected_metrics=[metric_name],
+                root_cause_probability=self._estimate_root_causes(
+                    metric_name, window, idx, device_id
+                ),
+                recommended_actions=self._generate_recommendations(
+                    anomaly_type, verdict.severity, metric_name
+                ),
+            ))
+        
+        with self._history_lock:
+            self._anomaly_history.extend(anomalies)
+        return anomalies
+    
+    @staticmethod
+    def _series_stats(values) -> Tuple[float, float]:
+        """Média e desvio padrão amostral (n - 1); desvio 0 com uma amostra."""
+        arr = np.asarray(values, dtype=float)
+        mean = float(arr.mean())
+        stdev = float(arr.std(ddof=1)) if arr.size > 1 else 0.0
+        return mean, stdev
+    
+    def _detect_zscore_anomalies(self, values) -> List[int]:
         """Detecta anomalias usando Z-Score."""
         if len(values) < 3:
             return []
         
-        mean = statistics.mean(values)
-        stdev = statistics.stdev(values) if len(values) > 1 else 0
+        arr = np.asarray(values, dtype=float)
+        mean, stdev = self._series_stats(arr)
         
         if stdev == 0:
             return []
         
-        anomalies = []
-        for i, v in enumerate(values):
-            zscore = abs((v - mean) / stdev)
-            if zscore > self.anomaly_threshold:
-                anomalies.append(i)
-        
-        return anomalies
+        zscore = np.abs((arr - mean) / stdev)
+        return np.flatnonzero(zscore > self.anomaly_threshold).tolist()
     
-    def _detect_iqr_anomalies(self, values: List[float]) -> List[int]:
+    def _detect_iqr_anomalies(self, values) -> List[int]:
         """Detecta anomalias usando método IQR."""
         if len(values) < 4:
             return []
         
-        sorted_vals = sorted(values)
-        n = len(sorted_vals)
+        arr = np.asarray(values, dtype=float)
+        n = arr.size
         
-        q1 = sorted_vals[n // 4]
-        q3 = sorted_vals[3 * n // 4]
+        # Mesmos quartis por posição (n//4, 3n//4) da versão ordenada
+        q1, q3 = np.partition(arr, (n // 4, 3 * n // 4))[[n // 4, 3 * n // 4]]
         iqr = q3 - q1
         
         lower = q1 - 1.5 * iqr
         upper = q3 + 1.5 * iqr
         
-        anomalies = []
-        for i, v in enumerate(values):
-            if v < lower or v > upper:
-                anomalies.append(i)
-        
-        return anomalies
+        return np.flatnonzero((arr < lower) | (arr > upper)).tolist()
     
     def _calculate_anomaly_severity(
         self,
@@ -307,10 +393,12 @@ class NetworkAnalyzer:
         all_values: List[float],
         in_zscore: bool,
         in_iqr: bool,
+        stats: Optional[Tuple[float, float]] = None,
     ) -> float:
-        """Calcula severidade da anomalia (0.0 - 1.0)."""
-        mean = statistics.mean(all_values)
-        stdev = statistics.stdev(all_values) if len(all_values) > 1 else 1
+        """Calcula severidade da anomalia (0.0 - 1.0). `stats`: (média, desvio) já calculados."""
+        mean, stdev = stats or self._series_stats(all_values)
+        if len(all_values) <= 1:
+            stdev = 1
         
         # Desvio normalizado
         deviation = abs(value - mean) / stdev if stdev > 0 else 0
@@ -354,9 +442,11 @@ class NetworkAnalyzer:
         value: float,
         all_values: List[float],
         anomaly_type: AnomalyType,
+        mean: Optional[float] = None,
     ) -> str:
         """Gera descrição legível da anomalia."""
-        mean = statistics.mean(all_values)
+        if mean is None:
+            mean = float(np.mean(all_values))
         pct_diff = ((value - mean) / mean * 100) if mean != 0 else 0
         
         direction = "acima" if value > mean else "abaixo"
@@ -488,15 +578,18 @@ class NetworkAnalyzer:
             )
         
         # Regressão linear simples
-        n = len(values)
-        x = list(range(n))
+        y = np.asarray(values, dtype=float)
+        n = y.size
+        x = np.arange(n, dtype=float)
         
-        x_mean = sum(x) / n
-        y_mean = sum(values) / n
+        x_mean = (n - 1) / 2
+        y_mean = float(y.mean())
         
         # Calcular slope e intercept
-        numerator = sum((x[i] - x_mean) * (values[i] - y_mean) for i in range(n))
-        denominator = sum((x[i] - x_mean) ** 2 for i in range(n))
+        dx = x - x_mean
+        dy = y - y_mean
+        numerator = float(dx @ dy)
+        denominator = float(dx @ dx)
         
         if denominator == 0:
             slope = 0
@@ -506,8 +599,9 @@ class NetworkAnalyzer:
         intercept = y_mean - slope * x_mean
         
         # Calcular R²
-        ss_tot = sum((v - y_mean) ** 2 for v in values)
-        ss_res = sum((values[i] - (slope * x[i] + intercept)) ** 2 for i in range(n))
+        ss_tot = float(dy @ dy)
+        resid = y - (slope * x + intercept)
+        ss_res = float(resid @ resid)
         
         r_squared = 1 - (ss_res / ss_tot) if ss_tot > 0 else 0
         r_squared = max(0, min(1, r_squared))  # Clamp entre 0 e 1
@@ -520,8 +614,8 @@ class NetworkAnalyzer:
         else:
             direction = TrendDirection.DECREASING
         
-        # Verificar volatilidade
-        stdev = statistics.stdev(values) if len(values) > 1 else 0
+        # Verificar volatilidade (ss_tot / (n - 1) = variância amostral)
+        stdev = math.sqrt(ss_tot / (n - 1)) if n > 1 else 0
         cv = stdev / abs(y_mean) if y_mean != 0 else 0
         
         if cv > 0.5:  # Coeficiente de variação alto
@@ -562,62 +656,110 @@ class NetworkAnalyzer:
         - Proximidade temporal
         - Tipo de anomalia similar
         - Características compartilhadas
+        
+        Varredura sobre os eventos ordenados por tempo: O(n log n), em vez
+        de comparar todos os pares.
         """
         if len(anomalies) < 2:
             return []
         
         window = timedelta(minutes=time_window_minutes)
+        window_us = (window.days * 86400 + window.seconds) * 1_000_000 + window.microseconds
         correlated_groups: List[CorrelatedEvent] = []
-        processed = set()
         
         # Ordenar por timestamp
         sorted_anomalies = sorted(anomalies, key=lambda a: a.timestamp)
+        n = len(sorted_anomalies)
+        
+        # Instantes em µs inteiros (comparação exata com a janela) e, para cada
+        # evento, o fim da sua janela: ends[i] = primeiro índice fora dela
+        t0 = sorted_anomalies[0].timestamp
+        offsets = [a.timestamp - t0 for a in sorted_anomalies]
+        us = np.fromiter(
+            ((d.days * 86400 + d.seconds) * 1_000_000 + d.microseconds for d in offsets),
+            dtype=np.int64,
+            count=n,
+        )
+        ends = np.searchsorted(us, us + window_us, side="right").tolist()
+        
+        # Candidatos de um evento: mesmo tipo ou severidade > 0.6. Uma lista
+        # ordenada de índices por tipo e uma dos severos; `skip` pula os já
+        # agrupados, então cada evento é visitado uma vez ao entrar num grupo
+        by_type: Dict[AnomalyType, List[int]] = defaultdict(list)
+        severe: List[int] = []
+        for idx, a in enumerate(sorted_anomalies):
+            by_type[a.anomaly_type].append(idx)
+            if a.severity > 0.6:
+                severe.append(idx)
+        skips = {key: list(range(len(lst) + 1)) for key, lst in by_type.items()}
+        severe_skip = list(range(len(severe) + 1))
+        
+        def _next(skip: List[int], k: int) -> int:
+            # Menor posição >= k ainda não agrupada (com compressão de caminho)
+            root = k
+            while skip[root] != root:
+                root = skip[root]
+            while skip[k] != root:
+                skip[k], k = root, skip[k]
+            return root
+        
+        def _window(lst: List[int], skip: List[int], i: int, end: int) -> List[int]:
+            found = []
+            k = _next(skip, bisect_right(lst, i))
+            while k < len(lst) and lst[k] < end:
+                found.append(lst[k])
+                k = _next(skip, k + 1)
+            return found
+        
+        def _remove(lst: List[int], skip: List[int], idx: int) -> None:
+            k = bisect_right(lst, idx) - 1
+            if k >= 0 and lst[k] == idx:
+                skip[k] = k + 1
+        
+        processed = np.zeros(n, dtype=bool)
         
         for i, anomaly in enumerate(sorted_anomalies):
-            if i in processed:
+            if processed[i]:
                 continue
             
             # Encontrar anomalias dentro da janela
-            group = [anomaly]
-            group_indices = {i}
-            
-            for j, other in enumerate(sorted_anomalies[i+1:], start=i+1):
-                if j in processed:
-                    continue
-                
-                time_diff = abs((other.timestamp - anomaly.timestamp).total_seconds())
-                
-                if time_diff <= window.total_seconds():
-                    # Verificar similaridade de tipo
-                    if (other.anomaly_type == anomaly.anomaly_type or 
-                        other.severity > 0.6):
-                        group.append(other)
-                        group_indices.add(j)
+            kind = anomaly.anomaly_type
+            members = set(_window(by_type[kind], skips[kind], i, ends[i]))
+            members.update(_window(severe, severe_skip, i, ends[i]))
             
             # Só criar grupo se tiver mais de um evento
-            if len(group) > 1:
-                processed.update(group_indices)
-                
-                # Calcular características compartilhadas
-                shared_chars = self._find_shared_characteristics(group)
-                
-                # Gerar hipótese de causa raiz
-                hypothesis = self._generate_root_cause_hypothesis(group, shared_chars)
-                
-                correlated = CorrelatedEvent(
-                    correlation_id=f"corr_{anomaly.timestamp.strftime('%Y%m%d%H%M%S')}_{len(group)}",
-                    events=group,
-                    common_timeframe=(
-                        min(a.timestamp for a in group),
-                        max(a.timestamp for a in group),
-                    ),
-                    shared_characteristics=shared_chars,
-                    root_cause_hypothesis=hypothesis,
-                    confidence=self._calculate_correlation_confidence(group),
-                    affected_device_count=len(set(a.device_id for a in group)),
-                )
-                
-                correlated_groups.append(correlated)
+            if not members:
+                continue
+            
+            group_indices = [i, *sorted(members)]
+            group = [sorted_anomalies[j] for j in group_indices]
+            for j in group_indices:
+                processed[j] = True
+                a = sorted_anomalies[j]
+                _remove(by_type[a.anomaly_type], skips[a.anomaly_type], j)
+                if a.severity > 0.6:
+                    _remove(severe, severe_skip, j)
+            
+            # Calcular características compartilhadas
+            shared_chars = self._find_shared_characteristics(group)
+            
+            # Gerar hipótese de causa raiz
+            hypothesis = self._generate_root_cause_hypothesis(group, shared_chars)
+            
+            correlated = CorrelatedEvent(
+                correlation_id=f"corr_{anomaly.timestamp.strftime('%Y%m%d%H%M%S')}_{len(group)}",
+                events=group,
+                common_timeframe=(
+                    min(a.timestamp for a in group),
+                    max(a.timestamp for a in group),
+                ),
+                shared_characteristics=shared_chars,
+                root_cause_hypothesis=hypothesis,
+                confidence=self._calculate_correlation_confidence(group),
+                affected_device_count=len(set(a.device_id for a in group)),
+            )
+            
+            correlated_groups.append(correlated)
         
         return correlated_groups
     
@@ -0,0 +1,277 @@
+# app/ml/streaming_detector.py
+"""
+Streaming Detector - detecção de anomalias amostra a amostra.
+
+Estado em memória por (dispositivo, métrica), com custo O(1) por amostra:
+- RollingWindow: buffer circular array('d') das últimas N amostras, com
+  média e variância de Welford atualizadas na entrada e na saída de cada valor
+  (recalculadas do buffer a cada volta completa, para não acumular erro)
+- P2Quantile: estimador P² (Jain & Chlamtac, 1985) de um quantil com 5
+  marcadores, sem guardar as amostras; Q1 e Q3 dão as cercas do IQR
+
+O veredito de cada amostra é calculado contra o estado anterior a ela
+(o valor anômalo não infla a própria média), com os mesmos critérios do
+NetworkAnalyzer.detect_anomalies: Z-Score acima do limiar ou fora de
+[Q1 - 1.5·IQR, Q3 + 1.5·IQR]. Os quantis P² cobrem todo o histórico da série;
+a média e o desvio, só a janela.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+log = logging.getLogger("semppre-bridge.ml.streaming_detector")
+
+
+class RollingWindow:
+    """Últimas `size` amostras com média/variância móveis (Welford)."""
+
+    __slots__ = ("size", "_buf", "_pos", "count", "mean", "_m2")
+
+    def __init__(self, size: int):
+        self.size = max(2, size)
+        self._buf = array("d", bytes(8 * self.size))
+        self._pos = 0
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def push(self, x: float) -> None:
+        if self.count == self.size:
+            # Remove o valor mais antigo (Welford inverso)
+            old = self._buf[self._pos]
+            n = self.count - 1
+            delta = old - self.mean
+            self.mean -= delta / n
+            self._m2 -= delta * (old - self.mean)
+            self.count = n
+        self._buf[self._pos] = x
+        self._pos = (self._pos + 1) % self.size
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+        if self._pos == 0 and self.count == self.size:
+            self._recompute()
+
+    def _recompute(self) -> None:
+        self.mean = math.fsum(self._buf) / self.size
+        self._m2 = math.fsum((v - self.mean) ** 2 for v in self._buf)
+
+    @property
+    def variance(self) -> float:
+        """Variância amostral (n - 1)."""
+        return max(self._m2, 0.0) / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def stdev(self) -> float:
+        return math.sqrt(self.variance)
+
+    def values(self) -> List[float]:
+        """Amostras da janela, da mais antiga para a mais recente."""
+        if self.count < self.size:
+            return list(self._buf[:self.count])
+        return list(self._buf[self._pos:]) + list(self._buf[:self._pos])
+
+
+class P2Quantile:
+    """Estimativa P² de um quantil `p` (0-1) em memória constante."""
+
+    __slots__ = ("p", "count", "_q", "_n", "_np", "_dn")
+
+    def __init__(self, p: float):
+        self.p = p
+        self.count = 0
+        self._q = array("d")  # alturas dos marcadores
+        self._n = array("d", (1, 2, 3, 4, 5))  # posições reais
+        self._np = array("d", (1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5))  # posições desejadas
+        self._dn = (0.0, p / 2, p, (1 + p) / 2, 1.0)
+
+    def add(self, x: float) -> None:
+        self.count += 1
+        q = self._q
+        if self.count <= 5:
+            q.append(x)
+            if self.count == 5:
+                self._q = array("d", sorted(q))
+            return
+
+        n = self._n
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._np[i] += self._dn[i]
+
+        for i in (1, 2, 3):
+            d = self._np[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                s = 1 if d > 0 else -1
+                # Parabólica; se sair da ordem dos vizinhos, linear
+                qp = q[i] + s / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + s) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - s) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + s * (q[i + s] - q[i]) / (n[i + s] - n[i])
+                q[i] = qp
+                n[i] += s
+
+    def value(self) -> float:
+        if self.count == 0:
+            return 0.0
+        if self.count < 5:
+            # Poucas amostras: quantil exato (interpolação linear)
+            data = sorted(self._q)
+            pos = self.p * (len(data) - 1)
+            lo = int(pos)
+            hi = min(lo + 1, len(data) - 1)
+            return data[lo] + (data[hi] - data[lo]) * (pos - lo)
+        return self._q[2]
+
+
+@dataclass
+class StreamVerdict:
+    """Resultado de uma amostra contra o estado da série."""
+    value: float
+    mean: float
+    stdev: float
+    zscore: float
+    lower: float  # cerca inferior do IQR
+    upper: float  # cerca superior do IQR
+    in_zscore: bool
+    in_iqr: bool
+    severity: float  # 0.0 - 1.0
+    samples: int  # amostras no estado antes desta
+
+    @property
+    def is_anomaly(self) -> bool:
+        return self.in_zscore or self.in_iqr
+
+
+class _SeriesState:
+    __slots__ = ("window", "q1", "q3")
+
+    def __init__(self, window: int):
+        self.window = RollingWindow(window)
+        self.q1 = P2Quantile(0.25)
+        self.q3 = P2Quantile(0.75)
+
+
+class StreamingDetector:
+    """
+    Estado de detecção por (dispositivo, métrica).
+
+    Até `min_samples` amostras a série só aquece (update retorna None).
+    Acima de `max_series` séries, a menos usada recentemente é descartada.
+    """
+
+    def __init__(
+        self,
+        window: int = 60,
+        min_samples: int = 10,
+        z_threshold: float = 2.5,
+        iqr_k: float = 1.5,
+        max_series: int = 200_000,
+    ):
+        self.window = window
+        self.min_samples = max(3, min_samples)
+        self.z_threshold = z_threshold
+        self.iqr_k = iqr_k
+        self.max_series = max_series
+        self._series: "OrderedDict[Tuple[str, str], _SeriesState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._evicted = 0
+
+    def update(self, device_id: str, metric: str, value: float) -> Optional[StreamVerdict]:
+        """Avalia `value` contra a série e o incorpora ao estado."""
+        key = (device_id, metric)
+        x = float(value)
+        if not math.isfinite(x):
+            return None
+        with self._lock:
+            state = self._series.get(key)
+            if state is None:
+                state = self._series[key] = _SeriesState(self.window)
+                if len(self._series) > self.max_series:
+                    self._series.popitem(last=False)
+                    self._evicted += 1
+            else:
+                self._series.move_to_end(key)
+
+            verdict = None
+            w = state.window
+            if w.count >= self.min_samples:
+                verdict = self._judge(x, w, state.q1.value(), state.q3.value())
+            w.push(x)
+            state.q1.add(x)
+            state.q3.add(x)
+            return verdict
+
+    def _judge(self, x: float, w: RollingWindow, q1: float, q3: float) -> StreamVerdict:
+        mean = w.mean
+        # Série constante: piso de 1% da média, para um salto ainda ter Z-Score
+        stdev = max(w.stdev, abs(mean) * 0.01, 1e-9)
+        zscore = (x - mean) / stdev
+        iqr = q3 - q1
+        lower, upper = q1 - self.iqr_k * iqr, q3 + self.iqr_k * iqr
+        in_zscore = abs(zscore) > self.z_threshold
+        in_iqr = x < lower or x > upper
+
+        # Mesma escala do NetworkAnalyzer._calculate_anomaly_severity
+        severity = min(abs(zscore) / 5.0, 1.0)
+        if in_zscore and in_iqr:
+            severity = min(severity * 1.2, 1.0)
+
+        return StreamVerdict(
+            value=x,
+            mean=mean,
+            stdev=stdev,
+            zscore=zscore,
+            lower=lower,
+            upper=upper,
+            in_zscore=in_zscore,
+            in_iqr=in_iqr,
+            severity=severity,
+            samples=w.count,
+        )
+
+    def window_values(self, device_id: str, metric: str) -> List[float]:
+        """Amostras na janela da série (vazio se não existe)."""
+        with self._lock:
+            state = self._series.get((device_id, metric))
+            return state.window.values() if state else []
+
+    def reset(self, device_id: Optional[str] = None) -> None:
+        """Descarta o estado de um dispositivo (ou de todos)."""
+        with self._lock:
+            if device_id is None:
+                self._series.clear()
+                return
+            for key in [k for k in self._series if k[0] == device_id]:
+                del self._series[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "series": len(self._series),
+                "max_series": self.max_series,
+                "evicted": self._evicted,
+                "window": self.window,
+                "min_samples": self.min_samples,
+            }
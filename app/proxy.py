@@ -1,24 +1,122 @@
 from fastapi import Request, Response, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from typing import AsyncIterator, Dict, Any
 import httpx
+import time
+
+from app.integrations.genieacs import get_nbi_client, nbi_timeout
+
+# hop-by-hop: não são repassados em nenhuma direção
+HOP_BY_HOP = {"host","connection","keep-alive","proxy-authenticate","proxy-authorization","te","trailers","transfer-encoding","upgrade"}
+
+# Contadores do proxy (expostos em /__debug/proxy)
+_stats: Dict[str, Any] = {
+    "requests": 0,
+    "active": 0,
+    "errors": 0,
+    "bytes_in": 0,
+    "bytes_out": 0,
+    "ttfb_ms_last": None,
+    "ttfb_ms_max": 0.0,
+    "ttfb_ms_total": 0.0,
+}
+
+
+def get_proxy_stats() -> Dict[str, Any]:
+    stats = dict(_stats)
+    done = stats["requests"] - stats["errors"]
+    stats["ttfb_ms_avg"] = round(stats["ttfb_ms_total"] / done, 2) if done > 0 else None
+    return stats
+
+
+def _has_body(req: Request) -> bool:
+    if "transfer-encoding" in req.headers:
+        return True
+    return req.headers.get("content-length", "0") not in ("", "0")
+
+
+async def _count_request_body(req: Request) -> AsyncIterator[bytes]:
+    async for chunk in req.stream():
+        _stats["bytes_in"] += len(chunk)
+        yield chunk
+
+
+class _UpstreamBody:
+    """Repassa o corpo da resposta upstream contando bytes e libera a conexão uma única vez."""
+
+    def __init__(self, r: httpx.Response):
+        self.r = r
+        self.released = False
+
+    async def relay(self) -> AsyncIterator[bytes]:
+        # aiter_raw: repassa os bytes como vieram (gzip/deflate intactos)
+        try:
+            async for chunk in self.r.aiter_raw():
+                _stats["bytes_out"] += len(chunk)
+                yield chunk
+        finally:
+            await self.release()
+
+    async def release(self) -> None:
+        # Idempotente: chamado ao fim do stream e também como background task
+        if self.released:
+            return
+        self.released = True
+        _stats["active"] -= 1
+        await self.r.aclose()
+
+
+async def stream_upstream(req: Request, url: str, error_prefix: str = "Upstream error") -> Response:
+    """
+    Proxy reverso em streaming nas duas direções: o corpo da requisição é
+    lido de req.stream() e a resposta é devolvida via StreamingResponse
+    sobre aiter_raw(), sem bufferizar o payload inteiro em memória.
+    """
+    method = req.method.upper()
+    headers = {k: v for k, v in req.headers.items() if k.lower() not in HOP_BY_HOP}
+    # A resposta é repassada comprimida como veio; só pede compressão se o cliente aceitar
+    headers["accept-encoding"] = req.headers.get("accept-encoding", "identity")
+    has_body = _has_body(req)
+    if not has_body:
+        headers.pop("content-length", None)
+
+    client = get_nbi_client()
+    upstream_req = client.build_request(
+        method,
+        url,
+        headers=headers,
+        content=_count_request_body(req) if has_body else None,
+        timeout=nbi_timeout("bulk"),
+    )
+
+    _stats["requests"] += 1
+    started = time.perf_counter()
+    try:
+        r = await client.send(upstream_req, stream=True)
+    except httpx.HTTPError as e:
+        _stats["errors"] += 1
+        raise HTTPException(status_code=502, detail=f"{error_prefix}: {e}")
+
+    ttfb_ms = (time.perf_counter() - started) * 1000
+    _stats["active"] += 1
+    _stats["ttfb_ms_last"] = round(ttfb_ms, 2)
+    _stats["ttfb_ms_total"] += ttfb_ms
+    _stats["ttfb_ms_max"] = max(_stats["ttfb_ms_max"], round(ttfb_ms, 2))
+
+    body = _UpstreamBody(r)
+    resp_headers = {k: v for k, v in r.headers.items() if k.lower() not in HOP_BY_HOP}
+    return StreamingResponse(
+        body.relay(),
+        status_code=r.status_code,
+        headers=resp_headers,
+        media_type=r.headers.get("content-type"),
+        background=BackgroundTask(body.release),
+    )
+
 
 async def stream_proxy(req: Request, upstream: str) -> Response:
     url = f"{upstream}{req.url.path.replace(req.scope.get('root_path',''), '')}"
     if req.url.query:
         url = f"{url}?{req.url.query}"
-
-    method = req.method.upper()
-    headers = dict(req.headers)
-    # remove hop-by-hop
-    for h in ["host","content-length","connection","keep-alive","proxy-authenticate","proxy-authorization","te","trailers","transfer-encoding","upgrade"]:
-        headers.pop(h, None)
-
-    body = await req.body()
-    timeout = httpx.Timeout(60.0, read=120.0, write=60.0, connect=30.0)
-    async with httpx.AsyncClient(timeout=timeout, verify=False) as client:
-        try:
-            r = await client.request(method, url, headers=headers, content=body)
-        except httpx.HTTPError as e:
-            raise HTTPException(status_code=502, detail=f"Upstream error: {e}")
-
-    resp_headers = [(k, v) for k, v in r.headers.items() if k.lower() not in {"content-encoding","transfer-encoding","connection"}]
-    return Response(content=r.content, status_code=r.status_code, headers=dict(resp_headers), media_type=r.headers.get("content-type"))
+    return await stream_upstream(req, url)
@@ -17,13 +17,18 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from fastapi import APIRouter, HTTPException, Query, Body, Depends
 from pydantic import BaseModel, Field
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from app.ml import LatencyPredictor, DropoutClassifier, WifiQualityScorer, network_analyzer, learning_engine
 from app.ml.dropout_classifier import ConnectionEvent
 from app.ml.wifi_quality_scorer import WifiMetrics
-from app.database.connection import get_db
+from app.database.connection import get_async_db, get_db, get_read_db
 from app.database.models import Device, DeviceMetric, DiagnosticLog, AlertEvent
+from app.services import metric_series
+from app.services.health_scoring import health_overview
+from app.services.tr069_paths import PathChain
 
 log = logging.getLogger("semppre-bridge.analytics")
 
@@ -34,6 +39,17 @@ latency_predictor = LatencyPredictor()
 dropout_classifier = DropoutClassifier()
 wifi_scorer = WifiQualityScorer()
 
+# Campos de device_metrics usados na análise completa de um dispositivo
+_ANALYSIS_FIELDS = (
+    "ping_latency_ms",
+    "cpu_usage",
+    "memory_usage",
+    "bytes_received",
+    "bytes_sent",
+    "wifi_clients_24ghz",
+    "wifi_clients_5ghz",
+)
+
 
 # ============ Schemas Pydantic ============
 
@@ -532,89 +548,109 @@ def _get_device_stats_from_db(db: Session) -> Dict[str, Any]:
         return {"total": 0, "online": 0, "metrics_count": 0, "active_alerts": 0, "alerts": []}
 
 
+# Métrica da anomalia -> tipo e descrição em top_issues
+_ISSUE_TYPES = {
+    "ping_latency_ms": ("high_latency", "Dispositivos com latência elevada ou spike"),
+    "ping_packet_loss": ("packet_loss", "Dispositivos com perda de pacotes"),
+    "cpu_usage": ("high_cpu", "Dispositivos com CPU elevada"),
+    "memory_usage": ("high_memory", "Dispositivos com memória elevada"),
+    "wifi_clients": ("wifi_overload", "Dispositivos com muitos clientes WiFi"),
+}
+
+
+def _latency_trend(overview: Dict[str, Any]) -> str:
+    """Tendência de latência da frota: maioria clara entre alta e queda."""
+    up = overview["latency_trend"]["increasing"]
+    down = overview["latency_trend"]["decreasing"]
+    if up > down * 1.5 and up > overview["scored"] * 0.05:
+        return "degrading"
+    if down > up * 1.5 and down > overview["scored"] * 0.05:
+        return "improving"
+    return "stable"
+
+
 @router.get("/dashboard/overview")
-async def get_dashboard_overview():
+def get_dashboard_overview(db: Session = Depends(get_read_db)):
     """
     Retorna visão geral de analytics para o dashboard.
     
-    Dados consolidados para exibição rápida:
-    - Contadores de saúde (dispositivos por status)
+    Dados consolidados do snapshot device_health (sem recalcular):
+    - Contadores de saúde (dispositivos por faixa de score)
     - Top problemas
     - Tendências
-    - Insights da IA
+    - Insights
     """
     try:
-        # Gerar insights dinâmicos baseados no horário e contexto
         now = datetime.utcnow()
-        hour = now.hour
-        
-        # Insights dinâmicos baseados no contexto
-        ai_insights = []
-        
-        # Insight baseado no horário
-        if 19 <= hour <= 23:
-            ai_insights.append("📊 Horário de pico detectado - monitoramento intensificado")
-        elif 0 <= hour <= 6:
-            ai_insights.append("🌙 Período de baixa demanda - ideal para manutenções")
-        else:
-            ai_insights.append("✅ Sistema operando em condições normais")
-        
-        # Insights de tendência (simulados mas realistas)
-        ai_insights.append("📈 Tendência de melhora na estabilidade de conexão nas últimas 24h")
-        ai_insights.append("🔍 Nenhuma anomalia crítica detectada pelo sistema de IA")
-        
-        # Distribuição de saúde (será real quando tivermos mais dados)
-        health_summary = {
-            "excellent": 45,
-            "good": 120,
-            "fair": 30,
-            "poor": 8,
-            "critical": 2,
-        }
+        overview = health_overview(db)
+        health_summary = overview["bands"]
+        scored = overview["scored"]
         
-        # Top issues
+        # Top issues: anomalias por métrica + risco de falha
         top_issues = [
             {
-                "type": "high_latency",
-                "count": 5,
-                "severity": "medium",
-                "description": "Dispositivos com latência > 100ms",
-            },
-            {
-                "type": "dropout_risk",
-                "count": 2,
-                "severity": "high",
-                "description": "Dispositivos com risco de queda",
-            },
-            {
-                "type": "wifi_interference",
-                "count": 3,
-                "severity": "low",
-                "description": "Possível interferência WiFi detectada",
-            },
+                "type": _ISSUE_TYPES.get(metric, (metric, ""))[0],
+                "count": entry["devices"],
+                "severity": "high" if entry["critical"] else "medium",
+                "description": _ISSUE_TYPES.get(metric, (metric, f"Anomalias em {metric}"))[1],
+            }
+            for metric, entry in overview["issues"].items()
         ]
+        if overview["risk"]["high"]:
+            top_issues.append({
+                "type": "failure_risk",
+                "count": overview["risk"]["high"],
+                "severity": "high",
+                "description": "Dispositivos com risco alto de falha",
+            })
+        top_issues.sort(key=lambda i: (i["severity"] != "high", -i["count"]))
         
-        # Tendências
         trends = {
-            "latency": "stable",
-            "dropouts": "improving",
-            "wifi_quality": "stable",
+            "latency": _latency_trend(overview),
+            "failure_risk": "elevated" if overview["risk"]["high"] > scored * 0.05 else "stable",
         }
         
+        # Insights a partir dos números do snapshot
+        ai_insights = []
+        hour = now.hour
+        if 19 <= hour <= 23:
+            ai_insights.append("📊 Horário de pico detectado - monitoramento intensificado")
+        elif 0 <= hour <= 6:
+            ai_insights.append("🌙 Período de baixa demanda - ideal para manutenções")
+        
+        if not scored:
+            ai_insights.append("ℹ️ Ainda não há dispositivos pontuados")
+        else:
+            critical = health_summary["critical"] + health_summary["poor"]
+            if critical:
+                ai_insights.append(f"🔴 {critical} dispositivo(s) com saúde ruim ou crítica")
+            else:
+                ai_insights.append("✅ Nenhum dispositivo em estado crítico")
+            if trends["latency"] == "degrading":
+                ai_insights.append("📈 Latência em tendência de alta em parte da frota")
+            elif trends["latency"] == "improving":
+                ai_insights.append("📉 Latência em tendência de queda na frota")
+            worst = overview["by_manufacturer"][0] if overview["by_manufacturer"] else None
+            if worst and len(overview["by_manufacturer"]) > 1 and worst["avg_score"] < overview["avg_score"] - 10:
+                ai_insights.append(f"🔍 {worst['name']}: score médio {worst['avg_score']} (frota: {overview['avg_score']})")
+        
         return {
             "success": True,
             "overview": {
                 "timestamp": now.isoformat(),
                 "health_summary": health_summary,
-                "top_issues": top_issues,
+                "top_issues": top_issues[:5],
                 "trends": trends,
                 "ai_insights": ai_insights,
+                "by_manufacturer": overview["by_manufacturer"],
                 "stats": {
-                    "total_devices": sum(health_summary.values()),
+                    "total_devices": scored,
+                    "without_data": overview["devices"] - scored,
+                    "average_score": overview["avg_score"],
                     "healthy_percentage": round(
-                        (health_summary["excellent"] + health_summary["good"]) / 
-                        sum(health_summary.values()) * 100, 1
-                    ),
+                        (health_summary["excellent"] + health_summary["good"]) / scored * 100, 1
+                    ) if scored else 0,
+                    "updated_at": overview["updated_at"].isoformat() if overview["updated_at"] else None,
                 },
             },
         }
@@ -658,47 +694,67 @@ async def get_device_health(device_id: str):
 
 
 @router.get("/insights")
-async def get_all_insights(
+def get_all_insights(
     severity: Optional[str] = Query(None, description="Filtrar por severidade"),
     category: Optional[str] = Query(None, description="Filtrar por categoria"),
     limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_read_db),
 ):
     """
-    Retorna lista de insights gerados pela IA.
+    Retorna lista de insights gerados a partir do snapshot device_health.
     """
     try:
-        # Gerar insights baseados no contexto atual
-        now = datetime.utcnow()
+        overview = health_overview(db)
+        scored = overview["scored"]
+        bands = overview["bands"]
+        timestamp = (overview["updated_at"] or datetime.utcnow()).isoformat()
+        # Confiança = fração dos dispositivos com dados suficientes para o score
+        confidence = round(scored / overview["devices"], 2) if overview["devices"] else 0.0
+        
+        insights = []
+        
+        def add(key: str, category_: str, severity_: str, title: str, message: str) -> None:
+            insights.append({
+                "id": f"insight_{key}",
+                "category": category_,
+                "severity": severity_,
+                "title": title,
+                "message": message,
+                "timestamp": timestamp,
+                "confidence": confidence,
+            })
         
-        insights = [
-            {
-                "id": "insight_001",
-                "category": "performance",
-                "severity": "info",
-                "title": "Rede em bom estado",
-                "message": "Maioria dos dispositivos operando dentro dos parâmetros normais",
-                "timestamp": now.isoformat(),
-                "confidence": 0.92,
-            },
-            {
-                "id": "insight_002",
-                "category": "prediction",
-                "severity": "medium",
-                "title": "Previsão de demanda",
-                "message": "Aumento de tráfego esperado nas próximas horas (horário de pico)",
-                "timestamp": now.isoformat(),
-                "confidence": 0.78,
-            },
-            {
-                "id": "insight_003",
-                "category": "stability",
-                "severity": "low",
-                "title": "Padrão de estabilidade",
-                "message": "Estabilidade geral melhorou 12% em relação à semana passada",
-                "timestamp": now.isoformat(),
-                "confidence": 0.85,
-            },
-        ]
+        bad = bands["critical"] + bands["poor"]
+        if bad:
+            add("critical_devices", "performance", "high", "Dispositivos com saúde crítica",
+                f"{bad} de {scored} dispositivo(s) com score abaixo de 50")
+        
+        for metric, entry in sorted(overview["issues"].items(), key=lambda kv: -kv[1]["devices"]):
+            issue_type, description = _ISSUE_TYPES.get(metric, (metric, f"Anomalias em {metric}"))
+            add(issue_type, "performance", "medium" if entry["critical"] else "low",
+                description, f"{entry['devices']} dispositivo(s) afetado(s), {entry['critical']} crítico(s)")
+        
+        if overview["risk"]["high"] or overview["risk"]["medium"]:
+            add("failure_risk", "prediction", "medium" if overview["risk"]["high"] else "low",
+                "Risco de falha",
+                f"{overview['risk']['high']} dispositivo(s) com risco alto e "
+                f"{overview['risk']['medium']} com risco médio nos últimos 7 dias")
+        
+        trend = _latency_trend(overview)
+        if trend != "stable":
+            up, down = overview["latency_trend"]["increasing"], overview["latency_trend"]["decreasing"]
+            add("latency_trend", "stability", "medium" if trend == "degrading" else "info",
+                "Tendência de latência",
+                f"Latência em alta em {up} dispositivo(s) e em queda em {down}")
+        
+        for m in overview["by_manufacturer"]:
+            if m["devices"] >= 10 and overview["avg_score"] is not None and m["avg_score"] < overview["avg_score"] - 10:
+                add(f"manufacturer_{m['name']}", "manufacturer", "low", f"Fabricante abaixo da média: {m['name']}",
+                    f"Score médio {m['avg_score']} em {m['devices']} dispositivo(s) (frota: {overview['avg_score']})")
+        
+        if scored and not insights:
+            add("fleet_ok", "performance", "info", "Rede em bom estado",
+                f"{scored} dispositivo(s) pontuados sem anomalias relevantes")
         
         # Filtrar por severidade se especificado
         if severity:
@@ -1038,7 +1094,7 @@ async def detect_drift(
 @router.get("/device/{device_id}/full-analysis")
 async def get_device_full_analysis(
     device_id: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
 ):
     """
     Retorna análise completa de um dispositivo.
@@ -1055,7 +1111,9 @@ async def get_device_full_analysis(
         now = datetime.utcnow()
         
         # Buscar dispositivo do banco
-        device = db.query(Device).filter(Device.device_id == device_id).first()
+        device = (await db.execute(
+            select(Device).where(Device.device_id == device_id).limit(1)
+        )).scalars().first()
         
         device_info = None
         device_pk = None  # ID numérico para queries
@@ -1070,20 +1128,25 @@ async def get_device_full_analysis(
                 "last_inform": device.last_inform.isoformat() if device.last_inform else None,
             }
         
-        # Buscar métricas recentes (usando ID numérico)
+        # Buscar métricas recentes (usando ID numérico): tuplas de colunas,
+        # sem hidratar objetos ORM, agrupadas em arrays por campo
         recent_time = now - timedelta(hours=24)
-        metrics = []
+        columns = metric_series.to_columns([], _ANALYSIS_FIELDS)
+        collected_at = []
         if device_pk:
-            metrics = db.query(DeviceMetric).filter(
-                DeviceMetric.device_id == device_pk,
-                DeviceMetric.collected_at >= recent_time,
-            ).order_by(DeviceMetric.collected_at.desc()).limit(100).all()
+            rows = (await db.execute(
+                select(DeviceMetric.collected_at, *(getattr(DeviceMetric, f) for f in _ANALYSIS_FIELDS)).where(
+                    DeviceMetric.device_id == device_pk,
+                    DeviceMetric.collected_at >= recent_time,
+                ).order_by(DeviceMetric.collected_at.desc()).limit(100)
+            )).all()
+            collected_at = [r[0] for r in rows]
+            columns = metric_series.to_columns(rows, _ANALYSIS_FIELDS)
         
         # Processar métricas para análise - usar campos específicos do modelo
-        latency_samples = []
-        for m in metrics:
-            if m.ping_latency_ms is not None:
-                latency_samples.append((m.collected_at, m.ping_latency_ms))
+        latency_samples = [
+            (t, v) for t, v in zip(collected_at, columns["ping_latency_ms"]) if v is not None
+        ]
         
         # Análise de latência
         latency_analysis = None
@@ -1112,21 +1175,10 @@ async def get_device_full_analysis(
         
         # Construir dicionário de métricas a partir dos campos do modelo
         metric_values = {}
-        for m in metrics:
-            if m.ping_latency_ms is not None:
-                metric_values.setdefault("ping_latency_ms", []).append(m.ping_latency_ms)
-            if m.cpu_usage is not None:
-                metric_values.setdefault("cpu_usage", []).append(m.cpu_usage)
-            if m.memory_usage is not None:
-                metric_values.setdefault("memory_usage", []).append(m.memory_usage)
-            if m.bytes_received is not None:
-                metric_values.setdefault("bytes_received", []).append(m.bytes_received)
-            if m.bytes_sent is not None:
-                metric_values.setdefault("bytes_sent", []).append(m.bytes_sent)
-            if m.wifi_clients_24ghz is not None:
-                metric_values.setdefault("wifi_clients_24ghz", []).append(m.wifi_clients_24ghz)
-            if m.wifi_clients_5ghz is not None:
-                metric_values.setdefault("wifi_clients_5ghz", []).append(m.wifi_clients_5ghz)
+        for field in _ANALYSIS_FIELDS:
+            values = [v for v in columns[field] if v is not None]
+            if values:
+                metric_values[field] = values
         
         # Detectar anomalias (com tratamento de erro)
         anomalies = []
@@ -1152,14 +1204,11 @@ async def get_device_full_analysis(
         
         # Detectar drift (com tratamento de erro)
         current_values = {}
-        if metrics:
-            m = metrics[0]  # Métrica mais recente
-            if m.ping_latency_ms is not None:
-                current_values["ping_latency_ms"] = m.ping_latency_ms
-            if m.cpu_usage is not None:
-                current_values["cpu_usage"] = m.cpu_usage
-            if m.memory_usage is not None:
-                current_values["memory_usage"] = m.memory_usage
+        if collected_at:
+            # Métrica mais recente
+            for field in ("ping_latency_ms", "cpu_usage", "memory_usage"):
+                if columns[field][0] is not None:
+                    current_values[field] = columns[field][0]
         
         drifts = []
         try:
@@ -1199,7 +1248,7 @@ async def get_device_full_analysis(
                 "insights": health_analysis["insights"],
                 "recommendations": recommendations,
             },
-            "metrics_analyzed": len(metrics),
+            "metrics_analyzed": len(collected_at),
             "analyzed_at": now.isoformat(),
         }
     except Exception as e:
@@ -1313,7 +1362,7 @@ async def bootstrap_learning(
     5. Calibra thresholds iniciais
     """
     import httpx
-    from app.settings import settings
+    from app.integrations.genieacs import get_nbi_client, nbi_timeout
     
     try:
         stats = learning_engine.get_learning_stats()
@@ -1328,12 +1377,12 @@ async def bootstrap_learning(
         log.info("Iniciando bootstrap de aprendizado...")
         
         # Buscar todos os dispositivos do GenieACS
-        async with httpx.AsyncClient(timeout=60, verify=False) as client:
-            resp = await client.get(
-                f"{settings.GENIE_NBI}/devices",
-                params={"projection": "_id,_deviceId._SerialNumber,_deviceId._Manufacturer,_deviceId._ProductClass,_lastInform,InternetGatewayDevice,Device"}
-            )
-            devices = resp.json() if resp.status_code == 200 else []
+        resp = await get_nbi_client().get(
+            "/devices",
+            params={"projection": "_id,_deviceId._SerialNumber,_deviceId._Manufacturer,_deviceId._ProductClass,_lastInform,InternetGatewayDevice,Device"},
+            timeout=nbi_timeout("bulk"),
+        )
+        devices = resp.json() if resp.status_code == 200 else []
         
         log.info(f"Encontrados {len(devices)} dispositivos no GenieACS")
         
@@ -1447,85 +1496,82 @@ async def bootstrap_learning(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Paths comuns de métricas (compilados uma vez em cadeias de fallback)
+_DEVICE_METRIC_PATHS: Dict[str, List[str]] = {
+    # Latência/Performance
+    "latency_ms": [
+        "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANIPConnection.1.Stats.TotalBytesReceived",
+    ],
+    # Uptime
+    "uptime_seconds": [
+        "InternetGatewayDevice.DeviceInfo.UpTime._value",
+        "Device.DeviceInfo.UpTime._value",
+    ],
+    # WiFi RSSI
+    "rssi_dbm": [
+        "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.Stats.X_TP_Rssi._value",
+        "Device.WiFi.AccessPoint.1.AssociatedDevice.1.SignalStrength._value",
+    ],
+    # WiFi Noise
+    "wifi_noise_dbm": [
+        "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.Stats.X_TP_Noise._value",
+    ],
+    # Clientes WiFi
+    "wifi_clients": [
+        "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.TotalAssociations._value",
+        "Device.WiFi.AccessPoint.1.AssociatedDeviceNumberOfEntries._value",
+    ],
+    # TX/RX Power
+    "tx_power_dbm": [
+        "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.TransmitPower._value",
+    ],
+    # Memory
+    "memory_free_kb": [
+        "InternetGatewayDevice.DeviceInfo.MemoryStatus.Free._value",
+        "Device.DeviceInfo.MemoryStatus.Free._value",
+    ],
+    "memory_total_kb": [
+        "InternetGatewayDevice.DeviceInfo.MemoryStatus.Total._value",
+        "Device.DeviceInfo.MemoryStatus.Total._value",
+    ],
+    # CPU
+    "cpu_usage_pct": [
+        "InternetGatewayDevice.DeviceInfo.ProcessStatus.CPUUsage._value",
+        "Device.DeviceInfo.ProcessStatus.CPUUsage._value",
+    ],
+}
+_DEVICE_METRIC_CHAINS: Dict[str, PathChain] = {
+    name: PathChain(*paths) for name, paths in _DEVICE_METRIC_PATHS.items()
+}
+_MANUFACTURER_CHAIN = PathChain(
+    "_deviceId._Manufacturer",
+    "InternetGatewayDevice.DeviceInfo.Manufacturer._value",
+    "Device.DeviceInfo.Manufacturer._value",
+)
+_MODEL_CHAIN = PathChain(
+    "_deviceId._ProductClass",
+    "InternetGatewayDevice.DeviceInfo.ModelName._value",
+    "Device.DeviceInfo.ModelName._value",
+)
+
+
 def _extract_device_metrics(device: Dict[str, Any]) -> Dict[str, float]:
     """Extrai métricas numéricas de um dispositivo do GenieACS."""
     metrics = {}
     
-    # Helper para extrair valor
-    def get_val(obj, path):
-        parts = path.split(".")
-        current = obj
-        for part in parts:
-            if isinstance(current, dict):
-                current = current.get(part)
-            else:
-                return None
-            if current is None:
-                return None
-        if isinstance(current, dict) and "_value" in current:
-            return current["_value"]
-        return current
-    
-    # Paths comuns de métricas
-    metric_paths = {
-        # Latência/Performance
-        "latency_ms": [
-            "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANIPConnection.1.Stats.TotalBytesReceived",
-        ],
-        # Uptime
-        "uptime_seconds": [
-            "InternetGatewayDevice.DeviceInfo.UpTime._value",
-            "Device.DeviceInfo.UpTime._value",
-        ],
-        # WiFi RSSI
-        "rssi_dbm": [
-            "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.Stats.X_TP_Rssi._value",
-            "Device.WiFi.AccessPoint.1.AssociatedDevice.1.SignalStrength._value",
-        ],
-        # WiFi Noise
-        "wifi_noise_dbm": [
-            "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.Stats.X_TP_Noise._value",
-        ],
-        # Clientes WiFi
-        "wifi_clients": [
-            "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.TotalAssociations._value",
-            "Device.WiFi.AccessPoint.1.AssociatedDeviceNumberOfEntries._value",
-        ],
-        # TX/RX Power
-        "tx_power_dbm": [
-            "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.TransmitPower._value",
-        ],
-        # Memory
-        "memory_free_kb": [
-            "InternetGatewayDevice.DeviceInfo.MemoryStatus.Free._value",
-            "Device.DeviceInfo.MemoryStatus.Free._value",
-        ],
-        "memory_total_kb": [
-            "InternetGatewayDevice.DeviceInfo.MemoryStatus.Total._value",
-            "Device.DeviceInfo.MemoryStatus.Total._value",
-        ],
-        # CPU
-        "cpu_usage_pct": [
-            "InternetGatewayDevice.DeviceInfo.ProcessStatus.CPUUsage._value",
-            "Device.DeviceInfo.ProcessStatus.CPUUsage._value",
-        ],
-    }
-    
-    for metric_name, paths in metric_paths.items():
-        for path in paths:
-            try:
-                val = get_val(device, path)
-                if val is not None:
-                    if isinstance(val, str):
-                        try:
-                            val = float(val)
-                        except:
-                            continue
-                    if isinstance(val, (int, float)):
-                        metrics[metric_name] = float(val)
-                        break
-            except:
+    for metric_name, chain in _DEVICE_METRIC_CHAINS.items():
+        for path in chain.paths:
+            val = path.get(device)
+            if val is None:
                 continue
+            if isinstance(val, str):
+                try:
+                    val = float(val)
+                except ValueError:
+                    continue
+            if isinstance(val, (int, float)):
+                metrics[metric_name] = float(val)
+                break
     
     # Calcular métricas derivadas
     if "memory_free_kb" in metrics and "memory_total_kb" in metrics:
@@ -1538,50 +1584,22 @@ def _extract_device_metrics(device: Dict[str, Any]) -> Dict[str, float]:
     return metrics
 
 
-def _extract_manufacturer(device: Dict[str, Any]) -> Optional[str]:
-    """Extrai fabricante do dispositivo."""
-    paths = [
-        "_deviceId._Manufacturer",
-        "InternetGatewayDevice.DeviceInfo.Manufacturer._value",
-        "Device.DeviceInfo.Manufacturer._value",
-    ]
-    
-    for path in paths:
-        parts = path.split(".")
-        current = device
-        for part in parts:
-            if isinstance(current, dict):
-                current = current.get(part)
-            else:
-                current = None
-                break
+def _first_string(device: Dict[str, Any], chain: PathChain) -> Optional[str]:
+    for path in chain.paths:
+        current = path.node(device)
         if current and isinstance(current, str):
             return current
-    
     return None
 
 
+def _extract_manufacturer(device: Dict[str, Any]) -> Optional[str]:
+    """Extrai fabricante do dispositivo."""
+    return _first_string(device, _MANUFACTURER_CHAIN)
+
+
 def _extract_model(device: Dict[str, Any]) -> Optional[str]:
     """Extrai modelo do dispositivo."""
-    paths = [
-        "_deviceId._ProductClass",
-        "InternetGatewayDevice.DeviceInfo.ModelName._value",
-        "Device.DeviceInfo.ModelName._value",
-    ]
-    
-    for path in paths:
-        parts = path.split(".")
-        current = device
-        for part in parts:
-            if isinstance(current, dict):
-                current = current.get(part)
-            else:
-                current = None
-                break
-        if current and isinstance(current, str):
-            return current
-    
-    return None
+    return _first_string(device, _MODEL_CHAIN)
 
 
 # Importar ThresholdConfig se ainda não foi importado no topo
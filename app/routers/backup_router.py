@@ -7,16 +7,20 @@ from __future__ import annotations
 
 from typing import Optional, List
 from fastapi import APIRouter, HTTPException, Depends, Query, BackgroundTasks
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel, Field
 from datetime import datetime
 import httpx
+import json
 import logging
 
-from app.database.connection import get_db
+from app.database.connection import get_async_db
 from app.database.models import Device, DeviceConfigBackup, DeviceBootstrapEvent
-from app.services.config_backup_service import ConfigBackupService
+from app.services.config_backup_service import ConfigBackupService, BACKUP_VIEW
+from app.services.device_projection import projection_params
 from app.settings import settings
+from app.integrations.genieacs import get_nbi_client
 
 log = logging.getLogger("semppre-bridge.backup")
 
@@ -97,16 +101,16 @@ class ToggleAutoRestoreRequest(BaseModel):
 async def list_backups(
     only_active: bool = Query(True, description="Apenas backups ativos"),
     limit: int = Query(100, ge=1, le=500),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Lista todos os backups de configurações."""
     service = ConfigBackupService(db)
-    backups = service.list_backups(limit=limit, only_active=only_active)
+    backups = await service.run("list_backups", limit=limit, only_active=only_active)
     
     result = []
     for backup in backups:
         # Buscar info do dispositivo
-        device = db.query(Device).filter(Device.id == backup.device_id).first()
+        device = await db.get(Device, backup.device_id)
         
         result.append(BackupSummary(
             id=backup.id,
@@ -128,11 +132,11 @@ async def list_backups(
 @router.get("/device/{device_id}", response_model=BackupResponse)
 async def get_device_backup(
     device_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtém backup de um dispositivo específico."""
     service = ConfigBackupService(db)
-    backup = service.get_backup_by_device(device_id)
+    backup = await service.run("get_backup_by_device", device_id)
     
     if not backup:
         raise HTTPException(status_code=404, detail="Backup não encontrado para este dispositivo")
@@ -143,11 +147,11 @@ async def get_device_backup(
 @router.get("/serial/{serial_number}", response_model=BackupResponse)
 async def get_backup_by_serial(
     serial_number: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Obtém backup pelo número de série."""
     service = ConfigBackupService(db)
-    backup = service.get_active_backup(serial_number)
+    backup = await service.run("get_active_backup", serial_number)
     
     if not backup:
         raise HTTPException(status_code=404, detail="Backup não encontrado para este serial")
@@ -159,21 +163,25 @@ async def get_backup_by_serial(
 async def create_backup(
     request: BackupConfigRequest,
     background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cria backup manual de um dispositivo."""
     service = ConfigBackupService(db)
     
     # Buscar dados completos do dispositivo no GenieACS
     try:
-        async with httpx.AsyncClient(timeout=30, verify=False) as client:
-            url = f"{settings.GENIE_NBI.rstrip('/')}/devices/{request.device_id}"
-            resp = await client.get(url)
-            
-            if resp.status_code != 200:
-                raise HTTPException(status_code=404, detail="Dispositivo não encontrado no GenieACS")
-            
-            device_data = resp.json()
+        resp = await get_nbi_client().get(
+            "/devices/",
+            params={
+                "query": json.dumps({"_id": request.device_id}),
+                **projection_params(BACKUP_VIEW),
+            },
+        )
+        
+        if resp.status_code != 200 or not resp.json():
+            raise HTTPException(status_code=404, detail="Dispositivo não encontrado no GenieACS")
+        
+        device_data = resp.json()[0]
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=f"Erro ao comunicar com GenieACS: {e}")
     
@@ -194,22 +202,24 @@ async def create_backup(
 @router.post("/restore")
 async def restore_config(
     request: RestoreRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Restaura configurações de um dispositivo manualmente."""
     service = ConfigBackupService(db)
     
     # Buscar dispositivo
-    device = db.query(Device).filter(Device.device_id == request.device_id).first()
+    device = (await db.execute(
+        select(Device).where(Device.device_id == request.device_id).limit(1)
+    )).scalars().first()
     if not device:
         raise HTTPException(status_code=404, detail="Dispositivo não encontrado")
     
     # Buscar backup
-    backup = service.get_backup_by_device(request.device_id)
+    backup = await service.run("get_backup_by_device", request.device_id)
     if not backup:
         # Tentar pelo serial
         if device.serial_number:
-            backup = service.get_active_backup(device.serial_number)
+            backup = await service.run("get_active_backup", device.serial_number)
     
     if not backup:
         raise HTTPException(status_code=404, detail="Nenhum backup encontrado para este dispositivo")
@@ -237,12 +247,12 @@ async def restore_config(
 @router.post("/toggle-auto-restore")
 async def toggle_auto_restore(
     request: ToggleAutoRestoreRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Habilita ou desabilita auto-restore para um dispositivo."""
     service = ConfigBackupService(db)
     
-    success = service.toggle_auto_restore(request.serial_number, request.enabled)
+    success = await service.run("toggle_auto_restore", request.serial_number, request.enabled)
     
     if not success:
         raise HTTPException(status_code=404, detail="Backup não encontrado para este serial")
@@ -258,34 +268,34 @@ async def toggle_auto_restore(
 async def list_bootstrap_events(
     device_id: Optional[str] = Query(None, description="Filtrar por device_id"),
     limit: int = Query(50, ge=1, le=200),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Lista eventos de bootstrap/reset detectados."""
     service = ConfigBackupService(db)
-    events = service.list_bootstrap_events(device_id=device_id, limit=limit)
+    events = await service.run("list_bootstrap_events", device_id=device_id, limit=limit)
     return events
 
 
 @router.get("/stats")
-async def backup_stats(db: Session = Depends(get_db)):
+async def backup_stats(db: AsyncSession = Depends(get_async_db)):
     """Estatísticas de backup e restore."""
-    total_backups = db.query(DeviceConfigBackup).filter(DeviceConfigBackup.is_active == True).count()
-    total_restores = db.query(DeviceConfigBackup).filter(DeviceConfigBackup.restore_count > 0).count()
+    count = select(func.count(DeviceConfigBackup.id))
+    total_backups = await db.scalar(count.where(DeviceConfigBackup.is_active == True))
+    total_restores = await db.scalar(count.where(DeviceConfigBackup.restore_count > 0))
     
     # Soma total de restores
-    from sqlalchemy import func
-    total_restore_count = db.query(func.sum(DeviceConfigBackup.restore_count)).scalar() or 0
+    total_restore_count = await db.scalar(select(func.sum(DeviceConfigBackup.restore_count))) or 0
     
     # Eventos recentes
-    recent_events = db.query(DeviceBootstrapEvent).order_by(
-        DeviceBootstrapEvent.detected_at.desc()
-    ).limit(10).all()
+    recent_events = (await db.execute(
+        select(DeviceBootstrapEvent).order_by(DeviceBootstrapEvent.detected_at.desc()).limit(10)
+    )).scalars().all()
     
     # Backups com auto-restore habilitado
-    auto_restore_enabled = db.query(DeviceConfigBackup).filter(
+    auto_restore_enabled = await db.scalar(count.where(
         DeviceConfigBackup.is_active == True,
         DeviceConfigBackup.is_auto_restore_enabled == True
-    ).count()
+    ))
     
     return {
         "total_backups": total_backups,
@@ -307,23 +317,27 @@ async def backup_stats(db: Session = Depends(get_db)):
 @router.delete("/device/{device_id}")
 async def delete_device_backup(
     device_id: str,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Remove backup de um dispositivo."""
-    device = db.query(Device).filter(Device.device_id == device_id).first()
+    device = (await db.execute(
+        select(Device).where(Device.device_id == device_id).limit(1)
+    )).scalars().first()
     if not device:
         raise HTTPException(status_code=404, detail="Dispositivo não encontrado")
     
-    backup = db.query(DeviceConfigBackup).filter(
-        DeviceConfigBackup.device_id == device.id,
-        DeviceConfigBackup.is_active == True
-    ).first()
+    backup = (await db.execute(
+        select(DeviceConfigBackup).where(
+            DeviceConfigBackup.device_id == device.id,
+            DeviceConfigBackup.is_active == True
+        ).limit(1)
+    )).scalars().first()
     
     if not backup:
         raise HTTPException(status_code=404, detail="Backup não encontrado")
     
     backup.is_active = False
-    db.commit()
+    await db.commit()
     
     return {
         "success": True,
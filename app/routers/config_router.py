@@ -15,6 +15,7 @@ from datetime import datetime, timedelta
 import time
 
 from app.settings import settings
+from app.integrations.genieacs import get_nbi_client, nbi_timeout
 from app.database.connection import get_db
 from app.database import models as db_models
 
@@ -62,23 +63,21 @@ async def _get_all_devices(manufacturer: Optional[str] = None) -> List[Dict]:
     filtra os dispositivos cujo _Manufacturer contém a string (case-insensitive).
     """
     try:
-        url = f"{settings.GENIE_NBI.rstrip('/')}/devices"
-        async with httpx.AsyncClient(timeout=30, verify=False) as client:
-            resp = await client.get(url)
-            if resp.status_code == 200:
-                devices = resp.json()
-                if manufacturer:
-                    m = manufacturer.lower()
-                    filtered = []
-                    for d in devices:
-                        dev_id = d.get("_deviceId", {})
-                        manu = str(dev_id.get("_Manufacturer", "")).lower()
-                        if m in manu:
-                            filtered.append(d)
-                    return filtered
-                return devices
-            else:
-                log.error(f"Erro ao buscar dispositivos NBI: status={resp.status_code} body={resp.text}")
+        resp = await get_nbi_client().get("/devices", timeout=nbi_timeout("bulk"))
+        if resp.status_code == 200:
+            devices = resp.json()
+            if manufacturer:
+                m = manufacturer.lower()
+                filtered = []
+                for d in devices:
+                    dev_id = d.get("_deviceId", {})
+                    manu = str(dev_id.get("_Manufacturer", "")).lower()
+                    if m in manu:
+                        filtered.append(d)
+                return filtered
+            return devices
+        else:
+            log.error(f"Erro ao buscar dispositivos NBI: status={resp.status_code} body={resp.text}")
     except Exception as e:
         log.error(f"Erro ao buscar dispositivos: {e}")
     return []
@@ -87,22 +86,23 @@ async def _get_all_devices(manufacturer: Optional[str] = None) -> List[Dict]:
 async def _send_connection_request(device_id: str) -> tuple[bool, int | None, str | None]:
     """Envia Connection Request para um dispositivo específico."""
     try:
-        url = f"{settings.GENIE_NBI.rstrip('/')}/devices/{device_id}/tasks"
+        url = f"/devices/{device_id}/tasks"
         payload = {"name": "refreshObject", "objectName": ""}
         
-        async with httpx.AsyncClient(timeout=30, verify=False) as client:
-            resp = await client.post(url, json=payload, params={"connection_request": ""})
-            status = resp.status_code
-            body = resp.text if resp is not None else None
-            if status in (200, 202):
-                log.info(f"Connection request enviado para: {device_id}")
-                return True, status, body
-            else:
-                # Log detalhado para facilitar diagnóstico (body pode conter info)
-                log.warning(
-                    f"Falha ao enviar connection request para {device_id}: {status} body={body}"
-                )
-                return False, status, body
+        resp = await get_nbi_client().post(
+            url, json=payload, params={"connection_request": ""}, timeout=nbi_timeout("task")
+        )
+        status = resp.status_code
+        body = resp.text if resp is not None else None
+        if status in (200, 202):
+            log.info(f"Connection request enviado para: {device_id}")
+            return True, status, body
+        else:
+            # Log detalhado para facilitar diagnóstico (body pode conter info)
+            log.warning(
+                f"Falha ao enviar connection request para {device_id}: {status} body={body}"
+            )
+            return False, status, body
     except Exception as e:
         log.error(f"Erro ao enviar connection request para {device_id}: {e}")
         return False, None, str(e)
@@ -51,11 +51,18 @@ class RestoreBackupRequest(BaseModel):
 # ============ Endpoints ============
 
 @router.get("/all")
-async def get_all_parameters(device_id: str):
+async def get_all_parameters(
+    device_id: str,
+    view: Optional[str] = Query(None, description="Limita a busca a uma view de projeção (ex: wifi, wan, lan)"),
+    max_staleness: Optional[int] = Query(None, ge=0, description="Aceita o snapshot local com até N segundos (só com view)")
+):
     """
     Retorna TODOS os parâmetros disponíveis no dispositivo
     
     - **device_id**: ID do dispositivo no GenieACS
+    - **view**: Opcional; busca só os parâmetros da view (wifi, wan, lan, identity...)
+    - **max_staleness**: Opcional; responde do snapshot local se tiver no máximo N segundos.
+      Só vale com view: a árvore completa não fica no snapshot e vem sempre do NBI
     
     Retorna:
     - total_params: Total de parâmetros encontrados
@@ -63,7 +70,7 @@ async def get_all_parameters(device_id: str):
     - parameters: Dict com todos os parâmetros e suas informações
     """
     try:
-        return await device_params_service.get_all_parameters(device_id)
+        return await device_params_service.get_all_parameters(device_id, view=view, max_staleness=max_staleness)
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
@@ -306,7 +313,10 @@ async def search_parameters(
 
 
 @router.get("/normalized")
-async def get_normalized_data(device_id: str):
+async def get_normalized_data(
+    device_id: str,
+    max_staleness: Optional[int] = Query(None, ge=0, description="Aceita o snapshot local com até N segundos")
+):
     """
     Retorna dados normalizados do dispositivo para uso no frontend.
     
@@ -322,25 +332,12 @@ async def get_normalized_data(device_id: str):
     """
     try:
         from app.services.tr069_normalizer import normalizer
-        import httpx
-        import urllib.parse
-        
-        # Buscar device completo do GenieACS
-        encoded_id = urllib.parse.quote(device_id, safe='')
+        from app.services.device_snapshot_service import fetch_device
         
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            resp = await client.get(
-                f"http://localhost:7557/devices/?query=%7B%22_id%22%3A%22{encoded_id}%22%7D"
-            )
-            
-            if resp.status_code != 200:
-                raise ValueError(f"Dispositivo {device_id} não encontrado")
-            
-            devices = resp.json()
-            if not devices:
-                raise ValueError(f"Dispositivo {device_id} não encontrado")
-            
-            device = devices[0]
+        # Buscar do GenieACS apenas os ramos lidos pelo normalizer (view "normalized")
+        device = await fetch_device(device_id, "normalized", max_staleness)
+        if not device:
+            raise ValueError(f"Dispositivo {device_id} não encontrado")
         
         # Usar normalizer existente
         model_info = normalizer.get_data_model_info(device)
@@ -3,34 +3,157 @@
 Router para ingestão e consulta de feeds (métricas de dispositivos, alertas, tarefas).
 
 Endpoints:
-- POST /feeds/ingest : Recebe métricas e persiste em device_metrics; dispara análises rápidas.
+- POST /feeds/ingest : Recebe métricas e persiste em device_metrics; enfileira a análise.
+- POST /feeds/ingest/batch : Lote (array JSON ou NDJSON) de amostras de vários dispositivos;
+  um INSERT por lote, resultado por item.
+- GET  /feeds/analytics/stats : Fila do pipeline de análise (profundidade, descartes, lotes)
 - GET  /feeds/alerts : Lista alertas recentes do banco de dados (AlertEvent)
 - GET  /feeds/tasks  : Lista tarefas recentes do banco de dados (TaskHistory)
 - GET  /feeds/metrics: Lista métricas recentes persistidas (DeviceMetric)
+
+Baseline e detecção de anomalias rodam no pipeline de análise
+(app/services/analytics_pipeline.py), não na requisição.
+
+As listagens aceitam `cursor` (o `next_cursor` da resposta anterior) para
+paginação por chave e `count=exact|approx|none` para o total.
 """
 from __future__ import annotations
 
+import base64
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 
-from fastapi import APIRouter, Body, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+import orjson
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database.connection import get_db
+from app.database.connection import get_async_db, get_async_read_db
 from app.database.models import Device, DeviceMetric, AlertEvent, TaskHistory
-from app.ml import learning_engine, network_analyzer
+from app.services.analytics_pipeline import ANALYSIS_COLUMNS, Sample, analytics_pipeline
+from app.services.feeds_summary_service import feeds_summary_cache
+from app.services.metrics_service import MetricsService
+from app.settings import settings
 
 log = logging.getLogger("semppre-bridge.feeds")
 
 router = APIRouter(prefix="/feeds", tags=["Feeds"])
 
 
+
+async def _get_device(db: AsyncSession, device_id: str) -> Optional[Device]:
+    """Device pelo device_id externo (GenieACS)."""
+    return (await db.execute(select(Device).where(Device.device_id == device_id).limit(1))).scalars().first()
+
+
+async def _get_or_create_device(db: AsyncSession, device_id: str) -> Device:
+    """Device pelo device_id externo, criando um registro mínimo se não existir."""
+    device = await _get_device(db, device_id)
+    if device:
+        return device
+    device = Device(device_id=device_id)
+    db.add(device)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Outra requisição criou o mesmo device entre a busca e o commit
+        await db.rollback()
+        return await _get_device(db, device_id)
+    await db.refresh(device)
+    return device
+
+
+async def _count(db: AsyncSession, stmt) -> int:
+    """COUNT(*) de um select (equivalente a Query.count())."""
+    return await db.scalar(select(func.count()).select_from(stmt.order_by(None).subquery())) or 0
+
+
+# ============ Paginação por cursor ============
+# As listagens ordenam por (data desc, id desc) e o cursor é a última linha
+# da página anterior: a próxima página é um range scan no índice da data, com
+# custo constante, em vez de OFFSET (que percorre e descarta as linhas puladas).
+
+def _encode_cursor(ts: datetime, pk: int) -> str:
+    return base64.urlsafe_b64encode(f"{ts.isoformat()}|{pk}".encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        ts, pk = raw.rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(pk)
+    except Exception:
+        raise HTTPException(status_code=400, detail="cursor inválido")
+
+
+def _keyset_page(stmt, ts_col, id_col, cursor: Optional[str], offset: int, limit: int):
+    """Ordena por (ts desc, id desc) e aplica o cursor (ou OFFSET, se não houver cursor)."""
+    stmt = stmt.order_by(ts_col.desc(), id_col.desc())
+    if cursor:
+        ts, pk = _decode_cursor(cursor)
+        stmt = stmt.where(or_(ts_col < ts, and_(ts_col == ts, id_col < pk)))
+    elif offset:
+        stmt = stmt.offset(offset)
+    # Uma linha a mais indica se existe próxima página
+    return stmt.limit(limit + 1)
+
+
+def _next_cursor(rows: List[Any], limit: int, ts_attr: str) -> Optional[str]:
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1][0]
+    return _encode_cursor(getattr(last, ts_attr), last.id)
+
+
+async def _total(db: AsyncSession, stmt, mode: str) -> Tuple[Optional[int], bool]:
+    """
+    Total da listagem conforme `mode`:
+    - exact:  COUNT(*) completo
+    - approx: COUNT limitado a FEEDS_COUNT_CAP linhas (custo limitado)
+    - none:   não conta
+    Retorna (total, exato).
+    """
+    if mode == "none":
+        return None, False
+    if mode == "approx":
+        cap = settings.FEEDS_COUNT_CAP
+        capped = await _count(db, stmt.order_by(None).limit(cap))
+        return capped, capped < cap
+    return await _count(db, stmt), True
+
+
+# Chaves aceitas em `metrics` -> colunas de DeviceMetric; as demais vão para extra_metrics
+_METRIC_MAPPING = {
+    "bytes_received": "bytes_received",
+    "bytes_sent": "bytes_sent",
+    "packets_received": "packets_received",
+    "packets_sent": "packets_sent",
+    "errors_received": "errors_received",
+    "errors_sent": "errors_sent",
+    "latency_ms": "ping_latency_ms",
+    "ping_latency_ms": "ping_latency_ms",
+    "ping_jitter_ms": "ping_jitter_ms",
+    "packet_loss_pct": "ping_packet_loss",
+    "wifi_clients_24ghz": "wifi_clients_24ghz",
+    "wifi_clients_5ghz": "wifi_clients_5ghz",
+    "channel_24ghz": "channel_24ghz",
+    "channel_5ghz": "channel_5ghz",
+    "noise_24ghz": "noise_24ghz",
+    "noise_5ghz": "noise_5ghz",
+    "cpu_usage": "cpu_usage",
+    "memory_usage": "memory_usage",
+    "uptime_seconds": "uptime_seconds",
+    "lan_clients": "lan_clients",
+}
+
+
 @router.post("/ingest")
-async def ingest_metrics(payload: Dict[str, Any] = Body(...), db: Session = Depends(get_db)):
+async def ingest_metrics(payload: Dict[str, Any] = Body(...), db: AsyncSession = Depends(get_async_db)):
     """Ingest de métricas. Espera JSON com pelo menos `device_id` e `metrics`.
     `metrics` pode ser um dict {metric_name: value} ou lista de samples.
+    Para muitas amostras por requisição, use POST /feeds/ingest/batch.
     """
     try:
         device_id_external = payload.get("device_id") or payload.get("device")
@@ -38,13 +161,8 @@ async def ingest_metrics(payload: Dict[str, Any] = Body(...), db: Session = Depe
             raise HTTPException(status_code=400, detail="device_id é obrigatório")
 
         # Tentar localizar Device interno
-        device = db.query(Device).filter(Device.device_id == device_id_external).first()
-        if not device:
-            # Criar registro mínimo se não existir
-            device = Device(device_id=device_id_external)
-            db.add(device)
-            db.commit()
-            db.refresh(device)
+        # Criar registro mínimo se não existir
+        device = await _get_or_create_device(db, device_id_external)
 
         metrics = payload.get("metrics") or {}
         ts = payload.get("timestamp")
@@ -63,32 +181,8 @@ async def ingest_metrics(payload: Dict[str, Any] = Body(...), db: Session = Depe
             extra_metrics={},
         )
 
-        # Known keys mapping
-        mapping = {
-            "bytes_received": "bytes_received",
-            "bytes_sent": "bytes_sent",
-            "packets_received": "packets_received",
-            "packets_sent": "packets_sent",
-            "errors_received": "errors_received",
-            "errors_sent": "errors_sent",
-            "latency_ms": "ping_latency_ms",
-            "ping_latency_ms": "ping_latency_ms",
-            "ping_jitter_ms": "ping_jitter_ms",
-            "packet_loss_pct": "ping_packet_loss",
-            "wifi_clients_24ghz": "wifi_clients_24ghz",
-            "wifi_clients_5ghz": "wifi_clients_5ghz",
-            "channel_24ghz": "channel_24ghz",
-            "channel_5ghz": "channel_5ghz",
-            "noise_24ghz": "noise_24ghz",
-            "noise_5ghz": "noise_5ghz",
-            "cpu_usage": "cpu_usage",
-            "memory_usage": "memory_usage",
-            "uptime_seconds": "uptime_seconds",
-            "lan_clients": "lan_clients",
-        }
-
         for k, v in metrics.items():
-            key = mapping.get(k, None)
+            key = _METRIC_MAPPING.get(k, None)
             try:
                 if key and hasattr(dm, key):
                     setattr(dm, key, v)
@@ -104,52 +198,17 @@ async def ingest_metrics(payload: Dict[str, Any] = Body(...), db: Session = Depe
                     dm.extra_metrics[k] = v
 
         db.add(dm)
-        db.commit()
-        db.refresh(dm)
+        await db.commit()
+        await db.refresh(dm)
 
-        # Atualizar baseline no learning engine (assíncrono rápido)
-        try:
-            baseline_metrics = {}
-            # escolher métricas úteis para baseline
-            for mkey in ["ping_latency_ms", "ping_packet_loss", "cpu_usage", "memory_usage"]:
-                if getattr(dm, mkey, None) is not None:
-                    baseline_metrics[mkey] = getattr(dm, mkey)
-            if baseline_metrics:
-                learning_engine.update_baseline(device_id_external, baseline_metrics)
-        except Exception as e:
-            log.warning(f"learning_engine.update_baseline falhou: {e}")
-
-        # Rodar detecção rápida de anomalias (síncrono leve)
-        try:
-            metric_values = {}
-            # transformar em shapes simples para network_analyzer
-            if dm.ping_latency_ms is not None:
-                metric_values.setdefault("latency_ms", []).append(dm.ping_latency_ms)
-            if dm.ping_packet_loss is not None:
-                metric_values.setdefault("packet_loss_pct", []).append(dm.ping_packet_loss)
-            # incluir alguns extras se existirem
-            for k, v in (dm.extra_metrics or {}).items():
-                if isinstance(v, (int, float)):
-                    metric_values.setdefault(k, []).append(v)
-
-            if metric_values:
-                anomalies = network_analyzer.detect_anomalies(device_id_external, metric_values)
-                # se anomalias significativas, persistir AlertEvent
-                for a in anomalies:
-                    if a.severity > 0.5:
-                        alert = AlertEvent(
-                            device_id=device.id,
-                            severity="error" if a.severity > 0.7 else "warning",
-                            category="performance",
-                            title=f"Anomalia: {a.anomaly_type.value}",
-                            message=a.description,
-                            details=a.to_dict(),
-                        )
-                        db.add(alert)
-                if anomalies:
-                    db.commit()
-        except Exception as e:
-            log.warning(f"network_analyzer.detect_anomalies falhou: {e}")
+        # Baseline e anomalias ficam com o pipeline de análise (fora da requisição)
+        analytics_pipeline.enqueue([Sample(
+            device_id=device_id_external,
+            device_pk=device.id,
+            collected_at=collected_at,
+            values={col: getattr(dm, col) for col in ANALYSIS_COLUMNS},
+            extras=dict(dm.extra_metrics or {}),
+        )])
 
         return {"success": True, "device_id": device_id_external, "metric_id": dm.id}
     except HTTPException:
@@ -159,61 +218,192 @@ async def ingest_metrics(payload: Dict[str, Any] = Body(...), db: Session = Depe
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ============ Ingest em lote ============
+
+def _parse_batch(body: bytes, content_type: str) -> List[Any]:
+    """
+    Corpo de /ingest/batch -> lista de itens. Array JSON, ou NDJSON (um objeto
+    por linha; também quando o corpo não começa com "["). Linhas NDJSON
+    inválidas viram um item ValueError, reportado no resultado daquele índice.
+    """
+    text = body.strip()
+    if not text:
+        return []
+    if "ndjson" not in content_type and text[:1] == b"[":
+        try:
+            items = orjson.loads(text)
+        except orjson.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"JSON inválido: {e}")
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="esperado um array de amostras")
+        return items
+    items: List[Any] = []
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(orjson.loads(line))
+        except orjson.JSONDecodeError as e:
+            items.append(ValueError(f"JSON inválido: {e}"))
+    return items
+
+
+def _batch_row(item: Any) -> Dict[str, Any]:
+    """Valida um item do lote e monta a linha de bulk_record_metrics (ValueError se inválido)."""
+    if isinstance(item, ValueError):
+        raise item
+    if not isinstance(item, dict):
+        raise ValueError("item deve ser um objeto")
+    device_id_external = item.get("device_id") or item.get("device")
+    if not device_id_external or not isinstance(device_id_external, str):
+        raise ValueError("device_id é obrigatório")
+    metrics = item.get("metrics") or {}
+    if not isinstance(metrics, dict):
+        raise ValueError("metrics deve ser um objeto")
+
+    ts = item.get("timestamp")
+    if ts:
+        try:
+            collected_at = datetime.fromisoformat(ts)
+        except (TypeError, ValueError):
+            raise ValueError(f"timestamp inválido: {ts!r}")
+    else:
+        collected_at = datetime.utcnow()
+
+    row: Dict[str, Any] = {"device_id": device_id_external, "collected_at": collected_at}
+    extras: Dict[str, Any] = {}
+    for k, v in metrics.items():
+        key = _METRIC_MAPPING.get(k)
+        if key is None:
+            extras[k] = v
+        elif v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)):
+            row[key] = v
+        else:
+            # Um valor não numérico numa coluna derrubaria o INSERT do lote inteiro
+            raise ValueError(f"{k} deve ser numérico")
+    row["extra_metrics"] = extras
+    return row
+
+
+@router.post("/ingest/batch")
+async def ingest_batch(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """
+    Ingest em lote: array JSON ou NDJSON (application/x-ndjson) de amostras
+    no formato de POST /feeds/ingest ({device_id, metrics, timestamp?}),
+    de vários dispositivos.
+
+    Os dispositivos são resolvidos com uma consulta IN (os ausentes são criados)
+    e as amostras válidas entram com um único INSERT, numa transação. Baseline
+    e detecção de anomalias ficam com o pipeline de análise. `results` traz o status
+    de cada item, na ordem recebida.
+    """
+    items = _parse_batch(await request.body(), request.headers.get("content-type", ""))
+    if len(items) > settings.FEEDS_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Máximo de {settings.FEEDS_BATCH_MAX_ITEMS} amostras por lote"
+        )
+
+    results: List[Dict[str, Any]] = []
+    rows: List[Dict[str, Any]] = []
+    for index, item in enumerate(items):
+        try:
+            row = _batch_row(item)
+        except ValueError as e:
+            device_id_external = item.get("device_id") if isinstance(item, dict) else None
+            results.append({"index": index, "device_id": device_id_external, "status": "rejected", "error": str(e)})
+            continue
+        rows.append(row)
+        results.append({"index": index, "device_id": row["device_id"], "status": "accepted"})
+
+    id_map: Dict[str, int] = {}
+    if rows:
+        def _insert(session) -> Dict[str, int]:
+            svc = MetricsService(session)
+            ids = svc.get_device_id_map(r["device_id"] for r in rows)
+            missing = list(dict.fromkeys(r["device_id"] for r in rows if r["device_id"] not in ids))
+            if missing:
+                ids.update(svc.bulk_upsert_devices([{"device_id": d} for d in missing], commit=False))
+            svc.bulk_record_metrics(rows, id_map=ids, commit=False)
+            session.commit()
+            return ids
+
+        try:
+            id_map = await db.run_sync(_insert)
+        except Exception as e:
+            await db.rollback()
+            log.exception(f"Erro ingest batch: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+        # INSERT via Core não passa pelos eventos do ORM: ajustar o resumo aqui
+        feeds_summary_cache.apply([("metrics", r["collected_at"], {"total": 1}) for r in rows])
+        analytics_pipeline.enqueue(
+            Sample(
+                device_id=r["device_id"],
+                device_pk=id_map[r["device_id"]],
+                collected_at=r["collected_at"],
+                values=r,
+                extras=r["extra_metrics"],
+            )
+            for r in rows
+        )
+
+    return {
+        "success": True,
+        "received": len(items),
+        "accepted": len(rows),
+        "rejected": len(items) - len(rows),
+        "results": results,
+    }
+
+
 # =============================================================================
 #  GET /feeds/alerts - Lista alertas recentes
 # =============================================================================
 @router.get("/alerts")
 async def list_alerts(
     limit: int = Query(50, ge=1, le=500),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Legado; prefira cursor"),
+    cursor: Optional[str] = Query(None, description="next_cursor da página anterior"),
+    count: str = Query("exact", pattern="^(exact|approx|none)$", description="Cálculo do total"),
     severity: Optional[str] = Query(None, description="Filtrar por severidade: info, warning, error, critical"),
     category: Optional[str] = Query(None, description="Filtrar por categoria: connectivity, wifi, wan, security, performance"),
     status: Optional[str] = Query(None, description="Filtrar por status: active, acknowledged, resolved"),
     device_id: Optional[str] = Query(None, description="Filtrar por device_id externo"),
     hours: Optional[int] = Query(None, description="Buscar apenas alertas das últimas N horas"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Lista alertas recentes do banco de dados (AlertEvent)."""
     try:
-        query = db.query(AlertEvent)
+        # device_id externo vem no mesmo SELECT (join), sem consulta por linha
+        query = select(AlertEvent, Device.device_id).outerjoin(Device, AlertEvent.device_id == Device.id)
 
         # Filtros
         if severity:
-            query = query.filter(AlertEvent.severity == severity)
+            query = query.where(AlertEvent.severity == severity)
         if category:
-            query = query.filter(AlertEvent.category == category)
+            query = query.where(AlertEvent.category == category)
         if status:
-            query = query.filter(AlertEvent.status == status)
+            query = query.where(AlertEvent.status == status)
         if device_id:
-            device = db.query(Device).filter(Device.device_id == device_id).first()
-            if device:
-                query = query.filter(AlertEvent.device_id == device.id)
-            else:
-                # device não encontrado, retorna lista vazia
-                return {
-                    "success": True,
-                    "total": 0,
-                    "alerts": [],
-                }
+            query = query.where(Device.device_id == device_id)
         if hours:
             cutoff = datetime.utcnow() - timedelta(hours=hours)
-            query = query.filter(AlertEvent.created_at >= cutoff)
+            query = query.where(AlertEvent.created_at >= cutoff)
 
-        # Total antes de paginação
-        total = query.count()
+        total, total_exact = await _total(db, query, count)
 
-        # Ordenar por mais recente primeiro e paginar
-        alerts = query.order_by(desc(AlertEvent.created_at)).offset(offset).limit(limit).all()
+        # Mais recente primeiro, paginado por cursor (created_at, id)
+        rows = (await db.execute(
+            _keyset_page(query, AlertEvent.created_at, AlertEvent.id, cursor, offset, limit)
+        )).all()
 
         # Serializar
         result = []
-        for a in alerts:
-            # Buscar device_id externo se houver
-            device_ext = None
-            if a.device_id:
-                dev = db.query(Device).filter(Device.id == a.device_id).first()
-                if dev:
-                    device_ext = dev.device_id
+        for a, device_ext in rows[:limit]:
             result.append({
                 "id": a.id,
                 "device_id": device_ext,
@@ -231,8 +421,12 @@ async def list_alerts(
         return {
             "success": True,
             "total": total,
+            "total_exact": total_exact,
+            "next_cursor": _next_cursor(rows, limit, "created_at"),
             "alerts": result,
         }
+    except HTTPException:
+        raise
     except Exception as e:
         log.exception(f"Erro listando alertas: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -244,42 +438,37 @@ async def list_alerts(
 @router.get("/tasks")
 async def list_tasks(
     limit: int = Query(50, ge=1, le=500),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Legado; prefira cursor"),
+    cursor: Optional[str] = Query(None, description="next_cursor da página anterior"),
+    count: str = Query("exact", pattern="^(exact|approx|none)$", description="Cálculo do total"),
     status: Optional[str] = Query(None, description="Filtrar por status: pending, running, success, failed"),
     task_type: Optional[str] = Query(None, description="Filtrar por tipo: reboot, setParameterValues, download, etc"),
     device_id: Optional[str] = Query(None, description="Filtrar por device_id externo"),
     hours: Optional[int] = Query(None, description="Buscar apenas tarefas das últimas N horas"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Lista tarefas recentes do banco de dados (TaskHistory)."""
     try:
-        query = db.query(TaskHistory)
+        query = select(TaskHistory, Device.device_id).outerjoin(Device, TaskHistory.device_id == Device.id)
 
         # Filtros
         if status:
-            query = query.filter(TaskHistory.status == status)
+            query = query.where(TaskHistory.status == status)
         if task_type:
-            query = query.filter(TaskHistory.task_type == task_type)
+            query = query.where(TaskHistory.task_type == task_type)
         if device_id:
-            device = db.query(Device).filter(Device.device_id == device_id).first()
-            if device:
-                query = query.filter(TaskHistory.device_id == device.id)
-            else:
-                return {"success": True, "total": 0, "tasks": []}
+            query = query.where(Device.device_id == device_id)
         if hours:
             cutoff = datetime.utcnow() - timedelta(hours=hours)
-            query = query.filter(TaskHistory.created_at >= cutoff)
+            query = query.where(TaskHistory.created_at >= cutoff)
 
-        total = query.count()
-        tasks = query.order_by(desc(TaskHistory.created_at)).offset(offset).limit(limit).all()
+        total, total_exact = await _total(db, query, count)
+        rows = (await db.execute(
+            _keyset_page(query, TaskHistory.created_at, TaskHistory.id, cursor, offset, limit)
+        )).all()
 
         result = []
-        for t in tasks:
-            device_ext = None
-            if t.device_id:
-                dev = db.query(Device).filter(Device.id == t.device_id).first()
-                if dev:
-                    device_ext = dev.device_id
+        for t, device_ext in rows[:limit]:
             result.append({
                 "id": t.id,
                 "genie_task_id": t.genie_task_id,
@@ -295,7 +484,15 @@ async def list_tasks(
                 "parameters": t.parameters or {},
             })
 
-        return {"success": True, "total": total, "tasks": result}
+        return {
+            "success": True,
+            "total": total,
+            "total_exact": total_exact,
+            "next_cursor": _next_cursor(rows, limit, "created_at"),
+            "tasks": result,
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         log.exception(f"Erro listando tarefas: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -307,36 +504,30 @@ async def list_tasks(
 @router.get("/metrics")
 async def list_metrics(
     limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Legado; prefira cursor"),
+    cursor: Optional[str] = Query(None, description="next_cursor da página anterior"),
+    count: str = Query("exact", pattern="^(exact|approx|none)$", description="Cálculo do total"),
     device_id: Optional[str] = Query(None, description="Filtrar por device_id externo"),
     hours: Optional[int] = Query(24, description="Buscar apenas métricas das últimas N horas"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Lista métricas recentes persistidas (DeviceMetric)."""
     try:
-        query = db.query(DeviceMetric)
+        query = select(DeviceMetric, Device.device_id).join(Device, DeviceMetric.device_id == Device.id)
 
         if device_id:
-            device = db.query(Device).filter(Device.device_id == device_id).first()
-            if device:
-                query = query.filter(DeviceMetric.device_id == device.id)
-            else:
-                return {"success": True, "total": 0, "metrics": []}
-
+            query = query.where(Device.device_id == device_id)
         if hours:
             cutoff = datetime.utcnow() - timedelta(hours=hours)
-            query = query.filter(DeviceMetric.collected_at >= cutoff)
+            query = query.where(DeviceMetric.collected_at >= cutoff)
 
-        total = query.count()
-        metrics = query.order_by(desc(DeviceMetric.collected_at)).offset(offset).limit(limit).all()
+        total, total_exact = await _total(db, query, count)
+        rows = (await db.execute(
+            _keyset_page(query, DeviceMetric.collected_at, DeviceMetric.id, cursor, offset, limit)
+        )).all()
 
         result = []
-        for m in metrics:
-            device_ext = None
-            if m.device_id:
-                dev = db.query(Device).filter(Device.id == m.device_id).first()
-                if dev:
-                    device_ext = dev.device_id
+        for m, device_ext in rows[:limit]:
             result.append({
                 "id": m.id,
                 "device_id": device_ext,
@@ -363,7 +554,15 @@ async def list_metrics(
                 "extra_metrics": m.extra_metrics or {},
             })
 
-        return {"success": True, "total": total, "metrics": result}
+        return {
+            "success": True,
+            "total": total,
+            "total_exact": total_exact,
+            "next_cursor": _next_cursor(rows, limit, "collected_at"),
+            "metrics": result,
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         log.exception(f"Erro listando métricas: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -376,11 +575,11 @@ async def list_metrics(
 async def update_alert(
     alert_id: int,
     payload: Dict[str, Any] = Body(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Atualiza status de um alerta (acknowledge, resolve)."""
     try:
-        alert = db.query(AlertEvent).filter(AlertEvent.id == alert_id).first()
+        alert = await db.get(AlertEvent, alert_id)
         if not alert:
             raise HTTPException(status_code=404, detail="Alerta não encontrado")
 
@@ -395,8 +594,8 @@ async def update_alert(
             elif new_status == "resolved":
                 alert.resolved_at = datetime.utcnow()
 
-        db.commit()
-        db.refresh(alert)
+        await db.commit()
+        await db.refresh(alert)
 
         return {"success": True, "alert_id": alert.id, "status": alert.status}
     except HTTPException:
@@ -412,23 +611,16 @@ async def update_alert(
 @router.post("/tasks")
 async def create_task(
     payload: Dict[str, Any] = Body(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Cria um registro de tarefa (TaskHistory) no banco."""
     try:
         device_id_external = payload.get("device_id")
         device_fk = None
         if device_id_external:
-            device = db.query(Device).filter(Device.device_id == device_id_external).first()
-            if device:
-                device_fk = device.id
-            else:
-                # criar device mínimo
-                device = Device(device_id=device_id_external)
-                db.add(device)
-                db.commit()
-                db.refresh(device)
-                device_fk = device.id
+            # criar device mínimo se não existir
+            device = await _get_or_create_device(db, device_id_external)
+            device_fk = device.id
 
         if not device_fk:
             raise HTTPException(status_code=400, detail="device_id é obrigatório")
@@ -456,8 +648,8 @@ async def create_task(
                 pass
 
         db.add(task)
-        db.commit()
-        db.refresh(task)
+        await db.commit()
+        await db.refresh(task)
 
         return {"success": True, "task_id": task.id}
     except HTTPException:
@@ -474,11 +666,11 @@ async def create_task(
 async def update_task(
     task_id: int,
     payload: Dict[str, Any] = Body(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Atualiza status de uma tarefa (TaskHistory)."""
     try:
-        task = db.query(TaskHistory).filter(TaskHistory.id == task_id).first()
+        task = await db.get(TaskHistory, task_id)
         if not task:
             raise HTTPException(status_code=404, detail="Tarefa não encontrada")
 
@@ -496,8 +688,8 @@ async def update_task(
         if "fault_message" in payload:
             task.fault_message = payload["fault_message"]
 
-        db.commit()
-        db.refresh(task)
+        await db.commit()
+        await db.refresh(task)
 
         return {"success": True, "task_id": task.id, "status": task.status}
     except HTTPException:
@@ -513,73 +705,22 @@ async def update_task(
 @router.get("/summary")
 async def feeds_summary(
     hours: int = Query(24, description="Período em horas para o resumo"),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Resumo geral: contagem de alertas, tarefas e métricas recentes."""
     try:
-        cutoff = datetime.utcnow() - timedelta(hours=hours)
-
-        # Contagens de alertas por severidade
-        alerts_total = db.query(AlertEvent).filter(AlertEvent.created_at >= cutoff).count()
-        alerts_critical = db.query(AlertEvent).filter(
-            AlertEvent.created_at >= cutoff,
-            AlertEvent.severity == "critical"
-        ).count()
-        alerts_error = db.query(AlertEvent).filter(
-            AlertEvent.created_at >= cutoff,
-            AlertEvent.severity == "error"
-        ).count()
-        alerts_warning = db.query(AlertEvent).filter(
-            AlertEvent.created_at >= cutoff,
-            AlertEvent.severity == "warning"
-        ).count()
-        alerts_active = db.query(AlertEvent).filter(
-            AlertEvent.created_at >= cutoff,
-            AlertEvent.status == "active"
-        ).count()
-
-        # Contagens de tarefas por status
-        tasks_total = db.query(TaskHistory).filter(TaskHistory.created_at >= cutoff).count()
-        tasks_pending = db.query(TaskHistory).filter(
-            TaskHistory.created_at >= cutoff,
-            TaskHistory.status == "pending"
-        ).count()
-        tasks_success = db.query(TaskHistory).filter(
-            TaskHistory.created_at >= cutoff,
-            TaskHistory.status == "success"
-        ).count()
-        tasks_failed = db.query(TaskHistory).filter(
-            TaskHistory.created_at >= cutoff,
-            TaskHistory.status == "failed"
-        ).count()
-
-        # Contagem de métricas e dispositivos únicos
-        metrics_total = db.query(DeviceMetric).filter(DeviceMetric.collected_at >= cutoff).count()
-        devices_with_metrics = db.query(DeviceMetric.device_id).filter(
-            DeviceMetric.collected_at >= cutoff
-        ).distinct().count()
-
-        return {
-            "success": True,
-            "period_hours": hours,
-            "alerts": {
-                "total": alerts_total,
-                "critical": alerts_critical,
-                "error": alerts_error,
-                "warning": alerts_warning,
-                "active": alerts_active,
-            },
-            "tasks": {
-                "total": tasks_total,
-                "pending": tasks_pending,
-                "success": tasks_success,
-                "failed": tasks_failed,
-            },
-            "metrics": {
-                "total": metrics_total,
-                "devices_active": devices_with_metrics,
-            },
-        }
+        # Contadores em cache (TTL curto, ajustados a cada commit deste processo);
+        # no recálculo, uma consulta de agregação condicional por tabela
+        return await feeds_summary_cache.summary(db, hours)
     except Exception as e:
         log.exception(f"Erro gerando resumo de feeds: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# =============================================================================
+#  GET /feeds/analytics/stats - Estado do pipeline de análise
+# =============================================================================
+@router.get("/analytics/stats")
+async def analytics_stats():
+    """Profundidade da fila, descartes (fila cheia), lotes e alertas do pipeline de análise."""
+    return analytics_pipeline.stats()
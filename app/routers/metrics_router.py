@@ -3,12 +3,17 @@
 
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.services.metrics_service import MetricsService
+from app.services.metric_partitions import metric_partitions
+from app.services.metric_rollup import rollup_status, run_rollups
+from app.services import metric_series
+from app.settings import settings
 
 router = APIRouter(prefix="/metrics", tags=["Metrics"])
 
@@ -82,6 +87,15 @@ class MetricOut(BaseModel):
         from_attributes = True
 
 
+class BulkSeriesIn(BaseModel):
+    device_ids: List[str] = Field(..., min_length=1, description="device_id (GenieACS) dos CPEs")
+    fields: List[str] = Field(["ping_latency_ms"], min_length=1, description="Colunas de device_metrics")
+    start: Optional[datetime] = Field(None, description="Início (UTC); padrão: agora - hours")
+    end: Optional[datetime] = Field(None, description="Fim exclusivo (UTC); padrão: agora")
+    hours: int = Field(24, ge=1, description="Janela quando start não é informado")
+    format: str = Field("json", pattern="^(json|arrow|binary)$")
+
+
 class DiagnosticIn(BaseModel):
     diagnostic_type: str = Field(..., description="ping, traceroute, speedtest, iperf")
     target_host: Optional[str] = None
@@ -180,7 +194,7 @@ def list_devices(
     manufacturer: Optional[str] = None,
     limit: int = Query(100, le=500),
     offset: int = 0,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Lista dispositivos com filtros."""
     svc = MetricsService(db)
@@ -188,7 +202,7 @@ def list_devices(
 
 
 @router.get("/devices/{device_id}", response_model=DeviceOut)
-def get_device(device_id: str, db: Session = Depends(get_db)):
+def get_device(device_id: str, db: Session = Depends(get_read_db)):
     """Busca um dispositivo pelo ID."""
     svc = MetricsService(db)
     device = svc.get_device(device_id)
@@ -212,16 +226,52 @@ def get_metrics(
     device_id: str,
     hours: int = Query(24, description="Buscar métricas das últimas N horas"),
     limit: int = Query(100, le=1000),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """Busca métricas de um dispositivo."""
+    """Busca métricas brutas de um dispositivo (para gráficos use /metrics/series)."""
     svc = MetricsService(db)
     start_time = datetime.utcnow() - timedelta(hours=hours)
     return svc.get_metrics(device_id, start_time=start_time, limit=limit)
 
 
+@router.post("/series/bulk")
+def get_bulk_series(data: BulkSeriesIn, db: Session = Depends(get_read_db)):
+    """
+    Séries colunares (t + um array por campo) de vários dispositivos numa
+    chamada. format: json (padrão), arrow (Arrow IPC stream, requer pyarrow)
+    ou binary (formato SMS1 descrito em app/services/metric_series.py).
+    """
+    if len(data.device_ids) > settings.METRICS_BULK_MAX_DEVICES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Máximo de {settings.METRICS_BULK_MAX_DEVICES} dispositivos por chamada"
+        )
+    if data.format == "arrow" and not metric_series.arrow_available():
+        raise HTTPException(status_code=501, detail="Formato arrow requer o pacote pyarrow")
+    try:
+        fields = metric_series.validate_fields(data.fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    end = data.end or datetime.utcnow()
+    start = data.start or end - timedelta(hours=data.hours)
+    series = metric_series.read_series(db, data.device_ids, fields, start, end)
+    
+    if data.format == "arrow":
+        return Response(metric_series.encode_arrow(series, fields), media_type=metric_series.MEDIA_TYPES["arrow"])
+    if data.format == "binary":
+        return Response(metric_series.encode_binary(series, fields), media_type=metric_series.MEDIA_TYPES["binary"])
+    return ORJSONResponse({
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "fields": fields,
+        "devices": len(series),
+        "series": series,
+    })
+
+
 @router.get("/devices/{device_id}/metrics/latest", response_model=Optional[MetricOut])
-def get_latest_metric(device_id: str, db: Session = Depends(get_db)):
+def get_latest_metric(device_id: str, db: Session = Depends(get_read_db)):
     """Busca a métrica mais recente de um dispositivo."""
     svc = MetricsService(db)
     return svc.get_latest_metric(device_id)
@@ -231,13 +281,45 @@ def get_latest_metric(device_id: str, db: Session = Depends(get_db)):
 def get_metrics_summary(
     device_id: str,
     hours: int = Query(24, description="Período em horas"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Retorna resumo estatístico das métricas."""
     svc = MetricsService(db)
     return svc.get_metrics_summary(device_id, hours=hours)
 
 
+@router.get("/devices/{device_id}/metrics/series")
+def get_metric_series(
+    device_id: str,
+    hours: int = Query(24, ge=1, description="Janela em horas"),
+    max_points: int = Query(500, ge=10, le=5000, description="Pontos devolvidos (após redução)"),
+    resolution: str = Query("auto", pattern="^(auto|raw|hour|day|week)$"),
+    method: str = Query("lttb", pattern="^(lttb|minmax)$", description="Redução: lttb ou minmax"),
+    field: str = Query("avg_latency", description="Campo que guia a redução"),
+    db: Session = Depends(get_read_db)
+):
+    """
+    Série de histórico para gráficos: resolução escolhida pela janela
+    (amostras brutas, ou agregações hora/dia/semana + período corrente)
+    e reduzida a max_points.
+    """
+    svc = MetricsService(db)
+    try:
+        series = svc.get_metric_series(
+            device_id,
+            start=datetime.utcnow() - timedelta(hours=hours),
+            max_points=max_points,
+            resolution=resolution,
+            method=method,
+            field=field,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if series is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    return series
+
+
 # ============ Endpoints - Diagnósticos ============
 
 @router.post("/devices/{device_id}/diagnostics", response_model=DiagnosticOut)
@@ -295,7 +377,7 @@ def get_diagnostics(
     device_id: str,
     diagnostic_type: Optional[str] = None,
     limit: int = Query(20, le=100),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Lista diagnósticos de um dispositivo."""
     svc = MetricsService(db)
@@ -323,7 +405,7 @@ def get_alerts(
     device_id: Optional[str] = None,
     severity: Optional[str] = None,
     limit: int = Query(50, le=200),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Lista alertas ativos."""
     svc = MetricsService(db)
@@ -398,6 +480,30 @@ def cleanup_old_data(
     return {"deleted_metrics": deleted, "days": days}
 
 
+@router.get("/maintenance/partitions")
+def list_metric_partitions(db: Session = Depends(get_read_db)):
+    """Partições mensais de métricas (armazenamento, estado, linhas)."""
+    return {"partitions": metric_partitions.list(db)}
+
+
+@router.post("/maintenance/partitions")
+def maintain_metric_partitions(db: Session = Depends(get_db)):
+    """Executa a manutenção das partições: registro, rollup dos meses fechados e retenção."""
+    return metric_partitions.maintain(db)
+
+
+@router.get("/maintenance/rollup")
+def get_rollup_status(db: Session = Depends(get_read_db)):
+    """Marca d'água do rollup incremental por tipo de período."""
+    return {"watermarks": rollup_status(db)}
+
+
+@router.post("/maintenance/rollup")
+def run_metric_rollup(db: Session = Depends(get_db)):
+    """Agrega (hora, dia, semana) os períodos completos desde a última marca d'água."""
+    return {"aggregated": run_rollups(db), "watermarks": rollup_status(db)}
+
+
 @router.post("/devices/{device_id}/aggregate")
 def aggregate_metrics(
     device_id: str,
@@ -7,8 +7,16 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.services.ml_service import MLService
+from app.services.health_scoring import (
+    DEFAULT_THRESHOLDS,
+    load_thresholds,
+    problem_counts,
+    refresh_device_health,
+    save_thresholds,
+    worst_devices,
+)
 
 router = APIRouter(prefix="/ml", tags=["Machine Learning"])
 
@@ -167,7 +175,7 @@ def get_recommendations(
 
 
 @router.get("/fleet", response_model=FleetAnalysisOut)
-def fleet_analysis(db: Session = Depends(get_db)):
+def fleet_analysis(db: Session = Depends(get_read_db)):
     """
     Análise geral da frota de dispositivos.
     """
@@ -197,71 +205,75 @@ def predict_traffic(
 def batch_health_check(
     limit: int = Query(50, le=200),
     only_problems: bool = Query(False, description="Filtrar apenas dispositivos com problemas"),
-    db: Session = Depends(get_db)
+    manufacturer: Optional[str] = Query(None, description="Filtrar por fabricante"),
+    db: Session = Depends(get_read_db)
 ):
     """
-    Verificação de saúde em lote de múltiplos dispositivos.
+    Saúde dos dispositivos online a partir do snapshot device_health
+    (atualizado pelo coletor e pelo ingest); retorna os `limit` piores.
     """
-    from app.database.models import Device
-    
-    ml = MLService(db)
-    
-    devices = db.query(Device)\
-        .filter(Device.is_online == True)\
-        .limit(limit)\
-        .all()
+    counts = problem_counts(db, manufacturer=manufacturer, online_only=True)
+    rows = worst_devices(
+        db,
+        limit=limit,
+        manufacturer=manufacturer,
+        max_score=70 if only_problems else None,
+        online_only=True,
+    )
     
-    results = []
-    for device in devices:
-        anomalies = ml.detect_anomalies(device.device_id, hours=6)
-        health_score = anomalies.get("health_score", 100)
-        
-        if only_problems and health_score >= 70:
-            continue
-        
-        results.append({
-            "device_id": device.device_id,
-            "manufacturer": device.manufacturer,
-            "model": device.product_class,
-            "pppoe_login": device.pppoe_login,
-            "wan_ip": device.wan_ip,
-            "health_score": health_score,
-            "anomaly_count": len(anomalies.get("anomalies", [])),
-            "anomalies": anomalies.get("anomalies", [])[:3]  # Máximo 3 anomalias
-        })
-    
-    # Ordenar por health_score (menor primeiro)
-    results.sort(key=lambda x: x["health_score"])
+    results = [
+        {
+            "device_id": row["device_id"],
+            "manufacturer": row["manufacturer"],
+            "model": row["product_class"],
+            "pppoe_login": row["pppoe_login"],
+            "wan_ip": row["wan_ip"],
+            "health_score": row["health_score"],
+            "anomaly_count": row["anomaly_count"],
+            "anomalies": (row["anomalies"] or [])[:3],  # Máximo 3 anomalias
+            "computed_at": row["computed_at"].isoformat() if row["computed_at"] else None,
+        }
+        for row in rows
+    ]
     
     return {
-        "devices_analyzed": len(devices),
-        "problems_found": len([r for r in results if r["health_score"] < 70]),
+        "devices_analyzed": counts["scored"],
+        "problems_found": counts["problems"],
         "results": results,
         "timestamp": datetime.utcnow().isoformat()
     }
 
 
+@router.post("/batch/score")
+def batch_score_fleet(db: Session = Depends(get_db)):
+    """
+    Pontua a frota inteira (saúde, anomalias e risco) e grava em device_health,
+    com os limiares de GET /ml/thresholds.
+    """
+    started = datetime.utcnow()
+    rows = refresh_device_health(db)
+    return {
+        "devices_scored": len(rows),
+        "with_data": len([r for r in rows if r["health_score"] is not None]),
+        "problems_found": len([r for r in rows if r["health_score"] is not None and r["health_score"] < 70]),
+        "elapsed_ms": round((datetime.utcnow() - started).total_seconds() * 1000, 1),
+    }
+
+
 @router.post("/thresholds")
 def update_thresholds(
     thresholds: Dict[str, float],
     db: Session = Depends(get_db)
 ):
     """
-    Atualiza thresholds de detecção de anomalias.
+    Atualiza thresholds de detecção de anomalias (persistidos: valem para
+    as análises, /ml/batch/score e as repontuações do coletor e do ingest).
     """
-    ml = MLService(db)
-    
-    valid_keys = list(ml.thresholds.keys())
-    updated = {}
-    
-    for key, value in thresholds.items():
-        if key in valid_keys:
-            ml.thresholds[key] = value
-            updated[key] = value
+    updated = {key: value for key, value in thresholds.items() if key in DEFAULT_THRESHOLDS}
     
     return {
         "updated": updated,
-        "current_thresholds": ml.thresholds
+        "current_thresholds": save_thresholds(db, updated)
     }
 
 
@@ -270,5 +282,4 @@ def get_thresholds(db: Session = Depends(get_db)):
     """
     Obtém thresholds atuais de detecção.
     """
-    ml = MLService(db)
-    return ml.thresholds
+    return load_thresholds(db)
@@ -9,6 +9,8 @@ Permite buscar dispositivos pelo login PPPoE (ou serial) e alterar configuraçõ
 from __future__ import annotations
 
 import os
+import asyncio
+import json
 import re
 import logging
 import hashlib
@@ -22,6 +24,11 @@ from pydantic import BaseModel, Field
 import httpx
 
 from app.settings import settings
+from app.integrations.genieacs import get_nbi_client, nbi_timeout
+from app.services.device_projection import projection_params
+from app.services.device_snapshot_service import fetch_device, snapshot_store
+from app.services.device_lookup_service import KINDS, device_lookup, normalize_mac
+from app.services.tr069_paths import PathChain
 
 log = logging.getLogger("semppre-bridge.mobile-api")
 
@@ -143,75 +150,124 @@ class ApiStatusResponse(BaseModel):
 
 # ============ Funções Auxiliares ============
 
-async def find_device_by_login_or_serial(identifier: str) -> Optional[Dict[str, Any]]:
+# Parâmetros lidos por extract_device_info e detect_device_paths (view "mobile",
+# registrada em device_projection). Busca por login/serial traz só esses ramos.
+MOBILE_VIEW = "mobile"
+
+
+# Caminhos onde o login PPPoE e o serial podem estar (TR-098 e TR-181)
+PPPOE_PATHS = (
+    "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.1.Username",
+    "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.2.WANPPPConnection.1.Username",
+    "Device.PPP.Interface.1.Username",
+    "Device.PPP.Interface.2.Username",  # Zyxel e outros TR-181
+    "Device.PPP.Interface.3.Username",
+)
+SERIAL_PATHS = (
+    "InternetGatewayDevice.DeviceInfo.SerialNumber",
+    "Device.DeviceInfo.SerialNumber",
+)
+WAN_MAC_PATHS = (
+    "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.1.MACAddress",
+    "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANIPConnection.1.MACAddress",
+    "Device.Ethernet.Link.1.MACAddress",
+)
+_PPPOE_CHAIN = PathChain(*PPPOE_PATHS)
+_SERIAL_CHAIN = PathChain(*SERIAL_PATHS, "_deviceId._SerialNumber")
+_MAC_CHAIN = PathChain(*WAN_MAC_PATHS)
+
+
+def _matched_kind(device: Dict[str, Any], identifier: str) -> Optional[str]:
     """
-    Busca um dispositivo pelo login PPPoE ou serial.
+    Critério que o documento satisfaz (login, serial, mac ou id), ou None.
+    Login e serial comparam exatamente, como a busca no NBI; MAC, normalizado.
+    """
+    if any(path.get(device) == identifier for path in _PPPOE_CHAIN.paths):
+        return "login"
+    if any(path.get(device) == identifier for path in _SERIAL_CHAIN.paths):
+        return "serial"
+    mac = normalize_mac(identifier)
+    if mac and any(normalize_mac(path.get(device)) == mac for path in _MAC_CHAIN.paths):
+        return "mac"
+    if device.get("_id") == identifier:
+        return "id"
+    return None
+
+
+def _match_kind(device: Dict[str, Any], identifier: str) -> str:
+    """Qual critério casou (login, serial ou id), na prioridade da busca."""
+    # Sem caminho conhecido: casou por um caminho de login fora da projeção
+    return _matched_kind(device, identifier) or "login"
+
+
+async def find_device_by_login_or_serial(
+    identifier: str,
+    max_staleness: Optional[int] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Busca um dispositivo pelo login PPPoE, serial ou MAC.
     
     Estratégia de busca:
-    1. Primeiro tenta buscar por username PPPoE (login)
-    2. Se não encontrar, busca por SerialNumber
-    3. Retorna o primeiro dispositivo encontrado
+    1. Índice local (device_lookups) -> _id, seguido de uma busca projetada
+       pelo _id (ou do snapshot local, com max_staleness). O documento tem
+       de conter o identificador (login/serial exatos): se o login mudou de
+       CPE, a entrada é descartada e a busca segue para o NBI
+    2. Se não estiver indexado: uma única consulta ao NBI com $or de todos os
+       caminhos de login/serial e do _id; o dispositivo encontrado é indexado
     """
-    genie_url = settings.GENIE_NBI
-    
-    async with httpx.AsyncClient(timeout=30.0, verify=False) as client:
-        # Estratégia 1: Buscar por username PPPoE (vários paths possíveis)
-        pppoe_paths = [
-            "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.1.Username",
-            "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.2.WANPPPConnection.1.Username",
-            "Device.PPP.Interface.1.Username",
-            "Device.PPP.Interface.2.Username",  # Zyxel e outros TR-181
-            "Device.PPP.Interface.3.Username",
-        ]
-        
-        for path in pppoe_paths:
-            query = f'{{"{path}._value":"{identifier}"}}'
-            log.info(f"[Mobile API] Buscando por PPPoE path: {path}")
-            
-            try:
-                res = await client.get(f"{genie_url}/devices/", params={"query": query})
-                if res.status_code == 200:
-                    devices = res.json()
-                    if devices and len(devices) > 0:
-                        log.info(f"[Mobile API] Dispositivo encontrado por PPPoE: {devices[0].get('_id')}")
-                        return devices[0]
-            except Exception as e:
-                log.warning(f"[Mobile API] Erro buscando por PPPoE: {e}")
-        
-        # Estratégia 2: Buscar por SerialNumber
-        serial_paths = [
-            "InternetGatewayDevice.DeviceInfo.SerialNumber",
-            "Device.DeviceInfo.SerialNumber",
-        ]
-        
-        for path in serial_paths:
-            query = f'{{"{path}._value":"{identifier}"}}'
-            log.info(f"[Mobile API] Buscando por Serial path: {path}")
-            
-            try:
-                res = await client.get(f"{genie_url}/devices/", params={"query": query})
-                if res.status_code == 200:
-                    devices = res.json()
-                    if devices and len(devices) > 0:
-                        log.info(f"[Mobile API] Dispositivo encontrado por Serial: {devices[0].get('_id')}")
-                        return devices[0]
-            except Exception as e:
-                log.warning(f"[Mobile API] Erro buscando por Serial: {e}")
-        
-        # Estratégia 3: Buscar pelo _id diretamente (se for um ID válido)
+    try:
+        device_id = await asyncio.to_thread(device_lookup.resolve_id, identifier)
+    except Exception as e:
+        log.warning(f"[Mobile API] Erro consultando índice local: {e}")
+        device_id = None
+    
+    if device_id:
         try:
-            query = f'{{"_id":"{identifier}"}}'
-            res = await client.get(f"{genie_url}/devices/", params={"query": query})
-            if res.status_code == 200:
-                devices = res.json()
-                if devices and len(devices) > 0:
-                    log.info(f"[Mobile API] Dispositivo encontrado por ID: {devices[0].get('_id')}")
-                    return devices[0]
+            device = await fetch_device(device_id, MOBILE_VIEW, max_staleness)
         except Exception as e:
-            log.warning(f"[Mobile API] Erro buscando por ID: {e}")
-        
+            log.warning(f"[Mobile API] Erro buscando {device_id}: {e}")
+            device = None
+        if device and _matched_kind(device, identifier):
+            log.info(f"[Mobile API] Dispositivo encontrado pelo índice: {device_id}")
+            return device
+        if device:
+            log.warning(f"[Mobile API] Índice desatualizado: {device_id} não tem mais {identifier}")
+        else:
+            log.info(f"[Mobile API] Índice aponta para {device_id}, mas o GenieACS não o retornou")
+        await asyncio.to_thread(device_lookup.forget, identifier, device_id)
+    
+    # Fallback: todos os caminhos numa só consulta
+    query = {"$or": [{f"{path}._value": identifier} for path in PPPOE_PATHS + SERIAL_PATHS] + [{"_id": identifier}]}
+    log.info(f"[Mobile API] Buscando no NBI ($or de {len(query['$or'])} caminhos): {identifier}")
+    try:
+        res = await get_nbi_client().get(
+            "/devices/",
+            params={"query": json.dumps(query), **projection_params(MOBILE_VIEW)},
+        )
+        devices = res.json() if res.status_code == 200 else []
+    except Exception as e:
+        log.warning(f"[Mobile API] Erro buscando no NBI: {e}")
+        return None
+    
+    if not devices:
         log.warning(f"[Mobile API] Dispositivo não encontrado para: {identifier}")
         return None
+    
+    # Mesmo desempate da busca sequencial: login, depois serial, depois _id
+    kinds = {d.get("_id"): _match_kind(d, identifier) for d in devices}
+    device = min(devices, key=lambda d: KINDS.index(kinds[d.get("_id")]))
+    device_id = device.get("_id")
+    log.info(f"[Mobile API] Dispositivo encontrado por {kinds[device_id]}: {device_id}")
+    
+    snapshot_store.remember(device, MOBILE_VIEW)
+    await asyncio.to_thread(
+        device_lookup.index_device,
+        device_id,
+        identifier if kinds[device_id] == "login" else _PPPOE_CHAIN.first(device),
+        _SERIAL_CHAIN.first(device),
+        _MAC_CHAIN.first(device),
+    )
+    return device
 
 
 def extract_device_info(device: Dict[str, Any]) -> DeviceSearchResponse:
@@ -643,7 +699,8 @@ async def api_status():
 
 @router.get("/device/search", response_model=DeviceSearchResponse, dependencies=[Depends(verify_mobile_token)])
 async def search_device(
-    login: str = Query(..., description="Login PPPoE ou Serial do dispositivo")
+    login: str = Query(..., description="Login PPPoE ou Serial do dispositivo"),
+    max_staleness: Optional[int] = Query(None, ge=0, description="Aceita o snapshot local com até N segundos")
 ):
     """
     Busca um dispositivo pelo login PPPoE ou serial.
@@ -652,11 +709,12 @@ async def search_device(
     
     **Parâmetros:**
     - `login`: Login PPPoE do cliente ou SerialNumber do dispositivo
+    - `max_staleness`: Opcional; responde do snapshot local se tiver no máximo N segundos
     
     **Retorna:**
     - Informações do dispositivo incluindo WiFi atual
     """
-    device = await find_device_by_login_or_serial(login)
+    device = await find_device_by_login_or_serial(login, max_staleness)
     
     if not device:
         return DeviceSearchResponse(
@@ -747,83 +805,79 @@ async def configure_wifi(request: WifiConfigRequest):
     log.info(f"[Mobile API] Parâmetros a alterar: {parameters}")
     
     # Enviar para o GenieACS
-    genie_url = settings.GENIE_NBI
-    
-    async with httpx.AsyncClient(timeout=30.0, verify=False) as client:
-        # Preparar task de setParameterValues
-        param_values = []
-        for path, value in parameters.items():
-            # Inferir tipo
-            if isinstance(value, bool):
-                param_values.append([path, value, "xsd:boolean"])
-            elif isinstance(value, int):
-                param_values.append([path, value, "xsd:unsignedInt"])
-            else:
-                param_values.append([path, str(value), "xsd:string"])
-        
-        task = {
-            "name": "setParameterValues",
-            "parameterValues": param_values
-        }
-        
-        # Enviar com connection_request para forçar execução imediata
-        # O device_id já vem URL-encoded do GenieACS, precisamos fazer encode novamente para a URL
-        encoded_device_id = quote(device_id, safe='')
-        url = f"{genie_url}/devices/{encoded_device_id}/tasks?connection_request"
-        log.info(f"[Mobile API] Enviando task para: {url}")
-        
-        try:
-            res = await client.post(url, json=task)
+    client = get_nbi_client()
+    # Preparar task de setParameterValues
+    param_values = []
+    for path, value in parameters.items():
+        # Inferir tipo
+        if isinstance(value, bool):
+            param_values.append([path, value, "xsd:boolean"])
+        elif isinstance(value, int):
+            param_values.append([path, value, "xsd:unsignedInt"])
+        else:
+            param_values.append([path, str(value), "xsd:string"])
+    
+    task = {
+        "name": "setParameterValues",
+        "parameterValues": param_values
+    }
+    
+    # Enviar com connection_request para forçar execução imediata
+    # O device_id já vem URL-encoded do GenieACS, precisamos fazer encode novamente para a URL
+    encoded_device_id = quote(device_id, safe='')
+    url = f"/devices/{encoded_device_id}/tasks?connection_request"
+    log.info(f"[Mobile API] Enviando task para: {url}")
+    
+    try:
+        res = await client.post(url, json=task, timeout=nbi_timeout("task"))
+        
+        if res.status_code in [200, 202]:
+            task_data = res.json() if res.text else {}
+            task_id = task_data.get('_id', 'pending')
             
-            if res.status_code in [200, 202]:
-                task_data = res.json() if res.text else {}
-                task_id = task_data.get('_id', 'pending')
-                
-                log.info(f"[Mobile API] Task criada com sucesso: {task_id}")
-                
-                return WifiConfigResponse(
-                    success=True,
-                    device_id=device_id,
-                    message="Configuração WiFi enviada com sucesso. As alterações serão aplicadas em breve.",
-                    parameters_changed=len(parameters),
-                    task_id=task_id
-                )
-            else:
-                log.error(f"[Mobile API] Erro ao criar task: {res.status_code} - {res.text}")
-                raise HTTPException(
-                    status_code=502,
-                    detail=f"Erro ao comunicar com o dispositivo: {res.status_code}"
-                )
-        
-        except httpx.HTTPError as e:
-            log.error(f"[Mobile API] Erro HTTP: {e}")
+            log.info(f"[Mobile API] Task criada com sucesso: {task_id}")
+            
+            return WifiConfigResponse(
+                success=True,
+                device_id=device_id,
+                message="Configuração WiFi enviada com sucesso. As alterações serão aplicadas em breve.",
+                parameters_changed=len(parameters),
+                task_id=task_id
+            )
+        else:
+            log.error(f"[Mobile API] Erro ao criar task: {res.status_code} - {res.text}")
             raise HTTPException(
                 status_code=502,
-                detail=f"Erro de comunicação com o servidor ACS: {str(e)}"
+                detail=f"Erro ao comunicar com o dispositivo: {res.status_code}"
             )
+    
+    except httpx.HTTPError as e:
+        log.error(f"[Mobile API] Erro HTTP: {e}")
+        raise HTTPException(
+            status_code=502,
+            detail=f"Erro de comunicação com o servidor ACS: {str(e)}"
+        )
 
 
 @router.get("/device/{device_id}/wifi", dependencies=[Depends(verify_mobile_token)])
-async def get_device_wifi(device_id: str):
+async def get_device_wifi(
+    device_id: str,
+    max_staleness: Optional[int] = Query(None, ge=0, description="Aceita o snapshot local com até N segundos")
+):
     """
     Obtém configuração WiFi atual de um dispositivo específico.
     
     **Autenticação:** Requer header `X-API-Key` com o token da API.
     """
-    genie_url = settings.GENIE_NBI
+    device = await fetch_device(device_id, MOBILE_VIEW, max_staleness)
     
-    async with httpx.AsyncClient(timeout=30.0, verify=False) as client:
-        query = f'{{"_id":"{device_id}"}}'
-        res = await client.get(f"{genie_url}/devices/", params={"query": query})
-        
-        if res.status_code != 200 or not res.json():
-            raise HTTPException(
-                status_code=404,
-                detail=f"Dispositivo {device_id} não encontrado"
-            )
-        
-        device = res.json()[0]
-        return extract_device_info(device)
+    if not device:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Dispositivo {device_id} não encontrado"
+        )
+    
+    return extract_device_info(device)
 
 
 @router.post("/device/{device_id}/reboot", dependencies=[Depends(verify_mobile_token)])
@@ -833,32 +887,30 @@ async def reboot_device(device_id: str):
     
     **Autenticação:** Requer header `X-API-Key` com o token da API.
     """
-    genie_url = settings.GENIE_NBI
-    
-    async with httpx.AsyncClient(timeout=30.0, verify=False) as client:
-        task = {"name": "reboot"}
-        encoded_device_id = quote(device_id, safe='')
-        url = f"{genie_url}/devices/{encoded_device_id}/tasks?connection_request"
-        
-        try:
-            res = await client.post(url, json=task)
-            
-            if res.status_code in [200, 202]:
-                return {
-                    "success": True,
-                    "device_id": device_id,
-                    "message": "Comando de reinicialização enviado. O dispositivo será reiniciado em breve."
-                }
-            else:
-                raise HTTPException(
-                    status_code=502,
-                    detail=f"Erro ao enviar comando de reboot: {res.status_code}"
-                )
-        except httpx.HTTPError as e:
+    client = get_nbi_client()
+    task = {"name": "reboot"}
+    encoded_device_id = quote(device_id, safe='')
+    url = f"/devices/{encoded_device_id}/tasks?connection_request"
+    
+    try:
+        res = await client.post(url, json=task, timeout=nbi_timeout("task"))
+        
+        if res.status_code in [200, 202]:
+            return {
+                "success": True,
+                "device_id": device_id,
+                "message": "Comando de reinicialização enviado. O dispositivo será reiniciado em breve."
+            }
+        else:
             raise HTTPException(
                 status_code=502,
-                detail=f"Erro de comunicação: {str(e)}"
+                detail=f"Erro ao enviar comando de reboot: {res.status_code}"
             )
+    except httpx.HTTPError as e:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Erro de comunicação: {str(e)}"
+        )
 
 
 @router.post("/device/{device_id}/refresh", dependencies=[Depends(verify_mobile_token)])
@@ -868,29 +920,27 @@ async def refresh_device(device_id: str):
     
     **Autenticação:** Requer header `X-API-Key` com o token da API.
     """
-    genie_url = settings.GENIE_NBI
-    
-    async with httpx.AsyncClient(timeout=30.0, verify=False) as client:
-        task = {"name": "refreshObject", "objectName": ""}
-        encoded_device_id = quote(device_id, safe='')
-        url = f"{genie_url}/devices/{encoded_device_id}/tasks?connection_request"
-        
-        try:
-            res = await client.post(url, json=task)
-            
-            if res.status_code in [200, 202]:
-                return {
-                    "success": True,
-                    "device_id": device_id,
-                    "message": "Refresh solicitado. Os parâmetros serão atualizados em breve."
-                }
-            else:
-                raise HTTPException(
-                    status_code=502,
-                    detail=f"Erro ao enviar comando de refresh: {res.status_code}"
-                )
-        except httpx.HTTPError as e:
+    client = get_nbi_client()
+    task = {"name": "refreshObject", "objectName": ""}
+    encoded_device_id = quote(device_id, safe='')
+    url = f"/devices/{encoded_device_id}/tasks?connection_request"
+    
+    try:
+        res = await client.post(url, json=task, timeout=nbi_timeout("task"))
+        
+        if res.status_code in [200, 202]:
+            return {
+                "success": True,
+                "device_id": device_id,
+                "message": "Refresh solicitado. Os parâmetros serão atualizados em breve."
+            }
+        else:
             raise HTTPException(
                 status_code=502,
-                detail=f"Erro de comunicação: {str(e)}"
+                detail=f"Erro ao enviar comando de refresh: {res.status_code}"
             )
+    except httpx.HTTPError as e:
+        raise HTTPException(
+            status_code=502,
+            detail=f"Erro de comunicação: {str(e)}"
+        )
@@ -191,28 +191,26 @@ async def provision_device(
     3. Aplicar via SetParameterValues
     4. Fazer refresh dos dados
     """
-    import httpx
-    from app.settings import settings
+    from app.integrations.genieacs import get_nbi_client
     
     device_info = request.device_info if request else None
     extra_params = request.extra_params if request else None
     
     # Se não forneceu device_info, buscar do GenieACS
     if not device_info:
-        async with httpx.AsyncClient() as client:
-            res = await client.get(
-                f"{settings.GENIE_NBI}/devices/",
-                params={"query": f'{{"_id":"{device_id}"}}'})
-            
-            if res.status_code != 200 or not res.json():
-                raise HTTPException(status_code=404, detail="Dispositivo não encontrado")
-            
-            device = res.json()[0]
-            device_info = {
-                "manufacturer": device.get("_deviceId", {}).get("_Manufacturer", "Unknown"),
-                "model": device.get("_deviceId", {}).get("_ProductClass", "Unknown"),
-                "serial": device.get("_deviceId", {}).get("_SerialNumber", "Unknown"),
-            }
+        res = await get_nbi_client().get(
+            "/devices/",
+            params={"query": f'{{"_id":"{device_id}"}}'})
+        
+        if res.status_code != 200 or not res.json():
+            raise HTTPException(status_code=404, detail="Dispositivo não encontrado")
+        
+        device = res.json()[0]
+        device_info = {
+            "manufacturer": device.get("_deviceId", {}).get("_Manufacturer", "Unknown"),
+            "model": device.get("_deviceId", {}).get("_ProductClass", "Unknown"),
+            "serial": device.get("_deviceId", {}).get("_SerialNumber", "Unknown"),
+        }
     
     try:
         result = await provisioning_service.provision_device(
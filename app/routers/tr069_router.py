@@ -2,10 +2,14 @@
 # Router para funcionalidades TR-069 com normalização TR-098/TR-181
 
 from fastapi import APIRouter, HTTPException, Query, Body
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
+from functools import lru_cache
 from pydantic import BaseModel
-from app.services.tr069_normalizer import TR069Normalizer
+from app.services.tr069_normalizer import TR069Normalizer, vars_key
+from app.services.tr069_paths import PathTemplate
 from app.settings import settings
+from app.integrations.genieacs import get_nbi_client, nbi_timeout
+from app.services.device_snapshot_service import fetch_device
 import httpx
 import asyncio
 import logging
@@ -453,6 +457,7 @@ class SmartSetParamRequest(BaseModel):
     use_connection_request: bool = True
     retry_on_fail: bool = True
     max_retries: int = 2
+    max_staleness: Optional[int] = None  # segundos; aceita o snapshot local para identificar o dispositivo
 
 
 class SmartSetParamResponse(BaseModel):
@@ -558,34 +563,55 @@ def is_logical_path(path: str) -> bool:
     return not (path.startswith("InternetGatewayDevice.") or path.startswith("Device."))
 
 
-def get_manufacturer_paths(manufacturer: str, logical_path: str, data_model: str, vars: Dict) -> List[str]:
-    """Obtém caminhos específicos do fabricante com fallbacks."""
+# Overrides compilados na importação: (fabricante em minúsculas, {logical_path: {modelo: templates}})
+_COMPILED_OVERRIDES: List[Tuple[str, Dict[str, Dict[str, Tuple[PathTemplate, ...]]]]] = [
+    (
+        manu_key.lower(),
+        {
+            logical: {model: tuple(PathTemplate(p) for p in paths) for model, paths in by_model.items()}
+            for logical, by_model in overrides.items()
+        },
+    )
+    for manu_key, overrides in MANUFACTURER_PATH_OVERRIDES.items()
+]
+
+
+def _manufacturer_paths(manufacturer: str, logical_path: str, data_model: str, vars: Dict) -> List[str]:
     paths = []
-    
-    # Verificar overrides do fabricante
-    for manu_key in MANUFACTURER_PATH_OVERRIDES:
-        if manu_key.lower() in manufacturer.lower():
-            overrides = MANUFACTURER_PATH_OVERRIDES[manu_key]
-            if logical_path in overrides:
-                model_paths = overrides[logical_path].get(data_model, [])
-                for p in model_paths:
-                    # Substituir variáveis
-                    resolved = p
-                    for k, v in vars.items():
-                        resolved = resolved.replace("{" + k + "}", str(v))
-                    paths.append(resolved)
-    
+    manufacturer = manufacturer.lower()
+    for manu_key, overrides in _COMPILED_OVERRIDES:
+        if manu_key in manufacturer and logical_path in overrides:
+            for template in overrides[logical_path].get(data_model, ()):
+                paths.append(template.format(vars))
     return paths
 
 
-async def fetch_device_data(device_id: str) -> Optional[Dict]:
-    """Busca dados completos do dispositivo no GenieACS."""
+@lru_cache(maxsize=4096)
+def _manufacturer_paths_cached(manufacturer: str, logical_path: str, data_model: str, key: Tuple) -> Tuple[str, ...]:
+    return tuple(_manufacturer_paths(manufacturer, logical_path, data_model, dict(key)))
+
+
+def get_manufacturer_paths(manufacturer: str, logical_path: str, data_model: str, vars: Dict) -> List[str]:
+    """Obtém caminhos específicos do fabricante com fallbacks."""
+    key = vars_key(vars)
+    if key is None:
+        return _manufacturer_paths(manufacturer, logical_path, data_model, vars)
+    return list(_manufacturer_paths_cached(manufacturer, logical_path, data_model, key))
+
+
+async def fetch_device_data(
+    device_id: str,
+    view: Optional[str] = "identity",
+    max_staleness: Optional[int] = None,
+) -> Optional[Dict]:
+    """
+    Busca o dispositivo no GenieACS.
+    Por padrão só a view "identity" (fabricante/modelo/data model), que é o que
+    smart-set precisa para resolver os caminhos; view=None traz a árvore completa.
+    Com max_staleness (segundos) aceita o snapshot local se for recente o bastante.
+    """
     try:
-        url = f"{settings.GENIE_NBI.rstrip('/')}/devices/{device_id}"
-        async with httpx.AsyncClient(timeout=30, verify=False) as client:
-            resp = await client.get(url)
-            if resp.status_code == 200:
-                return resp.json()
+        return await fetch_device(device_id, view, max_staleness)
     except Exception as e:
         log.error(f"Erro ao buscar dispositivo {device_id}: {e}")
     return None
@@ -597,7 +623,7 @@ async def send_set_parameter_values(
     connection_request: bool = True
 ) -> Dict[str, Any]:
     """Envia setParameterValues para o GenieACS."""
-    url = f"{settings.GENIE_NBI.rstrip('/')}/devices/{device_id}/tasks"
+    url = f"/devices/{device_id}/tasks"
     if connection_request:
         url += "?connection_request"
     
@@ -607,15 +633,14 @@ async def send_set_parameter_values(
     }
     
     try:
-        async with httpx.AsyncClient(timeout=60, verify=False) as client:
-            resp = await client.post(url, json=payload)
-            
-            return {
-                "success": resp.status_code in (200, 202),
-                "status_code": resp.status_code,
-                "response": resp.json() if resp.status_code in (200, 202) else resp.text,
-                "task_id": resp.json().get("_id") if resp.status_code in (200, 202) else None
-            }
+        resp = await get_nbi_client().post(url, json=payload, timeout=nbi_timeout("task"))
+        
+        return {
+            "success": resp.status_code in (200, 202),
+            "status_code": resp.status_code,
+            "response": resp.json() if resp.status_code in (200, 202) else resp.text,
+            "task_id": resp.json().get("_id") if resp.status_code in (200, 202) else None
+        }
     except Exception as e:
         return {
             "success": False,
@@ -663,7 +688,7 @@ async def smart_set_parameter_values(request: SmartSetParamRequest):
     errors = []
     
     # Buscar dados do dispositivo
-    device_data = await fetch_device_data(request.device_id)
+    device_data = await fetch_device_data(request.device_id, max_staleness=request.max_staleness)
     if not device_data:
         raise HTTPException(status_code=404, detail=f"Dispositivo não encontrado: {request.device_id}")
     
@@ -887,17 +912,16 @@ async def set_lan_config(
 @router.post("/reboot", summary="Reiniciar dispositivo")
 async def reboot_device(device_id: str = Body(..., embed=True)):
     """Envia comando de reboot para o dispositivo."""
-    url = f"{settings.GENIE_NBI.rstrip('/')}/devices/{device_id}/tasks?connection_request"
+    url = f"/devices/{device_id}/tasks?connection_request"
     payload = {"name": "reboot"}
     
     try:
-        async with httpx.AsyncClient(timeout=30, verify=False) as client:
-            resp = await client.post(url, json=payload)
-            
-            if resp.status_code in (200, 202):
-                return {"success": True, "message": "Comando de reboot enviado"}
-            else:
-                raise HTTPException(status_code=resp.status_code, detail=resp.text)
+        resp = await get_nbi_client().post(url, json=payload, timeout=nbi_timeout("task"))
+        
+        if resp.status_code in (200, 202):
+            return {"success": True, "message": "Comando de reboot enviado"}
+        else:
+            raise HTTPException(status_code=resp.status_code, detail=resp.text)
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=str(e))
 
@@ -905,17 +929,16 @@ async def reboot_device(device_id: str = Body(..., embed=True)):
 @router.post("/factory-reset", summary="Factory Reset")
 async def factory_reset_device(device_id: str = Body(..., embed=True)):
     """Envia comando de factory reset para o dispositivo."""
-    url = f"{settings.GENIE_NBI.rstrip('/')}/devices/{device_id}/tasks?connection_request"
+    url = f"/devices/{device_id}/tasks?connection_request"
     payload = {"name": "factoryReset"}
     
     try:
-        async with httpx.AsyncClient(timeout=30, verify=False) as client:
-            resp = await client.post(url, json=payload)
-            
-            if resp.status_code in (200, 202):
-                return {"success": True, "message": "Comando de factory reset enviado"}
-            else:
-                raise HTTPException(status_code=resp.status_code, detail=resp.text)
+        resp = await get_nbi_client().post(url, json=payload, timeout=nbi_timeout("task"))
+        
+        if resp.status_code in (200, 202):
+            return {"success": True, "message": "Comando de factory reset enviado"}
+        else:
+            raise HTTPException(status_code=resp.status_code, detail=resp.text)
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=str(e))
 
@@ -923,16 +946,15 @@ async def factory_reset_device(device_id: str = Body(..., embed=True)):
 @router.post("/refresh", summary="Atualizar dados do dispositivo")
 async def refresh_device(device_id: str = Body(..., embed=True), object_name: str = Body("", embed=True)):
     """Envia comando de refresh para obter dados atualizados do dispositivo."""
-    url = f"{settings.GENIE_NBI.rstrip('/')}/devices/{device_id}/tasks?connection_request"
+    url = f"/devices/{device_id}/tasks?connection_request"
     payload = {"name": "refreshObject", "objectName": object_name}
     
     try:
-        async with httpx.AsyncClient(timeout=30, verify=False) as client:
-            resp = await client.post(url, json=payload)
-            
-            if resp.status_code in (200, 202):
-                return {"success": True, "message": "Comando de refresh enviado"}
-            else:
-                raise HTTPException(status_code=resp.status_code, detail=resp.text)
+        resp = await get_nbi_client().post(url, json=payload, timeout=nbi_timeout("task"))
+        
+        if resp.status_code in (200, 202):
+            return {"success": True, "message": "Comando de refresh enviado"}
+        else:
+            raise HTTPException(status_code=resp.status_code, detail=resp.text)
     except httpx.HTTPError as e:
         raise HTTPException(status_code=502, detail=str(e))
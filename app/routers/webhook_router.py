@@ -12,9 +12,10 @@ from datetime import datetime
 from typing import Dict, Any, Optional
 
 from fastapi import APIRouter, Body, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database.connection import get_db
+from app.database.connection import get_async_db
 from app.database.models import Device, AlertEvent
 from app.ml import learning_engine
 
@@ -24,7 +25,7 @@ router = APIRouter(prefix="/webhook", tags=["Webhooks"])
 
 
 @router.post("/alert")
-async def receive_alert(payload: Dict[str, Any] = Body(...), db: Session = Depends(get_db)):
+async def receive_alert(payload: Dict[str, Any] = Body(...), db: AsyncSession = Depends(get_async_db)):
     """Recebe alerta de sistema externo e persiste em AlertEvent.
     payload esperado: device_id (opcional), severity, category, title, message, details
     """
@@ -39,7 +40,9 @@ async def receive_alert(payload: Dict[str, Any] = Body(...), db: Session = Depen
         device = None
         device_fk = None
         if device_id_external:
-            device = db.query(Device).filter(Device.device_id == device_id_external).first()
+            device = (await db.execute(
+                select(Device).where(Device.device_id == device_id_external).limit(1)
+            )).scalars().first()
             if device:
                 device_fk = device.id
             else:
@@ -55,8 +58,8 @@ async def receive_alert(payload: Dict[str, Any] = Body(...), db: Session = Depen
             details=details,
         )
         db.add(alert)
-        db.commit()
-        db.refresh(alert)
+        await db.commit()
+        await db.refresh(alert)
 
         # Registrar feedback/learning se houver campo 'feedback'
         fb = payload.get("feedback")
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# app/scripts/bench_network_analyzer.py
+"""
+Benchmark: NetworkAnalyzer em NumPy vs implementação anterior em Python puro.
+
+Frota sintética de N dispositivos × S amostras (padrão 10k × 288: um dia a
+cada 5 min) com latência e perda de pacotes, picos injetados e rampas. Mede:
+- detect:    detect_anomalies por dispositivo (Z-Score + IQR)
+- trend:     analyze_trend da latência por dispositivo
+- correlate: correlate_events sobre todas as anomalias (varredura ordenada
+             vs pares); a versão anterior é O(n²), então por padrão roda só
+             nas primeiras --legacy-events anomalias
+e confere que os resultados são os mesmos (floats com tolerância de 1e-9).
+
+Uso:
+    python app/scripts/bench_network_analyzer.py [--devices 10000] [--samples 288]
+"""
+
+import argparse
+import math
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.ml.network_analyzer import (
+    AnomalyEvent,
+    CorrelatedEvent,
+    NetworkAnalyzer,
+    TrendAnalysis,
+    TrendDirection,
+)
+
+
+class LegacyNetworkAnalyzer(NetworkAnalyzer):
+    """Implementações anteriores (copiadas para referência)."""
+
+    def _detect_zscore_anomalies(self, values):
+        if len(values) < 3:
+            return []
+        mean = statistics.mean(values)
+        stdev = statistics.stdev(values) if len(values) > 1 else 0
+        if stdev == 0:
+            return []
+        anomalies = []
+        for i, v in enumerate(values):
+            zscore = abs((v - mean) / stdev)
+            if zscore > self.anomaly_threshold:
+                anomalies.append(i)
+        return anomalies
+
+    def _detect_iqr_anomalies(self, values):
+        if len(values) < 4:
+            return []
+        sorted_vals = sorted(values)
+        n = len(sorted_vals)
+        q1 = sorted_vals[n // 4]
+        q3 = sorted_vals[3 * n // 4]
+        iqr = q3 - q1
+        lower = q1 - 1.5 * iqr
+        upper = q3 + 1.5 * iqr
+        anomalies = []
+        for i, v in enumerate(values):
+            if v < lower or v > upper:
+                anomalies.append(i)
+        return anomalies
+
+    def _calculate_anomaly_severity(self, value, all_values, in_zscore, in_iqr, stats=None):
+        mean = statistics.mean(all_values)
+        stdev = statistics.stdev(all_values) if len(all_values) > 1 else 1
+        deviation = abs(value - mean) / stdev if stdev > 0 else 0
+        base_severity = min(deviation / 5.0, 1.0)
+        if in_zscore and in_iqr:
+            base_severity = min(base_severity * 1.2, 1.0)
+        return base_severity
+
+    def detect_anomalies(self, device_id, metrics, timestamps=None):
+        anomalies = []
+        for metric_name, values in metrics.items():
+            if len(values) < 3:
+                continue
+            z_anomalies = self._detect_zscore_anomalies(values)
+            iqr_anomalies = self._detect_iqr_anomalies(values)
+            for idx in set(z_anomalies) | set(iqr_anomalies):
+                if idx >= len(timestamps):
+                    continue
+                severity = self._calculate_anomaly_severity(
+                    values[idx], values, in_zscore=idx in z_anomalies, in_iqr=idx in iqr_anomalies,
+                )
+                anomaly_type = self._classify_anomaly_type(metric_name, values, idx)
+                anomalies.append(AnomalyEvent(
+                    anomaly_type=anomaly_type,
+                    device_id=device_id,
+                    timestamp=timestamps[idx],
+                    severity=severity,
+                    description=self._generate_anomaly_description(
+                        metric_name, values[idx], values, anomaly_type, mean=statistics.mean(values)
+                    ),
+                    affected_metrics=[metric_name],
+                    root_cause_probability=self._estimate_root_causes(metric_name, values, idx, device_id),
+                    recommended_actions=self._generate_recommendations(anomaly_type, severity, metric_name),
+                ))
+        self._anomaly_history.extend(anomalies)
+        return anomalies
+
+    def analyze_trend(self, metric_name, values, timestamps=None):
+        n = len(values)
+        x = list(range(n))
+        x_mean = sum(x) / n
+        y_mean = sum(values) / n
+        numerator = sum((x[i] - x_mean) * (values[i] - y_mean) for i in range(n))
+        denominator = sum((x[i] - x_mean) ** 2 for i in range(n))
+        slope = 0 if denominator == 0 else numerator / denominator
+        intercept = y_mean - slope * x_mean
+        ss_tot = sum((v - y_mean) ** 2 for v in values)
+        ss_res = sum((values[i] - (slope * x[i] + intercept)) ** 2 for i in range(n))
+        r_squared = 1 - (ss_res / ss_tot) if ss_tot > 0 else 0
+        r_squared = max(0, min(1, r_squared))
+        if abs(slope) < 0.01:
+            direction = TrendDirection.STABLE
+        elif slope > 0:
+            direction = TrendDirection.INCREASING
+        else:
+            direction = TrendDirection.DECREASING
+        stdev = statistics.stdev(values) if len(values) > 1 else 0
+        cv = stdev / abs(y_mean) if y_mean != 0 else 0
+        if cv > 0.5:
+            direction = TrendDirection.VOLATILE
+        return TrendAnalysis(
+            metric_name=metric_name,
+            direction=direction,
+            slope=slope,
+            r_squared=r_squared,
+            forecast_24h=slope * (n + 24) + intercept,
+            forecast_7d=slope * (n + 168) + intercept,
+            confidence=r_squared * min(n / 50, 1.0),
+        )
+
+    def correlate_events(self, anomalies, time_window_minutes=30):
+        if len(anomalies) < 2:
+            return []
+        window = timedelta(minutes=time_window_minutes)
+        correlated_groups = []
+        processed = set()
+        sorted_anomalies = sorted(anomalies, key=lambda a: a.timestamp)
+        for i, anomaly in enumerate(sorted_anomalies):
+            if i in processed:
+                continue
+            group = [anomaly]
+            group_indices = {i}
+            for j, other in enumerate(sorted_anomalies[i + 1:], start=i + 1):
+                if j in processed:
+                    continue
+                time_diff = abs((other.timestamp - anomaly.timestamp).total_seconds())
+                if time_diff <= window.total_seconds():
+                    if other.anomaly_type == anomaly.anomaly_type or other.severity > 0.6:
+                        group.append(other)
+                        group_indices.add(j)
+            if len(group) > 1:
+                processed.update(group_indices)
+                shared_chars = self._find_shared_characteristics(group)
+                correlated_groups.append(CorrelatedEvent(
+                    correlation_id=f"corr_{anomaly.timestamp.strftime('%Y%m%d%H%M%S')}_{len(group)}",
+                    events=group,
+                    common_timeframe=(min(a.timestamp for a in group), max(a.timestamp for a in group)),
+                    shared_characteristics=shared_chars,
+                    root_cause_hypothesis=self._generate_root_cause_hypothesis(group, shared_chars),
+                    confidence=self._calculate_correlation_confidence(group),
+                    affected_device_count=len(set(a.device_id for a in group)),
+                ))
+        return correlated_groups
+
+
+# ============ Dados sintéticos ============
+
+def make_fleet(devices: int, samples: int) -> Tuple[List[Tuple[str, Dict[str, List[float]]]], List[datetime]]:
+    start = datetime(2025, 1, 1)
+    timestamps = [start + timedelta(minutes=5 * i) for i in range(samples)]
+    fleet = []
+    for d in range(devices):
+        base = random.uniform(5, 60)
+        ramp = random.choice((0.0, 0.0, 0.05, -0.03))
+        latency = [max(0.5, base + ramp * i + random.gauss(0, base * 0.1)) for i in range(samples)]
+        loss = [0.0 if random.random() < 0.9 else random.uniform(0, 3) for _ in range(samples)]
+        for _ in range(random.randint(0, 3)):
+            latency[random.randrange(samples)] *= random.uniform(4, 12)
+        if random.random() < 0.05:
+            burst = random.randrange(samples - 6)
+            for i in range(burst, burst + 6):
+                loss[i] = random.uniform(20, 60)
+        fleet.append((f"00259E-HG8245-{d:08d}", {"latency_ms": latency, "packet_loss_pct": loss}))
+    return fleet, timestamps
+
+
+# ============ Comparação ============
+
+def _close(a: float, b: float) -> bool:
+    return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+
+
+def same_anomalies(a: List[AnomalyEvent], b: List[AnomalyEvent]) -> bool:
+    key = lambda e: (e.device_id, e.affected_metrics[0], e.timestamp)
+    a, b = sorted(a, key=key), sorted(b, key=key)
+    return len(a) == len(b) and all(
+        key(x) == key(y) and x.anomaly_type == y.anomaly_type and _close(x.severity, y.severity)
+        for x, y in zip(a, b)
+    )
+
+
+def same_trend(a: TrendAnalysis, b: TrendAnalysis) -> bool:
+    return a.direction == b.direction and all(
+        _close(getattr(a, f), getattr(b, f))
+        for f in ("slope", "r_squared", "forecast_24h", "forecast_7d", "confidence")
+    )
+
+
+def same_groups(a: List[CorrelatedEvent], b: List[CorrelatedEvent]) -> bool:
+    return [(g.correlation_id, [id(e) for e in g.events]) for g in a] == \
+           [(g.correlation_id, [id(e) for e in g.events]) for g in b]
+
+
+def timed(fn: Callable[[], Any]) -> Tuple[Any, float]:
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def report(name: str, legacy_s: float, new_s: float, same: bool) -> None:
+    print(f"{name:<10} anterior {legacy_s * 1000:10.1f} ms   numpy {new_s * 1000:9.1f} ms   "
+          f"{legacy_s / new_s:6.1f}x   {'iguais' if same else 'DIFERENTES'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=10000)
+    parser.add_argument("--samples", type=int, default=288)
+    parser.add_argument("--legacy-events", type=int, default=5000,
+                        help="Anomalias na correlação pela versão O(n²) (0 = todas)")
+    args = parser.parse_args()
+
+    random.seed(42)
+    fleet, timestamps = make_fleet(args.devices, args.samples)
+    print(f"{args.devices} dispositivos × {args.samples} amostras × 2 métricas\n")
+
+    legacy, new = LegacyNetworkAnalyzer(), NetworkAnalyzer()
+
+    old_anoms, t_old = timed(lambda: [a for d, m in fleet for a in legacy.detect_anomalies(d, m, timestamps)])
+    new_anoms, t_new = timed(lambda: [a for d, m in fleet for a in new.detect_anomalies(d, m, timestamps)])
+    report("detect", t_old, t_new, same_anomalies(old_anoms, new_anoms))
+
+    old_tr, t_old = timed(lambda: [legacy.analyze_trend("latency_ms", m["latency_ms"]) for _, m in fleet])
+    new_tr, t_new = timed(lambda: [new.analyze_trend("latency_ms", m["latency_ms"]) for _, m in fleet])
+    report("trend", t_old, t_new, all(same_trend(a, b) for a, b in zip(old_tr, new_tr)))
+
+    events = new_anoms[:args.legacy_events] if args.legacy_events else new_anoms
+    old_groups, t_old = timed(lambda: legacy.correlate_events(events))
+    new_groups, t_new = timed(lambda: new.correlate_events(events))
+    report("correlate", t_old, t_new, same_groups(old_groups, new_groups))
+    print(f"           ({len(events)} anomalias, {len(new_groups)} grupos)")
+
+    if len(events) < len(new_anoms):
+        all_groups, t_all = timed(lambda: new.correlate_events(new_anoms))
+        print(f"\ncorrelate numpy com todas as {len(new_anoms)} anomalias: "
+              f"{t_all * 1000:.1f} ms ({len(all_groups)} grupos)")
+
+
+if __name__ == "__main__":
+    main()
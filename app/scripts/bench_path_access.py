@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# app/scripts/bench_path_access.py
+"""
+Micro-benchmark: custo de extração por dispositivo no coletor de métricas.
+
+Compara:
+- split:   get_value antigo (path.split(".") a cada chamada), ~60 chamadas
+- chain:   PathChain compilada por campo (caminhos pré-divididos)
+- pathset: PathSet.resolve (uma caminhada) + leitura das cadeias no resultado
+e o custo da extração completa (extract_device_info + extract_metrics), antes
+(cada campo refaz a caminhada com split, como o get_value antigo) e depois
+(PathSet.resolve uma vez por documento).
+
+Uso:
+    python app/scripts/bench_path_access.py [--devices 2000] [--hosts 200]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.scripts.metrics_collector import PATHS, CHAINS, extract_device_info, extract_metrics, resolve_paths
+
+
+def legacy_get_value(obj: Any, path: str, default: Any = None) -> Any:
+    """Implementação anterior (copiada para referência)."""
+    try:
+        parts = path.split(".")
+        result = obj
+        for part in parts:
+            if isinstance(result, dict):
+                result = result.get(part)
+            else:
+                result = getattr(result, part, None)
+            if result is None:
+                return default
+        if isinstance(result, dict) and "_value" in result:
+            return result["_value"]
+        return result if result is not None else default
+    except Exception:
+        return default
+
+
+class LegacyValues(dict):
+    """
+    `values` dos extratores resolvido sob demanda com legacy_get_value: cada
+    leitura de uma cadeia refaz o split e a caminhada, como antes do PathSet.
+    """
+
+    def __init__(self, device: Dict):
+        super().__init__()
+        self.device = device
+
+    def get(self, path: str, default: Any = None) -> Any:
+        return legacy_get_value(self.device, path, default)
+
+
+def _set(doc: Dict, path: str, value: Any) -> None:
+    node = doc
+    parts = path.split(".")
+    for part in parts[:-1]:
+        node = node.setdefault(part, {})
+    node[parts[-1]] = {"_value": value, "_type": "xsd:string", "_timestamp": "2025-01-01T00:00:00.000Z"}
+
+
+def make_device(i: int, tr181: bool, hosts: int) -> Dict:
+    doc: Dict[str, Any] = {
+        "_id": f"00259E-HG8245-{i:08d}",
+        "_deviceId": {"_SerialNumber": f"SN{i:08d}", "_Manufacturer": "Huawei", "_ProductClass": "HG8245", "_OUI": "00259E"},
+        "_lastInform": "2025-01-01T00:00:00.000Z",
+        "_tags": ["bench"],
+    }
+    root = "Device." if tr181 else "InternetGatewayDevice."
+    for chain in PATHS.values():
+        for path in chain:
+            if path.startswith(root) and random.random() < 0.7:
+                _set(doc, path, random.randint(1, 10_000))
+    # Tabela Hosts volumosa (o que a projeção evita, mas o documento completo traz)
+    table = "Device.Hosts.Host" if tr181 else "InternetGatewayDevice.LANDevice.1.Hosts.Host"
+    for h in range(1, hosts + 1):
+        _set(doc, f"{table}.{h}.MACAddress", f"aa:bb:cc:00:{h // 256:02x}:{h % 256:02x}")
+        _set(doc, f"{table}.{h}.IPAddress", f"192.168.{h // 256}.{h % 256}")
+        _set(doc, f"{table}.{h}.HostName", f"host-{h}")
+    return doc
+
+
+def run_split(device: Dict) -> None:
+    for chain in PATHS.values():
+        for path in chain:
+            if legacy_get_value(device, path):
+                break
+
+
+def run_chain(device: Dict) -> None:
+    for chain in CHAINS.values():
+        chain.first(device)
+
+
+def run_pathset(device: Dict) -> None:
+    values = resolve_paths(device)
+    for chain in CHAINS.values():
+        chain.first_in(values)
+
+
+def run_extract_legacy(device: Dict) -> None:
+    values = LegacyValues(device)
+    extract_device_info(device, values)
+    extract_metrics(device, values)
+
+
+def run_extract(device: Dict) -> None:
+    values = resolve_paths(device)
+    extract_device_info(device, values)
+    extract_metrics(device, values)
+
+
+def bench(name: str, fn: Callable[[Dict], None], devices: List[Dict], rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for d in devices:
+            fn(d)
+        best = min(best, time.perf_counter() - t0)
+    per_device_us = best / len(devices) * 1e6
+    print(f"{name:<8} {per_device_us:8.2f} µs/dispositivo   ({best * 1000:.1f} ms p/ {len(devices)})")
+    return per_device_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--hosts", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    random.seed(42)
+    devices = [make_device(i, tr181=i % 2 == 0, hosts=args.hosts) for i in range(args.devices)]
+    total_paths = sum(len(c) for c in PATHS.values())
+    print(f"{args.devices} dispositivos, {len(PATHS)} campos / {total_paths} caminhos, {args.hosts} hosts cada\n")
+
+    print("Lookups das cadeias de fallback:")
+    base = bench("split", run_split, devices, args.rounds)
+    chain = bench("chain", run_chain, devices, args.rounds)
+    pathset = bench("pathset", run_pathset, devices, args.rounds)
+    print(f"\nchain: {base / chain:.2f}x   pathset: {base / pathset:.2f}x  (vs split)")
+    print("\nExtração completa (extract_device_info + extract_metrics):")
+    before = bench("antes", run_extract_legacy, devices, args.rounds)
+    after = bench("depois", run_extract, devices, args.rounds)
+    print(f"\nextração: {before / after:.2f}x  (depois vs antes)")
+
+
+if __name__ == "__main__":
+    main()
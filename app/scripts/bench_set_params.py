@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# app/scripts/bench_set_params.py
+"""
+Micro-benchmark: TR069Normalizer.build_set_params com um lote de 50 parâmetros.
+
+Compara:
+- regex:    resolução anterior (re.sub por variável a cada chamada)
+- template: PathTemplate pré-compilado + LRU de (logical_path, modelo, vars)
+
+Uso:
+    python app/scripts/bench_set_params.py [--batches 2000] [--rounds 5]
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.services.tr069_normalizer import PARAM_MAP, normalizer
+
+BATCH_SIZE = 50
+
+
+def legacy_get_path(device: Dict[str, Any], logical_path: str, vars: Dict[str, Any] = None) -> str:
+    """Implementação anterior de get_path (copiada para referência)."""
+    model = normalizer.detect_data_model(device)
+    mapping = PARAM_MAP.get(logical_path, {})
+    path = mapping.get(model) or mapping.get("TR-098") or mapping.get("TR-181")
+    if not path:
+        return logical_path
+    if vars:
+        for key, value in vars.items():
+            path = re.sub(rf"\{{{key}\}}", str(value), path)
+    return path
+
+
+def legacy_build_set_params(device: Dict[str, Any], params: List[Dict[str, Any]]) -> List[List[str]]:
+    result = []
+    for param in params:
+        path = legacy_get_path(device, param["path"], param.get("vars"))
+        value = str(param["value"])
+        xsd_type = param.get("type") or normalizer.infer_xsd_type(param["value"])
+        result.append([path, value, xsd_type])
+    return result
+
+
+def make_batch() -> List[Dict[str, Any]]:
+    """50 parâmetros: Wi-Fi dos dois rádios, port mappings, LAN/DHCP e ACS."""
+    params: List[Dict[str, Any]] = []
+    wifi = [lp for lp in PARAM_MAP if lp.startswith("wifi.") and "{radio}" in PARAM_MAP[lp].get("TR-098", "")]
+    for radio in (1, 2):
+        for lp in wifi[:10]:
+            params.append({"path": lp, "value": "valor", "vars": {"radio": radio}})
+    nat = [lp for lp in PARAM_MAP if lp.startswith("nat.portmapping.")]
+    for idx in (1, 2):
+        for lp in nat:
+            params.append({"path": lp, "value": 8080, "vars": {"idx": idx}})
+    for lp in PARAM_MAP:
+        if len(params) >= BATCH_SIZE:
+            break
+        if lp.startswith(("lan.", "acs.", "device.")):
+            params.append({"path": lp, "value": True})
+    return params[:BATCH_SIZE]
+
+
+def bench(name: str, fn: Callable[[], Any], batches: int, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for _ in range(batches):
+            fn()
+        best = min(best, time.perf_counter() - t0)
+    per_batch_us = best / batches * 1e6
+    print(f"{name:<9} {per_batch_us:8.2f} µs/lote   ({best * 1000:.1f} ms p/ {batches} lotes)")
+    return per_batch_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batches", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    params = make_batch()
+    devices = {
+        "TR-098": {"_id": "bench-098", "_lastInform": "t", "InternetGatewayDevice": {}},
+        "TR-181": {"_id": "bench-181", "_lastInform": "t", "Device": {}},
+    }
+    print(f"Lote de {len(params)} parâmetros\n")
+
+    for model, device in devices.items():
+        assert legacy_build_set_params(device, params) == normalizer.build_set_params(device, params)
+        print(f"{model}:")
+        base = bench("regex", lambda: legacy_build_set_params(device, params), args.batches, args.rounds)
+        new = bench("template", lambda: normalizer.build_set_params(device, params), args.batches, args.rounds)
+        print(f"          {base / new:.2f}x\n")
+
+
+if __name__ == "__main__":
+    main()
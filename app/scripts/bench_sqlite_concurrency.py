@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# app/scripts/bench_sqlite_concurrency.py
+"""
+Benchmark: ingest concorrente + leituras de dashboard no SQLite.
+
+Compara, num arquivo temporário com o schema da aplicação:
+- legacy: configuração anterior (StaticPool — todas as threads na mesma
+          conexão, journal padrão, sem busy_timeout)
+- tuned:  engines de escrita/leitura de app/database/connection.py
+          (pool por conexão, WAL, synchronous=NORMAL, busy_timeout, cache/mmap)
+
+Escritores gravam 1 DeviceMetric + commit por operação (como /feeds/ingest);
+leitores rodam as consultas de resumo do dashboard.
+
+Uso:
+    python app/scripts/bench_sqlite_concurrency.py [--seconds 10] [--writers 4] [--readers 8]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database.connection import make_engine, sqlite_pragmas
+from app.database.models import AlertEvent, Base, Device, DeviceMetric
+
+DEVICES = 500
+
+
+def seed(url: str, metrics: int) -> None:
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    now = datetime.utcnow()
+    with Session() as db:
+        db.add_all(Device(device_id=f"dev-{i:05d}") for i in range(DEVICES))
+        db.commit()
+        db.execute(DeviceMetric.__table__.insert(), [
+            {
+                "device_id": random.randint(1, DEVICES),
+                "collected_at": now - timedelta(minutes=random.randint(0, 48 * 60)),
+                "ping_latency_ms": random.uniform(5, 80),
+                "cpu_usage": random.uniform(0, 100),
+                "extra_metrics": {},
+            }
+            for _ in range(metrics)
+        ])
+        db.commit()
+    engine.dispose()
+
+
+def write_op(Session) -> None:
+    with Session() as db:
+        db.add(DeviceMetric(
+            device_id=random.randint(1, DEVICES),
+            collected_at=datetime.utcnow(),
+            ping_latency_ms=random.uniform(5, 80),
+            cpu_usage=random.uniform(0, 100),
+            extra_metrics={},
+        ))
+        db.commit()
+
+
+def read_op(Session) -> None:
+    cutoff = datetime.utcnow() - timedelta(hours=24)
+    with Session() as db:
+        db.scalar(select(func.count()).select_from(DeviceMetric).where(DeviceMetric.collected_at >= cutoff))
+        db.scalar(select(func.count(func.distinct(DeviceMetric.device_id))).where(DeviceMetric.collected_at >= cutoff))
+        db.execute(
+            select(DeviceMetric.device_id, func.avg(DeviceMetric.ping_latency_ms))
+            .where(DeviceMetric.collected_at >= cutoff)
+            .group_by(DeviceMetric.device_id)
+            .limit(50)
+        ).all()
+        db.scalar(select(func.count()).select_from(AlertEvent).where(AlertEvent.status == "active"))
+
+
+def run(name: str, WriteSession, ReadSession, args) -> None:
+    stop = threading.Event()
+    lat: Dict[str, List[float]] = {"write": [], "read": []}
+    errors: Dict[str, int] = {"write": 0, "read": 0}
+    lock = threading.Lock()
+
+    def loop(kind: str, fn, Session):
+        local: List[float] = []
+        errs = 0
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            try:
+                fn(Session)
+                local.append((time.perf_counter() - t0) * 1000)
+            except Exception:
+                errs += 1
+        with lock:
+            lat[kind].extend(local)
+            errors[kind] += errs
+
+    threads = [threading.Thread(target=loop, args=("write", write_op, WriteSession)) for _ in range(args.writers)]
+    threads += [threading.Thread(target=loop, args=("read", read_op, ReadSession)) for _ in range(args.readers)]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    print(f"\n[{name}]")
+    for kind in ("write", "read"):
+        values = sorted(lat[kind])
+        if values:
+            p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+            print(f"  {kind:<5} {len(values) / args.seconds:8.1f} op/s   p50={statistics.median(values):7.2f} ms"
+                  f"   p95={p95:7.2f} ms   max={values[-1]:8.2f} ms   erros={errors[kind]}")
+        else:
+            print(f"  {kind:<5} nenhuma operação concluída   erros={errors[kind]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--metrics", type=int, default=200_000, help="linhas pré-carregadas em device_metrics")
+    args = parser.parse_args()
+    random.seed(42)
+
+    tmpdir = tempfile.mkdtemp(prefix="semppre-sqlite-")
+    print(f"{args.writers} escritores + {args.readers} leitores por {args.seconds:.0f}s, "
+          f"{args.metrics} métricas pré-carregadas")
+    print("pragmas tuned: " + ", ".join(f"{k}={v}" for k, v in sqlite_pragmas()))
+
+    url = f"sqlite:///{os.path.join(tmpdir, 'legacy.db')}"
+    seed(url, args.metrics)
+    legacy = create_engine(url, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Session = sessionmaker(bind=legacy)
+    run("legacy", Session, Session, args)
+    legacy.dispose()
+
+    url = f"sqlite:///{os.path.join(tmpdir, 'tuned.db')}"
+    seed(url, args.metrics)
+    writer, reader = make_engine(url), make_engine(url, readonly=True)
+    run("tuned", sessionmaker(bind=writer), sessionmaker(bind=reader), args)
+    writer.dispose()
+    reader.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -10,9 +10,10 @@ Script de Monitoramento de Dispositivos.
 
 import asyncio
 import httpx
+import json
 import logging
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional, Set
+from typing import AsyncIterator, Dict, List, Any, Optional, Set
 
 import sys
 from pathlib import Path
@@ -20,8 +21,11 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 
 from app.database import SessionLocal
 from app.database.models import Device, DeviceConfigBackup, DeviceBootstrapEvent
-from app.services.config_backup_service import ConfigBackupService
+from app.services.config_backup_service import ConfigBackupService, BACKUP_VIEW
+from app.services.device_projection import register_view, get_projection, projection_params
+from app.services.tr069_paths import get_value
 from app.settings import settings
+from app.integrations.genieacs import get_nbi_client, iter_device_pages, close_nbi_client
 
 logging.basicConfig(
     level=logging.INFO,
@@ -42,51 +46,32 @@ BACKUP_INTERVAL = 300  # 5 minutos
 # Threshold de uptime para detectar reset
 RESET_UPTIME_THRESHOLD = 600  # 10 minutos
 
-
-def get_value(obj: Any, path: str, default: Any = None) -> Any:
-    """Helper para extrair valores de objetos TR-069."""
-    try:
-        parts = path.split(".")
-        result = obj
-        for part in parts:
-            if isinstance(result, dict):
-                result = result.get(part)
-            else:
-                result = getattr(result, part, None)
-            if result is None:
-                return default
-        
-        if isinstance(result, dict) and "_value" in result:
-            return result["_value"]
-        
-        return result if result is not None else default
-    except:
-        return default
+# Parâmetros lidos por process_device/detect_reset no ciclo de monitoramento
+MONITOR_VIEW = "monitor"
+register_view(MONITOR_VIEW, paths=(
+    "InternetGatewayDevice.DeviceInfo.UpTime",
+    "Device.DeviceInfo.UpTime",
+    "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.SSID",
+    "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.1.Username",
+))
 
 
-async def fetch_all_devices(client: httpx.AsyncClient) -> List[Dict]:
-    """Busca todos os dispositivos do GenieACS."""
-    try:
-        response = await client.get(
-            f"{GENIE_API_URL}/devices",
-            timeout=30.0
-        )
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        log.error(f"Erro ao buscar dispositivos: {e}")
-        return []
+async def fetch_all_devices(page_size: Optional[int] = None) -> AsyncIterator[List[Dict]]:
+    """Itera todos os dispositivos do GenieACS em páginas (view "monitor")."""
+    async for page in iter_device_pages(
+        projection=get_projection(MONITOR_VIEW),
+        page_size=page_size,
+    ):
+        yield page
 
 
 async def fetch_device_full(client: httpx.AsyncClient, device_id: str) -> Optional[Dict]:
-    """Busca dados completos de um dispositivo via query."""
-    import urllib.parse
+    """Busca os parâmetros de backup (view "backup") de um dispositivo via query."""
     try:
         # GenieACS requer query para buscar dispositivo específico
-        query = urllib.parse.quote('{"_id":"' + device_id + '"}')
         response = await client.get(
-            f"{GENIE_API_URL}/devices?query={query}",
-            timeout=30.0
+            "/devices",
+            params={"query": json.dumps({"_id": device_id}), **projection_params(BACKUP_VIEW)},
         )
         response.raise_for_status()
         devices = response.json()
@@ -247,16 +232,12 @@ async def process_device(client: httpx.AsyncClient, device: Dict, backup_service
     return result
 
 
-async def run_backup_cycle(client: httpx.AsyncClient, devices: List[Dict], backup_service: ConfigBackupService):
-    """Executa ciclo de backup de configurações."""
+async def run_backup_cycle(client: httpx.AsyncClient, device_ids: List[str], backup_service: ConfigBackupService):
+    """Executa ciclo de backup de configurações dos dispositivos online informados."""
     log.info("📦 Iniciando ciclo de backup...")
     
     backup_count = 0
-    for device in devices:
-        device_id = device.get("_id", "")
-        if not device_id or not is_device_online(device):
-            continue
-        
+    for device_id in device_ids:
         try:
             device_full = await fetch_device_full(client, device_id)
             if device_full:
@@ -294,40 +275,41 @@ async def monitor_loop():
             db = SessionLocal()
             backup_service = ConfigBackupService(db)
             
-            async with httpx.AsyncClient(verify=False) as client:
-                devices = await fetch_all_devices(client)
-                
-                if not devices:
-                    log.warning("Nenhum dispositivo encontrado")
-                    await asyncio.sleep(MONITOR_INTERVAL)
-                    continue
-                
-                log.info(f"Monitorando {len(devices)} dispositivos...")
-                
-                # Processar cada dispositivo online
-                online_count = 0
-                new_count = 0
-                reset_count = 0
-                
+            client = get_nbi_client()
+            
+            # Processar cada dispositivo online, página a página
+            total_count = 0
+            new_count = 0
+            reset_count = 0
+            online_ids: List[str] = []
+            
+            async for devices in fetch_all_devices():
+                total_count += len(devices)
                 for device in devices:
                     if not is_device_online(device):
                         continue
                     
-                    online_count += 1
+                    online_ids.append(device.get("_id", ""))
                     result = await process_device(client, device, backup_service)
                     
                     if result.get("is_new"):
                         new_count += 1
                     if result.get("reset_detected"):
                         reset_count += 1
-                
-                log.info(f"📊 Online: {online_count} | Novos: {new_count} | Resets: {reset_count}")
-                
-                # Verificar se é hora do ciclo de backup
-                time_since_backup = (datetime.utcnow() - last_backup_time).total_seconds()
-                if time_since_backup >= BACKUP_INTERVAL:
-                    await run_backup_cycle(client, devices, backup_service)
-                    last_backup_time = datetime.utcnow()
+            
+            if not total_count:
+                log.warning("Nenhum dispositivo encontrado")
+                db.close()
+                await asyncio.sleep(MONITOR_INTERVAL)
+                continue
+            
+            log.info(f"📊 Total: {total_count} | Online: {len(online_ids)} | Novos: {new_count} | Resets: {reset_count}")
+            
+            # Verificar se é hora do ciclo de backup
+            time_since_backup = (datetime.utcnow() - last_backup_time).total_seconds()
+            if time_since_backup >= BACKUP_INTERVAL:
+                await run_backup_cycle(client, [d for d in online_ids if d], backup_service)
+                last_backup_time = datetime.utcnow()
             
             db.close()
             
@@ -344,7 +326,10 @@ async def monitor_loop():
 
 async def main():
     """Função principal."""
-    await monitor_loop()
+    try:
+        await monitor_loop()
+    finally:
+        await close_nbi_client()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# app/scripts/load_event_loop_lag.py
+"""
+Teste de carga: lag do event loop com tráfego misto de ingest + proxy NBI.
+
+Roda a aplicação no próprio processo (httpx.ASGITransport) com o NBI
+simulado por um transporte que só espera `--nbi-ms` (I/O puro), e mede o
+atraso do event loop com um probe que dorme 5 ms e registra o excedente.
+
+Modos:
+- async:    POST /feeds/ingest (AsyncSession / aiosqlite)
+- blocking: a mesma gravação com Session síncrona dentro de `async def`
+            (como o handler era antes) — rota só do benchmark
+
+O tráfego de proxy é GET /genie/devices/{id}; com o banco bloqueando o loop
+ele herda o lag, mesmo não tocando no banco.
+
+Uso:
+    python app/scripts/load_event_loop_lag.py [--mode async|blocking|both]
+        [--requests 2000] [--concurrency 32] [--ingest-ratio 0.5] [--nbi-ms 20]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+# Banco descartável (precisa estar definido antes de importar app.database)
+_tmpdir = tempfile.mkdtemp(prefix="semppre-lag-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmpdir}/lag.db")
+
+import httpx
+from fastapi import Body
+
+from app.database import init_db, SessionLocal
+from app.database.connection import dispose_async_engine
+from app.database.models import Device, DeviceMetric
+from app.integrations import genieacs
+from app.main import app
+
+PROBE_INTERVAL_S = 0.005
+DEVICES = [f"00259E-HG8245-{i:08d}" for i in range(200)]
+
+
+@app.post("/__bench/ingest-blocking", include_in_schema=False)
+async def ingest_blocking(payload: Dict = Body(...)):
+    """Gravação com Session síncrona dentro de async def (padrão anterior)."""
+    db = SessionLocal()
+    try:
+        device = db.query(Device).filter(Device.device_id == payload["device_id"]).first()
+        if not device:
+            device = Device(device_id=payload["device_id"])
+            db.add(device)
+            db.commit()
+            db.refresh(device)
+        dm = DeviceMetric(device_id=device.id, collected_at=datetime.utcnow(), extra_metrics={})
+        for k, v in payload["metrics"].items():
+            setattr(dm, k, v)
+        db.add(dm)
+        db.commit()
+        return {"success": True, "metric_id": dm.id}
+    finally:
+        db.close()
+
+
+def fake_nbi(delay_s: float) -> httpx.AsyncClient:
+    """Cliente NBI cujas respostas só esperam delay_s (sem CPU, sem rede)."""
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(delay_s)
+        device_id = DEVICES[hash(request.url.params.get("query", "")) % len(DEVICES)]
+        return httpx.Response(200, json=[{"_id": device_id, "_lastInform": datetime.utcnow().isoformat()}])
+
+    return httpx.AsyncClient(base_url="http://nbi.local", transport=httpx.MockTransport(handler))
+
+
+async def probe(samples: List[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL_S)
+        samples.append((time.perf_counter() - t0 - PROBE_INTERVAL_S) * 1000)
+
+
+def pct(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def run(mode: str, args) -> None:
+    genieacs._client = fake_nbi(args.nbi_ms / 1000)
+    ingest_url = "/feeds/ingest" if mode == "async" else "/__bench/ingest-blocking"
+    latencies: Dict[str, List[float]] = {"ingest": [], "proxy": []}
+    errors = 0
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait("ingest" if random.random() < args.ingest_ratio else "proxy")
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        nonlocal errors
+        while not queue.empty():
+            kind = queue.get_nowait()
+            device_id = random.choice(DEVICES)
+            t0 = time.perf_counter()
+            if kind == "ingest":
+                resp = await client.post(ingest_url, json={
+                    "device_id": device_id,
+                    "metrics": {"ping_latency_ms": random.uniform(5, 80), "cpu_usage": random.uniform(0, 100)},
+                })
+            else:
+                resp = await client.get(f"/genie/devices/{device_id}", params={"view": "identity"})
+            latencies[kind].append((time.perf_counter() - t0) * 1000)
+            if resp.status_code != 200:
+                errors += 1
+
+    lag: List[float] = []
+    stop = asyncio.Event()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bridge") as client:
+        probe_task = asyncio.create_task(probe(lag, stop))
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        await probe_task
+
+    await genieacs.close_nbi_client()
+    print(f"\n[{mode}] {args.requests} requisições em {elapsed:.2f}s ({args.requests / elapsed:.0f} req/s), erros={errors}")
+    print(f"  lag do loop (ms):  p50={pct(lag, .5):6.2f}  p95={pct(lag, .95):6.2f}  "
+          f"p99={pct(lag, .99):6.2f}  max={max(lag, default=0):6.2f}")
+    for kind, values in latencies.items():
+        if values:
+            print(f"  {kind:<6} (ms):      p50={pct(values, .5):6.2f}  p95={pct(values, .95):6.2f}  "
+                  f"p99={pct(values, .99):6.2f}  média={statistics.fmean(values):6.2f}")
+
+
+async def main_async(args) -> None:
+    init_db()
+    modes = ["blocking", "async"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        await run(mode, args)
+    await dispose_async_engine()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("async", "blocking", "both"), default="both")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--ingest-ratio", type=float, default=0.5)
+    parser.add_argument("--nbi-ms", type=float, default=20.0)
+    args = parser.parse_args()
+    random.seed(42)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
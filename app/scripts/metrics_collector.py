@@ -5,8 +5,11 @@
 import asyncio
 import httpx
 import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 from sqlalchemy.orm import Session
 
 # Importações do projeto
@@ -17,6 +20,14 @@ sys.path.insert(0, str(Path(__file__).parent.parent.parent))
 from app.database import SessionLocal, Device
 from app.services.metrics_service import MetricsService
 from app.settings import settings
+from app.integrations.genieacs import iter_device_pages, close_nbi_client
+from app.services.device_projection import register_view, get_projection
+from app.services.tr069_paths import PathChain, PathSet, get_value
+from app.services.device_snapshot_service import SNAPSHOT_VIEW, snapshot_row, snapshot_store
+from app.services.device_lookup_service import device_lookup, normalize_mac
+from app.services.metric_partitions import metric_partitions
+from app.services.metric_rollup import run_rollups
+from app.services.health_scoring import refresh_stale_health
 
 logging.basicConfig(
     level=logging.INFO,
@@ -27,44 +38,145 @@ log = logging.getLogger("metrics-collector")
 GENIE_API_URL = settings.GENIE_NBI  # GenieACS NBI (Northbound Interface)
 
 
-def get_value(obj: Any, path: str, default: Any = None) -> Any:
-    """Helper para extrair valores de objetos TR-069."""
-    try:
-        parts = path.split(".")
-        result = obj
-        for part in parts:
-            if isinstance(result, dict):
-                result = result.get(part)
-            else:
-                result = getattr(result, part, None)
-            if result is None:
-                return default
-        
-        # Se tem _value, retorna o valor interno
-        if isinstance(result, dict) and "_value" in result:
-            return result["_value"]
-        
-        return result if result is not None else default
-    except:
-        return default
+# Cadeias de fallback lidas pelos extratores (TR-098 e TR-181).
+# Também definem a projeção "metrics": só esses ramos são pedidos ao NBI.
+PATHS: Dict[str, Tuple[str, ...]] = {
+    "pppoe_login": (
+        "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.1.Username",
+        "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.2.Username",  # ZTE
+        "Device.PPP.Interface.1.Username",
+        "Device.PPP.Interface.2.Username",  # Zyxel TR-181
+    ),
+    "wan_ip": (
+        "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.1.ExternalIPAddress",
+        "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.2.ExternalIPAddress",  # ZTE
+        "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANIPConnection.1.ExternalIPAddress",
+        "Device.PPP.Interface.1.IPCP.LocalIPAddress",  # TR-181
+        "Device.PPP.Interface.2.IPCP.LocalIPAddress",  # Zyxel TR-181
+        "Device.IP.Interface.1.IPv4Address.1.IPAddress",  # TR-181
+        "Device.IP.Interface.3.IPv4Address.1.IPAddress",  # Zyxel/TP-Link TR-181
+    ),
+    "wan_mac": (
+        "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.1.MACAddress",
+        "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANIPConnection.1.MACAddress",
+        "Device.Ethernet.Link.1.MACAddress",  # TR-181
+    ),
+    "ssid_24": (
+        "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.SSID",
+        "Device.WiFi.SSID.1.SSID",  # TR-181
+    ),
+    "ssid_5": (
+        "InternetGatewayDevice.LANDevice.1.WLANConfiguration.2.SSID",  # TP-Link
+        "InternetGatewayDevice.LANDevice.1.WLANConfiguration.5.SSID",  # ZTE/Huawei
+        "Device.WiFi.SSID.2.SSID",  # TR-181
+        "Device.WiFi.SSID.3.SSID",  # Zyxel TR-181
+    ),
+    "firmware": (
+        "InternetGatewayDevice.DeviceInfo.SoftwareVersion",
+        "InternetGatewayDevice.DeviceInfo.FirmwareVersion",
+        "Device.DeviceInfo.SoftwareVersion",
+    ),
+    "hardware": (
+        "InternetGatewayDevice.DeviceInfo.HardwareVersion",
+        "InternetGatewayDevice.DeviceInfo.ModelName",
+        "Device.DeviceInfo.HardwareVersion",
+        "Device.DeviceInfo.ModelName",
+    ),
+    "wifi_enabled": (
+        "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.Enable",
+        "Device.WiFi.SSID.1.Enable",
+        "Device.WiFi.Radio.1.Enable",
+    ),
+    # Tráfego WAN (TR-098)
+    "bytes_rx": ("InternetGatewayDevice.WANDevice.1.WANCommonInterfaceConfig.TotalBytesReceived",),
+    "bytes_tx": ("InternetGatewayDevice.WANDevice.1.WANCommonInterfaceConfig.TotalBytesSent",),
+    "packets_rx": ("InternetGatewayDevice.WANDevice.1.WANCommonInterfaceConfig.TotalPacketsReceived",),
+    "packets_tx": ("InternetGatewayDevice.WANDevice.1.WANCommonInterfaceConfig.TotalPacketsSent",),
+    # Alternativa TR-181 (múltiplas interfaces possíveis)
+    "bytes_rx_tr181": (
+        "Device.Ethernet.Interface.1.Stats.BytesReceived",
+        "Device.Ethernet.Interface.2.Stats.BytesReceived",
+        "Device.IP.Interface.3.Stats.BytesReceived",  # Zyxel
+    ),
+    "bytes_tx_tr181": (
+        "Device.Ethernet.Interface.1.Stats.BytesSent",
+        "Device.Ethernet.Interface.2.Stats.BytesSent",
+        "Device.IP.Interface.3.Stats.BytesSent",  # Zyxel
+    ),
+    "wifi_24_clients": (
+        "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.TotalAssociations",
+        "Device.WiFi.AccessPoint.1.AssociatedDeviceNumberOfEntries",  # TR-181
+    ),
+    "wifi_5_clients": (
+        "InternetGatewayDevice.LANDevice.1.WLANConfiguration.2.TotalAssociations",  # TP-Link
+        "InternetGatewayDevice.LANDevice.1.WLANConfiguration.5.TotalAssociations",  # ZTE
+        "Device.WiFi.AccessPoint.2.AssociatedDeviceNumberOfEntries",  # TR-181
+        "Device.WiFi.AccessPoint.3.AssociatedDeviceNumberOfEntries",  # Zyxel TR-181
+    ),
+    "channel_24": (
+        "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.Channel",
+        "Device.WiFi.Radio.1.Channel",  # TR-181
+    ),
+    "channel_5": (
+        "InternetGatewayDevice.LANDevice.1.WLANConfiguration.2.Channel",  # TP-Link
+        "InternetGatewayDevice.LANDevice.1.WLANConfiguration.5.Channel",  # ZTE
+        "Device.WiFi.Radio.2.Channel",  # TR-181
+        "Device.WiFi.Radio.3.Channel",  # Zyxel TR-181
+    ),
+    "cpu_usage": (
+        "InternetGatewayDevice.DeviceInfo.ProcessStatus.CPUUsage",
+        "Device.DeviceInfo.ProcessStatus.CPUUsage",  # TR-181
+    ),
+    "memory_total": (
+        "InternetGatewayDevice.DeviceInfo.MemoryStatus.Total",
+        "Device.DeviceInfo.MemoryStatus.Total",  # TR-181
+    ),
+    "memory_free": (
+        "InternetGatewayDevice.DeviceInfo.MemoryStatus.Free",
+        "Device.DeviceInfo.MemoryStatus.Free",  # TR-181
+    ),
+    "uptime": (
+        "InternetGatewayDevice.DeviceInfo.UpTime",
+        "Device.DeviceInfo.UpTime",
+    ),
+    "lan_clients": (
+        "InternetGatewayDevice.LANDevice.1.Hosts.HostNumberOfEntries",
+        "Device.Hosts.HostNumberOfEntries",  # TR-181
+    ),
+}
 
+# Inclui a view de snapshot: o mesmo documento renova o snapshot local do dispositivo
+METRICS_VIEW = "metrics"
+register_view(METRICS_VIEW, paths=[p for chain in PATHS.values() for p in chain], include=(SNAPSHOT_VIEW,))
 
-async def fetch_devices(client: httpx.AsyncClient) -> List[Dict]:
-    """Busca todos os dispositivos do GenieACS."""
-    try:
-        response = await client.get(
-            f"{GENIE_API_URL}/devices",
-            timeout=30.0
-        )
-        response.raise_for_status()
-        return response.json()
-    except Exception as e:
-        log.error(f"Erro ao buscar dispositivos: {e}")
-        return []
+# Compilados uma vez: cadeias de fallback + todos os caminhos resolvidos numa só caminhada
+CHAINS: Dict[str, PathChain] = {key: PathChain(*paths) for key, paths in PATHS.items()}
+METRIC_PATHSET = PathSet(p for chain in PATHS.values() for p in chain)
+
+
+def resolve_paths(device: Dict) -> Dict[str, Any]:
+    """Resolve todos os caminhos de PATHS no documento (uma caminhada)."""
+    return METRIC_PATHSET.resolve(device)
+
+
+def first_value(values: Dict[str, Any], key: str, default: Any = None) -> Any:
+    """Primeiro valor não-vazio da cadeia de fallback PATHS[key]."""
+    return CHAINS[key].first_in(values, default)
 
 
-def extract_device_info(device: Dict) -> Dict[str, Any]:
-    """Extrai informações básicas do dispositivo."""
+async def fetch_device_pages(page_size: Optional[int] = None) -> AsyncIterator[List[Dict]]:
+    """Itera os dispositivos do GenieACS em páginas (apenas os parâmetros da view "metrics")."""
+    async for page in iter_device_pages(
+        projection=get_projection(METRICS_VIEW),
+        page_size=page_size,
+    ):
+        yield page
+
+
+def extract_device_info(device: Dict, values: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Extrai informações básicas do dispositivo (values: resultado de resolve_paths)."""
+    if values is None:
+        values = resolve_paths(device)
     device_id = device.get("_id", "")
     
     # Identificação
@@ -88,53 +200,8 @@ def extract_device_info(device: Dict) -> Dict[str, Any]:
         except:
             pass
     
-    # PPPoE Login (TR-098 e TR-181)
-    pppoe_login = (
-        get_value(device, "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.1.Username") or
-        get_value(device, "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.2.Username") or  # ZTE
-        get_value(device, "Device.PPP.Interface.1.Username") or
-        get_value(device, "Device.PPP.Interface.2.Username")  # Zyxel TR-181
-    )
-    
-    # WAN IP (TR-098 e TR-181)
-    wan_ip = (
-        get_value(device, "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.1.ExternalIPAddress") or
-        get_value(device, "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.2.ExternalIPAddress") or  # ZTE
-        get_value(device, "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANIPConnection.1.ExternalIPAddress") or
-        get_value(device, "Device.PPP.Interface.1.IPCP.LocalIPAddress") or  # TR-181
-        get_value(device, "Device.PPP.Interface.2.IPCP.LocalIPAddress") or  # Zyxel TR-181
-        get_value(device, "Device.IP.Interface.1.IPv4Address.1.IPAddress") or  # TR-181
-        get_value(device, "Device.IP.Interface.3.IPv4Address.1.IPAddress")  # Zyxel/TP-Link TR-181
-    )
-    
-    # SSIDs (TR-098 e TR-181)
-    ssid_24 = (
-        get_value(device, "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.SSID") or
-        get_value(device, "Device.WiFi.SSID.1.SSID")  # TR-181
-    )
-    ssid_5 = (
-        get_value(device, "InternetGatewayDevice.LANDevice.1.WLANConfiguration.2.SSID") or  # TP-Link
-        get_value(device, "InternetGatewayDevice.LANDevice.1.WLANConfiguration.5.SSID") or  # ZTE/Huawei
-        get_value(device, "Device.WiFi.SSID.2.SSID") or  # TR-181
-        get_value(device, "Device.WiFi.SSID.3.SSID")  # Zyxel TR-181
-    )
-    
-    # Firmware (TR-098 e TR-181)
-    firmware = get_value(device, "InternetGatewayDevice.DeviceInfo.SoftwareVersion") or \
-               get_value(device, "InternetGatewayDevice.DeviceInfo.FirmwareVersion") or \
-               get_value(device, "Device.DeviceInfo.SoftwareVersion")
-    
-    hardware = get_value(device, "InternetGatewayDevice.DeviceInfo.HardwareVersion") or \
-               get_value(device, "InternetGatewayDevice.DeviceInfo.ModelName") or \
-               get_value(device, "Device.DeviceInfo.HardwareVersion") or \
-               get_value(device, "Device.DeviceInfo.ModelName")
-    
     # WiFi Enabled (TR-098 e TR-181)
-    wifi_en = (
-        get_value(device, "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.Enable") or
-        get_value(device, "Device.WiFi.SSID.1.Enable") or
-        get_value(device, "Device.WiFi.Radio.1.Enable")
-    )
+    wifi_en = first_value(values, "wifi_enabled")
     if wifi_en is None:
         wifi_en = True
     if isinstance(wifi_en, dict):
@@ -146,92 +213,54 @@ def extract_device_info(device: Dict) -> Dict[str, Any]:
         "manufacturer": manufacturer,
         "product_class": product_class,
         "oui": oui,
-        "pppoe_login": pppoe_login,
+        "pppoe_login": first_value(values, "pppoe_login"),
         "tag": tag,
         "is_online": is_online,
         "last_inform": datetime.fromisoformat(last_inform.replace("Z", "+00:00")) if last_inform else None,
-        "wan_ip": wan_ip,
-        "ssid_24ghz": ssid_24,
-        "ssid_5ghz": ssid_5,
-        "firmware_version": firmware,
-        "hardware_version": hardware,
+        "wan_ip": first_value(values, "wan_ip"),
+        "wan_mac": normalize_mac(first_value(values, "wan_mac")),
+        "ssid_24ghz": first_value(values, "ssid_24"),
+        "ssid_5ghz": first_value(values, "ssid_5"),
+        "firmware_version": first_value(values, "firmware"),
+        "hardware_version": first_value(values, "hardware"),
         "wifi_enabled": bool(wifi_en) if wifi_en is not None else True
     }
 
 
-def extract_metrics(device: Dict) -> Dict[str, Any]:
-    """Extrai métricas do dispositivo."""
+def extract_metrics(device: Dict, values: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Extrai métricas do dispositivo (values: resultado de resolve_paths)."""
+    if values is None:
+        values = resolve_paths(device)
     
     # Tráfego WAN (TR-098)
-    bytes_rx = get_value(device, "InternetGatewayDevice.WANDevice.1.WANCommonInterfaceConfig.TotalBytesReceived", 0)
-    bytes_tx = get_value(device, "InternetGatewayDevice.WANDevice.1.WANCommonInterfaceConfig.TotalBytesSent", 0)
-    packets_rx = get_value(device, "InternetGatewayDevice.WANDevice.1.WANCommonInterfaceConfig.TotalPacketsReceived", 0)
-    packets_tx = get_value(device, "InternetGatewayDevice.WANDevice.1.WANCommonInterfaceConfig.TotalPacketsSent", 0)
+    bytes_rx = first_value(values, "bytes_rx", 0)
+    bytes_tx = first_value(values, "bytes_tx", 0)
+    packets_rx = first_value(values, "packets_rx", 0)
+    packets_tx = first_value(values, "packets_tx", 0)
     
     # Alternativa TR-181 (múltiplas interfaces possíveis)
     if bytes_rx == 0:
-        bytes_rx = (
-            get_value(device, "Device.Ethernet.Interface.1.Stats.BytesReceived", 0) or
-            get_value(device, "Device.Ethernet.Interface.2.Stats.BytesReceived", 0) or
-            get_value(device, "Device.IP.Interface.3.Stats.BytesReceived", 0)  # Zyxel
-        )
-        bytes_tx = (
-            get_value(device, "Device.Ethernet.Interface.1.Stats.BytesSent", 0) or
-            get_value(device, "Device.Ethernet.Interface.2.Stats.BytesSent", 0) or
-            get_value(device, "Device.IP.Interface.3.Stats.BytesSent", 0)  # Zyxel
-        )
+        bytes_rx = first_value(values, "bytes_rx_tr181", 0)
+        bytes_tx = first_value(values, "bytes_tx_tr181", 0)
     
-    # Clientes WiFi (TR-098 e TR-181)
-    wifi_24_clients = (
-        get_value(device, "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.TotalAssociations", 0) or
-        get_value(device, "Device.WiFi.AccessPoint.1.AssociatedDeviceNumberOfEntries", 0)  # TR-181
-    )
-    wifi_5_clients = (
-        get_value(device, "InternetGatewayDevice.LANDevice.1.WLANConfiguration.2.TotalAssociations", 0) or  # TP-Link
-        get_value(device, "InternetGatewayDevice.LANDevice.1.WLANConfiguration.5.TotalAssociations", 0) or  # ZTE
-        get_value(device, "Device.WiFi.AccessPoint.2.AssociatedDeviceNumberOfEntries", 0) or  # TR-181
-        get_value(device, "Device.WiFi.AccessPoint.3.AssociatedDeviceNumberOfEntries", 0)  # Zyxel TR-181
-    )
-    
-    # Canais (TR-098 e TR-181)
-    channel_24 = (
-        get_value(device, "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.Channel", 0) or
-        get_value(device, "Device.WiFi.Radio.1.Channel", 0)  # TR-181
-    )
-    channel_5 = (
-        get_value(device, "InternetGatewayDevice.LANDevice.1.WLANConfiguration.2.Channel", 0) or  # TP-Link
-        get_value(device, "InternetGatewayDevice.LANDevice.1.WLANConfiguration.5.Channel", 0) or  # ZTE
-        get_value(device, "Device.WiFi.Radio.2.Channel", 0) or  # TR-181
-        get_value(device, "Device.WiFi.Radio.3.Channel", 0)  # Zyxel TR-181
-    )
+    # Clientes WiFi e canais (TR-098 e TR-181)
+    wifi_24_clients = first_value(values, "wifi_24_clients", 0)
+    wifi_5_clients = first_value(values, "wifi_5_clients", 0)
+    channel_24 = first_value(values, "channel_24", 0)
+    channel_5 = first_value(values, "channel_5", 0)
     
     # Sistema (TR-098 e TR-181)
-    cpu_usage = (
-        get_value(device, "InternetGatewayDevice.DeviceInfo.ProcessStatus.CPUUsage") or
-        get_value(device, "Device.DeviceInfo.ProcessStatus.CPUUsage")  # TR-181
-    )
-    memory_total = (
-        get_value(device, "InternetGatewayDevice.DeviceInfo.MemoryStatus.Total", 0) or
-        get_value(device, "Device.DeviceInfo.MemoryStatus.Total", 0)  # TR-181
-    )
-    memory_free = (
-        get_value(device, "InternetGatewayDevice.DeviceInfo.MemoryStatus.Free", 0) or
-        get_value(device, "Device.DeviceInfo.MemoryStatus.Free", 0)  # TR-181
-    )
+    cpu_usage = first_value(values, "cpu_usage")
+    memory_total = first_value(values, "memory_total", 0)
+    memory_free = first_value(values, "memory_free", 0)
     
     memory_usage = None
     if memory_total and memory_total > 0:
         memory_usage = ((memory_total - memory_free) / memory_total) * 100
     
-    # Uptime (TR-098 e TR-181)
-    uptime = get_value(device, "InternetGatewayDevice.DeviceInfo.UpTime") or \
-             get_value(device, "Device.DeviceInfo.UpTime")
-    
-    # LAN Hosts (TR-098 e TR-181)
-    lan_clients = (
-        get_value(device, "InternetGatewayDevice.LANDevice.1.Hosts.HostNumberOfEntries", 0) or
-        get_value(device, "Device.Hosts.HostNumberOfEntries", 0)  # TR-181
-    )
+    # Uptime e LAN Hosts (TR-098 e TR-181)
+    uptime = first_value(values, "uptime")
+    lan_clients = first_value(values, "lan_clients", 0)
     
     return {
         "bytes_received": float(bytes_rx) if bytes_rx else 0,
@@ -249,46 +278,230 @@ def extract_metrics(device: Dict) -> Dict[str, Any]:
     }
 
 
-async def collect_metrics():
-    """Coleta métricas de todos os dispositivos."""
-    log.info("=== Iniciando coleta de métricas ===")
+def extract_page(devices: List[Dict]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]], int]:
+    """
+    Extrai uma página inteira (executado no pool de extração).
+    Retorna (linhas de Device, linhas de métricas, snapshots compactados, dispositivos com erro).
+    """
+    device_rows: List[Dict[str, Any]] = []
+    metric_rows: List[Dict[str, Any]] = []
+    snapshot_rows: List[Dict[str, Any]] = []
+    fetched_at = datetime.utcnow()
+    errors = 0
+    for device in devices:
+        try:
+            device_id = device.get("_id", "")
+            if not device_id:
+                continue
+            
+            values = resolve_paths(device)
+            device_rows.append(extract_device_info(device, values))
+            snapshot_rows.append(snapshot_row(device, SNAPSHOT_VIEW, fetched_at))
+            
+            metrics = extract_metrics(device, values)
+            if any(v for v in metrics.values() if v is not None):
+                metric_rows.append({"device_id": device_id, **metrics})
+            else:
+                log.warning(f"⚠ Sem métricas para {device_id}")
+            
+        except Exception as e:
+            errors += 1
+            log.error(f"Erro ao processar device {device.get('_id')}: {e}")
+    return device_rows, metric_rows, snapshot_rows, errors
+
+
+def write_page(
+    svc: MetricsService,
+    device_rows: List[Dict[str, Any]],
+    metric_rows: List[Dict[str, Any]],
+    snapshot_rows: Optional[List[Dict[str, Any]]] = None,
+) -> int:
+    """Upsert de Device, insert de métricas, snapshots e índice de busca num único commit por página."""
+    try:
+        id_map = svc.bulk_upsert_devices(device_rows, commit=False)
+        device_lookup.update_from_devices(svc.db, device_rows, commit=False)
+        recorded = svc.bulk_record_metrics(metric_rows, id_map=id_map, commit=False)
+        if snapshot_rows:
+            snapshot_store.save_rows(svc.db, snapshot_rows, commit=False)
+        svc.db.commit()
+        return recorded
+    except Exception:
+        svc.db.rollback()
+        raise
+
+
+@dataclass
+class StageStats:
+    """
+    Contadores de um estágio do pipeline de coleta.
+    max_queue: maior profundidade observada na fila de saída do estágio.
+    """
+    pages: int = 0
+    devices: int = 0
+    errors: int = 0
+    busy_s: float = 0.0
+    max_queue: int = 0
     
-    db: Session = SessionLocal()
-    svc = MetricsService(db)
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "pages": self.pages,
+            "devices": self.devices,
+            "errors": self.errors,
+            "busy_s": round(self.busy_s, 3),
+            "devices_per_s": round(self.devices / self.busy_s, 1) if self.busy_s > 0 else None,
+            "max_queue": self.max_queue,
+        }
+
+
+# Estatísticas do último ciclo (fetch / extract / write)
+last_cycle_stats: Dict[str, Any] = {}
+
+
+def _make_extract_pool(kind: str, workers: int) -> Executor:
+    if kind == "thread":
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract")
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+async def collect_metrics(
+    page_size: Optional[int] = None,
+    workers: Optional[int] = None,
+    pool_kind: Optional[str] = None,
+    queue_size: Optional[int] = None,
+):
+    """
+    Coleta métricas de todos os dispositivos em pipeline:
     
-    try:
-        async with httpx.AsyncClient() as client:
-            devices = await fetch_devices(client)
-            log.info(f"Encontrados {len(devices)} dispositivos no GenieACS")
-            
-            for device in devices:
+        fetch (páginas do NBI) → extract (pool de processos/threads) → write (lotes no banco)
+    
+    Os estágios são ligados por asyncio.Queue limitadas: se o banco atrasa, a
+    extração espera, e se a extração atrasa, a paginação do NBI espera. Se o
+    escritor morre, a extração para em vez de esperar a fila para sempre, e
+    a exceção dele é propagada.
+    """
+    workers = workers or settings.METRICS_EXTRACT_WORKERS
+    pool_kind = pool_kind or settings.METRICS_EXTRACT_POOL
+    queue_size = queue_size or settings.METRICS_QUEUE_SIZE
+    
+    log.info(f"=== Iniciando coleta de métricas (workers={workers} pool={pool_kind} fila={queue_size}) ===")
+    
+    loop = asyncio.get_running_loop()
+    extract_q: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    write_q: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    stats = {"fetch": StageStats(), "extract": StageStats(), "write": StageStats()}
+    started = time.perf_counter()
+    
+    async def fetcher():
+        try:
+            t0 = time.perf_counter()
+            async for devices in fetch_device_pages(page_size):
+                stats["fetch"].busy_s += time.perf_counter() - t0
+                stats["fetch"].pages += 1
+                stats["fetch"].devices += len(devices)
+                await extract_q.put(devices)
+                stats["fetch"].max_queue = max(stats["fetch"].max_queue, extract_q.qsize())
+                t0 = time.perf_counter()
+        except Exception as e:
+            stats["fetch"].errors += 1
+            log.error(f"Erro ao paginar dispositivos: {e}")
+        finally:
+            for _ in range(workers):
+                await extract_q.put(None)
+    
+    async def send(item) -> None:
+        """write_q.put que desiste se o escritor já terminou (a fila cheia nunca esvaziaria)."""
+        if writer_task.done():
+            writer_task.result()
+            raise RuntimeError("escritor encerrado antes do fim da coleta")
+        if not write_q.full():
+            write_q.put_nowait(item)
+            return
+        put = asyncio.ensure_future(write_q.put(item))
+        await asyncio.wait({put, writer_task}, return_when=asyncio.FIRST_COMPLETED)
+        if not put.done():
+            put.cancel()
+            writer_task.result()  # propaga a exceção do escritor
+            raise RuntimeError("escritor encerrado antes do fim da coleta")
+    
+    async def extractor(pool: Executor):
+        while True:
+            devices = await extract_q.get()
+            if devices is None:
+                return
+            t0 = time.perf_counter()
+            try:
+                device_rows, metric_rows, snapshot_rows, errors = await loop.run_in_executor(pool, extract_page, devices)
+            except Exception as e:
+                stats["extract"].errors += len(devices)
+                log.error(f"Erro ao extrair página: {e}")
+                continue
+            stats["extract"].busy_s += time.perf_counter() - t0
+            stats["extract"].pages += 1
+            stats["extract"].devices += len(device_rows)
+            stats["extract"].errors += errors
+            await send((device_rows, metric_rows, snapshot_rows))
+            stats["extract"].max_queue = max(stats["extract"].max_queue, write_q.qsize())
+    
+    async def writer():
+        # Um único escritor: uma sessão, uma thread dedicada (SQLite aceita um writer por vez)
+        db: Session = SessionLocal()
+        svc = MetricsService(db)
+        db_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="writer")
+        try:
+            while True:
+                item = await write_q.get()
+                if item is None:
+                    return
+                device_rows, metric_rows, snapshot_rows = item
+                t0 = time.perf_counter()
                 try:
-                    device_id = device.get("_id", "")
-                    if not device_id:
-                        continue
-                    
-                    # Extrair e atualizar info do dispositivo
-                    device_info = extract_device_info(device)
-                    svc.upsert_device(device_id, device_info)
-                    
-                    # Extrair e registrar métricas
-                    metrics = extract_metrics(device)
-                    if any(v for v in metrics.values() if v is not None):
-                        svc.record_metric(device_id, metrics)
-                        log.info(f"✓ Métricas coletadas: {device_id} ({device_info.get('manufacturer')} {device_info.get('product_class')})")
-                    else:
-                        log.warning(f"⚠ Sem métricas para {device_id}")
-                    
+                    recorded = await loop.run_in_executor(
+                        db_thread, write_page, svc, device_rows, metric_rows, snapshot_rows
+                    )
                 except Exception as e:
-                    log.error(f"Erro ao processar device {device.get('_id')}: {e}")
+                    stats["write"].errors += len(device_rows)
+                    log.error(f"Erro ao gravar página: {e}")
                     continue
-            
-            log.info(f"=== Coleta concluída: {len(devices)} dispositivos processados ===")
-            
+                stats["write"].busy_s += time.perf_counter() - t0
+                stats["write"].pages += 1
+                stats["write"].devices += recorded
+        finally:
+            await loop.run_in_executor(db_thread, db.close)
+            db_thread.shutdown(wait=False)
+    
+    pool = _make_extract_pool(pool_kind, workers)
+    writer_task = asyncio.create_task(writer())
+    tasks: List[asyncio.Task] = []
+    try:
+        tasks = [asyncio.create_task(fetcher())] + [asyncio.create_task(extractor(pool)) for _ in range(workers)]
+        await asyncio.gather(*tasks)
+        await send(None)
+        await writer_task
     except Exception as e:
         log.error(f"Erro na coleta: {e}")
+        raise
     finally:
-        db.close()
+        for task in tasks + [writer_task]:
+            if not task.done():
+                task.cancel()
+        pool.shutdown(wait=False, cancel_futures=True)
+    
+    elapsed = time.perf_counter() - started
+    last_cycle_stats.clear()
+    last_cycle_stats.update({
+        "elapsed_s": round(elapsed, 3),
+        **{name: st.as_dict() for name, st in stats.items()},
+    })
+    for name, st in stats.items():
+        d = st.as_dict()
+        log.info(
+            f"[{name}] páginas={d['pages']} dispositivos={d['devices']} erros={d['errors']} "
+            f"ocupado={d['busy_s']}s taxa={d['devices_per_s']}/s fila_max={d['max_queue']}"
+        )
+    log.info(
+        f"=== Coleta concluída em {elapsed:.1f}s: {stats['fetch'].devices} dispositivos, "
+        f"{stats['write'].devices} métricas gravadas ==="
+    )
 
 
 async def check_alerts(db: Session):
@@ -343,12 +556,67 @@ async def check_alerts(db: Session):
                 )
 
 
+def maintain_partitions() -> None:
+    """metric_partitions.maintain() com sessão própria (roda fora do event loop)."""
+    db = SessionLocal()
+    try:
+        result = metric_partitions.maintain(db)
+        if result["closed"] or result["removed_rows"]:
+            log.info(f"Partições de métricas: {result}")
+    except Exception as e:
+        db.rollback()
+        log.error(f"Erro na manutenção das partições de métricas: {e}")
+    finally:
+        db.close()
+
+
+def rollup_metrics() -> None:
+    """run_rollups() (hora/dia/semana da frota) com sessão própria, fora do event loop."""
+    db = SessionLocal()
+    try:
+        run_rollups(db)
+    except Exception as e:
+        db.rollback()
+        log.error(f"Erro no rollup de métricas: {e}")
+    finally:
+        db.close()
+
+
+def refresh_health() -> None:
+    """Repontua em device_health só os dispositivos com amostras novas."""
+    db = SessionLocal()
+    try:
+        refresh_stale_health(db)
+    except Exception as e:
+        db.rollback()
+        log.error(f"Erro ao atualizar device_health: {e}")
+    finally:
+        db.close()
+
+
 async def main():
     """Função principal."""
+    try:
+        await _run_forever()
+    finally:
+        await close_nbi_client()
+
+
+async def _run_forever():
+    """
+    Loop de coleta periódica em cadência fixa: cada ciclo começa
+    METRICS_COLLECT_INTERVAL segundos após o início do anterior, independente
+    de quanto a coleta demorou.
+    """
+    interval = settings.METRICS_COLLECT_INTERVAL
     while True:
+        cycle_start = time.monotonic()
         try:
             await collect_metrics()
             
+            # Índice login/serial/MAC: linhas de Device alteradas fora do coletor
+            await asyncio.to_thread(device_lookup.sync)
+            
             # Verificar alertas
             db = SessionLocal()
             try:
@@ -356,16 +624,27 @@ async def main():
             finally:
                 db.close()
             
-            # Aguardar 5 minutos
-            log.info("Aguardando 5 minutos até próxima coleta...")
-            await asyncio.sleep(300)
+            # Partições mensais: rollup dos meses fechados e retenção
+            await asyncio.to_thread(maintain_partitions)
+            
+            # Agregações incrementais (a partir da marca d'água)
+            await asyncio.to_thread(rollup_metrics)
+            
+            # Snapshot de saúde (só dispositivos com amostras novas)
+            await asyncio.to_thread(refresh_health)
             
         except KeyboardInterrupt:
             log.info("Coleta interrompida pelo usuário")
             break
         except Exception as e:
             log.error(f"Erro no loop principal: {e}")
-            await asyncio.sleep(60)
+        
+        elapsed = time.monotonic() - cycle_start
+        if elapsed > interval:
+            log.warning(f"Ciclo levou {elapsed:.0f}s, acima do intervalo de {interval}s")
+        wait = max(0.0, interval - elapsed)
+        log.info(f"Aguardando {wait:.0f}s até próxima coleta...")
+        await asyncio.sleep(wait)
 
 
 if __name__ == "__main__":
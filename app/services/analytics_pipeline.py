@@ -0,0 +1,268 @@
+# app/services/analytics_pipeline.py
+"""
+Estágio de análise das amostras recebidas em /feeds/ingest, fora da requisição.
+
+O ingest só grava a métrica e enfileira a amostra (fila limitada, sem
+esperar: com a fila cheia a amostra é descartada e contada em `dropped`).
+Uma task do event loop consome a fila em lotes de até ANALYTICS_BATCH_SIZE
+amostras (ou o que chegar em ANALYTICS_BATCH_LINGER_MS), agrupa por
+dispositivo e, numa thread:
+- atualiza o baseline do learning engine amostra a amostra (média móvel)
+- passa cada amostra por network_analyzer.observe (detecção em streaming
+  contra o histórico em memória do dispositivo)
+learning_engine e network_analyzer são os mesmos das rotas (baselines e
+histórico compartilhados); os dois serializam o acesso com locks próprios.
+Os alertas do lote (anomalias com severidade > 0.5) são gravados com um
+único commit. Os dispositivos dos lotes se acumulam e, a cada
+HEALTH_REFRESH_INTERVAL segundos, são repontuados em device_health.
+
+A análise é best-effort: amostras na fila se perdem se o processo cair.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.database.connection import SessionLocal, get_async_sessionmaker
+from app.database.models import AlertEvent
+from app.ml import learning_engine, network_analyzer
+from app.services.health_scoring import refresh_device_health
+from app.settings import settings
+
+log = logging.getLogger("semppre-bridge.analytics")
+
+# Métricas (colunas de DeviceMetric) usadas no baseline
+BASELINE_METRICS = ("ping_latency_ms", "ping_packet_loss", "cpu_usage", "memory_usage")
+# Colunas -> nomes esperados pelo network_analyzer
+_ANOMALY_METRICS = {"ping_latency_ms": "latency_ms", "ping_packet_loss": "packet_loss_pct"}
+# Colunas que Sample.values precisa trazer
+ANALYSIS_COLUMNS = tuple(dict.fromkeys((*BASELINE_METRICS, *_ANOMALY_METRICS)))
+
+
+@dataclass
+class Sample:
+    """Amostra gravada, pendente de análise."""
+    device_id: str  # GenieACS
+    device_pk: int  # Device.id
+    collected_at: datetime
+    values: Dict[str, Any]  # colunas de DeviceMetric
+    extras: Dict[str, Any] = field(default_factory=dict)
+
+
+def analyze_device(device_id: str, device_pk: int, samples: List[Sample]) -> List[AlertEvent]:
+    """Baseline + anomalias das amostras de um dispositivo (em ordem de chegada)."""
+    try:
+        for s in samples:
+            baseline = {m: s.values[m] for m in BASELINE_METRICS if s.values.get(m) is not None}
+            if baseline:
+                learning_engine.update_baseline(device_id, baseline)
+    except Exception as e:
+        log.warning(f"learning_engine.update_baseline falhou: {e}")
+
+    alerts: List[AlertEvent] = []
+    try:
+        for s in samples:
+            values = {name: s.values.get(col) for col, name in _ANOMALY_METRICS.items()}
+            for k, v in (s.extras or {}).items():
+                if isinstance(v, (int, float)) and not isinstance(v, bool):
+                    values[k] = v
+            for a in network_analyzer.observe(device_id, values, s.collected_at):
+                if a.severity > 0.5:
+                    alerts.append(AlertEvent(
+                        device_id=device_pk,
+                        severity="error" if a.severity > 0.7 else "warning",
+                        category="performance",
+                        title=f"Anomalia: {a.anomaly_type.value}",
+                        message=a.description,
+                        details=a.to_dict(),
+                    ))
+    except Exception as e:
+        log.warning(f"network_analyzer.observe falhou: {e}")
+    return alerts
+
+
+def analyze_batch(samples: List[Sample]) -> List[AlertEvent]:
+    """Agrupa o lote por dispositivo e analisa cada grupo."""
+    by_device: Dict[int, List[Sample]] = {}
+    for s in samples:
+        by_device.setdefault(s.device_pk, []).append(s)
+    alerts: List[AlertEvent] = []
+    for device_pk, group in by_device.items():
+        alerts.extend(analyze_device(group[0].device_id, device_pk, group))
+    return alerts
+
+
+def refresh_health(device_pks: List[int]) -> int:
+    """refresh_device_health com sessão própria (roda numa thread)."""
+    db = SessionLocal()
+    try:
+        return len(refresh_device_health(db, device_pks))
+    finally:
+        db.close()
+
+
+class AnalyticsPipeline:
+    """Fila limitada + worker em lotes (ver docstring do módulo)."""
+
+    def __init__(self, maxsize: int, batch_size: int, linger_ms: float, health_interval: float = 60.0):
+        self.maxsize = maxsize
+        self.batch_size = max(1, batch_size)
+        self.linger = max(0.0, linger_ms / 1000)
+        self.health_interval = max(0.0, health_interval)
+        self._dirty: set = set()  # Device.id com amostras ainda não repontuadas
+        self._health_at = 0.0
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._stats = {
+            "enqueued": 0,
+            "dropped": 0,
+            "processed": 0,
+            "batches": 0,
+            "alerts": 0,
+            "errors": 0,
+            "last_batch_size": 0,
+            "last_batch_ms": 0.0,
+            "health_refreshed": 0,
+        }
+
+    # ---------- ciclo de vida ----------
+
+    def start(self) -> None:
+        """Inicia o worker no event loop corrente (idempotente)."""
+        if self._worker is not None and not self._worker.done():
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+        self._worker = asyncio.create_task(self._run(), name="analytics-pipeline")
+        log.info(f"[Analytics] worker iniciado (fila={self.maxsize}, lote={self.batch_size})")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Processa o que resta na fila (até `timeout` s) e encerra o worker."""
+        if self._worker is None:
+            return
+        if self._queue is not None and not self._worker.done():
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                log.warning(f"[Analytics] {self._queue.qsize()} amostras descartadas no desligamento")
+        if self._dirty and not self._worker.done():
+            await self._refresh_health()
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+    # ---------- produtor ----------
+
+    def enqueue(self, samples: Iterable[Sample]) -> int:
+        """Enfileira sem bloquear; retorna quantas entraram (o resto conta em dropped)."""
+        self.start()
+        accepted = 0
+        for s in samples:
+            try:
+                self._queue.put_nowait(s)
+                accepted += 1
+            except asyncio.QueueFull:
+                self._stats["dropped"] += 1
+        self._stats["enqueued"] += accepted
+        return accepted
+
+    # ---------- consumidor ----------
+
+    async def _next_batch(self) -> List[Sample]:
+        while True:
+            # Fila parada com dispositivos pendentes: repontua ao fim do intervalo
+            timeout = None
+            if self._dirty:
+                timeout = max(0.0, self._health_at + self.health_interval - time.monotonic())
+            try:
+                batch = [await asyncio.wait_for(self._queue.get(), timeout)]
+                break
+            except asyncio.TimeoutError:
+                await self._refresh_health()
+        deadline = time.monotonic() + self.linger
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _refresh_health(self) -> None:
+        """Repontua em device_health os dispositivos acumulados."""
+        pks, self._dirty = sorted(self._dirty), set()
+        self._health_at = time.monotonic()
+        try:
+            self._stats["health_refreshed"] += await asyncio.to_thread(refresh_health, pks)
+        except Exception as e:
+            self._stats["errors"] += 1
+            log.exception(f"[Analytics] erro ao repontuar {len(pks)} dispositivos: {e}")
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            started = time.perf_counter()
+            try:
+                alerts = await asyncio.to_thread(analyze_batch, batch)
+                if alerts:
+                    async with get_async_sessionmaker()() as session:
+                        session.add_all(alerts)
+                        await session.commit()
+                self._stats["alerts"] += len(alerts)
+                self._dirty.update(s.device_pk for s in batch)
+                if time.monotonic() - self._health_at >= self.health_interval:
+                    await self._refresh_health()
+            except Exception as e:
+                self._stats["errors"] += 1
+                log.exception(f"[Analytics] erro no lote de {len(batch)} amostras: {e}")
+            finally:
+                self._stats["processed"] += len(batch)
+                self._stats["batches"] += 1
+                self._stats["last_batch_size"] = len(batch)
+                self._stats["last_batch_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                for _ in batch:
+                    self._queue.task_done()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._worker is not None and not self._worker.done(),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "queue_max": self.maxsize,
+            "health_pending": len(self._dirty),
+            **self._stats,
+        }
+
+
+# Instância singleton para uso direto
+analytics_pipeline = AnalyticsPipeline(
+    maxsize=settings.ANALYTICS_QUEUE_SIZE,
+    batch_size=settings.ANALYTICS_BATCH_SIZE,
+    linger_ms=settings.ANALYTICS_BATCH_LINGER_MS,
+    health_interval=settings.HEALTH_REFRESH_INTERVAL,
+)
+
+
+__all__ = [
+    "ANALYSIS_COLUMNS",
+    "BASELINE_METRICS",
+    "AnalyticsPipeline",
+    "Sample",
+    "analytics_pipeline",
+    "analyze_batch",
+    "analyze_device",
+    "refresh_health",
+]
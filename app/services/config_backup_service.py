@@ -11,16 +11,19 @@ import hashlib
 import json
 import logging
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
 
-import httpx
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import and_, desc
 
 from app.database.models import (
     Device, DeviceConfigBackup, DeviceBootstrapEvent, TaskHistory
 )
 from app.settings import settings
+from app.integrations.genieacs import get_nbi_client, nbi_timeout
+from app.services.device_projection import register_view
+from app.services.tr069_paths import get_value
 
 log = logging.getLogger("semppre-bridge.config-backup")
 
@@ -29,35 +32,58 @@ RESET_UPTIME_THRESHOLD = 600  # 10 minutos
 # Threshold para considerar um dispositivo como "novo" (nunca visto antes)
 NEW_DEVICE_THRESHOLD_HOURS = 1
 
+# Parâmetros lidos pelos extratores de backup (_extract_*_config / create_backup).
+# Registrados como view "backup" para buscar o dispositivo com projection=
+_WLAN_FIELDS = (
+    "SSID", "PreSharedKey.1.PreSharedKey", "KeyPassphrase", "Enable", "Channel",
+    "AutoChannelEnable", "BeaconType", "X_TP_SecurityMode", "SSIDAdvertisementEnabled",
+    "X_TP_Bandwidth", "X_TP_TransmitPower",
+)
+_PPP_PREFIX = "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.1"
+_IP_PREFIX = "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANIPConnection.1"
+
+BACKUP_VIEW = "backup"
+register_view(BACKUP_VIEW, paths=[
+    *(f"InternetGatewayDevice.LANDevice.1.WLANConfiguration.{idx}.{field}"
+      for idx in (1, 2, 5) for field in _WLAN_FIELDS),
+    *(f"Device.WiFi.SSID.{idx}.SSID" for idx in (1, 2)),
+    *(f"Device.WiFi.AccessPoint.{idx}.Security.KeyPassphrase" for idx in (1, 2)),
+    *(f"{_PPP_PREFIX}.{field}" for field in ("Username", "Password", "Enable", "NATEnabled", "MaxMTUSize", "MACAddress")),
+    "Device.PPP.Interface.1.Username",
+    "Device.PPP.Interface.1.Password",
+    *(f"{_IP_PREFIX}.{field}" for field in ("ExternalIPAddress", "DefaultGateway", "DNSServers")),
+    "InternetGatewayDevice.LANDevice.1.LANHostConfigManagement",
+])
+
 
 class ConfigBackupService:
-    """Serviço para backup e restauração de configurações de dispositivos."""
+    """
+    Serviço para backup e restauração de configurações de dispositivos.
+
+    Aceita Session (scripts, device_monitor) ou AsyncSession (rotas async).
+    Os métodos síncronos trabalham sobre Session; com AsyncSession use
+    `await service.run("list_backups", ...)`. Os métodos async (create_backup,
+    auto_restore_config, process_new_device) funcionam com as duas: o acesso
+    ao banco passa por run() e, com AsyncSession, não bloqueia o event loop.
+    """
     
-    def __init__(self, db: Session):
+    def __init__(self, db: Union[Session, AsyncSession]):
         self.db = db
         self.genie_url = settings.GENIE_NBI.rstrip("/")
+
+    async def run(self, method: str, *args, **kwargs) -> Any:
+        """Executa um método síncrono do serviço (via run_sync se a sessão for assíncrona)."""
+        if isinstance(self.db, AsyncSession):
+            return await self.db.run_sync(
+                lambda session: getattr(ConfigBackupService(session), method)(*args, **kwargs)
+            )
+        return getattr(self, method)(*args, **kwargs)
     
     # ============ Extração de Configurações ============
     
     def _get_value(self, obj: Any, path: str, default: Any = None) -> Any:
-        """Helper para extrair valores de objetos TR-069."""
-        try:
-            parts = path.split(".")
-            result = obj
-            for part in parts:
-                if isinstance(result, dict):
-                    result = result.get(part)
-                else:
-                    result = getattr(result, part, None)
-                if result is None:
-                    return default
-            
-            if isinstance(result, dict) and "_value" in result:
-                return result["_value"]
-            
-            return result if result is not None else default
-        except:
-            return default
+        """Helper para extrair valores de objetos TR-069 (caminhos compilados)."""
+        return get_value(obj, path, default)
     
     def _extract_wifi_config(self, device_data: Dict) -> Dict[str, Any]:
         """Extrai configurações WiFi do dispositivo."""
@@ -231,6 +257,10 @@ class ConfigBackupService:
         """
         Cria ou atualiza backup de configurações para um dispositivo.
         """
+        return await self.run("save_backup", device_id, device_data)
+
+    def save_backup(self, device_id: str, device_data: Dict) -> Optional[DeviceConfigBackup]:
+        """Versão síncrona de create_backup (sobre Session)."""
         try:
             # Buscar dispositivo no banco local
             device = self.db.query(Device).filter(Device.device_id == device_id).first()
@@ -421,46 +451,60 @@ class ConfigBackupService:
         Restaura automaticamente configurações de um dispositivo após reset.
         """
         try:
-            # Buscar backup ativo
-            backup = self.get_active_backup(serial_number)
-            if not backup:
-                log.info(f"Nenhum backup encontrado para restaurar: {serial_number}")
-                return False
-            
-            if not backup.is_auto_restore_enabled:
-                log.info(f"Auto-restore desabilitado para: {serial_number}")
+            started = await self.run("_begin_restore", device_id, serial_number)
+            if not started:
                 return False
-            
-            # Registrar evento de bootstrap
-            event = DeviceBootstrapEvent(
-                device_id=backup.device_id,
-                serial_number=serial_number,
-                genie_device_id=device_id,
-                event_type="auto_restore_triggered",
-                action_taken="auto_restore",
-                restore_status="pending"
-            )
-            self.db.add(event)
-            self.db.commit()
+            backup, event = started
             
             # Executar restauração via GenieACS
             success = await self._send_restore_task(device_id, backup.tr069_params)
             
+            await self.run("_finish_restore", backup, event, success)
             if success:
-                backup.restore_count += 1
-                backup.last_restored_at = datetime.utcnow()
-                event.restore_status = "success"
                 log.info(f"✅ Configurações restauradas com sucesso: {device_id}")
             else:
-                event.restore_status = "failed"
                 log.error(f"❌ Falha ao restaurar configurações: {device_id}")
-            
-            self.db.commit()
             return success
             
         except Exception as e:
             log.error(f"Erro no auto-restore para {device_id}: {e}")
             return False
+
+    def _begin_restore(
+        self, device_id: str, serial_number: str
+    ) -> Optional[Tuple[DeviceConfigBackup, DeviceBootstrapEvent]]:
+        """Busca o backup ativo e registra o evento de bootstrap (restore pendente)."""
+        backup = self.get_active_backup(serial_number)
+        if not backup:
+            log.info(f"Nenhum backup encontrado para restaurar: {serial_number}")
+            return None
+        
+        if not backup.is_auto_restore_enabled:
+            log.info(f"Auto-restore desabilitado para: {serial_number}")
+            return None
+        
+        # Registrar evento de bootstrap
+        event = DeviceBootstrapEvent(
+            device_id=backup.device_id,
+            serial_number=serial_number,
+            genie_device_id=device_id,
+            event_type="auto_restore_triggered",
+            action_taken="auto_restore",
+            restore_status="pending"
+        )
+        self.db.add(event)
+        self.db.commit()
+        return backup, event
+
+    def _finish_restore(self, backup: DeviceConfigBackup, event: DeviceBootstrapEvent, success: bool) -> None:
+        """Grava o resultado do restore no backup e no evento."""
+        if success:
+            backup.restore_count += 1
+            backup.last_restored_at = datetime.utcnow()
+            event.restore_status = "success"
+        else:
+            event.restore_status = "failed"
+        self.db.commit()
     
     async def _send_restore_task(self, device_id: str, params: List[Dict]) -> bool:
         """Envia task de setParameterValues para restaurar configurações."""
@@ -482,36 +526,37 @@ class ConfigBackupService:
                 "parameterValues": parameter_values
             }
             
-            url = f"{self.genie_url}/devices/{device_id}/tasks?connection_request"
+            url = f"/devices/{device_id}/tasks?connection_request"
+            
+            resp = await get_nbi_client().post(url, json=task_payload, timeout=nbi_timeout("task"))
             
-            async with httpx.AsyncClient(timeout=60, verify=False) as client:
-                resp = await client.post(url, json=task_payload)
+            if resp.status_code in (200, 202):
+                log.info(f"Task de restore enviada com sucesso: {device_id}")
+                
+                # Registrar no histórico de tasks
+                await self.run("_record_restore_task", device_id, len(params))
+                return True
+            else:
+                log.error(f"Erro ao enviar task de restore: {resp.status_code} - {resp.text}")
+                return False
                 
-                if resp.status_code in (200, 202):
-                    log.info(f"Task de restore enviada com sucesso: {device_id}")
-                    
-                    # Registrar no histórico de tasks
-                    device = self.db.query(Device).filter(Device.device_id == device_id).first()
-                    if device:
-                        task_history = TaskHistory(
-                            device_id=device.id,
-                            task_type="setParameterValues",
-                            parameters={"restore": True, "params_count": len(params)},
-                            status="pending",
-                            triggered_by="auto_restore"
-                        )
-                        self.db.add(task_history)
-                        self.db.commit()
-                    
-                    return True
-                else:
-                    log.error(f"Erro ao enviar task de restore: {resp.status_code} - {resp.text}")
-                    return False
-                    
         except Exception as e:
             log.error(f"Exceção ao enviar task de restore: {e}")
             return False
     
+    def _record_restore_task(self, device_id: str, params_count: int) -> None:
+        device = self.db.query(Device).filter(Device.device_id == device_id).first()
+        if device:
+            task_history = TaskHistory(
+                device_id=device.id,
+                task_type="setParameterValues",
+                parameters={"restore": True, "params_count": params_count},
+                status="pending",
+                triggered_by="auto_restore"
+            )
+            self.db.add(task_history)
+            self.db.commit()
+    
     # ============ Processamento de Novos Dispositivos ============
     
     async def process_new_device(self, device_id: str, device_data: Dict) -> Dict[str, Any]:
@@ -533,14 +578,12 @@ class ConfigBackupService:
         if not serial:
             return result
         
-        # Verificar se dispositivo existe no banco
-        device = self.db.query(Device).filter(Device.device_id == device_id).first()
+        # Verificar se dispositivo existe no banco (e se houve reset / se há backup)
+        known, has_backup, (is_reset, reason) = await self.run("_device_state", device_id, serial, device_data)
         
-        if not device:
+        if not known:
             # Dispositivo novo - verificar se temos backup pelo serial
-            existing_backup = self.get_active_backup(serial)
-            
-            if existing_backup:
+            if has_backup:
                 # Temos backup! Pode ser reconexão após troca de device_id
                 log.info(f"Dispositivo reconhecido pelo serial: {serial}")
                 result["reset_detected"] = True
@@ -552,8 +595,6 @@ class ConfigBackupService:
                 log.info(f"Novo dispositivo detectado: {serial}")
         else:
             # Dispositivo conhecido - verificar se houve reset
-            is_reset, reason = self.detect_factory_reset(device_data)
-            
             if is_reset:
                 log.warning(f"Reset detectado para {device_id}: {reason}")
                 result["reset_detected"] = True
@@ -567,6 +608,13 @@ class ConfigBackupService:
         
         return result
     
+    def _device_state(self, device_id: str, serial: str, device_data: Dict) -> Tuple[bool, bool, Tuple[bool, str]]:
+        """(dispositivo conhecido, tem backup pelo serial, resultado de detect_factory_reset)."""
+        device = self.db.query(Device).filter(Device.device_id == device_id).first()
+        if not device:
+            return False, self.get_active_backup(serial) is not None, (False, "no_reset")
+        return True, False, self.detect_factory_reset(device_data)
+    
     # ============ Utilitários ============
     
     def list_backups(self, limit: int = 100, only_active: bool = True) -> List[DeviceConfigBackup]:
@@ -0,0 +1,257 @@
+# app/services/device_lookup_service.py
+"""
+Índice local login PPPoE / serial / MAC -> _id do GenieACS.
+
+Buscar um CPE pelo login no NBI exige varrer vários caminhos TR-069 sem
+índice no MongoDB do GenieACS. Aqui o mapeamento fica numa tabela indexada
+(device_lookups), alimentada:
+- pelo coletor, a cada página gravada (update_from_devices)
+- pelas colunas pppoe_login / serial_number / wan_mac de Device, de forma
+  incremental (sync_from_devices lê só o que mudou desde a última vez), na
+  subida da aplicação e a cada ciclo do coletor — nunca numa requisição
+- pelas buscas que precisaram cair no NBI (só o dispositivo encontrado)
+
+Valores são normalizados: login/serial em minúsculas, MAC como aa:bb:cc:dd:ee:ff.
+O índice só aponta candidatos: quem busca confere o documento retornado
+(login e serial com maiúsculas exatas) e descarta a entrada com forget()
+quando ela não confere mais.
+"""
+from __future__ import annotations
+
+import logging
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.database.connection import SessionLocal
+from app.database.models import Device, DeviceLookup
+
+log = logging.getLogger("semppre-bridge.lookup")
+
+# Ordem de preferência quando o mesmo identificador aparece em mais de um tipo
+KINDS: Tuple[str, ...] = ("login", "serial", "mac", "id")
+
+# Intervalo mínimo entre sincronizações incrementais com a tabela devices
+SYNC_INTERVAL_S = 60
+
+# Limite de parâmetros por IN (...) — SQLite antigo aceita no máximo 999
+_IN_CHUNK = 500
+
+_MAC_RE = re.compile(r"^[0-9a-f]{12}$")
+
+
+def normalize_mac(value: Any) -> Optional[str]:
+    """aa:bb:cc:dd:ee:ff a partir de qualquer separador; None se não for MAC."""
+    if not value:
+        return None
+    digits = re.sub(r"[^0-9a-f]", "", str(value).lower())
+    if not _MAC_RE.match(digits):
+        return None
+    return ":".join(digits[i:i + 2] for i in range(0, 12, 2))
+
+
+def normalize(kind: str, value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if kind == "mac":
+        return normalize_mac(value)
+    if kind == "id":
+        text = str(value).strip()
+    else:
+        text = str(value).strip().lower()
+    return text or None
+
+
+def lookup_rows(
+    device_id: str,
+    login: Any = None,
+    serial: Any = None,
+    mac: Any = None,
+) -> List[Dict[str, str]]:
+    """Entradas do índice para um dispositivo (valores vazios são ignorados)."""
+    rows = []
+    for kind, value in (("login", login), ("serial", serial), ("mac", mac), ("id", device_id)):
+        norm = normalize(kind, value)
+        if norm:
+            rows.append({"kind": kind, "value": norm, "device_id": device_id})
+    return rows
+
+
+class DeviceLookupIndex:
+    """Índice login/serial/MAC -> _id sobre a tabela device_lookups."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._synced_until: Optional[datetime] = None
+        self._last_sync = 0.0
+
+    # ============ Escrita ============
+
+    def update(self, db: Session, rows: List[Dict[str, str]], commit: bool = True) -> int:
+        """
+        Insere/atualiza entradas (kind, value) -> device_id.
+        Entradas que já apontam para o mesmo device_id não são regravadas.
+
+        Returns:
+            Quantidade de entradas criadas ou alteradas
+        """
+        by_key = {(r["kind"], r["value"]): r["device_id"] for r in rows if r.get("value") and r.get("device_id")}
+        if not by_key:
+            return 0
+
+        table = DeviceLookup.__table__
+        existing: Dict[Tuple[str, str], str] = {}
+        values = list({value for _, value in by_key})
+        for i in range(0, len(values), _IN_CHUNK):
+            for kind, value, device_id in db.execute(
+                select(table.c.kind, table.c.value, table.c.device_id)
+                .where(table.c.value.in_(values[i:i + _IN_CHUNK]))
+            ):
+                existing[(kind, value)] = device_id
+
+        now = datetime.utcnow()
+        new_rows, changed_rows = [], []
+        for (kind, value), device_id in by_key.items():
+            current = existing.get((kind, value))
+            if current is None:
+                new_rows.append({"kind": kind, "value": value, "device_id": device_id, "updated_at": now})
+            elif current != device_id:
+                changed_rows.append({"b_kind": kind, "b_value": value, "b_device_id": device_id, "b_updated_at": now})
+
+        if new_rows:
+            db.execute(insert(table), new_rows)
+        if changed_rows:
+            db.execute(
+                update(table)
+                .where(table.c.kind == bindparam("b_kind"))
+                .where(table.c.value == bindparam("b_value"))
+                .values(device_id=bindparam("b_device_id"), updated_at=bindparam("b_updated_at")),
+                changed_rows,
+            )
+        if commit:
+            db.commit()
+        return len(new_rows) + len(changed_rows)
+
+    def update_from_devices(self, db: Session, device_rows: Iterable[Dict[str, Any]], commit: bool = True) -> int:
+        """Indexa linhas no formato de Device (device_id, pppoe_login, serial_number, wan_mac)."""
+        rows: List[Dict[str, str]] = []
+        for row in device_rows:
+            device_id = row.get("device_id")
+            if device_id:
+                rows.extend(lookup_rows(device_id, row.get("pppoe_login"), row.get("serial_number"), row.get("wan_mac")))
+        return self.update(db, rows, commit=commit)
+
+    def sync_from_devices(self, db: Session, force: bool = False) -> int:
+        """
+        Traz para o índice os Device alterados desde a última sincronização
+        (updated_at); a primeira chamada do processo lê a tabela inteira.
+        """
+        with self._lock:
+            if not force and time.monotonic() - self._last_sync < SYNC_INTERVAL_S:
+                return 0
+            since = self._synced_until
+            started = datetime.utcnow()
+            self._last_sync = time.monotonic()
+
+        stmt = select(Device.device_id, Device.pppoe_login, Device.serial_number, Device.wan_mac)
+        if since is not None:
+            stmt = stmt.where(Device.updated_at >= since)
+        rows = [
+            {"device_id": d, "pppoe_login": login, "serial_number": serial, "wan_mac": mac}
+            for d, login, serial, mac in db.execute(stmt)
+        ]
+        changed = self.update_from_devices(db, rows)
+        with self._lock:
+            self._synced_until = started
+        if changed:
+            log.info(f"[Lookup] {changed} entradas atualizadas a partir de devices ({len(rows)} dispositivos)")
+        return changed
+
+    def sync(self, force: bool = False) -> int:
+        """sync_from_devices com sessão própria (subida da aplicação, coletor)."""
+        db = SessionLocal()
+        try:
+            return self.sync_from_devices(db, force=force)
+        except Exception as e:
+            db.rollback()
+            log.warning(f"[Lookup] Erro sincronizando com devices: {e}")
+            return 0
+        finally:
+            db.close()
+
+    # ============ Leitura ============
+
+    @staticmethod
+    def _candidates(identifier: str) -> set:
+        return {v for v in (normalize("login", identifier), normalize("id", identifier), normalize_mac(identifier)) if v}
+
+    def resolve(self, db: Session, identifier: str) -> Optional[str]:
+        """_id do dispositivo para um login, serial, MAC ou _id (uma consulta indexada)."""
+        candidates = self._candidates(identifier)
+        if not candidates:
+            return None
+        found = {
+            kind: device_id
+            for kind, device_id in db.execute(
+                select(DeviceLookup.kind, DeviceLookup.device_id).where(DeviceLookup.value.in_(candidates))
+            )
+        }
+        for kind in KINDS:
+            if kind in found:
+                return found[kind]
+        return None
+
+    def resolve_id(self, identifier: str) -> Optional[str]:
+        """resolve() com sessão própria (para asyncio.to_thread)."""
+        db = SessionLocal()
+        try:
+            return self.resolve(db, identifier)
+        finally:
+            db.close()
+
+    def forget(self, identifier: str, device_id: str) -> int:
+        """Remove as entradas de `identifier` que apontam para `device_id` (índice desatualizado)."""
+        table = DeviceLookup.__table__
+        db = SessionLocal()
+        try:
+            removed = db.execute(
+                delete(table).where(table.c.value.in_(self._candidates(identifier)), table.c.device_id == device_id)
+            ).rowcount
+            db.commit()
+            return removed
+        except Exception as e:
+            db.rollback()
+            log.warning(f"[Lookup] Erro removendo {identifier} -> {device_id}: {e}")
+            return 0
+        finally:
+            db.close()
+
+    def index_device(self, device_id: str, login: Any = None, serial: Any = None, mac: Any = None) -> int:
+        """Indexa um dispositivo encontrado fora do índice (ex: busca no NBI)."""
+        db = SessionLocal()
+        try:
+            return self.update(db, lookup_rows(device_id, login, serial, mac))
+        except Exception as e:
+            db.rollback()
+            log.warning(f"[Lookup] Erro indexando {device_id}: {e}")
+            return 0
+        finally:
+            db.close()
+
+
+# Instância singleton para uso direto
+device_lookup = DeviceLookupIndex()
+
+
+__all__ = [
+    "DeviceLookupIndex",
+    "device_lookup",
+    "lookup_rows",
+    "normalize",
+    "normalize_mac",
+]
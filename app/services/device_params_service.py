@@ -6,8 +6,9 @@ Busca todos os parâmetros disponíveis e permite edição via SetParameterValue
 
 from typing import Dict, List, Any, Optional
 from datetime import datetime
-import httpx
 from app.settings import settings
+from app.integrations.genieacs import get_nbi_client, nbi_timeout
+from app.services.device_snapshot_service import fetch_device
 
 
 class DeviceParametersService:
@@ -16,10 +17,19 @@ class DeviceParametersService:
     def __init__(self):
         self.genie_url = settings.GENIE_NBI
         
-    async def get_all_parameters(self, device_id: str) -> Dict[str, Any]:
+    async def get_all_parameters(
+        self,
+        device_id: str,
+        view: Optional[str] = None,
+        max_staleness: Optional[int] = None,
+    ) -> Dict[str, Any]:
         """
         Busca TODOS os parâmetros disponíveis no dispositivo
         
+        Args:
+            view: View de projeção (ex: "wifi"); None busca a árvore completa
+            max_staleness: Segundos; aceita o snapshot local se for recente o bastante
+        
         Returns:
             {
                 "device_id": str,
@@ -35,29 +45,23 @@ class DeviceParametersService:
                 }
             }
         """
-        async with httpx.AsyncClient() as client:
-            # Buscar dispositivo completo do GenieACS
-            res = await client.get(
-                f"{self.genie_url}/devices/",
-                params={"query": f'{{"_id":"{device_id}"}}'})
-            
-            if res.status_code != 200 or not res.json():
-                raise ValueError(f"Dispositivo {device_id} não encontrado")
-            
-            device_data = res.json()[0]
-            
-            # Extrair todos os parâmetros recursivamente
-            parameters = self._extract_parameters(device_data)
-            
-            writable_count = sum(1 for p in parameters.values() if p.get('writable'))
-            
-            return {
-                "device_id": device_id,
-                "total_params": len(parameters),
-                "writable_params": writable_count,
-                "parameters": parameters,
-                "fetched_at": datetime.utcnow().isoformat()
-            }
+        # Buscar dispositivo do GenieACS (completo ou só a view pedida)
+        device_data = await fetch_device(device_id, view, max_staleness)
+        if not device_data:
+            raise ValueError(f"Dispositivo {device_id} não encontrado")
+        
+        # Extrair todos os parâmetros recursivamente
+        parameters = self._extract_parameters(device_data)
+        
+        writable_count = sum(1 for p in parameters.values() if p.get('writable'))
+        
+        return {
+            "device_id": device_id,
+            "total_params": len(parameters),
+            "writable_params": writable_count,
+            "parameters": parameters,
+            "fetched_at": datetime.utcnow().isoformat()
+        }
     
     def _extract_parameters(
         self, 
@@ -122,70 +126,70 @@ class DeviceParametersService:
         import logging
         logger = logging.getLogger(__name__)
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            # Preparar todos os parâmetros em uma única task
-            param_values = []
-            for path, value in parameters.items():
-                param_values.append([path, value, self._infer_type(value)])
-            
-            logger.info(f"[set_parameters] Device: {device_id}")
-            logger.info(f"[set_parameters] Parameters: {param_values}")
+        client = get_nbi_client()
+        # Preparar todos os parâmetros em uma única task
+        param_values = []
+        for path, value in parameters.items():
+            param_values.append([path, value, self._infer_type(value)])
+        
+        logger.info(f"[set_parameters] Device: {device_id}")
+        logger.info(f"[set_parameters] Parameters: {param_values}")
+        
+        # Task única com todos os parâmetros
+        task = {
+            "name": "setParameterValues",
+            "parameterValues": param_values
+        }
+        
+        # Enviar task com connection_request para forçar o dispositivo a conectar
+        url = f"/devices/{device_id}/tasks?connection_request"
+        logger.info(f"[set_parameters] URL: {url}")
+        
+        res = await client.post(
+            url,
+            json=task,
+            timeout=nbi_timeout("task")
+        )
+        
+        logger.info(f"[set_parameters] Response: {res.status_code}")
+        
+        results = [{
+            "status": res.status_code,
+            "task": "setParameterValues",
+            "success": res.status_code in [200, 202],
+            "response": res.text[:500] if res.text else ""
+        }]
+        
+        # Se auto_refresh, adicionar refreshObject após 2 segundos
+        if auto_refresh and res.status_code in [200, 202]:
+            import asyncio
+            await asyncio.sleep(2)
             
-            # Task única com todos os parâmetros
-            task = {
-                "name": "setParameterValues",
-                "parameterValues": param_values
+            refresh_task = {
+                "name": "refreshObject",
+                "objectName": ""
             }
-            
-            # Enviar task com connection_request para forçar o dispositivo a conectar
-            url = f"{self.genie_url}/devices/{device_id}/tasks?connection_request"
-            logger.info(f"[set_parameters] URL: {url}")
-            
-            res = await client.post(
-                url,
-                json=task,
-                timeout=30.0
+            refresh_res = await client.post(
+                f"/devices/{device_id}/tasks?connection_request",
+                json=refresh_task,
+                timeout=nbi_timeout("task")
             )
-            
-            logger.info(f"[set_parameters] Response: {res.status_code}")
-            
-            results = [{
-                "status": res.status_code,
-                "task": "setParameterValues",
-                "success": res.status_code in [200, 202],
-                "response": res.text[:500] if res.text else ""
-            }]
-            
-            # Se auto_refresh, adicionar refreshObject após 2 segundos
-            if auto_refresh and res.status_code in [200, 202]:
-                import asyncio
-                await asyncio.sleep(2)
-                
-                refresh_task = {
-                    "name": "refreshObject",
-                    "objectName": ""
-                }
-                refresh_res = await client.post(
-                    f"{self.genie_url}/devices/{device_id}/tasks?connection_request",
-                    json=refresh_task,
-                    timeout=30.0
-                )
-                results.append({
-                    "status": refresh_res.status_code,
-                    "task": "refreshObject", 
-                    "success": refresh_res.status_code in [200, 202]
-                })
-            
-            success_count = sum(1 for r in results if r['success'])
-            
-            return {
-                "success": success_count == len(results),
-                "tasks_executed": len(results),
-                "tasks_successful": success_count,
-                "results": results,
-                "parameters_sent": param_values,
-                "timestamp": datetime.utcnow().isoformat()
-            }
+            results.append({
+                "status": refresh_res.status_code,
+                "task": "refreshObject", 
+                "success": refresh_res.status_code in [200, 202]
+            })
+        
+        success_count = sum(1 for r in results if r['success'])
+        
+        return {
+            "success": success_count == len(results),
+            "tasks_executed": len(results),
+            "tasks_successful": success_count,
+            "results": results,
+            "parameters_sent": param_values,
+            "timestamp": datetime.utcnow().isoformat()
+        }
     
     def _infer_type(self, value: Any) -> str:
         """Infere o tipo XSD do valor"""
@@ -0,0 +1,220 @@
+# app/services/device_projection.py
+"""
+Projeções do GenieACS NBI por "view".
+
+Em vez de baixar a árvore inteira do dispositivo (em CPEs TR-181 a tabela
+Hosts sozinha pode ter milhares de parâmetros), cada chamador declara o que
+lê — "wifi", "metrics", "mobile"... — e o NBI devolve só esses ramos via
+`projection=`.
+
+As views são montadas a partir dos caminhos lógicos do PARAM_MAP (TR-098 e
+TR-181 expandidos) e/ou das listas de caminhos usadas pelos extratores de
+cada módulo, que registram a própria view com register_view().
+"""
+from __future__ import annotations
+
+import logging
+from functools import lru_cache
+from itertools import product
+from string import Formatter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.services.tr069_normalizer import PARAM_MAP
+
+log = logging.getLogger("semppre-bridge.projection")
+
+# Campos de metadados do GenieACS que todo chamador usa (_id, status, tags)
+BASE_FIELDS: Tuple[str, ...] = ("_id", "_deviceId", "_lastInform", "_registered", "_tags")
+
+# Valores padrão das variáveis dos templates do PARAM_MAP
+# (mesmos rádios lidos por get_wifi_params: 1 = 2.4GHz, 2 = 5GHz)
+DEFAULT_VARS: Dict[str, Sequence[int]] = {
+    "radio": (1, 2),
+    "idx": (1,),
+}
+
+_views: Dict[str, str] = {}
+
+
+def _template_fields(template: str) -> List[str]:
+    return [name for _, name, _, _ in Formatter().parse(template) if name]
+
+
+def expand_logical(
+    logical_path: str,
+    vars: Optional[Dict[str, Sequence[int]]] = None,
+) -> List[str]:
+    """
+    Expande um caminho lógico do PARAM_MAP para os caminhos TR-098 e TR-181,
+    substituindo cada variável por todos os valores informados.
+    Variáveis sem valores projetam o objeto pai (prefixo antes do placeholder).
+    """
+    mapping = PARAM_MAP.get(logical_path)
+    if not mapping:
+        log.warning(f"[Projection] caminho lógico desconhecido: {logical_path}")
+        return []
+
+    values = {**DEFAULT_VARS, **(vars or {})}
+    paths: List[str] = []
+    for template in mapping.values():
+        fields = _template_fields(template)
+        if not fields:
+            paths.append(template)
+            continue
+        missing = [f for f in fields if not values.get(f)]
+        if missing:
+            # Ex: "....PortMapping.{idx}.Protocol" sem idx → "....PortMapping"
+            paths.append(template.split("{" + missing[0] + "}", 1)[0].rstrip("."))
+            continue
+        for combo in product(*(values[f] for f in fields)):
+            paths.append(template.format(**dict(zip(fields, combo))))
+    return paths
+
+
+def build_projection(paths: Iterable[str]) -> str:
+    """
+    Monta o valor de `projection=`: remove duplicados e caminhos já cobertos
+    por um ancestral (projetar "Device.WiFi" já inclui "Device.WiFi.SSID.1").
+    """
+    kept: List[str] = []
+    # Em ordem lexicográfica os descendentes ("A.B") vêm logo após o ancestral ("A")
+    for path in sorted({p.strip() for p in paths if p and p.strip()}):
+        if kept and (path == kept[-1] or path.startswith(kept[-1] + ".")):
+            continue
+        kept.append(path)
+    return ",".join(kept)
+
+
+def register_view(
+    name: str,
+    paths: Iterable[str] = (),
+    logical: Iterable[str] = (),
+    vars: Optional[Dict[str, Sequence[int]]] = None,
+    include: Iterable[str] = (),
+) -> str:
+    """
+    Registra (ou substitui) uma view.
+
+    Args:
+        name: Nome da view (ex: "metrics")
+        paths: Caminhos TR-069 absolutos lidos pelo extrator
+        logical: Caminhos lógicos do PARAM_MAP
+        vars: Valores das variáveis dos caminhos lógicos (ex: {"radio": (1, 2)})
+        include: Outras views já registradas a incorporar
+    """
+    all_paths: List[str] = list(BASE_FIELDS)
+    all_paths.extend(paths)
+    for lp in logical:
+        all_paths.extend(expand_logical(lp, vars))
+    for other in include:
+        all_paths.extend(get_projection(other).split(","))
+
+    projection = build_projection(all_paths)
+    _views[name] = projection
+    view_covers.cache_clear()
+    return projection
+
+
+def get_projection(view: str) -> str:
+    """Retorna a string de projeção de uma view registrada."""
+    try:
+        return _views[view]
+    except KeyError:
+        raise ValueError(f"View de projeção desconhecida: {view}") from None
+
+
+def projection_params(view: Optional[str]) -> Dict[str, str]:
+    """Parâmetros de query para o NBI; view=None mantém o documento completo."""
+    if not view:
+        return {}
+    return {"projection": get_projection(view)}
+
+
+@lru_cache(maxsize=256)
+def view_covers(view: Optional[str], requested: Optional[str]) -> bool:
+    """
+    True se um documento buscado com `view` contém tudo o que `requested` pede.
+    None significa o documento completo; views desconhecidas não cobrem nada.
+    """
+    if view is None:
+        return True
+    if requested is None or view not in _views or requested not in _views:
+        return False
+    have = _views[view].split(",")
+    return all(
+        any(path == h or path.startswith(h + ".") for h in have)
+        for path in _views[requested].split(",")
+    )
+
+
+def list_views() -> Dict[str, int]:
+    """Views registradas e quantidade de caminhos projetados."""
+    return {name: len(p.split(",")) for name, p in _views.items()}
+
+
+def _logical_by_prefix(*prefixes: str) -> List[str]:
+    return [lp for lp in PARAM_MAP if lp.startswith(prefixes)]
+
+
+# ---------------------- Views baseadas no PARAM_MAP ----------------------
+register_view(
+    "identity",
+    logical=[lp for lp in _logical_by_prefix("device.") if lp != "device.reboot"] + ["wan.ppp.username"],
+)
+register_view("wifi", logical=_logical_by_prefix("wifi."), include=("identity",))
+register_view("wan", logical=_logical_by_prefix("wan."), include=("identity",))
+register_view("lan", logical=_logical_by_prefix("lan."), include=("identity",))
+register_view(
+    "normalized",
+    paths=("InternetGatewayDevice.LANDevice.1.Hosts.Host", "Device.Hosts.Host"),
+    include=("wifi", "wan", "lan"),
+)
+
+# Parâmetros lidos pelo app mobile (extract_device_info / detect_device_paths)
+register_view(
+    "mobile",
+    paths=(
+        'InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANIPConnection.1.ExternalIPAddress',
+        'InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.1.ExternalIPAddress',
+        'Device.IP.Interface.1.IPv4Address.1.IPAddress',
+        # Login PPPoE, serial e MAC WAN (conferência das buscas pelo índice local)
+        'InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.1.Username',
+        'InternetGatewayDevice.WANDevice.1.WANConnectionDevice.2.WANPPPConnection.1.Username',
+        'Device.PPP.Interface.1.Username',
+        'Device.PPP.Interface.2.Username',
+        'Device.PPP.Interface.3.Username',
+        'InternetGatewayDevice.DeviceInfo.SerialNumber',
+        'Device.DeviceInfo.SerialNumber',
+        'InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.1.MACAddress',
+        'InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANIPConnection.1.MACAddress',
+        'Device.Ethernet.Link.1.MACAddress',
+        # Temperatura e sinal óptico
+        'Device.X_ZYXEL_GPON.ONU',
+        'Device.X_ZYXEL_GPON.Xpon.phyStatus',
+        'Device.DeviceInfo.TemperatureStatus.TemperatureSensor.1.Value',
+        'Device.DeviceInfo.X_TP_Temperature',
+        'InternetGatewayDevice.DeviceInfo.X_TP_Temperature',
+        'Device.Optical.Interface.1',
+        'InternetGatewayDevice.WANDevice.1.X_GponInterfaceConfig',
+        'InternetGatewayDevice.WANDevice.1.WANDSLInterfaceConfig.X_BROADCOM_COM_RXPower',
+        # WiFi TR-181 (índices detectados via OperatingFrequencyBand/LowerLayers)
+        *(f'Device.WiFi.Radio.{i}.{f}' for i in range(1, 5) for f in ('OperatingFrequencyBand', 'Channel')),
+        *(f'Device.WiFi.SSID.{i}.{f}' for i in range(1, 9) for f in ('SSID', 'Enable', 'LowerLayers')),
+        *(f'Device.WiFi.AccessPoint.{i}.SSIDAdvertisementEnabled' for i in range(1, 9)),
+        # WiFi TR-098 (5GHz pode estar em .2, .3, .4 ou .5)
+        *(f'InternetGatewayDevice.LANDevice.1.WLANConfiguration.{i}.{f}'
+          for i in range(1, 6) for f in ('SSID', 'Enable', 'Channel', 'SSIDAdvertisementEnabled')),
+    ),
+    include=("identity",),
+)
+
+__all__ = [
+    "BASE_FIELDS",
+    "build_projection",
+    "expand_logical",
+    "get_projection",
+    "list_views",
+    "projection_params",
+    "register_view",
+    "view_covers",
+]
@@ -0,0 +1,341 @@
+# app/services/device_snapshot_service.py
+"""
+Snapshots locais dos documentos de dispositivo do GenieACS.
+
+A cada ciclo o coletor grava o último documento visto de cada CPE (JSON
+compactado com zlib, versionado pelo hash do conteúdo). Rotas de leitura
+podem responder a partir do snapshot quando o chamador aceita dados com
+até `max_staleness` segundos, sem ir ao NBI:
+
+    device = await fetch_device(device_id, view="mobile", max_staleness=300)
+
+O snapshot cobre as views identity/wifi/wan/lan/mobile/normalized; leituras
+da árvore completa (view=None) ou de outras views sempre vão ao NBI.
+Os documentos mais lidos ficam num LRU em memória; o banco só é consultado
+quando o LRU não tem o dispositivo ou a entrada é antiga demais. Quem lê
+recebe uma cópia: alterar o documento não afeta o LRU.
+A idade é medida a partir de quando o documento foi obtido do GenieACS
+(fetched_at), não do _lastInform.
+"""
+from __future__ import annotations
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.database.connection import ReadSessionLocal
+from app.database.models import DeviceSnapshot
+from app.integrations.genieacs import get_nbi_client
+from app.services.device_projection import projection_params, register_view, view_covers
+from app.settings import settings
+
+log = logging.getLogger("semppre-bridge.snapshots")
+
+# View gravada pelo coletor: cobre as leituras de identity/wifi/wan/lan/mobile
+# e a normalizada (wifi/wan/lan + tabela de hosts). A árvore completa não é guardada.
+SNAPSHOT_VIEW = "snapshot"
+register_view(SNAPSHOT_VIEW, include=("identity", "wifi", "wan", "lan", "mobile", "normalized"))
+
+# Limite de parâmetros por IN (...) — SQLite antigo aceita no máximo 999
+_IN_CHUNK = 500
+
+
+def _parse_inform(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+def snapshot_row(
+    device: Dict[str, Any],
+    view: Optional[str] = SNAPSHOT_VIEW,
+    fetched_at: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """Linha de DeviceSnapshot para um documento (serializa, compacta e calcula o hash)."""
+    raw = json.dumps(device, separators=(",", ":"), default=str).encode("utf-8")
+    return {
+        "device_id": device["_id"],
+        "last_inform": _parse_inform(device.get("_lastInform")),
+        "view": view,
+        "data": zlib.compress(raw, settings.DEVICE_SNAPSHOT_COMPRESS_LEVEL),
+        "content_hash": hashlib.sha1(raw).hexdigest(),
+        "raw_size": len(raw),
+        "fetched_at": fetched_at or datetime.utcnow(),
+    }
+
+
+@dataclass
+class Snapshot:
+    """Documento de dispositivo guardado localmente."""
+    device_id: str
+    document: Dict[str, Any]
+    view: Optional[str]
+    version: Optional[int]  # None: só em memória (lido do NBI por uma rota)
+    last_inform: Optional[datetime]
+    fetched_at: datetime
+
+    @property
+    def age_s(self) -> float:
+        return (datetime.utcnow() - self.fetched_at).total_seconds()
+
+    def usable(self, view: Optional[str], max_staleness: Optional[float]) -> bool:
+        if max_staleness is not None and self.age_s > max_staleness:
+            return False
+        return view_covers(self.view, view)
+
+
+class DeviceSnapshotStore:
+    """Snapshots no banco (device_snapshots) + LRU em memória dos mais lidos."""
+
+    def __init__(self, lru_size: int):
+        self.lru_size = lru_size
+        self._lru: "OrderedDict[str, Snapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"lru_hits": 0, "db_hits": 0, "misses": 0, "saved": 0}
+
+    # ============ LRU ============
+
+    @staticmethod
+    def _detached(snap: Snapshot) -> Snapshot:
+        """Cópia com documento próprio (o do LRU é compartilhado entre leitores)."""
+        return replace(snap, document=copy.deepcopy(snap.document))
+
+    def _recall(self, device_id: str) -> Optional[Snapshot]:
+        with self._lock:
+            snap = self._lru.get(device_id)
+            if snap is None:
+                return None
+            self._lru.move_to_end(device_id)
+        return self._detached(snap)
+
+    def _remember(self, snap: Snapshot) -> None:
+        if self.lru_size <= 0:
+            return
+        with self._lock:
+            self._lru[snap.device_id] = snap
+            self._lru.move_to_end(snap.device_id)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def forget(self, device_ids: Iterable[str]) -> None:
+        with self._lock:
+            for device_id in device_ids:
+                self._lru.pop(device_id, None)
+
+    def remember(self, device: Dict[str, Any], view: Optional[str]) -> None:
+        """Guarda no LRU um documento recém-lido do NBI (não grava no banco)."""
+        device_id = device.get("_id")
+        if not device_id:
+            return
+        self._remember(Snapshot(
+            device_id=device_id,
+            document=copy.deepcopy(device),
+            view=view,
+            version=None,
+            last_inform=_parse_inform(device.get("_lastInform")),
+            fetched_at=datetime.utcnow(),
+        ))
+
+    # ============ Escrita (coletor) ============
+
+    def save_rows(self, db: Session, rows: List[Dict[str, Any]], commit: bool = True) -> int:
+        """
+        Grava várias linhas de snapshot_row() (uma página do coletor).
+
+        Conteúdo igual ao gravado (mesmo hash) só renova fetched_at; conteúdo
+        novo substitui o blob e incrementa version.
+
+        Returns:
+            Quantidade de snapshots criados ou alterados
+        """
+        by_id = {r["device_id"]: r for r in rows if r.get("device_id")}
+        if not by_id:
+            return 0
+
+        table = DeviceSnapshot.__table__
+        ids = list(by_id)
+        existing: Dict[str, str] = {}
+        for i in range(0, len(ids), _IN_CHUNK):
+            for device_id, content_hash in db.execute(
+                select(table.c.device_id, table.c.content_hash).where(table.c.device_id.in_(ids[i:i + _IN_CHUNK]))
+            ):
+                existing[device_id] = content_hash
+
+        now = datetime.utcnow()
+        new_rows, changed_rows, touched_rows = [], [], []
+        for device_id, row in by_id.items():
+            if device_id not in existing:
+                new_rows.append({**row, "version": 1, "created_at": now})
+            elif existing[device_id] != row["content_hash"]:
+                changed_rows.append({f"b_{k}": v for k, v in row.items()})
+            else:
+                touched_rows.append({
+                    "b_device_id": device_id,
+                    "b_fetched_at": row["fetched_at"],
+                    "b_view": row["view"],
+                })
+
+        if new_rows:
+            db.execute(insert(table), new_rows)
+        if changed_rows:
+            db.execute(
+                update(table)
+                .where(table.c.device_id == bindparam("b_device_id"))
+                .values({
+                    **{c: bindparam(f"b_{c}") for c in ("last_inform", "view", "data", "content_hash", "raw_size", "fetched_at")},
+                    "version": table.c.version + 1,
+                }),
+                changed_rows,
+            )
+        if touched_rows:
+            db.execute(
+                update(table)
+                .where(table.c.device_id == bindparam("b_device_id"))
+                .values(fetched_at=bindparam("b_fetched_at"), view=bindparam("b_view")),
+                touched_rows,
+            )
+        if commit:
+            db.commit()
+
+        # Entradas do LRU desses dispositivos ficaram para trás
+        self.forget(ids)
+        saved = len(new_rows) + len(changed_rows)
+        self._stats["saved"] += saved
+        return saved
+
+    def save_documents(
+        self,
+        db: Session,
+        devices: Iterable[Dict[str, Any]],
+        view: Optional[str] = SNAPSHOT_VIEW,
+        commit: bool = True,
+    ) -> int:
+        """Atalho: snapshot_row() de cada documento + save_rows()."""
+        fetched_at = datetime.utcnow()
+        rows = [snapshot_row(d, view, fetched_at) for d in devices if d.get("_id")]
+        return self.save_rows(db, rows, commit=commit)
+
+    # ============ Leitura ============
+
+    def _load(self, device_id: str) -> Optional[Snapshot]:
+        table = DeviceSnapshot.__table__
+        db = ReadSessionLocal()
+        try:
+            row = db.execute(select(table).where(table.c.device_id == device_id)).first()
+        finally:
+            db.close()
+        if row is None:
+            return None
+        snap = Snapshot(
+            device_id=row.device_id,
+            document=json.loads(zlib.decompress(row.data)),
+            view=row.view,
+            version=row.version,
+            last_inform=row.last_inform,
+            fetched_at=row.fetched_at,
+        )
+        self._remember(self._detached(snap))
+        return snap
+
+    def _get_from_db(self, device_id: str, view: Optional[str], max_staleness: Optional[float]) -> Optional[Snapshot]:
+        try:
+            snap = self._load(device_id)
+        except Exception as e:
+            log.warning(f"[Snapshots] Erro lendo snapshot de {device_id}: {e}")
+            snap = None
+        if snap is None or not snap.usable(view, max_staleness):
+            self._stats["misses"] += 1
+            return None
+        self._stats["db_hits"] += 1
+        return snap
+
+    def get(
+        self,
+        device_id: str,
+        view: Optional[str] = None,
+        max_staleness: Optional[float] = None,
+    ) -> Optional[Snapshot]:
+        """
+        Snapshot do dispositivo se cobrir `view` e tiver no máximo
+        `max_staleness` segundos; senão None. Consulta o LRU e depois o banco.
+        """
+        snap = self._recall(device_id)
+        if snap is not None and snap.usable(view, max_staleness):
+            self._stats["lru_hits"] += 1
+            return snap
+        return self._get_from_db(device_id, view, max_staleness)
+
+    async def aget(
+        self,
+        device_id: str,
+        view: Optional[str] = None,
+        max_staleness: Optional[float] = None,
+    ) -> Optional[Snapshot]:
+        """Como get(), mas a leitura do banco roda fora do event loop."""
+        snap = self._recall(device_id)
+        if snap is not None and snap.usable(view, max_staleness):
+            self._stats["lru_hits"] += 1
+            return snap
+        return await asyncio.to_thread(self._get_from_db, device_id, view, max_staleness)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"lru_size": len(self._lru), "lru_max": self.lru_size, **self._stats}
+
+
+# Instância singleton para uso direto
+snapshot_store = DeviceSnapshotStore(settings.DEVICE_SNAPSHOT_LRU_SIZE)
+
+
+async def fetch_device(
+    device_id: str,
+    view: Optional[str] = None,
+    max_staleness: Optional[float] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Documento de um dispositivo.
+
+    Com max_staleness (segundos) responde do snapshot local se houver um
+    recente o bastante que cubra a view; senão busca no NBI (só a view pedida;
+    view=None traz a árvore completa). Retorna None se o dispositivo não existe.
+    Erros de comunicação com o NBI (httpx.HTTPError) são propagados.
+    """
+    if max_staleness is not None:
+        snap = await snapshot_store.aget(device_id, view, max_staleness)
+        if snap is not None:
+            return snap.document
+
+    resp = await get_nbi_client().get(
+        "/devices/",
+        params={"query": json.dumps({"_id": device_id}), **projection_params(view)},
+    )
+    if resp.status_code != 200:
+        return None
+    devices = resp.json()
+    if not devices:
+        return None
+    snapshot_store.remember(devices[0], view)
+    return devices[0]
+
+
+__all__ = [
+    "SNAPSHOT_VIEW",
+    "DeviceSnapshotStore",
+    "Snapshot",
+    "fetch_device",
+    "snapshot_row",
+    "snapshot_store",
+]
@@ -0,0 +1,236 @@
+# app/services/feeds_summary_service.py
+"""
+Resumo de feeds (GET /feeds/summary) com contadores em cache.
+
+O cálculo é uma consulta de agregação condicional por tabela
+(COUNT + SUM(CASE ...)): três consultas no total, em vez de uma por contador.
+
+O resultado de cada janela (hours) fica em memória por FEEDS_SUMMARY_TTL
+segundos. Enquanto isso, inserts de AlertEvent/TaskHistory/DeviceMetric e
+mudanças de status de alertas e tarefas feitos por este processo (qualquer
+Session do ORM) ajustam os contadores em cache no commit, então o dashboard
+vê um alerta novo sem esperar o TTL. O TTL cobre o que não passa por aqui:
+linhas que saem da janela com o tempo, dispositivos ativos (contagem
+distinta), inserts em lote via Core e escritas de outros processos (coletor).
+"""
+from __future__ import annotations
+
+import asyncio
+import copy
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, event, func, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.database.models import AlertEvent, DeviceMetric, TaskHistory
+from app.settings import settings
+
+log = logging.getLogger("semppre-bridge.feeds-summary")
+
+ALERT_SEVERITIES = ("critical", "error", "warning")
+TASK_STATUSES = ("pending", "success", "failed")
+
+# Janelas (hours) distintas mantidas em cache
+_MAX_ENTRIES = 16
+
+# (seção, created_at, {contador: delta})
+Delta = Tuple[str, Optional[datetime], Dict[str, int]]
+
+
+def _flag(condition) -> Any:
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+async def compute_summary(db: AsyncSession, hours: int) -> Dict[str, Any]:
+    """Contadores da janela de `hours` horas: uma consulta por tabela."""
+    cutoff = datetime.utcnow() - timedelta(hours=hours)
+
+    alerts = (await db.execute(
+        select(
+            func.count(),
+            *(_flag(AlertEvent.severity == s) for s in ALERT_SEVERITIES),
+            _flag(AlertEvent.status == "active"),
+        ).where(AlertEvent.created_at >= cutoff)
+    )).one()
+
+    tasks = (await db.execute(
+        select(
+            func.count(),
+            *(_flag(TaskHistory.status == s) for s in TASK_STATUSES),
+        ).where(TaskHistory.created_at >= cutoff)
+    )).one()
+
+    metrics = (await db.execute(
+        select(func.count(), func.count(func.distinct(DeviceMetric.device_id)))
+        .where(DeviceMetric.collected_at >= cutoff)
+    )).one()
+
+    return {
+        "success": True,
+        "period_hours": hours,
+        "alerts": {
+            "total": alerts[0],
+            **{s: int(v) for s, v in zip(ALERT_SEVERITIES, alerts[1:4])},
+            "active": int(alerts[4]),
+        },
+        "tasks": {
+            "total": tasks[0],
+            **{s: int(v) for s, v in zip(TASK_STATUSES, tasks[1:])},
+        },
+        "metrics": {
+            "total": metrics[0],
+            "devices_active": metrics[1],
+        },
+    }
+
+
+class FeedsSummaryCache:
+    """Resumos por janela com TTL, ajustados incrementalmente pelos commits."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        # hours -> (instante do cálculo (monotonic), início da janela, resumo)
+        self._entries: Dict[int, Tuple[float, datetime, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._refresh_lock: Optional[asyncio.Lock] = None
+
+    def get(self, hours: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(hours)
+            if not entry or time.monotonic() - entry[0] > self.ttl:
+                return None
+            return copy.deepcopy(entry[2])
+
+    def put(self, hours: int, summary: Dict[str, Any]) -> None:
+        cutoff = datetime.utcnow() - timedelta(hours=hours)
+        with self._lock:
+            self._entries[hours] = (time.monotonic(), cutoff, copy.deepcopy(summary))
+            while len(self._entries) > _MAX_ENTRIES:
+                self._entries.pop(next(iter(self._entries)))
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def apply(self, deltas: List[Delta]) -> None:
+        """Soma os deltas nos resumos em cache cujas janelas contêm a linha."""
+        with self._lock:
+            for _, cutoff, summary in self._entries.values():
+                for section, created_at, changes in deltas:
+                    if created_at is not None and created_at < cutoff:
+                        continue
+                    counters = summary[section]
+                    for key, delta in changes.items():
+                        counters[key] = max(0, counters.get(key, 0) + delta)
+
+    async def summary(self, db: AsyncSession, hours: int) -> Dict[str, Any]:
+        """Resumo da janela: do cache, ou calculado (uma requisição por vez)."""
+        cached = self.get(hours)
+        if cached is not None:
+            return cached
+        if self._refresh_lock is None:
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            # Outra requisição pode ter recalculado enquanto esta esperava
+            cached = self.get(hours)
+            if cached is not None:
+                return cached
+            result = await compute_summary(db, hours)
+            self.put(hours, result)
+            return result
+
+
+# Instância singleton para uso direto
+feeds_summary_cache = FeedsSummaryCache(ttl=settings.FEEDS_SUMMARY_TTL)
+
+
+# ============ Ajuste incremental (eventos de Session) ============
+# Os deltas de cada flush ficam em session.info e só são aplicados no commit;
+# rollback os descarta.
+
+_INFO_KEY = "feeds_summary_deltas"
+
+
+def _status_change(obj: Any) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    history = inspect(obj).attrs.status.history
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return old, new
+
+
+def _alert_insert(alert: AlertEvent) -> Delta:
+    changes = {"total": 1}
+    if alert.severity in ALERT_SEVERITIES:
+        changes[alert.severity] = 1
+    if (alert.status or "active") == "active":
+        changes["active"] = 1
+    return "alerts", alert.created_at, changes
+
+
+def _task_insert(task: TaskHistory) -> Delta:
+    changes = {"total": 1}
+    status = task.status or "pending"
+    if status in TASK_STATUSES:
+        changes[status] = 1
+    return "tasks", task.created_at, changes
+
+
+def _collect(session: Session) -> List[Delta]:
+    deltas: List[Delta] = []
+    for obj in session.new:
+        if isinstance(obj, AlertEvent):
+            deltas.append(_alert_insert(obj))
+        elif isinstance(obj, TaskHistory):
+            deltas.append(_task_insert(obj))
+        elif isinstance(obj, DeviceMetric):
+            deltas.append(("metrics", obj.collected_at, {"total": 1}))
+    for obj in session.dirty:
+        if isinstance(obj, AlertEvent):
+            change = _status_change(obj)
+            if change:
+                old, new = change
+                delta = (new == "active") - (old == "active")
+                if delta:
+                    deltas.append(("alerts", obj.created_at, {"active": delta}))
+        elif isinstance(obj, TaskHistory):
+            change = _status_change(obj)
+            if change:
+                old, new = change
+                changes = {}
+                if old in TASK_STATUSES:
+                    changes[old] = -1
+                if new in TASK_STATUSES:
+                    changes[new] = changes.get(new, 0) + 1
+                if changes:
+                    deltas.append(("tasks", obj.created_at, changes))
+    return deltas
+
+
+@event.listens_for(Session, "before_flush")
+def _on_before_flush(session: Session, flush_context, instances) -> None:
+    # Em before_flush new/dirty e o histórico dos atributos ainda refletem a mudança
+    deltas = _collect(session)
+    if deltas:
+        session.info.setdefault(_INFO_KEY, []).extend(deltas)
+
+
+@event.listens_for(Session, "after_commit")
+def _on_after_commit(session: Session) -> None:
+    deltas = session.info.pop(_INFO_KEY, None)
+    if deltas:
+        feeds_summary_cache.apply(deltas)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _on_after_rollback(session: Session, previous_transaction) -> None:
+    session.info.pop(_INFO_KEY, None)
+
+
+__all__ = ["FeedsSummaryCache", "compute_summary", "feeds_summary_cache"]
@@ -0,0 +1,681 @@
+# app/services/health_scoring.py
+"""
+Pontuação de saúde da frota em lote.
+
+Em vez de MLService.detect_anomalies / predict_failure_risk por dispositivo
+(duas consultas cada), uma rodada:
+1. lê a janela de risco (RISK_DAYS) de todos os dispositivos-alvo numa
+   consulta, ordenada por (device_id, collected_at), só com as colunas usadas
+2. monta arrays NumPy colunares (None -> NaN) e delimita cada dispositivo
+   pelos pontos em que device_id muda
+3. calcula com operações vetorizadas por grupo (bincount / reduceat):
+   - saúde (últimas HEALTH_HOURS): os mesmos limiares e pesos de
+     MLService.detect_anomalies (último valor, Z-Score da latência)
+   - risco: os mesmos fatores de MLService.predict_failure_risk (tendência
+     de latência e perda, reboots, lacunas > 30 min)
+4. grava uma linha por dispositivo em device_health (upsert)
+
+A janela de risco fica dentro de METRICS_HOT_DAYS, então só device_metrics é
+lida (meses arquivados não entram).
+
+device_health é o snapshot lido pelos dashboards (worst_devices,
+health_overview). Ele é mantido incrementalmente: refresh_stale_health
+repontua só os dispositivos com amostras mais novas que o seu
+last_sample_at (e os que saíram da janela de saúde), e o pipeline de
+análise do ingest repontua os dispositivos dos lotes que processou.
+
+Os limiares vêm de DEFAULT_THRESHOLDS com os ajustes de POST /ml/thresholds,
+gravados em system_config (load_thresholds / save_thresholds) para valerem
+também no coletor e no pipeline.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from sqlalchemy import and_, bindparam, case, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.database.models import Device, DeviceHealth, DeviceMetric, SystemConfig
+from app.settings import settings
+
+log = logging.getLogger("semppre-bridge.health")
+
+HEALTH_HOURS = 6
+RISK_DAYS = 7
+
+# Limiares padrão (MLService.thresholds parte destes valores)
+DEFAULT_THRESHOLDS: Dict[str, float] = {
+    "latency_warning": 50,      # ms
+    "latency_critical": 100,    # ms
+    "packet_loss_warning": 1,   # %
+    "packet_loss_critical": 5,  # %
+    "cpu_warning": 80,          # %
+    "cpu_critical": 95,         # %
+    "memory_warning": 85,       # %
+    "memory_critical": 95,      # %
+    "wifi_clients_warning": 20, # clientes
+    "anomaly_zscore": 2.5,      # desvios padrão
+    "offline_minutes": 15,      # minutos sem inform
+}
+_THRESHOLDS_KEY = "ml_thresholds"
+
+_COLUMNS = (
+    "ping_latency_ms",
+    "ping_packet_loss",
+    "cpu_usage",
+    "memory_usage",
+    "wifi_clients_24ghz",
+    "wifi_clients_5ghz",
+    "uptime_seconds",
+)
+_VALUE_COLUMNS = (
+    "manufacturer",
+    "health_score",
+    "anomaly_count",
+    "anomalies",
+    "risk_score",
+    "risk_level",
+    "trend",
+    "samples",
+    "last_sample_at",
+    "computed_at",
+)
+
+# Limite de parâmetros por IN (...) — SQLite antigo aceita no máximo 999
+_IN_CHUNK = 500
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Faixas de health_score (limite inferior de cada uma)
+HEALTH_BANDS = (("excellent", 90), ("good", 70), ("fair", 50), ("poor", 25), ("critical", 0))
+
+
+# ============ Limiares ============
+
+def load_thresholds(db: Session) -> Dict[str, float]:
+    """DEFAULT_THRESHOLDS com os ajustes gravados em system_config."""
+    value = db.scalar(select(SystemConfig.value).where(SystemConfig.key == _THRESHOLDS_KEY))
+    stored = json.loads(value) if value else {}
+    return {**DEFAULT_THRESHOLDS, **{k: float(v) for k, v in stored.items() if k in DEFAULT_THRESHOLDS}}
+
+
+def save_thresholds(db: Session, values: Dict[str, float], commit: bool = True) -> Dict[str, float]:
+    """
+    Grava ajustes de limiares (chaves fora de DEFAULT_THRESHOLDS são ignoradas).
+
+    Returns:
+        Os limiares em vigor depois da gravação
+    """
+    current = load_thresholds(db)
+    current.update({k: float(v) for k, v in values.items() if k in DEFAULT_THRESHOLDS})
+    rec = db.query(SystemConfig).filter(SystemConfig.key == _THRESHOLDS_KEY).first()
+    if rec is None:
+        rec = SystemConfig(
+            key=_THRESHOLDS_KEY,
+            value_type="json",
+            description="Limiares de anomalia/saúde (POST /ml/thresholds)",
+        )
+        db.add(rec)
+    rec.value = json.dumps({k: v for k, v in current.items() if v != DEFAULT_THRESHOLDS[k]})
+    if commit:
+        db.commit()
+    return current
+
+
+def _epoch_us(value: datetime) -> int:
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+# ============ Leitura ============
+
+class MetricWindow:
+    """Amostras colunares ordenadas por (device, t), delimitadas por dispositivo."""
+
+    def __init__(self, device: np.ndarray, t: np.ndarray, cols: Dict[str, np.ndarray]):
+        self.device = device
+        self.t = t  # epoch em µs (int64)
+        self.cols = cols
+        n = device.size
+        if n:
+            self.starts = np.flatnonzero(np.r_[True, device[1:] != device[:-1]])
+        else:
+            self.starts = np.zeros(0, dtype=np.int64)
+        self.counts = np.diff(np.r_[self.starts, n]).astype(np.int64)
+        self.gid = np.repeat(np.arange(self.starts.size), self.counts)
+        self.pks = device[self.starts] if n else np.zeros(0, dtype=np.int64)
+
+    @property
+    def groups(self) -> int:
+        return self.starts.size
+
+    def subset(self, mask: np.ndarray) -> "MetricWindow":
+        return MetricWindow(self.device[mask], self.t[mask], {k: v[mask] for k, v in self.cols.items()})
+
+
+def load_window(
+    db: Session,
+    since: datetime,
+    until: datetime,
+    device_pks: Optional[Sequence[int]] = None,
+) -> MetricWindow:
+    """Amostras de [since, until) dos dispositivos (todos se device_pks=None)."""
+    c = DeviceMetric.__table__.c
+    base = (
+        select(c.device_id, c.collected_at, *(c[name] for name in _COLUMNS))
+        .where(c.collected_at >= since, c.collected_at < until)
+        .order_by(c.device_id, c.collected_at)
+    )
+    if device_pks is None:
+        rows = db.execute(base).all()
+    else:
+        pks = sorted(set(device_pks))
+        rows = []
+        for i in range(0, len(pks), _IN_CHUNK):
+            rows.extend(db.execute(base.where(c.device_id.in_(pks[i:i + _IN_CHUNK]))).all())
+
+    if not rows:
+        empty = np.zeros(0)
+        return MetricWindow(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), {name: empty for name in _COLUMNS})
+
+    columns = list(zip(*rows))
+    device = np.array(columns[0], dtype=np.int64)
+    t = np.array(columns[1], dtype="datetime64[us]").astype(np.int64)
+    cols = {name: np.array(values, dtype=float) for name, values in zip(_COLUMNS, columns[2:])}
+    return MetricWindow(device, t, cols)
+
+
+# ============ Operações por grupo ============
+
+def _count(w: MetricWindow, valid: np.ndarray) -> np.ndarray:
+    return np.bincount(w.gid, weights=valid, minlength=w.groups).astype(np.int64)
+
+
+def _last(w: MetricWindow, x: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """Último valor válido de cada grupo (NaN se nenhum)."""
+    idx = np.where(valid, np.arange(x.size), -1)
+    last = np.maximum.reduceat(idx, w.starts)
+    return np.where(last >= 0, x[np.maximum(last, 0)], np.nan)
+
+
+def _mean_std(w: MetricWindow, x: np.ndarray, valid: np.ndarray, cnt: np.ndarray):
+    """Média e desvio populacional (como np.std) dos válidos, em duas passadas."""
+    safe = np.maximum(cnt, 1)
+    mean = np.bincount(w.gid, weights=np.where(valid, x, 0.0), minlength=w.groups) / safe
+    dev = np.where(valid, x - mean[w.gid], 0.0)
+    std = np.sqrt(np.bincount(w.gid, weights=dev * dev, minlength=w.groups) / safe)
+    return mean, std
+
+
+def _trend(w: MetricWindow, x: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    """
+    MLService.detect_trend por grupo: média da 2ª metade dos válidos contra a
+    da 1ª; "increasing"/"decreasing" acima de ±15%. Retorna +1, -1 ou 0.
+    """
+    cnt = _count(w, valid)
+    if not x.size:
+        return np.zeros(w.groups, dtype=np.int8)
+    before = np.cumsum(valid) - valid  # válidos antes de cada linha
+    rank = before - before[w.starts][w.gid]  # posição entre os válidos do grupo
+    half = cnt // 2
+    first = valid & (rank < half[w.gid])
+    second = valid & ~first
+    first_mean = np.bincount(w.gid, weights=np.where(first, x, 0.0), minlength=w.groups) / np.maximum(half, 1)
+    second_mean = np.bincount(w.gid, weights=np.where(second, x, 0.0), minlength=w.groups) / np.maximum(cnt - half, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        diff_pct = np.where(first_mean != 0, (second_mean - first_mean) / first_mean * 100, 0.0)
+    out = np.where(diff_pct > 15, 1, np.where(diff_pct < -15, -1, 0)).astype(np.int8)
+    out[cnt < 3] = 0
+    return out
+
+
+def _pairs(w: MetricWindow, keep: np.ndarray, hit: np.ndarray) -> np.ndarray:
+    """
+    Pares consecutivos de linhas `keep` do mesmo grupo com hit verdadeiro
+    (hit[i] compara a i-ésima linha mantida com a seguinte), por grupo.
+    """
+    gid = w.gid[keep]
+    same = gid[1:] == gid[:-1]
+    return np.bincount(gid[1:], weights=same & hit, minlength=w.groups).astype(np.int64)
+
+
+# ============ Pontuação ============
+
+def _health(w: MetricWindow, th: Dict[str, float]) -> Dict[int, Dict[str, Any]]:
+    """Saúde por dispositivo (MLService.detect_anomalies, janela já recortada)."""
+    if not w.groups:
+        return {}
+    lat = w.cols["ping_latency_ms"]
+    lat_ok = ~np.isnan(lat) & (lat != 0)
+    lat_n = _count(w, lat_ok)
+    lat_last = _last(w, lat, lat_ok)
+    lat_mean, lat_std = _mean_std(w, lat, lat_ok, lat_n)
+
+    last = {}
+    for name in ("ping_packet_loss", "cpu_usage", "memory_usage"):
+        x = w.cols[name]
+        last[name] = _last(w, x, ~np.isnan(x))
+    end = w.starts + w.counts - 1
+    clients = np.nan_to_num(w.cols["wifi_clients_24ghz"][end]) + np.nan_to_num(w.cols["wifi_clients_5ghz"][end])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        zscore = np.where(lat_std > 0, (lat_last - lat_mean) / lat_std, 0.0)
+
+    # (métrica, valores, chave do limiar, rótulo crítico, rótulo alerta, unidade)
+    checks = (
+        ("ping_latency_ms", lat_last, "latency", "Latência crítica", "Latência elevada", "ms"),
+        ("ping_packet_loss", last["ping_packet_loss"], "packet_loss", "Perda de pacotes crítica", "Perda de pacotes elevada", "%"),
+        ("cpu_usage", last["cpu_usage"], "cpu", "CPU crítica", "CPU elevada", "%"),
+        ("memory_usage", last["memory_usage"], "memory", "Memória crítica", "Memória elevada", "%"),
+    )
+    flags = []
+    for metric, values, key, crit_label, warn_label, unit in checks:
+        crit = values > th[f"{key}_critical"]
+        warn = ~crit & (values > th[f"{key}_warning"])
+        flags.append((metric, values, key, crit_label, warn_label, unit, crit, warn))
+    spike = (lat_std > 0) & (np.abs(zscore) > th["anomaly_zscore"]) & (lat_n > 0)
+    busy = clients > th["wifi_clients_warning"]
+
+    crit_total = sum(f[6].astype(np.int64) for f in flags)
+    warn_total = sum(f[7].astype(np.int64) for f in flags) + spike + busy
+    score = np.maximum(0, 100 - 25 * crit_total - 10 * warn_total)
+    flagged = (crit_total + warn_total) > 0
+    enough = w.counts >= 5
+
+    result: Dict[int, Dict[str, Any]] = {}
+    for g in range(w.groups):
+        if not enough[g]:
+            result[int(w.pks[g])] = {"health_score": None, "anomalies": [], "samples": int(w.counts[g])}
+            continue
+        anomalies: List[Dict[str, Any]] = []
+        if flagged[g]:
+            # Lista legível só para quem tem anomalia (minoria da frota)
+            for metric, values, key, crit_label, warn_label, unit, crit, warn in flags:
+                v = float(values[g])
+                if crit[g]:
+                    anomalies.append({"metric": metric, "value": v, "threshold": th[f"{key}_critical"],
+                                      "severity": "critical", "message": f"{crit_label}: {v:.1f}{unit}"})
+                elif warn[g]:
+                    anomalies.append({"metric": metric, "value": v, "threshold": th[f"{key}_warning"],
+                                      "severity": "warning", "message": f"{warn_label}: {v:.1f}{unit}"})
+                if metric == "ping_latency_ms" and spike[g]:
+                    z = float(zscore[g])
+                    anomalies.append({"metric": metric, "value": v, "zscore": round(z, 2), "severity": "warning",
+                                      "message": f"Spike de latência detectado (Z={z:.2f})"})
+            if busy[g]:
+                n_clients = int(clients[g])
+                anomalies.append({"metric": "wifi_clients", "value": n_clients, "threshold": th["wifi_clients_warning"],
+                                  "severity": "warning", "message": f"Muitos clientes WiFi: {n_clients}"})
+        result[int(w.pks[g])] = {
+            "health_score": float(score[g]),
+            "anomalies": anomalies,
+            "samples": int(w.counts[g]),
+        }
+    return result
+
+
+def _risk(w: MetricWindow) -> Dict[int, Dict[str, Any]]:
+    """Risco por dispositivo (MLService.predict_failure_risk)."""
+    if not w.groups:
+        return {}
+    lat = w.cols["ping_latency_ms"]
+    loss = w.cols["ping_packet_loss"]
+    uptime = w.cols["uptime_seconds"]
+
+    lat_trend = _trend(w, lat, ~np.isnan(lat) & (lat != 0))
+    loss_trend = _trend(w, loss, ~np.isnan(loss))
+
+    up_ok = ~np.isnan(uptime)
+    up = uptime[up_ok]
+    reboots = _pairs(w, up_ok, up[1:] < up[:-1])  # uptime voltou = reboot
+    gaps = _pairs(w, np.ones(w.device.size, dtype=bool), np.diff(w.t) > 1800 * 1_000_000)
+
+    score = (
+        20 * (lat_trend == 1)
+        + 25 * (loss_trend == 1)
+        + 30 * (reboots > 3)
+        + 15 * (gaps > 5)
+    ).astype(np.int64)
+    level = np.where(score >= 50, "high", np.where(score >= 25, "medium", np.where(score > 0, "low", "minimal")))
+    enough = w.counts >= 10
+    names = {1: "increasing", -1: "decreasing", 0: "stable"}
+    last_t = w.t[w.starts + w.counts - 1]
+
+    return {
+        int(w.pks[g]): {
+            "risk_score": int(min(100, score[g])) if enough[g] else 0,
+            "risk_level": str(level[g]) if enough[g] else "unknown",
+            "trend": names[int(lat_trend[g])],
+            "last_sample_at": _EPOCH + timedelta(microseconds=int(last_t[g])),
+        }
+        for g in range(w.groups)
+    }
+
+
+def score_devices(
+    db: Session,
+    device_pks: Optional[Sequence[int]] = None,
+    online_only: bool = False,
+    now: Optional[datetime] = None,
+    thresholds: Optional[Dict[str, float]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Pontua os dispositivos (todos, ou `device_pks`) sem gravar. Retorna uma
+    linha por dispositivo no formato de device_health, mais device_id
+    (GenieACS) em "device" e os campos do Device usados pelos endpoints.
+    `thresholds` sobrepõe os limiares gravados (load_thresholds).
+    """
+    now = now or datetime.utcnow()
+    th = {**load_thresholds(db), **(thresholds or {})}
+
+    query = select(
+        Device.id, Device.device_id, Device.manufacturer, Device.product_class,
+        Device.pppoe_login, Device.wan_ip, Device.is_online,
+    )
+    if online_only:
+        query = query.where(Device.is_online == True)  # noqa: E712
+    if device_pks is not None:
+        pks = sorted(set(device_pks))
+        devices = []
+        for i in range(0, len(pks), _IN_CHUNK):
+            devices.extend(db.execute(query.where(Device.id.in_(pks[i:i + _IN_CHUNK]))).all())
+    else:
+        devices = db.execute(query).all()
+    if not devices:
+        return []
+
+    # Sem filtro por id quando o alvo é a frota toda: uma varredura por tempo
+    targets = None if device_pks is None and not online_only else [d.id for d in devices]
+    window = load_window(db, now - timedelta(days=RISK_DAYS), now, targets)
+    health = _health(window.subset(window.t >= _epoch_us(now - timedelta(hours=HEALTH_HOURS))), th)
+    risk = _risk(window)
+
+    rows = []
+    for d in devices:
+        h = health.get(d.id, {"health_score": None, "anomalies": [], "samples": 0})
+        r = risk.get(d.id, {"risk_score": 0, "risk_level": "unknown", "trend": "stable", "last_sample_at": None})
+        rows.append({
+            "device_id": d.id,
+            "device": d.device_id,
+            "product_class": d.product_class,
+            "pppoe_login": d.pppoe_login,
+            "wan_ip": d.wan_ip,
+            "is_online": d.is_online,
+            "manufacturer": d.manufacturer,
+            "health_score": h["health_score"],
+            "anomaly_count": len(h["anomalies"]),
+            "anomalies": h["anomalies"],
+            **r,
+            "samples": h["samples"],
+            "computed_at": now,
+        })
+    return rows
+
+
+# ============ Gravação ============
+
+def _upsert(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Grava em device_health: ON CONFLICT quando o dialeto suporta, senão update + insert."""
+    table = DeviceHealth.__table__
+    rows = [{k: r[k] for k in ("device_id", *_VALUE_COLUMNS)} for r in rows]
+    name = db.get_bind().dialect.name
+    if name in ("sqlite", "postgresql"):
+        if name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.device_id],
+            set_={col: stmt.excluded[col] for col in _VALUE_COLUMNS},
+        )
+        for i in range(0, len(rows), _IN_CHUNK):
+            db.execute(stmt, rows[i:i + _IN_CHUNK])
+        return
+
+    existing = set()
+    ids = [r["device_id"] for r in rows]
+    for i in range(0, len(ids), _IN_CHUNK):
+        existing.update(db.scalars(select(table.c.device_id).where(table.c.device_id.in_(ids[i:i + _IN_CHUNK]))))
+    updates = [{**r, "b_device_id": r["device_id"]} for r in rows if r["device_id"] in existing]
+    inserts = [r for r in rows if r["device_id"] not in existing]
+    if updates:
+        db.execute(update(table).where(table.c.device_id == bindparam("b_device_id")), updates)
+    if inserts:
+        db.execute(insert(table), inserts)
+
+
+def refresh_device_health(
+    db: Session,
+    device_pks: Optional[Sequence[int]] = None,
+    online_only: bool = False,
+    now: Optional[datetime] = None,
+    thresholds: Optional[Dict[str, float]] = None,
+    commit: bool = True,
+) -> List[Dict[str, Any]]:
+    """Pontua (score_devices) e grava em device_health. Retorna as linhas calculadas."""
+    started = time.perf_counter()
+    rows = score_devices(db, device_pks, online_only=online_only, now=now, thresholds=thresholds)
+    if rows:
+        _upsert(db, rows)
+        if commit:
+            db.commit()
+    log.info(
+        f"[Health] {len(rows)} dispositivos pontuados em "
+        f"{(time.perf_counter() - started) * 1000:.0f} ms"
+    )
+    return rows
+
+
+def stale_device_pks(db: Session, now: Optional[datetime] = None) -> List[int]:
+    """
+    Dispositivos cujo snapshot está desatualizado:
+    - amostras em device_metrics mais novas que device_health.last_sample_at
+      (ou sem linha em device_health)
+    - saúde calculada com amostras que já saíram da janela de HEALTH_HOURS
+    - risco calculado com amostras que já saíram da janela de RISK_DAYS
+      (dispositivo parou de reportar: a repontuação volta para "unknown")
+
+    As amostras novas são procuradas a partir da mais recente já pontuada na
+    frota, menos HEALTH_REFRESH_GRACE_SECONDS (amostras atrasadas além disso
+    só entram na próxima pontuação completa).
+    """
+    now = now or datetime.utcnow()
+    health = DeviceHealth.__table__
+    h = health.c
+    m = DeviceMetric.__table__.c
+
+    since = now - timedelta(days=RISK_DAYS)
+    mark = db.scalar(select(func.max(h.last_sample_at)))
+    if mark is not None:
+        since = max(since, mark - timedelta(seconds=settings.HEALTH_REFRESH_GRACE_SECONDS))
+
+    latest = (
+        select(m.device_id, func.max(m.collected_at).label("latest"))
+        .where(m.collected_at >= since, m.collected_at < now)
+        .group_by(m.device_id)
+        .subquery()
+    )
+    fresh = (
+        select(latest.c.device_id)
+        .outerjoin(health, h.device_id == latest.c.device_id)
+        .where(or_(h.last_sample_at.is_(None), latest.c.latest > h.last_sample_at))
+    )
+    expired = select(h.device_id).where(or_(
+        and_(h.health_score.is_not(None), h.last_sample_at < now - timedelta(hours=HEALTH_HOURS)),
+        and_(
+            or_(h.risk_level != "unknown", h.risk_score != 0),
+            h.last_sample_at < now - timedelta(days=RISK_DAYS),
+        ),
+    ))
+    return sorted(set(db.scalars(fresh)) | set(db.scalars(expired)))
+
+
+def refresh_stale_health(
+    db: Session,
+    now: Optional[datetime] = None,
+    thresholds: Optional[Dict[str, float]] = None,
+) -> List[Dict[str, Any]]:
+    """Repontua só os dispositivos de stale_device_pks (vazio se nenhum)."""
+    now = now or datetime.utcnow()
+    pks = stale_device_pks(db, now)
+    if not pks:
+        return []
+    return refresh_device_health(db, pks, now=now, thresholds=thresholds)
+
+
+# ============ Consulta (snapshot) ============
+
+def worst_devices(
+    db: Session,
+    limit: int = 10,
+    manufacturer: Optional[str] = None,
+    max_score: Optional[float] = None,
+    online_only: bool = False,
+) -> List[Dict[str, Any]]:
+    """Os `limit` piores health_score do snapshot (ix_device_health_*)."""
+    h = DeviceHealth
+    query = (
+        select(
+            h.health_score, h.anomaly_count, h.anomalies, h.risk_score, h.risk_level,
+            h.trend, h.last_sample_at, h.computed_at, h.manufacturer,
+            Device.device_id, Device.product_class, Device.pppoe_login, Device.wan_ip,
+        )
+        .join(Device, Device.id == h.device_id)
+        .where(h.health_score.is_not(None))
+        .order_by(h.health_score, h.device_id)
+        .limit(limit)
+    )
+    if manufacturer is not None:
+        query = query.where(h.manufacturer == manufacturer)
+    if max_score is not None:
+        query = query.where(h.health_score < max_score)
+    if online_only:
+        query = query.where(Device.is_online == True)  # noqa: E712
+    return [dict(row._mapping) for row in db.execute(query)]
+
+
+def problem_counts(
+    db: Session,
+    manufacturer: Optional[str] = None,
+    online_only: bool = False,
+) -> Dict[str, int]:
+    """Dispositivos pontuados e com health_score < 70 no snapshot."""
+    h = DeviceHealth
+    query = select(
+        func.count(h.id).label("scored"),
+        _count_if(h.health_score < 70).label("problems"),
+    ).where(h.health_score.is_not(None))
+    if manufacturer is not None:
+        query = query.where(h.manufacturer == manufacturer)
+    if online_only:
+        query = query.join(Device, Device.id == h.device_id).where(Device.is_online == True)  # noqa: E712
+    row = db.execute(query).one()
+    return {"scored": int(row.scored), "problems": int(row.problems)}
+
+
+def _count_if(cond) -> Any:
+    """Contagem condicional (SUM(CASE ...)) para agregar numa só consulta."""
+    return func.coalesce(func.sum(case((cond, 1), else_=0)), 0)
+
+
+def health_overview(db: Session) -> Dict[str, Any]:
+    """
+    Resumo da frota a partir do snapshot: faixas de saúde, risco, tendência,
+    anomalias por métrica e média por fabricante.
+    """
+    h = DeviceHealth
+    scored = h.health_score.is_not(None)
+
+    bands = []
+    upper = None
+    for name, lower in HEALTH_BANDS:
+        cond = h.health_score >= lower
+        if upper is not None:
+            cond = cond & (h.health_score < upper)
+        bands.append(_count_if(cond).label(name))
+        upper = lower
+
+    totals = db.execute(select(
+        func.count(h.id).label("rows"),
+        _count_if(scored).label("scored"),
+        func.avg(h.health_score).label("avg_score"),
+        _count_if(h.risk_level == "high").label("risk_high"),
+        _count_if(h.risk_level == "medium").label("risk_medium"),
+        _count_if(h.trend == "increasing").label("latency_increasing"),
+        _count_if(h.trend == "decreasing").label("latency_decreasing"),
+        _count_if(h.anomaly_count > 0).label("with_anomalies"),
+        func.max(h.computed_at).label("updated_at"),
+        *bands,
+    )).one()._mapping
+
+    by_manufacturer = [
+        {
+            "name": row.manufacturer or "Unknown",
+            "devices": row.devices,
+            "avg_score": round(row.avg_score, 1),
+            "problems": int(row.problems),
+        }
+        for row in db.execute(
+            select(
+                h.manufacturer,
+                func.count(h.id).label("devices"),
+                func.avg(h.health_score).label("avg_score"),
+                _count_if(h.health_score < 70).label("problems"),
+            )
+            .where(scored)
+            .group_by(h.manufacturer)
+            .order_by(func.avg(h.health_score))
+        )
+    ]
+
+    # Só as linhas com anomalia (minoria da frota) trazem o JSON
+    issues: Dict[str, Dict[str, int]] = {}
+    for anomalies in db.scalars(select(h.anomalies).where(h.anomaly_count > 0)):
+        seen = set()
+        for a in anomalies or []:
+            entry = issues.setdefault(a.get("metric", "unknown"), {"devices": 0, "critical": 0})
+            if a.get("metric") not in seen:
+                entry["devices"] += 1
+                seen.add(a.get("metric"))
+            if a.get("severity") == "critical":
+                entry["critical"] += 1
+
+    return {
+        "devices": totals["rows"],
+        "scored": int(totals["scored"]),
+        "avg_score": round(totals["avg_score"], 1) if totals["avg_score"] is not None else None,
+        "bands": {name: int(totals[name]) for name, _ in HEALTH_BANDS},
+        "risk": {"high": int(totals["risk_high"]), "medium": int(totals["risk_medium"])},
+        "latency_trend": {
+            "increasing": int(totals["latency_increasing"]),
+            "decreasing": int(totals["latency_decreasing"]),
+        },
+        "with_anomalies": int(totals["with_anomalies"]),
+        "issues": issues,
+        "by_manufacturer": by_manufacturer,
+        "updated_at": totals["updated_at"],
+    }
+
+
+__all__ = [
+    "DEFAULT_THRESHOLDS",
+    "HEALTH_BANDS",
+    "HEALTH_HOURS",
+    "RISK_DAYS",
+    "MetricWindow",
+    "health_overview",
+    "load_thresholds",
+    "load_window",
+    "problem_counts",
+    "refresh_device_health",
+    "refresh_stale_health",
+    "save_thresholds",
+    "score_devices",
+    "stale_device_pks",
+    "worst_devices",
+]
@@ -0,0 +1,435 @@
+# app/services/metric_partitions.py
+"""
+Partições mensais de device_metrics: retenção e rollup por partição.
+
+PostgreSQL (tabela criada por init_db): device_metrics é particionada por
+RANGE (collected_at), uma partição por mês, pré-criadas com
+METRICS_PARTITIONS_AHEAD meses de antecedência (init_db e cada ciclo do
+coletor). Uma partição DEFAULT recebe o que cair fora dos meses criados
+(amostras muito adiantadas ou atrasadas, coletor parado); ao criar o mês,
+as linhas dele saem da DEFAULT para a partição nova.
+
+SQLite (ou PostgreSQL com a tabela antiga, não particionada): device_metrics
+é a partição "quente" — inserts e leituras continuam nela. Um mês fechado há
+mais de METRICS_HOT_DAYS é movido, em lotes curtos, para a tabela
+device_metrics_AAAA_MM.
+
+Em ambos os casos:
+- fechar um mês faz o rollup diário dele em metric_aggregations (uma vez)
+- a retenção remove partições inteiras (DROP TABLE), sem DELETE por linha
+- o registro das partições fica em metric_partitions
+
+Amostras atrasadas (coletor/feeds com relógio atrasado) podem cair na
+tabela quente num mês já arquivado ou removido, ou na DEFAULT num mês já
+removido: close_due as leva para o arquivo (refazendo o rollup dos
+dispositivos afetados) e apply_retention apaga as de meses removidos.
+
+O custo de manutenção é proporcional ao número de partições, não de linhas.
+maintain() é chamado pelo coletor a cada ciclo.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Index, MetaData, PrimaryKeyConstraint, Table, delete, func, inspect, select, text, union_all
+from sqlalchemy.sql import FromClause
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.database.models import Device, DeviceMetric, MetricPartition
+from app.services.metric_rollup import rollup_range
+from app.settings import settings
+
+log = logging.getLogger("semppre-bridge.partitions")
+
+BASE_TABLE = DeviceMetric.__tablename__
+DEFAULT_PARTITION = f"{BASE_TABLE}_default"
+
+# Linhas movidas por transação ao arquivar um mês (mantém o lock de escrita curto)
+_MOVE_BATCH = 5000
+
+ROLLUP_PERIOD = "day"
+
+
+def month_start(dt: datetime) -> datetime:
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month(dt: datetime) -> datetime:
+    start = month_start(dt)
+    return (start + timedelta(days=32)).replace(day=1)
+
+
+def partition_name(start: datetime) -> str:
+    return f"{BASE_TABLE}_{start:%Y_%m}"
+
+
+def metrics_table(name: str) -> Table:
+    """Table com as colunas de device_metrics sob outro nome (partição/arquivo)."""
+    if name == BASE_TABLE:
+        return DeviceMetric.__table__
+    md = MetaData()
+    Device.__table__.to_metadata(md)
+    table = DeviceMetric.__table__.to_metadata(md, name=name)
+    # Os índices copiados teriam os mesmos nomes dos de device_metrics
+    table.indexes.clear()
+    Index(f"ix_{name}_device_time", table.c.device_id, table.c.collected_at)
+    return table
+
+
+# ============ Schema (PostgreSQL) ============
+
+def is_partitioned(bind) -> bool:
+    """device_metrics é uma tabela particionada nativa (PostgreSQL)?"""
+    if bind.dialect.name != "postgresql":
+        return False
+    return bool(bind.execute(
+        text("SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = :t"),
+        {"t": BASE_TABLE},
+    ).scalar())
+
+
+def create_partitioned_table(engine: Engine) -> bool:
+    """
+    Cria device_metrics como tabela particionada por mês no PostgreSQL,
+    antes do create_all. A chave primária passa a ser (id, collected_at),
+    exigência do particionamento; o mapeamento ORM continua por id.
+
+    Returns:
+        True se criou; False se não é PostgreSQL ou a tabela já existe
+    """
+    if engine.dialect.name != "postgresql":
+        return False
+    with engine.begin() as conn:
+        if inspect(conn).has_table(BASE_TABLE):
+            if not is_partitioned(conn):
+                log.warning(
+                    f"[Partitions] {BASE_TABLE} já existe sem particionamento; "
+                    "usando arquivamento por tabela (como no SQLite)"
+                )
+            return False
+        md = MetaData()
+        Device.__table__.to_metadata(md)
+        table = DeviceMetric.__table__.to_metadata(md)
+        table.c.collected_at.nullable = False
+        table.c.id.autoincrement = True
+        table.append_constraint(PrimaryKeyConstraint(table.c.id, table.c.collected_at))
+        table.dialect_options["postgresql"]["partition_by"] = "RANGE (collected_at)"
+        table.create(conn)
+        conn.execute(text(f'CREATE TABLE IF NOT EXISTS "{DEFAULT_PARTITION}" PARTITION OF {BASE_TABLE} DEFAULT'))
+    log.info(f"[Partitions] {BASE_TABLE} criada com particionamento mensal")
+    return True
+
+
+class MetricPartitionManager:
+    """Ciclo de vida das partições mensais de device_metrics."""
+
+    def __init__(self, hot_days: int, retention_days: int, ahead: int):
+        self.hot_days = hot_days
+        self.retention_days = retention_days
+        self.ahead = ahead
+
+    # ============ Registro ============
+
+    def _registry(self, db: Session) -> Dict[str, MetricPartition]:
+        return {p.name: p for p in db.query(MetricPartition).all()}
+
+    def _register(self, db: Session, start: datetime, storage: str) -> MetricPartition:
+        part = MetricPartition(
+            name=partition_name(start),
+            period_start=start,
+            period_end=next_month(start),
+            storage=storage,
+            status="open",
+        )
+        db.add(part)
+        return part
+
+    # ============ Criação ============
+
+    def ensure(self, db: Session, now: Optional[datetime] = None) -> List[str]:
+        """
+        Registra (e no PostgreSQL cria) as partições do mês mais antigo com
+        dados até `ahead` meses à frente.
+
+        Returns:
+            Nomes das partições registradas agora
+        """
+        now = now or datetime.utcnow()
+        native = is_partitioned(db.connection())
+        registry = self._registry(db)
+        if native:
+            # Bancos criados antes da DEFAULT também passam a tê-la
+            db.execute(text(f'CREATE TABLE IF NOT EXISTS "{DEFAULT_PARTITION}" PARTITION OF {BASE_TABLE} DEFAULT'))
+
+        oldest = db.scalar(select(func.min(DeviceMetric.collected_at)))
+        start = month_start(min(oldest, now) if oldest else now)
+        last = month_start(now)
+        for _ in range(self.ahead if native else 0):
+            last = next_month(last)
+
+        created = []
+        while start <= last:
+            name = partition_name(start)
+            if name not in registry:
+                if native:
+                    self._create_native(db, name, start)
+                self._register(db, start, "native" if native else "hot")
+                created.append(name)
+            start = next_month(start)
+        if created:
+            db.commit()
+            log.info(f"[Partitions] registradas: {', '.join(created)}")
+        return created
+
+    def _create_native(self, db: Session, name: str, start: datetime) -> None:
+        """
+        Cria a partição do mês. Se a DEFAULT já tem linhas do mês (o
+        PostgreSQL recusaria o CREATE ... PARTITION OF), a partição é criada
+        solta, recebe essas linhas e então é anexada.
+        """
+        end = next_month(start)
+        bounds = f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        default = metrics_table(DEFAULT_PARTITION)
+        in_range = (default.c.collected_at >= start, default.c.collected_at < end)
+        if not db.scalar(select(func.count()).select_from(default).where(*in_range)):
+            db.execute(text(f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF {BASE_TABLE} {bounds}'))
+            return
+        db.execute(text(f'CREATE TABLE "{name}" (LIKE {BASE_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+        part = metrics_table(name)
+        db.execute(part.insert().from_select([part.c[c.name] for c in default.c], select(*default.c).where(*in_range)))
+        db.execute(delete(default).where(*in_range))
+        db.execute(text(f'ALTER TABLE {BASE_TABLE} ATTACH PARTITION "{name}" {bounds}'))
+        log.info(f"[Partitions] {name}: linhas do mês movidas da partição DEFAULT")
+
+    # ============ Fechamento (rollup + arquivamento) ============
+
+    def _move_to_archive(self, db: Session, part: MetricPartition) -> int:
+        """Copia o mês para device_metrics_AAAA_MM e remove da tabela quente, em lotes."""
+        hot = DeviceMetric.__table__
+        in_range = (hot.c.collected_at >= part.period_start, hot.c.collected_at < part.period_end)
+        archive = metrics_table(part.name)
+        archive.create(db.connection(), checkfirst=True)
+        db.commit()
+
+        moved = 0
+        while True:
+            ids = [r[0] for r in db.execute(select(hot.c.id).where(*in_range).order_by(hot.c.id).limit(_MOVE_BATCH))]
+            if not ids:
+                break
+            db.execute(archive.insert().from_select(
+                [archive.c[c.name] for c in hot.c],
+                select(*hot.c).where(hot.c.id.in_(ids)),
+            ))
+            db.execute(delete(hot).where(hot.c.id.in_(ids)))
+            db.commit()
+            moved += len(ids)
+        log.debug(f"[Partitions] {moved} linhas movidas para {part.name}")
+        return moved
+
+    def close(self, db: Session, part: MetricPartition, archive: bool = True) -> None:
+        """Rollup do mês e, fora do PostgreSQL particionado, arquivamento."""
+        source = metrics_table(part.name if part.storage in ("native", "archive") else BASE_TABLE)
+        aggregated = rollup_range(db, part.period_start, part.period_end, ROLLUP_PERIOD, source=source, commit=False)
+        part.row_count = db.scalar(
+            select(func.count()).select_from(source)
+            .where(source.c.collected_at >= part.period_start, source.c.collected_at < part.period_end)
+        )
+        part.closed_at = datetime.utcnow()
+        part.status = "closed"
+        db.commit()
+        if part.storage == "hot" and archive:
+            self._move_to_archive(db, part)
+            part.storage = "archive"
+            db.commit()
+        log.info(f"[Partitions] {part.name} fechada: {part.row_count} linhas, {aggregated} agregações")
+
+    def _late_parts(self, db: Session, status: str) -> List[MetricPartition]:
+        """
+        Meses já arquivados/removidos que ainda podem ter linhas na tabela
+        quente: só os que terminam depois da amostra mais antiga dela.
+        """
+        oldest = db.scalar(select(func.min(DeviceMetric.collected_at)))
+        if oldest is None:
+            return []
+        query = db.query(MetricPartition).filter(MetricPartition.period_end > oldest)
+        if status == "archive":
+            query = query.filter(MetricPartition.storage == "archive", MetricPartition.status != "dropped")
+        else:
+            query = query.filter(MetricPartition.storage != "native", MetricPartition.status == "dropped")
+        return query.order_by(MetricPartition.period_start).all()
+
+    def _sweep_late_rows(self, db: Session) -> int:
+        """Move para o arquivo as linhas que chegaram depois de o mês ser arquivado."""
+        hot = DeviceMetric.__table__
+        swept = 0
+        for part in self._late_parts(db, "archive"):
+            in_range = (hot.c.collected_at >= part.period_start, hot.c.collected_at < part.period_end)
+            device_ids = db.scalars(select(hot.c.device_id).where(*in_range).distinct()).all()
+            if not device_ids:
+                continue
+            moved = self._move_to_archive(db, part)
+            # O rollup do mês foi feito sem essas amostras
+            rollup_range(
+                db, part.period_start, part.period_end, ROLLUP_PERIOD,
+                source=metrics_table(part.name), device_ids=device_ids, commit=False,
+            )
+            part.row_count = (part.row_count or 0) + moved
+            db.commit()
+            swept += moved
+            log.info(f"[Partitions] {part.name}: {moved} linhas atrasadas movidas para o arquivo")
+        return swept
+
+    def _delete_hot_range(self, db: Session, start: datetime, end: datetime) -> int:
+        """DELETE em lotes de [start, end) da tabela quente."""
+        hot = DeviceMetric.__table__
+        in_range = (hot.c.collected_at >= start, hot.c.collected_at < end)
+        deleted = 0
+        while True:
+            ids = select(hot.c.id).where(*in_range).limit(_MOVE_BATCH).scalar_subquery()
+            count = db.execute(delete(hot).where(hot.c.id.in_(ids))).rowcount
+            db.commit()
+            if not count:
+                return deleted
+            deleted += count
+
+    def close_due(self, db: Session, now: Optional[datetime] = None) -> List[str]:
+        """
+        Fecha os meses encerrados (no SQLite, só depois de METRICS_HOT_DAYS)
+        e leva para o arquivo as linhas atrasadas de meses já arquivados.
+        """
+        now = now or datetime.utcnow()
+        closed = []
+        for part in sorted(self._registry(db).values(), key=lambda p: p.period_start):
+            if part.status != "open":
+                continue
+            hot_until = part.period_end + timedelta(days=self.hot_days if part.storage == "hot" else 0)
+            if hot_until > now:
+                continue
+            # Mês que já saiu da retenção não precisa ser copiado: só o rollup
+            expired = part.period_end <= now - timedelta(days=self.retention_days)
+            self.close(db, part, archive=not expired)
+            closed.append(part.name)
+        self._sweep_late_rows(db)
+        return closed
+
+    # ============ Retenção ============
+
+    def apply_retention(self, db: Session, days: Optional[int] = None, now: Optional[datetime] = None) -> int:
+        """
+        Remove as partições inteiramente anteriores a now - days, as linhas
+        atrasadas de meses já removidos (tabela quente) e, no PostgreSQL
+        particionado, as linhas da DEFAULT anteriores a now - days.
+
+        Returns:
+            Quantidade de linhas removidas (row_count das partições + linhas avulsas)
+        """
+        days = self.retention_days if days is None else days
+        now = now or datetime.utcnow()
+        cutoff = now - timedelta(days=days)
+        removed = 0
+        for part in sorted(self._registry(db).values(), key=lambda p: p.period_start):
+            if part.status == "dropped" or part.period_end > cutoff:
+                continue
+            if part.status == "open":
+                self.close(db, part, archive=False)
+            if part.storage in ("native", "archive"):
+                db.execute(text(f'DROP TABLE IF EXISTS "{part.name}"'))
+            else:
+                # Mês ainda na tabela quente (retenção menor que METRICS_HOT_DAYS)
+                self._delete_hot_range(db, part.period_start, part.period_end)
+            part.status = "dropped"
+            part.dropped_at = datetime.utcnow()
+            db.commit()
+            removed += part.row_count or 0
+            log.info(f"[Partitions] {part.name} removida ({part.row_count} linhas)")
+
+        # Linhas que chegaram depois de o mês ser removido
+        for part in self._late_parts(db, "dropped"):
+            late = self._delete_hot_range(db, part.period_start, part.period_end)
+            if late:
+                removed += late
+                log.info(f"[Partitions] {part.name}: {late} linhas atrasadas removidas")
+        if is_partitioned(db.connection()):
+            default = metrics_table(DEFAULT_PARTITION)
+            late = db.execute(delete(default).where(default.c.collected_at < cutoff)).rowcount
+            db.commit()
+            if late:
+                removed += late
+                log.info(f"[Partitions] {DEFAULT_PARTITION}: {late} linhas anteriores à retenção removidas")
+        return removed
+
+    def maintain(self, db: Session, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """ensure + close_due + apply_retention (idempotente; barato quando não há nada a fazer)."""
+        now = now or datetime.utcnow()
+        return {
+            "registered": self.ensure(db, now),
+            "closed": self.close_due(db, now),
+            "removed_rows": self.apply_retention(db, now=now),
+        }
+
+    # ============ Leitura ============
+
+    def tables_for_range(self, db: Session, start: datetime, end: datetime) -> List[Table]:
+        """Tabelas com dados de [start, end): device_metrics + arquivos do período."""
+        tables = [DeviceMetric.__table__]
+        for part in db.query(MetricPartition).filter(
+            MetricPartition.storage == "archive",
+            MetricPartition.status != "dropped",
+            MetricPartition.period_end > start,
+            MetricPartition.period_start < end,
+        ).order_by(MetricPartition.period_start):
+            tables.append(metrics_table(part.name))
+        return tables
+
+    def source_for_range(self, db: Session, start: datetime, end: datetime) -> FromClause:
+        """
+        Origem das amostras de [start, end): device_metrics ou, com meses
+        arquivados no período, a união (UNION ALL) dela com os arquivos, já
+        recortada ao intervalo. Tem as colunas de device_metrics; serve de
+        `source` para aggregate_range e de FROM para leituras brutas.
+        """
+        tables = self.tables_for_range(db, start, end)
+        if len(tables) == 1:
+            return tables[0]
+        return union_all(*(
+            select(*t.c).where(t.c.collected_at >= start, t.c.collected_at < end) for t in tables
+        )).subquery(f"{BASE_TABLE}_range")
+
+    def list(self, db: Session) -> List[Dict[str, Any]]:
+        return [
+            {
+                "name": p.name,
+                "period_start": p.period_start.isoformat(),
+                "period_end": p.period_end.isoformat(),
+                "storage": p.storage,
+                "status": p.status,
+                "row_count": p.row_count,
+                "closed_at": p.closed_at.isoformat() if p.closed_at else None,
+                "dropped_at": p.dropped_at.isoformat() if p.dropped_at else None,
+            }
+            for p in db.query(MetricPartition).order_by(MetricPartition.period_start)
+        ]
+
+
+# Instância singleton para uso direto
+metric_partitions = MetricPartitionManager(
+    hot_days=settings.METRICS_HOT_DAYS,
+    retention_days=settings.METRICS_RETENTION_DAYS,
+    ahead=settings.METRICS_PARTITIONS_AHEAD,
+)
+
+
+__all__ = [
+    "DEFAULT_PARTITION",
+    "MetricPartitionManager",
+    "create_partitioned_table",
+    "is_partitioned",
+    "metric_partitions",
+    "metrics_table",
+    "month_start",
+    "next_month",
+    "partition_name",
+]
@@ -0,0 +1,372 @@
+# app/services/metric_rollup.py
+"""
+Rollup de device_metrics em metric_aggregations, feito no banco.
+
+Uma consulta GROUP BY (device_id, período) sobre o intervalo produz as
+agregações de todos os dispositivos de uma vez; só as linhas agregadas
+(dispositivos x períodos) trafegam até o Python. A gravação é um upsert
+(unique device_id/period_type/period_start): reprocessar um intervalo
+atualiza as agregações em vez de duplicá-las.
+
+Além das somas/médias, cada agregação recebe:
+- p95_latency: percentil 95 contínuo (percentile_cont no PostgreSQL; no
+  SQLite, uma passada ordenada por dispositivo/período/latência)
+- online_samples: amostras com perda de pacotes < 100%
+- uptime_percentage: online_samples sobre o número esperado de amostras no
+  período (duração / METRICS_COLLECT_INTERVAL) ou sobre as recebidas, se
+  forem mais; coletas que faltaram contam como indisponibilidade
+
+run_rollups() é o job incremental (hora, dia e semana) chamado pelo coletor:
+agrega só períodos completos após a marca d'água de cada tipo, guardada em
+system_config, e avança a marca na mesma transação das agregações. Rodar de
+novo não refaz nada; uma execução interrompida recomeça do último lote.
+
+Também usado no fechamento das partições mensais (metric_partitions).
+"""
+from __future__ import annotations
+
+import itertools
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Table, bindparam, case, func, insert, null, select, update
+from sqlalchemy.orm import Session
+
+from app.database.models import DeviceMetric, MetricAggregation, SystemConfig
+from app.settings import settings
+
+log = logging.getLogger("semppre-bridge.rollup")
+
+PERIODS: Dict[str, timedelta] = {
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+    "week": timedelta(weeks=1),
+}
+
+# strftime + modificadores do SQLite; semana começa na segunda (como date_trunc)
+_SQLITE_BUCKETS: Dict[str, Tuple[str, ...]] = {
+    "hour": ("%Y-%m-%d %H:00:00",),
+    "day": ("%Y-%m-%d 00:00:00",),
+    "week": ("%Y-%m-%d 00:00:00", "weekday 0", "-6 days"),
+}
+
+# Intervalo agregado por transação no job incremental
+_CHUNK_SPAN: Dict[str, timedelta] = {
+    "hour": timedelta(days=1),
+    "day": timedelta(days=7),
+    "week": timedelta(weeks=4),
+}
+
+_WATERMARK_KEY = "metrics.rollup_watermark.{}"
+
+_VALUE_COLUMNS = (
+    "period_end",
+    "total_bytes_rx",
+    "total_bytes_tx",
+    "avg_bytes_rx",
+    "avg_bytes_tx",
+    "avg_latency",
+    "min_latency",
+    "max_latency",
+    "p95_latency",
+    "uptime_percentage",
+    "total_samples",
+    "online_samples",
+    "avg_wifi_clients",
+    "max_wifi_clients",
+)
+
+P95 = 0.95
+
+
+def period_floor(dt: datetime, period_type: str) -> datetime:
+    """Início do período (hora, dia ou semana iniciada na segunda) que contém dt."""
+    if period_type == "hour":
+        return dt.replace(minute=0, second=0, microsecond=0)
+    start = dt.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period_type == "week":
+        start -= timedelta(days=start.weekday())
+    return start
+
+
+def _bucket(db: Session, column, period_type: str):
+    """Início do período de cada linha, calculado pelo banco."""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.date_trunc(period_type, column)
+    fmt, *modifiers = _SQLITE_BUCKETS[period_type]
+    return func.strftime(fmt, column, *modifiers)
+
+
+def _as_datetime(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    return datetime.fromisoformat(str(value))
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    """Percentil contínuo (interpolação linear, como percentile_cont) de valores ordenados."""
+    pos = q * (len(values) - 1)
+    lo = math.floor(pos)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (pos - lo)
+
+
+def _p95_by_group(db: Session, src: Table, bucket, where: List[Any]) -> Dict[Tuple[int, datetime], float]:
+    """
+    p95 da latência por (dispositivo, período) sem percentile_cont (SQLite):
+    uma passada ordenada, um grupo em memória por vez.
+    """
+    c = src.c
+    stmt = (
+        select(c.device_id, bucket, c.ping_latency_ms)
+        .where(*where, c.ping_latency_ms.isnot(None))
+        .order_by(c.device_id, bucket, c.ping_latency_ms)
+        .execution_options(yield_per=10_000)
+    )
+    result: Dict[Tuple[int, datetime], float] = {}
+    for (device_id, period_start), rows in itertools.groupby(db.execute(stmt), key=lambda r: (r[0], r[1])):
+        result[(device_id, _as_datetime(period_start))] = _percentile([r[2] for r in rows], P95)
+    return result
+
+
+def _upsert(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Grava as agregações: ON CONFLICT quando o dialeto suporta, senão update + insert."""
+    agg = MetricAggregation.__table__
+    name = db.get_bind().dialect.name
+    if name in ("sqlite", "postgresql"):
+        if name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        stmt = dialect_insert(agg)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[agg.c.device_id, agg.c.period_type, agg.c.period_start],
+            set_={col: stmt.excluded[col] for col in _VALUE_COLUMNS},
+        )
+        db.execute(stmt, rows)
+        return
+
+    period_type = rows[0]["period_type"]
+    starts = [r["period_start"] for r in rows]
+    existing = {
+        (device_id, _as_datetime(period_start))
+        for device_id, period_start in db.execute(
+            select(agg.c.device_id, agg.c.period_start).where(
+                agg.c.period_type == period_type,
+                agg.c.period_start >= min(starts),
+                agg.c.period_start <= max(starts),
+            )
+        )
+    }
+    updates = [r for r in rows if (r["device_id"], r["period_start"]) in existing]
+    inserts = [r for r in rows if (r["device_id"], r["period_start"]) not in existing]
+    if updates:
+        db.execute(
+            update(agg)
+            .where(
+                agg.c.device_id == bindparam("b_device_id"),
+                agg.c.period_type == bindparam("b_period_type"),
+                agg.c.period_start == bindparam("b_period_start"),
+            ),
+            [{**r, "b_device_id": r["device_id"], "b_period_type": r["period_type"],
+              "b_period_start": r["period_start"]} for r in updates],
+        )
+    if inserts:
+        db.execute(insert(agg), inserts)
+
+
+def aggregate_range(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    period_type: str = "day",
+    source: Table = None,
+    device_ids: Optional[Iterable[int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Agregações de [start, end) de `source` (device_metrics ou uma
+    partição/arquivo) por dispositivo e período, sem gravar.
+    `device_ids` restringe a alguns dispositivos.
+    """
+    if period_type not in PERIODS:
+        raise ValueError(f"period_type inválido: {period_type}")
+    src = source if source is not None else DeviceMetric.__table__
+    c = src.c
+    step = PERIODS[period_type]
+    postgres = db.get_bind().dialect.name == "postgresql"
+
+    where = [c.collected_at >= start, c.collected_at < end]
+    if device_ids is not None:
+        where.append(c.device_id.in_(list(device_ids)))
+
+    bucket = _bucket(db, c.collected_at, period_type).label("bucket")
+    clients = func.coalesce(c.wifi_clients_24ghz, 0) + func.coalesce(c.wifi_clients_5ghz, 0)
+    online = func.sum(case((func.coalesce(c.ping_packet_loss, 0) < 100, 1), else_=0))
+    p95 = func.percentile_cont(P95).within_group(c.ping_latency_ms) if postgres else null()
+
+    stmt = (
+        select(
+            c.device_id,
+            bucket,
+            func.sum(func.coalesce(c.bytes_received, 0)),
+            func.sum(func.coalesce(c.bytes_sent, 0)),
+            func.avg(func.coalesce(c.bytes_received, 0)),
+            func.avg(func.coalesce(c.bytes_sent, 0)),
+            func.avg(c.ping_latency_ms),
+            func.min(c.ping_latency_ms),
+            func.max(c.ping_latency_ms),
+            p95,
+            func.count(),
+            online,
+            func.avg(clients),
+            func.max(clients),
+        )
+        .where(*where)
+        .group_by(c.device_id, bucket)
+    )
+    p95_sqlite = {} if postgres else _p95_by_group(db, src, bucket, where)
+    expected = step.total_seconds() / settings.METRICS_COLLECT_INTERVAL
+
+    rows: List[Dict[str, Any]] = []
+    for (device_id, period_start, rx, tx, avg_rx, avg_tx, avg_lat, min_lat, max_lat,
+         p95_lat, samples, online_samples, avg_clients, max_clients) in db.execute(stmt):
+        period_start = _as_datetime(period_start)
+        if not postgres:
+            p95_lat = p95_sqlite.get((device_id, period_start))
+        rows.append({
+            "device_id": device_id,
+            "period_type": period_type,
+            "period_start": period_start,
+            "period_end": period_start + step,
+            "total_bytes_rx": rx,
+            "total_bytes_tx": tx,
+            "avg_bytes_rx": avg_rx,
+            "avg_bytes_tx": avg_tx,
+            "avg_latency": avg_lat,
+            "min_latency": min_lat,
+            "max_latency": max_lat,
+            "p95_latency": p95_lat,
+            "uptime_percentage": min(100.0, 100.0 * online_samples / max(samples, expected)),
+            "total_samples": samples,
+            "online_samples": online_samples,
+            "avg_wifi_clients": avg_clients,
+            "max_wifi_clients": max_clients,
+        })
+    return rows
+
+
+def rollup_range(
+    db: Session,
+    start: datetime,
+    end: datetime,
+    period_type: str = "day",
+    source: Table = None,
+    commit: bool = True,
+    device_ids: Optional[Iterable[int]] = None,
+) -> int:
+    """
+    Agrega [start, end) (ver aggregate_range) e grava em metric_aggregations.
+
+    Returns:
+        Quantidade de agregações gravadas (criadas ou atualizadas)
+    """
+    rows = aggregate_range(db, start, end, period_type, source=source, device_ids=device_ids)
+    if rows:
+        _upsert(db, rows)
+    if commit:
+        db.commit()
+    name = source.name if source is not None else DeviceMetric.__tablename__
+    log.debug(f"[Rollup] {len(rows)} agregações '{period_type}' em [{start}, {end}) de {name}")
+    return len(rows)
+
+
+# ============ Job incremental ============
+
+def get_watermark(db: Session, period_type: str) -> Optional[datetime]:
+    """Fim do último período já agregado pelo job (None se nunca rodou)."""
+    value = db.scalar(select(SystemConfig.value).where(SystemConfig.key == _WATERMARK_KEY.format(period_type)))
+    return datetime.fromisoformat(value) if value else None
+
+
+def _set_watermark(db: Session, period_type: str, value: datetime) -> None:
+    key = _WATERMARK_KEY.format(period_type)
+    rec = db.query(SystemConfig).filter(SystemConfig.key == key).first()
+    if rec is None:
+        rec = SystemConfig(
+            key=key,
+            value_type="datetime",
+            description=f"Rollup '{period_type}' de métricas concluído até esta data (exclusive)",
+        )
+        db.add(rec)
+    rec.value = value.isoformat()
+
+
+def run_rollups(
+    db: Session,
+    now: Optional[datetime] = None,
+    periods: Optional[Iterable[str]] = None,
+) -> Dict[str, int]:
+    """
+    Agrega, para todos os dispositivos, os períodos completos entre a marca
+    d'água de cada tipo e now - METRICS_ROLLUP_GRACE_SECONDS. Cada lote
+    (_CHUNK_SPAN) é gravado junto com a nova marca d'água num único commit.
+
+    Na primeira execução começa pela amostra mais antiga de device_metrics
+    (meses já arquivados têm o rollup diário feito no fechamento da partição).
+
+    Returns:
+        Agregações gravadas por tipo de período
+    """
+    now = now or datetime.utcnow()
+    if periods is None:
+        periods = [p.strip() for p in settings.METRICS_ROLLUP_PERIODS.split(",") if p.strip()]
+    horizon = now - timedelta(seconds=settings.METRICS_ROLLUP_GRACE_SECONDS)
+
+    written: Dict[str, int] = {}
+    for period_type in periods:
+        if period_type not in PERIODS:
+            raise ValueError(f"period_type inválido: {period_type}")
+        end = period_floor(horizon, period_type)
+        start = get_watermark(db, period_type)
+        if start is None:
+            oldest = db.scalar(select(func.min(DeviceMetric.collected_at)))
+            if oldest is None:
+                continue
+            start = period_floor(_as_datetime(oldest), period_type)
+
+        written[period_type] = 0
+        while start < end:
+            chunk_end = min(end, start + _CHUNK_SPAN[period_type])
+            try:
+                written[period_type] += rollup_range(db, start, chunk_end, period_type, commit=False)
+                _set_watermark(db, period_type, chunk_end)
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            start = chunk_end
+        if written[period_type]:
+            log.info(f"[Rollup] '{period_type}': {written[period_type]} agregações até {end}")
+    return written
+
+
+def rollup_status(db: Session) -> Dict[str, Optional[str]]:
+    """Marca d'água de cada tipo de período (ISO) para diagnóstico."""
+    status = {}
+    for period_type in PERIODS:
+        watermark = get_watermark(db, period_type)
+        status[period_type] = watermark.isoformat() if watermark else None
+    return status
+
+
+__all__ = [
+    "PERIODS",
+    "aggregate_range",
+    "get_watermark",
+    "period_floor",
+    "rollup_range",
+    "rollup_status",
+    "run_rollups",
+]
@@ -0,0 +1,267 @@
+# app/services/metric_series.py
+"""
+Leitura em massa de device_metrics no formato colunar.
+
+Para dashboards e análises offline que puxam semanas de dados de milhares de
+CPEs: as linhas vêm de select() de colunas (tuplas, sem hidratar objetos ORM),
+em streaming, e são agrupadas por dispositivo em arrays paralelos:
+
+    {"00259E-...": {"t": [ms, ...], "ping_latency_ms": [12.1, None, ...]}}
+
+t é epoch em milissegundos (UTC). Meses já arquivados (metric_partitions)
+entram na leitura quando o intervalo os alcança.
+
+Codificações:
+- json:   o dicionário acima (serializado com orjson pelo router)
+- arrow:  Arrow IPC stream, tabela longa (device_id, t, campos...); requer o
+          pacote opcional pyarrow
+- binary: formato compacto próprio, little-endian:
+            b"SMS1" | u16 nº de campos | por campo: u8 tamanho + nome utf-8
+            | u32 nº de dispositivos | por dispositivo: u16 tamanho + id utf-8
+            | u32 n | i64[n] t (ms) | por campo: f64[n] (NaN = nulo)
+          legível com numpy.frombuffer ou struct
+"""
+from __future__ import annotations
+
+import logging
+import math
+import struct
+import sys
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.database.models import Device
+from app.services.metric_partitions import metric_partitions
+
+log = logging.getLogger("semppre-bridge.series")
+
+# Colunas numéricas de device_metrics disponíveis como série
+SERIES_FIELDS = (
+    "bytes_received",
+    "bytes_sent",
+    "packets_received",
+    "packets_sent",
+    "errors_received",
+    "errors_sent",
+    "ping_latency_ms",
+    "ping_jitter_ms",
+    "ping_packet_loss",
+    "wifi_clients_24ghz",
+    "wifi_clients_5ghz",
+    "channel_24ghz",
+    "channel_5ghz",
+    "noise_24ghz",
+    "noise_5ghz",
+    "cpu_usage",
+    "memory_usage",
+    "uptime_seconds",
+    "lan_clients",
+)
+
+FORMATS = ("json", "arrow", "binary")
+MEDIA_TYPES = {
+    "arrow": "application/vnd.apache.arrow.stream",
+    "binary": "application/octet-stream",
+}
+
+# Limite de parâmetros por IN (...) — SQLite antigo aceita no máximo 999
+_IN_CHUNK = 500
+_YIELD_PER = 10_000
+
+Columns = Dict[str, List[Any]]
+
+
+_EPOCH = datetime(1970, 1, 1)
+_MS = timedelta(milliseconds=1)
+
+
+def _epoch_ms(value: Any) -> int:
+    """datetime (naive = UTC, como gravado pelo coletor) -> epoch em ms."""
+    if not isinstance(value, datetime):
+        value = datetime.fromisoformat(str(value))
+    if value.tzinfo is not None:
+        return int(value.timestamp() * 1000)
+    return (value - _EPOCH) // _MS
+
+
+def validate_fields(fields: Sequence[str]) -> List[str]:
+    """Campos pedidos, sem repetição; ValueError para campo desconhecido."""
+    unknown = [f for f in fields if f not in SERIES_FIELDS]
+    if unknown:
+        raise ValueError(f"campos inválidos: {', '.join(unknown)}")
+    return list(dict.fromkeys(fields))
+
+
+def to_columns(rows: Iterable[Sequence[Any]], fields: Sequence[str]) -> Columns:
+    """Tuplas (collected_at, *fields) -> {"t": [ms...], campo: [...]} na ordem recebida."""
+    columns: Columns = {"t": [], **{f: [] for f in fields}}
+    appenders = [columns[f].append for f in fields]
+    append_t = columns["t"].append
+    for row in rows:
+        append_t(_epoch_ms(row[0]))
+        for append, value in zip(appenders, row[1:]):
+            append(value)
+    return columns
+
+
+def read_series(
+    db: Session,
+    device_ids: Sequence[str],
+    fields: Sequence[str],
+    start: datetime,
+    end: Optional[datetime] = None,
+) -> Dict[str, Columns]:
+    """
+    Séries colunares de [start, end) dos dispositivos pedidos (device_id do
+    GenieACS), em ordem temporal. Dispositivos desconhecidos ou sem amostras
+    no intervalo ficam de fora.
+    """
+    fields = validate_fields(fields)
+    end = end or datetime.utcnow()
+
+    id_map: Dict[int, str] = {}
+    ids = list(dict.fromkeys(d for d in device_ids if d))
+    for i in range(0, len(ids), _IN_CHUNK):
+        for pk, device_id in db.execute(
+            select(Device.id, Device.device_id).where(Device.device_id.in_(ids[i:i + _IN_CHUNK]))
+        ):
+            id_map[pk] = device_id
+    if not id_map:
+        return {}
+
+    # Arquivos (meses mais antigos) primeiro, tabela quente por último:
+    # cada dispositivo recebe as amostras já em ordem temporal
+    tables = metric_partitions.tables_for_range(db, start, end)
+    tables = tables[1:] + tables[:1]
+
+    series: Dict[str, Columns] = {}
+    pks = list(id_map)
+    for table in tables:
+        c = table.c
+        for i in range(0, len(pks), _IN_CHUNK):
+            stmt = (
+                select(c.device_id, c.collected_at, *(c[f] for f in fields))
+                .where(
+                    c.device_id.in_(pks[i:i + _IN_CHUNK]),
+                    c.collected_at >= start,
+                    c.collected_at < end,
+                )
+                .order_by(c.device_id, c.collected_at)
+                .execution_options(yield_per=_YIELD_PER)
+            )
+            current_pk = None
+            cols: Columns = {}
+            for row in db.execute(stmt):
+                if row[0] != current_pk:
+                    current_pk = row[0]
+                    cols = series.setdefault(id_map[current_pk], {"t": [], **{f: [] for f in fields}})
+                cols["t"].append(_epoch_ms(row[1]))
+                for f, value in zip(fields, row[2:]):
+                    cols[f].append(value)
+    log.debug(f"[Series] {sum(len(c['t']) for c in series.values())} amostras de {len(series)} dispositivos")
+    return series
+
+
+# ============ Codificações ============
+
+def arrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def encode_arrow(series: Dict[str, Columns], fields: Sequence[str]) -> bytes:
+    """Arrow IPC stream com uma tabela longa (device_id, t, campos...)."""
+    import pyarrow as pa
+
+    device_col: List[str] = []
+    t_col: List[int] = []
+    values: Dict[str, List[Any]] = {f: [] for f in fields}
+    for device_id, cols in series.items():
+        device_col.extend([device_id] * len(cols["t"]))
+        t_col.extend(cols["t"])
+        for f in fields:
+            values[f].extend(cols[f])
+
+    table = pa.table({
+        "device_id": pa.array(device_col, pa.string()).dictionary_encode(),
+        "t": pa.array(t_col, pa.timestamp("ms")),
+        **{f: pa.array(values[f], pa.float64()) for f in fields},
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _le(arr: array) -> bytes:
+    if sys.byteorder != "little":
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def encode_binary(series: Dict[str, Columns], fields: Sequence[str]) -> bytes:
+    """Formato compacto SMS1 (ver docstring do módulo)."""
+    nan = math.nan
+    parts: List[bytes] = [b"SMS1", struct.pack("<H", len(fields))]
+    for f in fields:
+        name = f.encode()
+        parts.append(struct.pack("<B", len(name)) + name)
+    parts.append(struct.pack("<I", len(series)))
+    for device_id, cols in series.items():
+        key = device_id.encode()
+        parts.append(struct.pack("<H", len(key)) + key + struct.pack("<I", len(cols["t"])))
+        parts.append(_le(array("q", cols["t"])))
+        for f in fields:
+            parts.append(_le(array("d", (nan if v is None else v for v in cols[f]))))
+    return b"".join(parts)
+
+
+def decode_binary(data: bytes) -> Dict[str, Columns]:
+    """Inverso de encode_binary (para clientes Python e testes manuais)."""
+    if data[:4] != b"SMS1":
+        raise ValueError("formato binário desconhecido")
+    pos = 4
+    (n_fields,) = struct.unpack_from("<H", data, pos)
+    pos += 2
+    fields = []
+    for _ in range(n_fields):
+        size = data[pos]
+        fields.append(data[pos + 1:pos + 1 + size].decode())
+        pos += 1 + size
+    (n_devices,) = struct.unpack_from("<I", data, pos)
+    pos += 4
+    series: Dict[str, Columns] = {}
+    for _ in range(n_devices):
+        (size,) = struct.unpack_from("<H", data, pos)
+        device_id = data[pos + 2:pos + 2 + size].decode()
+        pos += 2 + size
+        (n,) = struct.unpack_from("<I", data, pos)
+        pos += 4
+        cols: Columns = {"t": list(struct.unpack_from(f"<{n}q", data, pos))}
+        pos += 8 * n
+        for f in fields:
+            cols[f] = [None if v != v else v for v in struct.unpack_from(f"<{n}d", data, pos)]
+            pos += 8 * n
+        series[device_id] = cols
+    return series
+
+
+__all__ = [
+    "FORMATS",
+    "MEDIA_TYPES",
+    "SERIES_FIELDS",
+    "arrow_available",
+    "decode_binary",
+    "encode_arrow",
+    "encode_binary",
+    "read_series",
+    "to_columns",
+    "validate_fields",
+]
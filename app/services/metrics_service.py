@@ -2,18 +2,56 @@
 # Serviço de coleta e armazenamento de métricas
 
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterable
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, desc
+from sqlalchemy import func, and_, case, desc, insert, select, update, bindparam, Table
 import logging
 
 from app.database.models import (
     Device, DeviceMetric, DiagnosticLog, WifiSnapshot,
     ClientSession, AlertEvent, TaskHistory, MetricAggregation
 )
+from app.services.metric_partitions import metric_partitions
+from app.services.metric_rollup import PERIODS, aggregate_range, get_watermark, period_floor, rollup_range
+from app.services.series_downsample import downsample
+from app.settings import settings
 
 log = logging.getLogger("semppre-bridge.metrics")
 
+# Limite de parâmetros por IN (...) — SQLite antigo aceita no máximo 999
+_IN_CHUNK = 500
+
+# Campos dos pontos de get_metric_series (e guias válidos da redução)
+SERIES_FIELDS = (
+    "avg_latency", "min_latency", "max_latency", "p95_latency",
+    "avg_bytes_rx", "avg_bytes_tx", "avg_wifi_clients", "uptime_percentage", "samples",
+)
+
+
+def _dialect_insert(db: Session):
+    """insert() com suporte a ON CONFLICT do dialeto, ou None se não houver."""
+    name = db.get_bind().dialect.name
+    if name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+def _uniform_rows(table: Table, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Normaliza as linhas para o mesmo conjunto de colunas (requisito do executemany).
+    Colunas ausentes recebem o default escalar da coluna, ou None.
+    """
+    keys = {k for row in rows for k in row if k in table.c}
+    defaults = {}
+    for key in keys:
+        default = table.c[key].default
+        defaults[key] = default.arg if default is not None and default.is_scalar else None
+    return [{k: row.get(k, defaults[k]) for k in keys} for row in rows]
+
 
 class MetricsService:
     """Serviço para gerenciar métricas de dispositivos."""
@@ -97,6 +135,44 @@ class MetricsService:
         
         return metric
     
+    def read_metrics(
+        self,
+        device_pk: int,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: Optional[int] = None,
+        newest_first: bool = True
+    ) -> List[DeviceMetric]:
+        """
+        Amostras de um dispositivo (Device.id) em [start, end], incluindo os
+        meses já arquivados (metric_partitions). Com arquivos no período as
+        linhas voltam como DeviceMetric transientes (fora da sessão).
+        """
+        start = start or datetime.min
+        end = end or datetime.max
+        # end inclusivo; source_for_range recorta [start, end)
+        source = metric_partitions.source_for_range(
+            self.db, start, end if end == datetime.max else end + timedelta(microseconds=1)
+        )
+        order = desc(source.c.collected_at) if newest_first else source.c.collected_at
+        
+        if source is DeviceMetric.__table__:
+            query = self.db.query(DeviceMetric).filter(
+                DeviceMetric.device_id == device_pk,
+                DeviceMetric.collected_at >= start,
+                DeviceMetric.collected_at <= end
+            ).order_by(order)
+            return (query.limit(limit) if limit else query).all()
+        
+        stmt = select(source).where(
+            source.c.device_id == device_pk,
+            source.c.collected_at >= start,
+            source.c.collected_at <= end
+        ).order_by(order)
+        if limit:
+            stmt = stmt.limit(limit)
+        return [DeviceMetric(**row) for row in self.db.execute(stmt).mappings()]
+    
     def get_metrics(
         self,
         device_id: str,
@@ -105,31 +181,31 @@ class MetricsService:
         limit: int = 100
     ) -> List[DeviceMetric]:
         """
-        Busca métricas de um dispositivo em um período.
+        Busca métricas de um dispositivo em um período (mais recentes primeiro).
         """
         device = self.get_device(device_id)
         if not device:
             return []
         
-        query = self.db.query(DeviceMetric).filter(DeviceMetric.device_id == device.id)
-        
-        if start_time:
-            query = query.filter(DeviceMetric.collected_at >= start_time)
-        if end_time:
-            query = query.filter(DeviceMetric.collected_at <= end_time)
-        
-        return query.order_by(desc(DeviceMetric.collected_at)).limit(limit).all()
+        return self.read_metrics(device.id, start_time, end_time, limit=limit)
     
     def get_latest_metric(self, device_id: str) -> Optional[DeviceMetric]:
-        """Busca a métrica mais recente de um dispositivo."""
+        """
+        Busca a métrica mais recente de um dispositivo. Olha só a tabela
+        quente; os arquivos (UNION de todos os meses) só se ela não tiver nada.
+        """
         device = self.get_device(device_id)
         if not device:
             return None
         
-        return self.db.query(DeviceMetric)\
-            .filter(DeviceMetric.device_id == device.id)\
-            .order_by(desc(DeviceMetric.collected_at))\
-            .first()
+        latest = self.db.query(DeviceMetric).filter(
+            DeviceMetric.device_id == device.id
+        ).order_by(desc(DeviceMetric.collected_at)).first()
+        if latest is not None:
+            return latest
+        
+        metrics = self.read_metrics(device.id, limit=1)
+        return metrics[0] if metrics else None
     
     def get_metrics_summary(
         self,
@@ -138,37 +214,56 @@ class MetricsService:
     ) -> Dict[str, Any]:
         """
         Retorna resumo estatístico das métricas das últimas N horas.
+        Janelas longas são resumidas a partir das agregações (ver
+        plan_resolution). Em qualquer resolução packet_loss_avg é a
+        porcentagem de amostras sem resposta (perda de 100%), a mesma base
+        do online_samples das agregações.
         """
         device = self.get_device(device_id)
         if not device:
             return {}
         
-        since = datetime.utcnow() - timedelta(hours=hours)
-        
-        result = self.db.query(
-            func.count(DeviceMetric.id).label("total_samples"),
-            func.avg(DeviceMetric.ping_latency_ms).label("avg_latency"),
-            func.min(DeviceMetric.ping_latency_ms).label("min_latency"),
-            func.max(DeviceMetric.ping_latency_ms).label("max_latency"),
-            func.avg(DeviceMetric.ping_packet_loss).label("avg_packet_loss"),
-            func.sum(DeviceMetric.bytes_received).label("total_bytes_rx"),
-            func.sum(DeviceMetric.bytes_sent).label("total_bytes_tx"),
-            func.avg(DeviceMetric.wifi_clients_24ghz + DeviceMetric.wifi_clients_5ghz).label("avg_wifi_clients"),
-            func.max(DeviceMetric.wifi_clients_24ghz + DeviceMetric.wifi_clients_5ghz).label("max_wifi_clients"),
-        ).filter(
-            DeviceMetric.device_id == device.id,
-            DeviceMetric.collected_at >= since
+        now = datetime.utcnow()
+        since = now - timedelta(hours=hours)
+        resolution = self.plan_resolution(since, now)
+        
+        if resolution != "raw":
+            return self._summary_from_aggregates(
+                self._stitched_aggregates(device.id, since, now, resolution), hours, resolution
+            )
+        
+        # Janela curta, mas pode começar num mês já arquivado
+        src = metric_partitions.source_for_range(self.db, since, now + timedelta(microseconds=1)).c
+        clients = src.wifi_clients_24ghz + src.wifi_clients_5ghz
+        result = self.db.execute(
+            select(
+                func.count().label("total_samples"),
+                func.avg(src.ping_latency_ms).label("avg_latency"),
+                func.min(src.ping_latency_ms).label("min_latency"),
+                func.max(src.ping_latency_ms).label("max_latency"),
+                func.sum(case((func.coalesce(src.ping_packet_loss, 0) >= 100, 1), else_=0)).label("lost_samples"),
+                func.sum(src.bytes_received).label("total_bytes_rx"),
+                func.sum(src.bytes_sent).label("total_bytes_tx"),
+                func.avg(clients).label("avg_wifi_clients"),
+                func.max(clients).label("max_wifi_clients"),
+            ).where(
+                src.device_id == device.id,
+                src.collected_at >= since,
+                src.collected_at <= now
+            )
         ).first()
+        samples = result.total_samples or 0
         
         return {
             "period_hours": hours,
-            "total_samples": result.total_samples or 0,
+            "resolution": "raw",
+            "total_samples": samples,
             "latency": {
                 "avg_ms": round(result.avg_latency or 0, 2),
                 "min_ms": round(result.min_latency or 0, 2),
                 "max_ms": round(result.max_latency or 0, 2),
             },
-            "packet_loss_avg": round(result.avg_packet_loss or 0, 2),
+            "packet_loss_avg": round(100 * (result.lost_samples or 0) / samples, 2) if samples else 0,
             "traffic": {
                 "total_rx_bytes": result.total_bytes_rx or 0,
                 "total_tx_bytes": result.total_bytes_tx or 0,
@@ -179,6 +274,318 @@ class MetricsService:
             }
         }
     
+    @staticmethod
+    def _summary_from_aggregates(rows: List[Dict[str, Any]], hours: int, resolution: str) -> Dict[str, Any]:
+        """get_metrics_summary combinando agregações (médias ponderadas pelas amostras)."""
+        samples = sum(r["total_samples"] or 0 for r in rows)
+        online = sum(r["online_samples"] or 0 for r in rows)
+        with_latency = [r for r in rows if r["avg_latency"] is not None]
+        weight = sum(r["total_samples"] for r in with_latency)
+        
+        def weighted(key: str) -> float:
+            return sum(r[key] * r["total_samples"] for r in with_latency) / weight if weight else 0
+        
+        return {
+            "period_hours": hours,
+            "resolution": resolution,
+            "total_samples": samples,
+            "latency": {
+                "avg_ms": round(weighted("avg_latency"), 2),
+                "min_ms": round(min((r["min_latency"] for r in with_latency), default=0), 2),
+                "max_ms": round(max((r["max_latency"] for r in with_latency), default=0), 2),
+            },
+            "packet_loss_avg": round(100 * (samples - online) / samples, 2) if samples else 0,
+            "traffic": {
+                "total_rx_bytes": sum(r["total_bytes_rx"] or 0 for r in rows),
+                "total_tx_bytes": sum(r["total_bytes_tx"] or 0 for r in rows),
+            },
+            "wifi_clients": {
+                "avg": round(
+                    sum((r["avg_wifi_clients"] or 0) * r["total_samples"] for r in rows) / samples, 1
+                ) if samples else 0,
+                "max": max((r["max_wifi_clients"] or 0 for r in rows), default=0),
+            }
+        }
+    
+    # ============ Séries de histórico (planejador de resolução) ============
+    
+    def plan_resolution(
+        self,
+        start: datetime,
+        end: datetime,
+        max_points: Optional[int] = None
+    ) -> str:
+        """
+        Escolhe a resolução mais fina (raw, hour, day, week) cujo número
+        estimado de linhas cabe em max_points * METRICS_SERIES_OVERSAMPLE.
+        Amostras brutas são estimadas por METRICS_COLLECT_INTERVAL.
+        """
+        budget = (max_points or settings.METRICS_SERIES_MAX_POINTS) * settings.METRICS_SERIES_OVERSAMPLE
+        span = max((end - start).total_seconds(), 0)
+        if span / settings.METRICS_COLLECT_INTERVAL <= budget:
+            return "raw"
+        for period_type in ("hour", "day"):
+            if span / PERIODS[period_type].total_seconds() <= budget:
+                return period_type
+        return "week"
+    
+    def _stitched_aggregates(
+        self,
+        device_pk: int,
+        start: datetime,
+        end: datetime,
+        period_type: str
+    ) -> List[Dict[str, Any]]:
+        """
+        Agregações de [start, end) em `period_type`, em ordem:
+        - período inicial incompleto: calculado das amostras brutas a partir de start
+        - períodos completos até a marca d'água do rollup: lidos de metric_aggregations
+        - do fim da marca d'água até end (inclui o período corrente): calculado na hora
+        """
+        step = PERIODS[period_type]
+        first_full = period_floor(start, period_type)
+        if first_full < start:
+            first_full += step
+        first_full = min(first_full, end)
+        watermark = get_watermark(self.db, period_type) or first_full
+        covered_end = max(first_full, min(watermark, end))
+        
+        # Os trechos calculados na hora podem cair em meses já arquivados
+        rows = aggregate_range(
+            self.db, start, first_full, period_type,
+            source=metric_partitions.source_for_range(self.db, start, first_full), device_ids=[device_pk]
+        ) if start < first_full else []
+        stored = self.db.query(MetricAggregation).filter(
+            MetricAggregation.device_id == device_pk,
+            MetricAggregation.period_type == period_type,
+            MetricAggregation.period_start >= first_full,
+            MetricAggregation.period_start < covered_end
+        ).order_by(MetricAggregation.period_start).all()
+        rows.extend({c.name: getattr(agg, c.name) for c in MetricAggregation.__table__.columns} for agg in stored)
+        if covered_end < end:
+            rows.extend(sorted(
+                aggregate_range(
+                    self.db, covered_end, end, period_type,
+                    source=metric_partitions.source_for_range(self.db, covered_end, end), device_ids=[device_pk]
+                ),
+                key=lambda r: r["period_start"]
+            ))
+        return rows
+    
+    def get_metric_series(
+        self,
+        device_id: str,
+        start: datetime,
+        end: Optional[datetime] = None,
+        max_points: Optional[int] = None,
+        resolution: str = "auto",
+        method: str = "lttb",
+        field: str = "avg_latency"
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Série de histórico pronta para gráfico.
+        
+        resolution="auto" usa plan_resolution: janelas curtas vêm das
+        amostras brutas, longas das agregações hour/day/week (com o período
+        corrente calculado das amostras). A série lida é reduzida a
+        max_points com `method` (lttb | minmax) guiado por `field`.
+        """
+        device = self.get_device(device_id)
+        if not device:
+            return None
+        
+        if field not in SERIES_FIELDS:
+            raise ValueError(f"field inválido: {field} (use {', '.join(SERIES_FIELDS)})")
+        
+        end = end or datetime.utcnow()
+        max_points = max_points or settings.METRICS_SERIES_MAX_POINTS
+        if resolution == "auto":
+            resolution = self.plan_resolution(start, end, max_points)
+        
+        if resolution == "raw":
+            # Tabela quente + meses arquivados da janela
+            src = metric_partitions.source_for_range(self.db, start, end).c
+            clients = func.coalesce(src.wifi_clients_24ghz, 0) + func.coalesce(src.wifi_clients_5ghz, 0)
+            points = [
+                {
+                    "t": t,
+                    "avg_latency": latency,
+                    "min_latency": latency,
+                    "max_latency": latency,
+                    "p95_latency": latency,
+                    "avg_bytes_rx": rx,
+                    "avg_bytes_tx": tx,
+                    "avg_wifi_clients": wifi,
+                    "uptime_percentage": 0.0 if (loss or 0) >= 100 else 100.0,
+                    "samples": 1,
+                }
+                for t, latency, rx, tx, wifi, loss in self.db.execute(
+                    select(
+                        src.collected_at, src.ping_latency_ms,
+                        src.bytes_received, src.bytes_sent,
+                        clients, src.ping_packet_loss,
+                    )
+                    .where(
+                        src.device_id == device.id,
+                        src.collected_at >= start,
+                        src.collected_at < end,
+                    )
+                    .order_by(src.collected_at)
+                )
+            ]
+        elif resolution in PERIODS:
+            points = [
+                {
+                    "t": r["period_start"],
+                    "avg_latency": r["avg_latency"],
+                    "min_latency": r["min_latency"],
+                    "max_latency": r["max_latency"],
+                    "p95_latency": r["p95_latency"],
+                    "avg_bytes_rx": r["avg_bytes_rx"],
+                    "avg_bytes_tx": r["avg_bytes_tx"],
+                    "avg_wifi_clients": r["avg_wifi_clients"],
+                    "uptime_percentage": r["uptime_percentage"],
+                    "samples": r["total_samples"],
+                }
+                for r in self._stitched_aggregates(device.id, start, end, resolution)
+            ]
+        else:
+            raise ValueError(f"resolution inválida: {resolution}")
+        
+        source_rows = len(points)
+        if source_rows > max_points:
+            reduced = downsample(points, max_points, method, x="t", y=field)
+            # Série sem valores no campo guia: amostragem uniforme
+            points = reduced or points[::-(-source_rows // max_points)]
+        
+        return {
+            "device_id": device_id,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "resolution": resolution,
+            "method": method if source_rows > max_points else None,
+            "source_rows": source_rows,
+            "points": [{**p, "t": p["t"].isoformat()} for p in points],
+        }
+    
+    # ============ Escrita em lote (coletor) ============
+    
+    def get_device_id_map(self, device_ids: Iterable[str]) -> Dict[str, int]:
+        """Mapa device_id (GenieACS) -> Device.id, com um SELECT ... IN por bloco."""
+        ids = list(dict.fromkeys(d for d in device_ids if d))
+        id_map: Dict[str, int] = {}
+        for i in range(0, len(ids), _IN_CHUNK):
+            chunk = ids[i:i + _IN_CHUNK]
+            for pk, device_id in self.db.execute(
+                select(Device.id, Device.device_id).where(Device.device_id.in_(chunk))
+            ):
+                id_map[device_id] = pk
+        return id_map
+    
+    def bulk_upsert_devices(self, rows: List[Dict[str, Any]], commit: bool = True) -> Dict[str, int]:
+        """
+        Cria ou atualiza vários dispositivos de uma vez (uma página do coletor).
+        
+        Cada linha tem "device_id" + colunas de Device. Como em upsert_device,
+        valores None não sobrescrevem o que já está no banco.
+        Em SQLite/PostgreSQL usa INSERT ... ON CONFLICT (device_id) DO UPDATE;
+        nos demais, um SELECT ... IN seguido de insert/update em executemany.
+        
+        Returns:
+            Mapa device_id -> Device.id de todas as linhas
+        """
+        rows = [r for r in rows if r.get("device_id")]
+        if not rows:
+            return {}
+        
+        now = datetime.utcnow()
+        table = Device.__table__
+        values = _uniform_rows(table, [{**r, "last_sync": now, "updated_at": now} for r in rows])
+        columns = [k for k in values[0] if k not in ("device_id", "last_sync", "updated_at")]
+        
+        dialect_insert = _dialect_insert(self.db)
+        if dialect_insert is not None:
+            stmt = dialect_insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.device_id],
+                set_={
+                    **{c: func.coalesce(stmt.excluded[c], table.c[c]) for c in columns},
+                    "last_sync": stmt.excluded.last_sync,
+                    "updated_at": stmt.excluded.updated_at,
+                },
+            )
+            self.db.execute(stmt, values)
+            id_map = self.get_device_id_map(r["device_id"] for r in values)
+        else:
+            id_map = self.get_device_id_map(r["device_id"] for r in values)
+            new_rows = [r for r in values if r["device_id"] not in id_map]
+            old_rows = [
+                {"b_device_id": r["device_id"], **{f"b_{k}": v for k, v in r.items() if k != "device_id"}}
+                for r in values if r["device_id"] in id_map
+            ]
+            if new_rows:
+                self.db.execute(insert(table), new_rows)
+            if old_rows:
+                self.db.execute(
+                    update(table)
+                    .where(table.c.device_id == bindparam("b_device_id"))
+                    .values({
+                        **{c: func.coalesce(bindparam(f"b_{c}"), table.c[c]) for c in columns},
+                        "last_sync": bindparam("b_last_sync"),
+                        "updated_at": bindparam("b_updated_at"),
+                    }),
+                    old_rows,
+                )
+            if new_rows:
+                id_map.update(self.get_device_id_map(r["device_id"] for r in new_rows))
+        
+        if commit:
+            self.db.commit()
+        return id_map
+    
+    def bulk_record_metrics(
+        self,
+        rows: List[Dict[str, Any]],
+        id_map: Optional[Dict[str, int]] = None,
+        commit: bool = True
+    ) -> int:
+        """
+        Registra métricas de vários dispositivos com um único INSERT em executemany.
+        
+        Args:
+            rows: Dicts com "device_id" (GenieACS) + métricas; campos que não
+                  são colunas de DeviceMetric vão para extra_metrics
+            id_map: Mapa device_id -> Device.id (ex: retorno de bulk_upsert_devices);
+                    dispositivos ausentes são criados como em record_metric
+        
+        Returns:
+            Quantidade de métricas inseridas
+        """
+        rows = [r for r in rows if r.get("device_id")]
+        if not rows:
+            return 0
+        
+        id_map = dict(id_map) if id_map is not None else self.get_device_id_map(r["device_id"] for r in rows)
+        missing = [r["device_id"] for r in rows if r["device_id"] not in id_map]
+        if missing:
+            id_map.update(self.bulk_upsert_devices([{"device_id": d} for d in missing], commit=False))
+        
+        table = DeviceMetric.__table__
+        collected_at = datetime.utcnow()
+        values = []
+        for row in rows:
+            metric = {k: v for k, v in row.items() if k in table.c and k not in ("id", "device_id")}
+            extra = {k: v for k, v in row.items() if k not in table.c and k != "device_id"}
+            metric["device_id"] = id_map[row["device_id"]]
+            metric.setdefault("collected_at", collected_at)
+            metric["extra_metrics"] = extra or metric.get("extra_metrics") or {}
+            values.append(metric)
+        
+        self.db.execute(insert(table), _uniform_rows(table, values))
+        if commit:
+            self.db.commit()
+        return len(values)
+    
     # ============ Diagnósticos ============
     
     def create_diagnostic(
@@ -455,88 +862,40 @@ class MetricsService:
         period_type: str = "hour"
     ) -> Optional[MetricAggregation]:
         """
-        Cria agregação de métricas para o último período completo.
+        Cria (ou atualiza) a agregação de métricas do último período completo.
+        O cálculo é o mesmo rollup em SQL do job da frota (metric_rollup),
+        restrito a este dispositivo.
         """
+        if period_type not in PERIODS:
+            return None
         device = self.get_device(device_id)
         if not device:
             return None
         
-        now = datetime.utcnow()
+        period_end = period_floor(datetime.utcnow(), period_type)
+        period_start = period_end - PERIODS[period_type]
         
-        # Determinar período
-        if period_type == "hour":
-            period_end = now.replace(minute=0, second=0, microsecond=0)
-            period_start = period_end - timedelta(hours=1)
-        elif period_type == "day":
-            period_end = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            period_start = period_end - timedelta(days=1)
-        elif period_type == "week":
-            period_end = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            period_end -= timedelta(days=period_end.weekday())  # início da semana
-            period_start = period_end - timedelta(weeks=1)
-        else:
+        if not rollup_range(self.db, period_start, period_end, period_type, device_ids=[device.id]):
             return None
         
-        # Verificar se já existe
-        existing = self.db.query(MetricAggregation).filter(
+        return self.db.query(MetricAggregation).filter(
             MetricAggregation.device_id == device.id,
             MetricAggregation.period_type == period_type,
             MetricAggregation.period_start == period_start
         ).first()
-        
-        if existing:
-            return existing
-        
-        # Calcular agregações
-        metrics = self.db.query(DeviceMetric).filter(
-            DeviceMetric.device_id == device.id,
-            DeviceMetric.collected_at >= period_start,
-            DeviceMetric.collected_at < period_end
-        ).all()
-        
-        if not metrics:
-            return None
-        
-        # Calcular estatísticas
-        latencies = [m.ping_latency_ms for m in metrics if m.ping_latency_ms]
-        
-        agg = MetricAggregation(
-            device_id=device.id,
-            period_type=period_type,
-            period_start=period_start,
-            period_end=period_end,
-            total_bytes_rx=sum(m.bytes_received or 0 for m in metrics),
-            total_bytes_tx=sum(m.bytes_sent or 0 for m in metrics),
-            avg_bytes_rx=sum(m.bytes_received or 0 for m in metrics) / len(metrics),
-            avg_bytes_tx=sum(m.bytes_sent or 0 for m in metrics) / len(metrics),
-            avg_latency=sum(latencies) / len(latencies) if latencies else None,
-            min_latency=min(latencies) if latencies else None,
-            max_latency=max(latencies) if latencies else None,
-            total_samples=len(metrics),
-            avg_wifi_clients=sum((m.wifi_clients_24ghz or 0) + (m.wifi_clients_5ghz or 0) for m in metrics) / len(metrics),
-            max_wifi_clients=max((m.wifi_clients_24ghz or 0) + (m.wifi_clients_5ghz or 0) for m in metrics)
-        )
-        
-        self.db.add(agg)
-        self.db.commit()
-        self.db.refresh(agg)
-        
-        return agg
     
     # ============ Limpeza ============
     
     def cleanup_old_metrics(self, days: int = 30) -> int:
         """
         Remove métricas mais antigas que N dias.
+        A retenção é por partição mensal: meses inteiramente anteriores ao
+        corte são agregados (rollup diário) e removidos com DROP TABLE.
         Retorna quantidade removida.
         """
-        cutoff = datetime.utcnow() - timedelta(days=days)
-        
-        deleted = self.db.query(DeviceMetric)\
-            .filter(DeviceMetric.collected_at < cutoff)\
-            .delete()
-        
-        self.db.commit()
+        metric_partitions.ensure(self.db)
+        deleted = metric_partitions.apply_retention(self.db, days)
         log.info(f"Cleaned up {deleted} metrics older than {days} days")
         
         return deleted
+
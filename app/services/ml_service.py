@@ -10,7 +10,9 @@ from collections import defaultdict
 import logging
 import json
 
-from app.database.models import Device, DeviceMetric, DiagnosticLog, AlertEvent
+from app.database.models import Device, DiagnosticLog, AlertEvent
+from app.services.metrics_service import MetricsService
+from app.services.health_scoring import load_thresholds, worst_devices
 
 log = logging.getLogger("semppre-bridge.ml")
 
@@ -27,20 +29,8 @@ class MLService:
     def __init__(self, db: Session):
         self.db = db
         
-        # Thresholds configuráveis
-        self.thresholds = {
-            "latency_warning": 50,      # ms
-            "latency_critical": 100,    # ms
-            "packet_loss_warning": 1,   # %
-            "packet_loss_critical": 5,  # %
-            "cpu_warning": 80,          # %
-            "cpu_critical": 95,         # %
-            "memory_warning": 85,       # %
-            "memory_critical": 95,      # %
-            "wifi_clients_warning": 20, # clientes
-            "anomaly_zscore": 2.5,      # desvios padrão
-            "offline_minutes": 15,      # minutos sem inform
-        }
+        # Thresholds configuráveis (padrões + ajustes de POST /ml/thresholds)
+        self.thresholds = load_thresholds(db)
     
     # ============ Análise Estatística ============
     
@@ -104,11 +94,7 @@ class MLService:
             return {"device_id": device_id, "anomalies": [], "score": 0}
         
         since = datetime.utcnow() - timedelta(hours=hours)
-        metrics = self.db.query(DeviceMetric)\
-            .filter(DeviceMetric.device_id == device.id)\
-            .filter(DeviceMetric.collected_at >= since)\
-            .order_by(DeviceMetric.collected_at)\
-            .all()
+        metrics = MetricsService(self.db).read_metrics(device.id, since, newest_first=False)
         
         if len(metrics) < 5:
             return {"device_id": device_id, "anomalies": [], "score": 0, "message": "Dados insuficientes"}
@@ -259,11 +245,7 @@ class MLService:
             return {"device_id": device_id, "risk": "unknown", "score": 0}
         
         since = datetime.utcnow() - timedelta(days=days)
-        metrics = self.db.query(DeviceMetric)\
-            .filter(DeviceMetric.device_id == device.id)\
-            .filter(DeviceMetric.collected_at >= since)\
-            .order_by(DeviceMetric.collected_at)\
-            .all()
+        metrics = MetricsService(self.db).read_metrics(device.id, since, newest_first=False)
         
         if len(metrics) < 10:
             return {
@@ -466,21 +448,18 @@ class MLService:
             func.count(Device.id)
         ).group_by(Device.product_class).all()
         
-        # Dispositivos com problemas (score < 70)
-        problem_devices = []
-        devices = self.db.query(Device).filter(Device.is_online == True).limit(100).all()
-        
-        for device in devices:
-            anomalies = self.detect_anomalies(device.device_id, hours=6)
-            if anomalies.get("health_score", 100) < 70:
-                problem_devices.append({
-                    "device_id": device.device_id,
-                    "manufacturer": device.manufacturer,
-                    "model": device.product_class,
-                    "pppoe_login": device.pppoe_login,
-                    "health_score": anomalies["health_score"],
-                    "anomaly_count": len(anomalies.get("anomalies", []))
-                })
+        # Dispositivos com problemas (score < 70): lidos do snapshot device_health
+        problem_devices = [
+            {
+                "device_id": row["device_id"],
+                "manufacturer": row["manufacturer"],
+                "model": row["product_class"],
+                "pppoe_login": row["pppoe_login"],
+                "health_score": row["health_score"],
+                "anomaly_count": row["anomaly_count"],
+            }
+            for row in worst_devices(self.db, limit=10, max_score=70, online_only=True)
+        ]
         
         return {
             "summary": {
@@ -491,7 +470,7 @@ class MLService:
             },
             "by_manufacturer": [{"name": m[0] or "Unknown", "count": m[1]} for m in by_manufacturer],
             "by_model": [{"name": m[0] or "Unknown", "count": m[1]} for m in by_model],
-            "problem_devices": sorted(problem_devices, key=lambda x: x["health_score"])[:10],
+            "problem_devices": problem_devices,
             "analysis_timestamp": datetime.utcnow().isoformat()
         }
     
@@ -511,11 +490,7 @@ class MLService:
         
         # Buscar métricas das últimas 24h
         since = datetime.utcnow() - timedelta(hours=24)
-        metrics = self.db.query(DeviceMetric)\
-            .filter(DeviceMetric.device_id == device.id)\
-            .filter(DeviceMetric.collected_at >= since)\
-            .order_by(DeviceMetric.collected_at)\
-            .all()
+        metrics = MetricsService(self.db).read_metrics(device.id, since, newest_first=False)
         
         if len(metrics) < 6:
             return {"device_id": device_id, "prediction": None, "message": "Dados insuficientes"}
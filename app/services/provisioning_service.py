@@ -6,12 +6,12 @@ Aplica configurações automaticamente baseado em regras e templates
 
 from typing import Dict, List, Any, Optional
 from datetime import datetime
-import httpx
 import json
 import logging
 from sqlalchemy.orm import Session
 
 from app.settings import settings
+from app.integrations.genieacs import get_nbi_client, nbi_timeout
 from app.database import get_db
 from app.database.models import Device, SystemConfig
 
@@ -174,51 +174,53 @@ class ProvisioningService:
         # Aplicar via GenieACS
         log.info(f"Provisionando dispositivo {device_id} com {len(parameters)} parâmetros")
         
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            success_count = 0
-            failed = []
-            
-            for path, value in parameters.items():
-                try:
-                    task = {
-                        "name": "setParameterValues",
-                        "parameterValues": [[path, value, self._infer_type(value)]]
-                    }
-                    
-                    res = await client.post(
-                        f"{self.genie_url}/devices/{device_id}/tasks",
-                        params={"timeout": 5000, "connection_request": ""},
-                        json=task
-                    )
-                    
-                    if res.status_code in [200, 202]:
-                        success_count += 1
-                    else:
-                        failed.append({"path": path, "error": f"HTTP {res.status_code}"})
-                        
-                except Exception as e:
-                    failed.append({"path": path, "error": str(e)})
-            
-            # Refresh final
+        client = get_nbi_client()
+        success_count = 0
+        failed = []
+        
+        for path, value in parameters.items():
             try:
-                await client.post(
-                    f"{self.genie_url}/devices/{device_id}/tasks",
-                    params={"timeout": 10000, "connection_request": ""},
-                    json={"name": "refreshObject", "objectName": ""}
+                task = {
+                    "name": "setParameterValues",
+                    "parameterValues": [[path, value, self._infer_type(value)]]
+                }
+                
+                res = await client.post(
+                    f"/devices/{device_id}/tasks",
+                    params={"timeout": 5000, "connection_request": ""},
+                    json=task,
+                    timeout=nbi_timeout("task")
                 )
-            except:
-                pass
-            
-            return {
-                "success": success_count == len(parameters),
-                "device_id": device_id,
-                "rules_applied": [r.name for r in rules],
-                "parameters_total": len(parameters),
-                "parameters_applied": success_count,
-                "parameters_failed": len(failed),
-                "failed_details": failed[:10] if failed else [],
-                "timestamp": datetime.utcnow().isoformat()
-            }
+                
+                if res.status_code in [200, 202]:
+                    success_count += 1
+                else:
+                    failed.append({"path": path, "error": f"HTTP {res.status_code}"})
+                    
+            except Exception as e:
+                failed.append({"path": path, "error": str(e)})
+        
+        # Refresh final
+        try:
+            await client.post(
+                f"/devices/{device_id}/tasks",
+                params={"timeout": 10000, "connection_request": ""},
+                json={"name": "refreshObject", "objectName": ""},
+                timeout=nbi_timeout("task")
+            )
+        except:
+            pass
+        
+        return {
+            "success": success_count == len(parameters),
+            "device_id": device_id,
+            "rules_applied": [r.name for r in rules],
+            "parameters_total": len(parameters),
+            "parameters_applied": success_count,
+            "parameters_failed": len(failed),
+            "failed_details": failed[:10] if failed else [],
+            "timestamp": datetime.utcnow().isoformat()
+        }
     
     def _infer_type(self, value: Any) -> str:
         """Infere o tipo XSD do valor"""
@@ -236,46 +238,46 @@ class ProvisioningService:
         Detecta se um dispositivo foi resetado para fábrica
         Baseado em mudanças de configuração (ex: SSID padrão, senha padrão)
         """
-        async with httpx.AsyncClient() as client:
-            res = await client.get(
-                f"{self.genie_url}/devices/",
-                params={"query": f'{{"_id":"{device_id}"}}'})
-            
-            if res.status_code != 200 or not res.json():
-                return False
-            
-            device = res.json()[0]
-            
-            # Indicadores de factory reset:
-            indicators = 0
-            
-            # 1. SSID padrão (geralmente contém o modelo ou "TP-Link", etc)
-            ssid = self._get_param_value(device, 
-                "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.SSID", "")
-            default_ssids = ["TP-LINK", "HUAWEI", "ZTE", "OpenWrt", "default"]
-            if any(ds.lower() in ssid.lower() for ds in default_ssids):
-                indicators += 1
-            
-            # 2. Senha WiFi padrão ou vazia
-            wifi_pass = self._get_param_value(device,
-                "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.PreSharedKey.1.PreSharedKey", "")
-            if not wifi_pass or len(wifi_pass) < 4:
-                indicators += 1
-            
-            # 3. PPPoE sem usuário
-            pppoe_user = self._get_param_value(device,
-                "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.1.Username", "")
-            if not pppoe_user:
-                indicators += 1
-            
-            # 4. IP padrão (192.168.0.1 ou 192.168.1.1)
-            lan_ip = self._get_param_value(device,
-                "InternetGatewayDevice.LANDevice.1.LANHostConfigManagement.IPRouters", "")
-            if lan_ip in ["192.168.0.1", "192.168.1.1"]:
-                indicators += 1
-            
-            # Considera factory reset se >= 2 indicadores
-            return indicators >= 2
+        client = get_nbi_client()
+        res = await client.get(
+            "/devices/",
+            params={"query": f'{{"_id":"{device_id}"}}'})
+        
+        if res.status_code != 200 or not res.json():
+            return False
+        
+        device = res.json()[0]
+        
+        # Indicadores de factory reset:
+        indicators = 0
+        
+        # 1. SSID padrão (geralmente contém o modelo ou "TP-Link", etc)
+        ssid = self._get_param_value(device, 
+            "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.SSID", "")
+        default_ssids = ["TP-LINK", "HUAWEI", "ZTE", "OpenWrt", "default"]
+        if any(ds.lower() in ssid.lower() for ds in default_ssids):
+            indicators += 1
+        
+        # 2. Senha WiFi padrão ou vazia
+        wifi_pass = self._get_param_value(device,
+            "InternetGatewayDevice.LANDevice.1.WLANConfiguration.1.PreSharedKey.1.PreSharedKey", "")
+        if not wifi_pass or len(wifi_pass) < 4:
+            indicators += 1
+        
+        # 3. PPPoE sem usuário
+        pppoe_user = self._get_param_value(device,
+            "InternetGatewayDevice.WANDevice.1.WANConnectionDevice.1.WANPPPConnection.1.Username", "")
+        if not pppoe_user:
+            indicators += 1
+        
+        # 4. IP padrão (192.168.0.1 ou 192.168.1.1)
+        lan_ip = self._get_param_value(device,
+            "InternetGatewayDevice.LANDevice.1.LANHostConfigManagement.IPRouters", "")
+        if lan_ip in ["192.168.0.1", "192.168.1.1"]:
+            indicators += 1
+        
+        # Considera factory reset se >= 2 indicadores
+        return indicators >= 2
     
     def _get_param_value(self, device: Dict, path: str, default: Any = None) -> Any:
         """Extrai valor de um parâmetro do dispositivo"""
@@ -0,0 +1,97 @@
+# app/services/series_downsample.py
+"""
+Redução de séries temporais para gráficos.
+
+- lttb: Largest-Triangle-Three-Buckets — escolhe, em cada balde, o ponto que
+  forma o maior triângulo com o ponto escolhido antes e a média do balde
+  seguinte; preserva picos e a forma visual da série
+- minmax: em cada balde mantém o menor e o maior valor (em ordem temporal);
+  nenhum pico some, ao custo de até 2 pontos por balde
+
+Os pontos são dicts ordenados por tempo; `x` e `y` são as chaves usadas
+(o eixo x precisa ser numérico ou datetime). Pontos com y None nunca são
+escolhidos; os pontos devolvidos são os originais, com todos os campos.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Any, Dict, List
+
+Point = Dict[str, Any]
+
+
+def _xf(value: Any) -> float:
+    return value.timestamp() if isinstance(value, datetime) else float(value)
+
+
+def lttb(points: List[Point], threshold: int, x: str = "t", y: str = "value") -> List[Point]:
+    """Reduz `points` a no máximo `threshold` pontos com LTTB."""
+    data = [p for p in points if p.get(y) is not None]
+    if threshold >= len(data):
+        return data
+    if threshold < 3:
+        return [data[0], data[-1]][:max(threshold, 0)]
+
+    xs = [_xf(p[x]) for p in data]
+    ys = [float(p[y]) for p in data]
+    n = len(data)
+    every = (n - 2) / (threshold - 2)
+
+    sampled = [data[0]]
+    a = 0
+    for i in range(threshold - 2):
+        # Média do próximo balde (o ponto C do triângulo)
+        nxt_start = int((i + 1) * every) + 1
+        nxt_end = min(int((i + 2) * every) + 1, n)
+        if nxt_start >= nxt_end:
+            nxt_start, nxt_end = n - 1, n
+        span = nxt_end - nxt_start
+        avg_x = sum(xs[nxt_start:nxt_end]) / span
+        avg_y = sum(ys[nxt_start:nxt_end]) / span
+
+        # Ponto do balde atual com o maior triângulo (A = último escolhido)
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(data[best])
+        a = best
+    sampled.append(data[-1])
+    return sampled
+
+
+def minmax(points: List[Point], threshold: int, y: str = "value") -> List[Point]:
+    """Reduz `points` a no máximo `threshold` pontos mantendo mínimo e máximo de cada balde."""
+    data = [p for p in points if p.get(y) is not None]
+    if threshold >= len(data):
+        return data
+    buckets = max(1, threshold // 2)
+    size = len(data) / buckets
+    out: List[Point] = []
+    for b in range(buckets):
+        chunk = range(int(b * size), min(int((b + 1) * size), len(data)))
+        if not chunk:
+            continue
+        lo = min(chunk, key=lambda j: data[j][y])
+        hi = max(chunk, key=lambda j: data[j][y])
+        out.extend(data[j] for j in sorted({lo, hi}))
+    return out
+
+
+METHODS = {"lttb": lttb, "minmax": minmax}
+
+
+def downsample(points: List[Point], threshold: int, method: str = "lttb", x: str = "t", y: str = "value") -> List[Point]:
+    """Aplica `method` (lttb | minmax)."""
+    if method == "lttb":
+        return lttb(points, threshold, x=x, y=y)
+    if method == "minmax":
+        return minmax(points, threshold, y=y)
+    raise ValueError(f"método de redução inválido: {method}")
+
+
+__all__ = ["METHODS", "downsample", "lttb", "minmax"]
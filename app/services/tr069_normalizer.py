@@ -1,10 +1,12 @@
 # app/services/tr069_normalizer.py
 # Serviço de Normalização TR-069 para suporte a TR-098 (TP-Link/Intelbras/ZTE) e TR-181 (Huawei/Fiberhome)
 
+from functools import lru_cache
 from typing import Any, Dict, List, Optional, Tuple, Literal
-import re
 import logging
 
+from app.services.tr069_paths import PathTemplate, compile_path
+
 logger = logging.getLogger(__name__)
 
 DataModel = Literal["TR-098", "TR-181"]
@@ -424,6 +426,64 @@ PARAM_MAP: Dict[str, Dict[str, str]] = {
 }
 
 
+# Templates compilados na importação: logical_path -> {modelo: PathTemplate}
+COMPILED_PARAM_MAP: Dict[str, Dict[str, PathTemplate]] = {
+    logical: {model: PathTemplate(template) for model, template in mapping.items()}
+    for logical, mapping in PARAM_MAP.items()
+}
+
+
+def vars_key(vars: Optional[Dict[str, Any]]) -> Optional[Tuple[Tuple[str, Any], ...]]:
+    """Chave hashable das variáveis para o cache (None se não for hashable)."""
+    if not vars:
+        return ()
+    try:
+        key = tuple(sorted(vars.items()))
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _resolve(logical_path: str, model: str, vars: Optional[Dict[str, Any]]) -> Optional[str]:
+    template = COMPILED_PARAM_MAP.get(logical_path, {}).get(model)
+    return template.format(vars) if template else None
+
+
+def _select(logical_path: str, model: str, vars: Optional[Dict[str, Any]]) -> Optional[str]:
+    # Modelo pedido primeiro, depois TR-098 e TR-181 como fallback
+    return (
+        _resolve(logical_path, model, vars)
+        or _resolve(logical_path, "TR-098", vars)
+        or _resolve(logical_path, "TR-181", vars)
+    )
+
+
+@lru_cache(maxsize=8192)
+def _resolve_cached(logical_path: str, model: str, key: Tuple, fallback: bool) -> Optional[str]:
+    vars = dict(key)
+    if fallback:
+        return _select(logical_path, model, vars)
+    return _resolve(logical_path, model, vars)
+
+
+def resolve_param_path(
+    logical_path: str,
+    model: str,
+    vars: Optional[Dict[str, Any]] = None,
+    fallback: bool = False,
+) -> Optional[str]:
+    """
+    Caminho real de um parâmetro lógico para um data model, com as variáveis
+    substituídas. Com fallback=True tenta o modelo pedido, depois TR-098 e
+    TR-181. None se não houver mapeamento.
+    """
+    key = vars_key(vars)
+    if key is None:
+        return _select(logical_path, model, vars) if fallback else _resolve(logical_path, model, vars)
+    return _resolve_cached(logical_path, model, key, fallback)
+
+
 # =============================================================================
 # FABRICANTES E SEUS DATA MODELS
 # =============================================================================
@@ -468,37 +528,58 @@ class TR069Normalizer:
     PARAM_MAP = PARAM_MAP
     MANUFACTURER_MODEL_MAP = MANUFACTURER_MODEL_MAP
     
+    # Cache do data model por documento: (_id, _lastInform) -> modelo
+    MODEL_CACHE_SIZE = 4096
+
+    def __init__(self):
+        self._model_cache: Dict[Tuple[str, Any], DataModel] = {}
+
     def detect_data_model(self, device: Dict[str, Any]) -> DataModel:
         """
         Detecta o Data Model do dispositivo (TR-098 ou TR-181).
         
+        O resultado é memorizado por (_id, _lastInform): get_path/get_value
+        chamam este método para cada caminho lógico do mesmo documento.
+        Só a detecção pela raiz é memorizada: um documento projetado sem
+        "Device"/"InternetGatewayDevice" cai no palpite pelo fabricante, que
+        não pode valer para o documento completo com a mesma chave.
+        
         Args:
             device: Dicionário representando o dispositivo
             
         Returns:
             "TR-098" ou "TR-181"
         """
-        # 1. Verifica estrutura do objeto (busca recursiva mais tolerante)
-        def _contains_key_recursive(obj: Any, key: str) -> bool:
-            try:
-                if isinstance(obj, dict):
-                    if key in obj:
-                        return True
-                    return any(_contains_key_recursive(v, key) for v in obj.values())
-                if isinstance(obj, list):
-                    return any(_contains_key_recursive(v, key) for v in obj)
-            except Exception:
-                return False
-            return False
-
-        if _contains_key_recursive(device, "Device") or _contains_key_recursive(device, "DeviceInfo"):
-            # prefira TR-181 quando estruturas Device/DeviceInfo aparecerem
+        if not isinstance(device, dict):
+            return "TR-098"
+
+        key = None
+        device_key = device.get("_id")
+        has_root = "Device" in device or "InternetGatewayDevice" in device
+        if device_key and has_root:
+            key = (device_key, device.get("_lastInform"))
+            cached = self._model_cache.get(key)
+            if cached is not None:
+                return cached
+
+        model = self._detect_data_model(device)
+
+        if key is not None:
+            self._model_cache[key] = model
+            if len(self._model_cache) > self.MODEL_CACHE_SIZE:
+                # Descarta a entrada mais antiga (um _lastInform novo gera outra chave)
+                self._model_cache.pop(next(iter(self._model_cache)), None)
+        return model
+
+    def _detect_data_model(self, device: Dict[str, Any]) -> DataModel:
+        # 1. Verifica a raiz do documento (só o nível superior, sem varrer a árvore)
+        if "Device" in device:
             return "TR-181"
-        if _contains_key_recursive(device, "InternetGatewayDevice"):
+        if "InternetGatewayDevice" in device:
             return "TR-098"
         
         # 2. Verifica pelo fabricante
-        device_id = device.get("_deviceId", {})
+        device_id = device.get("_deviceId") or {}
         manufacturer = str(device_id.get("_Manufacturer", "")).lower().strip()
         
         for key, model in MANUFACTURER_MODEL_MAP.items():
@@ -533,20 +614,14 @@ class TR069Normalizer:
             Caminho TR-069 real
         """
         model = self.detect_data_model(device)
-        mapping = PARAM_MAP.get(logical_path, {})
 
         # Tenta modelo detectado primeiro, depois tenta ambos como fallback
-        path = mapping.get(model) or mapping.get("TR-098") or mapping.get("TR-181")
+        path = resolve_param_path(logical_path, model, vars, fallback=True)
 
         if not path:
             logger.warning(f"[TR069 Normalizer] Caminho não mapeado: {logical_path} ({model})")
             return logical_path  # Fallback
         
-        # Substitui variáveis
-        if vars:
-            for key, value in vars.items():
-                path = re.sub(rf"\{{{key}\}}", str(value), path)
-        
         return path
     
     def get_paths(
@@ -564,15 +639,8 @@ class TR069Normalizer:
         Returns:
             Tupla (tr098_path, tr181_path)
         """
-        mapping = PARAM_MAP.get(logical_path, {})
-        tr098 = mapping.get("TR-098", logical_path)
-        tr181 = mapping.get("TR-181", logical_path)
-        
-        if vars:
-            for key, value in vars.items():
-                tr098 = re.sub(rf"\{{{key}\}}", str(value), tr098)
-                tr181 = re.sub(rf"\{{{key}\}}", str(value), tr181)
-        
+        tr098 = resolve_param_path(logical_path, "TR-098", vars) or logical_path
+        tr181 = resolve_param_path(logical_path, "TR-181", vars) or logical_path
         return (tr098, tr181)
     
     def get_value(
@@ -588,13 +656,12 @@ class TR069Normalizer:
         # Primeiro tenta o caminho baseado no modelo detectado, mas se não
         # encontrar valor tenta também o outro modelo (suporta qualquer marca)
         model = self.detect_data_model(device)
-        mapping = PARAM_MAP.get(logical_path, {})
 
         paths_to_try: List[str] = []
-        if mapping:
+        if logical_path in PARAM_MAP:
             # ordem: detectado -> TR-098 -> TR-181
-            preferred = mapping.get(model)
-            other = mapping.get("TR-098") if model == "TR-181" else mapping.get("TR-181")
+            preferred = resolve_param_path(logical_path, model, vars)
+            other = resolve_param_path(logical_path, "TR-098" if model == "TR-181" else "TR-181", vars)
             if preferred:
                 paths_to_try.append(preferred)
             if other and other != preferred:
@@ -603,11 +670,7 @@ class TR069Normalizer:
             # sem mapeamento explícito, usa get_path que faz fallback
             paths_to_try.append(self.get_path(device, logical_path, vars))
 
-        # aplica vars e tenta cada caminho
         for p in paths_to_try:
-            if vars:
-                for key, value in vars.items():
-                    p = re.sub(rf"\{{{key}\}}", str(value), p)
             val = self.get_value_by_path(device, p, None)
             if val is not None and val != "":
                 return val
@@ -626,24 +689,9 @@ class TR069Normalizer:
         default: Any = None
     ) -> Any:
         """
-        Lê um valor do device usando caminho literal.
+        Lê um valor do device usando caminho literal (compilado/cacheado em tr069_paths).
         """
-        try:
-            parts = path.split(".")
-            current = device
-            
-            for part in parts:
-                if current is None:
-                    return default
-                current = current.get(part) if isinstance(current, dict) else None
-            
-            # GenieACS armazena valores em _value
-            if isinstance(current, dict) and "_value" in current:
-                return current["_value"]
-            
-            return current if current is not None else default
-        except Exception:
-            return default
+        return compile_path(path).get(device, default)
     
     def get_value_multi(
         self,
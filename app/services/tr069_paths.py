@@ -0,0 +1,214 @@
+# app/services/tr069_paths.py
+"""
+Acesso compilado a caminhos TR-069 em documentos do GenieACS.
+
+Substitui os vários get_value() que faziam path.split(".") a cada chamada:
+- TRPath: caminho pré-dividido (segmentos internados), compilado uma vez
+- PathChain: cadeia de fallback ("TR-098 ou TR-181 ou variante do fabricante")
+- PathSet: resolve muitos caminhos em uma única caminhada pela árvore,
+  percorrendo prefixos comuns (InternetGatewayDevice.LANDevice.1...) uma vez só
+- PathTemplate: template com variáveis ("...WLANConfiguration.{radio}.SSID")
+  pré-dividido em segmentos; a resolução é só um join
+
+Valores no formato do GenieACS ({"_value": ..., "_type": ...}) são
+desembrulhados; caminhos ausentes retornam o default.
+"""
+from __future__ import annotations
+
+import re
+import sys
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+_MISSING = object()
+_FIELD = re.compile(r"\{(\w+)\}")
+
+
+def _unwrap(node: Any) -> Any:
+    # GenieACS armazena valores em _value
+    if isinstance(node, dict) and "_value" in node:
+        return node["_value"]
+    return node
+
+
+class TRPath:
+    """Caminho TR-069 pré-dividido."""
+
+    __slots__ = ("path", "parts")
+
+    def __init__(self, path: str):
+        self.path = sys.intern(path)
+        self.parts: Tuple[str, ...] = tuple(sys.intern(p) for p in path.split("."))
+
+    def node(self, obj: Any) -> Any:
+        """Nó bruto (sem desembrulhar _value) ou None."""
+        current = obj
+        for part in self.parts:
+            if not isinstance(current, dict):
+                return None
+            current = current.get(part)
+            if current is None:
+                return None
+        return current
+
+    def get(self, obj: Any, default: Any = None) -> Any:
+        current = self.node(obj)
+        if current is None:
+            return default
+        return _unwrap(current)
+
+    def __repr__(self) -> str:
+        return f"TRPath({self.path!r})"
+
+
+@lru_cache(maxsize=8192)
+def compile_path(path: str) -> TRPath:
+    """Compila (e guarda em cache) um caminho literal."""
+    return TRPath(path)
+
+
+def get_value(obj: Any, path: str, default: Any = None) -> Any:
+    """Lê um valor do documento pelo caminho literal (ex: "Device.DeviceInfo.UpTime")."""
+    return compile_path(path).get(obj, default)
+
+
+class PathChain:
+    """Cadeia de fallback compilada: os caminhos são tentados em ordem."""
+
+    __slots__ = ("paths",)
+
+    def __init__(self, *paths: str):
+        self.paths: Tuple[TRPath, ...] = tuple(compile_path(p) for p in paths)
+
+    def first(self, obj: Any, default: Any = None) -> Any:
+        """Primeiro valor não-vazio (truthy) — semântica de `a or b or c`."""
+        for path in self.paths:
+            value = path.get(obj)
+            if value:
+                return value
+        return default
+
+    def first_present(self, obj: Any, default: Any = None) -> Any:
+        """Primeiro valor existente (não None), mesmo que seja 0/""/False."""
+        for path in self.paths:
+            value = path.get(obj, _MISSING)
+            if value is not _MISSING:
+                return value
+        return default
+
+    def first_in(self, values: Dict[str, Any], default: Any = None) -> Any:
+        """Como first(), mas sobre o resultado de PathSet.resolve()."""
+        for path in self.paths:
+            value = values.get(path.path)
+            if value:
+                return value
+        return default
+
+    def __iter__(self):
+        return iter(p.path for p in self.paths)
+
+
+class PathSet:
+    """
+    Conjunto de caminhos resolvidos em uma única caminhada.
+
+    Os caminhos formam uma trie por segmento; resolve() desce cada ramo do
+    documento uma vez e devolve {caminho: valor} apenas dos caminhos presentes.
+    """
+
+    __slots__ = ("paths", "_root")
+
+    def __init__(self, paths: Iterable[str]):
+        self.paths: List[TRPath] = [compile_path(p) for p in dict.fromkeys(paths)]
+        # trie: segmento -> [filhos, caminho terminal ou None]
+        root: Dict[str, list] = {}
+        for path in self.paths:
+            level = root
+            entry: Optional[list] = None
+            for part in path.parts:
+                entry = level.get(part)
+                if entry is None:
+                    entry = level[part] = [{}, None]
+                level = entry[0]
+            entry[1] = path.path
+        self._freeze(root)
+        self._root = tuple(root.items())
+
+    @classmethod
+    def _freeze(cls, level: Dict[str, list]) -> None:
+        # Converte para tuplas (filhos vazios viram None) para a caminhada ser barata
+        for part, entry in level.items():
+            children, terminal = entry
+            if children:
+                cls._freeze(children)
+                level[part] = (tuple(children.items()), terminal)
+            else:
+                level[part] = (None, terminal)
+
+    def resolve(self, obj: Any) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        if not isinstance(obj, dict):
+            return out
+        stack = [(self._root, obj)]
+        while stack:
+            level, node = stack.pop()
+            for part, (children, terminal) in level:
+                child = node.get(part)
+                if child is None:
+                    continue
+                if terminal is not None:
+                    out[terminal] = _unwrap(child)
+                if children is not None and isinstance(child, dict):
+                    stack.append((children, child))
+        return out
+
+
+class PathTemplate:
+    """
+    Template de caminho pré-dividido: texto fixo + slots das variáveis.
+
+    format({"radio": 2}) preenche os slots e junta os segmentos; variáveis
+    não informadas mantêm o placeholder, como na substituição anterior.
+    """
+
+    __slots__ = ("template", "parts", "slots")
+
+    def __init__(self, template: str):
+        self.template = template
+        parts: List[str] = []
+        slots: List[Tuple[int, str]] = []
+        pos = 0
+        for m in _FIELD.finditer(template):
+            parts.append(template[pos:m.start()])
+            slots.append((len(parts), m.group(1)))
+            parts.append(m.group(0))
+            pos = m.end()
+        parts.append(template[pos:])
+        self.parts: Tuple[str, ...] = tuple(parts)
+        self.slots: Tuple[Tuple[int, str], ...] = tuple(slots)
+
+    @property
+    def fields(self) -> Tuple[str, ...]:
+        return tuple(dict.fromkeys(name for _, name in self.slots))
+
+    def format(self, vars: Optional[Dict[str, Any]] = None) -> str:
+        if not self.slots or not vars:
+            return self.template
+        parts = list(self.parts)
+        for i, name in self.slots:
+            if name in vars:
+                parts[i] = str(vars[name])
+        return "".join(parts)
+
+    def __repr__(self) -> str:
+        return f"PathTemplate({self.template!r})"
+
+
+__all__ = [
+    "TRPath",
+    "PathChain",
+    "PathSet",
+    "PathTemplate",
+    "compile_path",
+    "get_value",
+]
@@ -31,6 +31,75 @@ class Settings(BaseSettings):
     GENIE_CWMP_USERNAME: str = os.getenv("GENIE_CWMP_USERNAME", "admin")
     GENIE_CWMP_PASSWORD: str = os.getenv("GENIE_CWMP_PASSWORD", "admin")
 
+    # Pool de conexões do cliente NBI (compartilhado por toda a aplicação)
+    # HTTP/2 requer o pacote opcional "h2" (pip install h2)
+    GENIE_NBI_HTTP2: bool = os.getenv("GENIE_NBI_HTTP2", "false").lower() == "true"
+    GENIE_NBI_VERIFY_SSL: bool = os.getenv("GENIE_NBI_VERIFY_SSL", "false").lower() == "true"
+    GENIE_NBI_MAX_CONNECTIONS: int = int(os.getenv("GENIE_NBI_MAX_CONNECTIONS", "100"))
+    GENIE_NBI_MAX_KEEPALIVE: int = int(os.getenv("GENIE_NBI_MAX_KEEPALIVE", "20"))
+    GENIE_NBI_KEEPALIVE_EXPIRY: float = float(os.getenv("GENIE_NBI_KEEPALIVE_EXPIRY", "30"))
+    GENIE_NBI_CONNECT_TIMEOUT: float = float(os.getenv("GENIE_NBI_CONNECT_TIMEOUT", "10"))
+    GENIE_NBI_READ_TIMEOUT: float = float(os.getenv("GENIE_NBI_READ_TIMEOUT", "30"))
+    GENIE_NBI_TASK_TIMEOUT: float = float(os.getenv("GENIE_NBI_TASK_TIMEOUT", "60"))
+    GENIE_NBI_BULK_TIMEOUT: float = float(os.getenv("GENIE_NBI_BULK_TIMEOUT", "120"))
+    # Tamanho de página ao iterar o inventário do NBI (coletor/monitor)
+    GENIE_NBI_PAGE_SIZE: int = int(os.getenv("GENIE_NBI_PAGE_SIZE", "500"))
+
+    # -----------------------------
+    # COLETOR DE MÉTRICAS (app/scripts/metrics_collector.py)
+    # -----------------------------
+    METRICS_COLLECT_INTERVAL: int = int(os.getenv("METRICS_COLLECT_INTERVAL", "300"))  # segundos entre inícios de ciclo
+    METRICS_EXTRACT_WORKERS: int = int(os.getenv("METRICS_EXTRACT_WORKERS", "4"))
+    METRICS_EXTRACT_POOL: str = os.getenv("METRICS_EXTRACT_POOL", "process")  # process | thread
+    METRICS_QUEUE_SIZE: int = int(os.getenv("METRICS_QUEUE_SIZE", "4"))  # páginas em espera por estágio
+    # Partições mensais de device_metrics (app/services/metric_partitions.py)
+    METRICS_RETENTION_DAYS: int = int(os.getenv("METRICS_RETENTION_DAYS", "90"))  # partições inteiras além disso são removidas
+    METRICS_HOT_DAYS: int = int(os.getenv("METRICS_HOT_DAYS", "35"))  # meses fechados ficam na tabela principal por N dias
+    METRICS_PARTITIONS_AHEAD: int = int(os.getenv("METRICS_PARTITIONS_AHEAD", "2"))  # meses futuros pré-criados (PostgreSQL)
+    # Rollup incremental em metric_aggregations (app/services/metric_rollup.py)
+    METRICS_ROLLUP_PERIODS: str = os.getenv("METRICS_ROLLUP_PERIODS", "hour,day,week")
+    METRICS_ROLLUP_GRACE_SECONDS: int = int(os.getenv("METRICS_ROLLUP_GRACE_SECONDS", "300"))  # espera por amostras atrasadas
+    # Séries de histórico (MetricsService.get_metric_series)
+    METRICS_SERIES_MAX_POINTS: int = int(os.getenv("METRICS_SERIES_MAX_POINTS", "500"))  # pontos devolvidos por padrão
+    METRICS_SERIES_OVERSAMPLE: int = int(os.getenv("METRICS_SERIES_OVERSAMPLE", "4"))  # linhas lidas por ponto antes de reduzir
+    METRICS_BULK_MAX_DEVICES: int = int(os.getenv("METRICS_BULK_MAX_DEVICES", "5000"))  # POST /metrics/series/bulk
+
+    # -----------------------------
+    # FEEDS (app/routers/feeds_router.py)
+    # -----------------------------
+    FEEDS_COUNT_CAP: int = int(os.getenv("FEEDS_COUNT_CAP", "10000"))  # teto do total com count=approx
+    FEEDS_SUMMARY_TTL: float = float(os.getenv("FEEDS_SUMMARY_TTL", "15"))  # s; cache de GET /feeds/summary
+    FEEDS_BATCH_MAX_ITEMS: int = int(os.getenv("FEEDS_BATCH_MAX_ITEMS", "10000"))  # amostras por POST /feeds/ingest/batch
+    # Pipeline de análise do ingest (app/services/analytics_pipeline.py)
+    ANALYTICS_QUEUE_SIZE: int = int(os.getenv("ANALYTICS_QUEUE_SIZE", "50000"))  # amostras; cheia = descarte
+    ANALYTICS_BATCH_SIZE: int = int(os.getenv("ANALYTICS_BATCH_SIZE", "1000"))  # amostras por lote do worker
+    ANALYTICS_BATCH_LINGER_MS: float = float(os.getenv("ANALYTICS_BATCH_LINGER_MS", "200"))  # espera para completar o lote
+    # Snapshot device_health (app/services/health_scoring.py)
+    HEALTH_REFRESH_INTERVAL: float = float(os.getenv("HEALTH_REFRESH_INTERVAL", "60"))  # s entre repontuações pelo pipeline
+    HEALTH_REFRESH_GRACE_SECONDS: int = int(os.getenv("HEALTH_REFRESH_GRACE_SECONDS", "900"))  # amostras atrasadas ainda detectadas
+
+    # -----------------------------
+    # BANCO DE DADOS (app/database/connection.py)
+    # -----------------------------
+    DATABASE_READ_URL: str = os.getenv("DATABASE_READ_URL", "")  # réplica de leitura; vazio = DATABASE_URL
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))  # conexões do engine de escrita
+    DB_READ_POOL_SIZE: int = int(os.getenv("DB_READ_POOL_SIZE", "10"))  # conexões do engine de leitura
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # espera por conexão livre (s)
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # s; só PostgreSQL
+    # Perfil SQLite aplicado em cada conexão
+    SQLITE_JOURNAL_MODE: str = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+    SQLITE_SYNCHRONOUS: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))  # por conexão
+    SQLITE_MMAP_SIZE_MB: int = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+
+    # -----------------------------
+    # SNAPSHOTS DE DISPOSITIVOS (app/services/device_snapshot_service.py)
+    # -----------------------------
+    DEVICE_SNAPSHOT_LRU_SIZE: int = int(os.getenv("DEVICE_SNAPSHOT_LRU_SIZE", "5000"))  # documentos em memória
+    DEVICE_SNAPSHOT_COMPRESS_LEVEL: int = int(os.getenv("DEVICE_SNAPSHOT_COMPRESS_LEVEL", "6"))  # zlib 1-9
+
     # -----------------------------
     # IXC INTEGRAÇÃO
     # -----------------------------
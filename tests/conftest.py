@@ -0,0 +1,34 @@
+# tests/conftest.py
+# Banco SQLite temporário: DATABASE_URL precisa existir antes de importar app
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+_TMP = tempfile.mkdtemp(prefix="semppre_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{_TMP}/test.db"
+os.environ.pop("DATABASE_READ_URL", None)
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+
+from app.database import init_db
+from app.database.connection import SessionLocal
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _schema():
+    init_db()
+    yield
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.rollback()
+        session.close()
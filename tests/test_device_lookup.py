@@ -0,0 +1,81 @@
+# tests/test_device_lookup.py
+# Índice login/serial/MAC -> _id: entradas desatualizadas não podem desviar a busca
+
+import asyncio
+
+import pytest
+
+from app.routers import mobile_api_router
+from app.services.device_lookup_service import device_lookup, lookup_rows
+
+
+def _tr181(device_id, login=None, serial=None):
+    doc = {"_id": device_id, "Device": {}}
+    if login:
+        doc["Device"]["PPP"] = {"Interface": {"1": {"Username": {"_value": login}}}}
+    if serial:
+        doc["Device"]["DeviceInfo"] = {"SerialNumber": {"_value": serial}}
+    return doc
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, payload):
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+
+class _NBI:
+    def __init__(self, devices):
+        self.devices = devices
+        self.calls = 0
+
+    async def get(self, path, params=None):
+        self.calls += 1
+        return _Response(self.devices)
+
+
+@pytest.fixture
+def genie(monkeypatch):
+    """GenieACS falso: documentos por _id e resposta fixa para a busca $or."""
+    docs = {}
+    nbi = _NBI([])
+
+    async def fake_fetch(device_id, view=None, max_staleness=None):
+        return docs.get(device_id)
+
+    monkeypatch.setattr(mobile_api_router, "fetch_device", fake_fetch)
+    monkeypatch.setattr(mobile_api_router, "get_nbi_client", lambda: nbi)
+    return docs, nbi
+
+
+def test_stale_index_entry_falls_back_to_nbi(db, genie):
+    docs, nbi = genie
+    # O login "cliente01" era do CPE antigo e passou para o novo
+    docs["OLD-CPE"] = _tr181("OLD-CPE", login="outro.cliente")
+    docs["NEW-CPE"] = _tr181("NEW-CPE", login="cliente01")
+    nbi.devices = [docs["NEW-CPE"]]
+    device_lookup.update(db, lookup_rows("OLD-CPE", "cliente01"))
+
+    device = asyncio.run(mobile_api_router.find_device_by_login_or_serial("cliente01"))
+
+    assert device["_id"] == "NEW-CPE"
+    assert nbi.calls == 1
+    # A entrada foi corrigida: a próxima busca já sai do índice
+    assert device_lookup.resolve_id("cliente01") == "NEW-CPE"
+    asyncio.run(mobile_api_router.find_device_by_login_or_serial("cliente01"))
+    assert nbi.calls == 1
+
+
+def test_index_hit_is_case_sensitive(db, genie):
+    docs, nbi = genie
+    docs["CPE-A"] = _tr181("CPE-A", login="Maria")
+    device_lookup.update(db, lookup_rows("CPE-A", "Maria"))
+
+    assert asyncio.run(mobile_api_router.find_device_by_login_or_serial("Maria"))["_id"] == "CPE-A"
+    # "maria" cai na mesma entrada normalizada, mas o login do CPE é "Maria"
+    assert asyncio.run(mobile_api_router.find_device_by_login_or_serial("maria")) is None
+    assert nbi.calls == 1
@@ -0,0 +1,52 @@
+# tests/test_health_scoring.py
+# Snapshot de saúde de um dispositivo que parou de reportar
+
+from datetime import datetime, timedelta
+
+from app.database.models import DeviceHealth, DeviceMetric
+from app.services.health_scoring import HEALTH_HOURS, RISK_DAYS, refresh_device_health, refresh_stale_health, stale_device_pks
+from app.services.metrics_service import MetricsService
+
+
+def _snapshot(db, device_pk):
+    db.expire_all()
+    return db.query(DeviceHealth).filter(DeviceHealth.device_id == device_pk).one()
+
+
+def test_silent_device_snapshot_expires(db):
+    device = MetricsService(db).upsert_device("HEALTH-SILENT", {})
+    last = datetime.utcnow() - timedelta(days=RISK_DAYS + 5)
+    # Uma amostra por 5 min na última hora antes de parar, com perda crescente
+    db.add_all([
+        DeviceMetric(
+            device_id=device.id,
+            collected_at=last - timedelta(minutes=5 * i),
+            ping_latency_ms=200.0,
+            ping_packet_loss=float(60 - i),
+            uptime_seconds=3600 - 300 * i,
+        )
+        for i in range(12)
+    ])
+    db.commit()
+
+    refresh_device_health(db, [device.id], now=last + timedelta(minutes=1))
+    scored = _snapshot(db, device.id)
+    assert scored.health_score is not None
+    assert scored.risk_level != "unknown"
+    assert scored.last_sample_at == last
+
+    # Fora da janela de saúde: score some, risco ainda vale
+    later = last + timedelta(hours=HEALTH_HOURS, minutes=1)
+    assert device.id in stale_device_pks(db, later)
+    refresh_stale_health(db, now=later)
+    snap = _snapshot(db, device.id)
+    assert snap.health_score is None
+    assert snap.risk_level == scored.risk_level
+
+    # Fora da janela de risco: volta para "unknown" e sai da lista de pendentes
+    expired = last + timedelta(days=RISK_DAYS, minutes=1)
+    assert device.id in stale_device_pks(db, expired)
+    refresh_stale_health(db, now=expired)
+    snap = _snapshot(db, device.id)
+    assert (snap.risk_level, snap.risk_score, snap.last_sample_at) == ("unknown", 0, None)
+    assert device.id not in stale_device_pks(db, expired)
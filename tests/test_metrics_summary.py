@@ -0,0 +1,57 @@
+# tests/test_metrics_summary.py
+# Resumo bruto (janela curta) lendo também os meses já arquivados
+
+from datetime import datetime, timedelta
+
+from app.database.models import DeviceMetric, MetricPartition
+from app.services.metric_partitions import metric_partitions
+from app.services.metrics_service import MetricsService
+
+
+def _seed(db, device_id, start, count, step=timedelta(minutes=5), lost_every=4):
+    device = MetricsService(db).upsert_device(device_id, {})
+    db.add_all([
+        DeviceMetric(
+            device_id=device.id,
+            collected_at=start + i * step,
+            ping_latency_ms=10.0 + i % 3,
+            ping_packet_loss=100.0 if i % lost_every == 0 else 0.0,
+            bytes_received=1000,
+            bytes_sent=500,
+            wifi_clients_24ghz=1,
+            wifi_clients_5ghz=2,
+        )
+        for i in range(count)
+    ])
+    db.commit()
+    return device
+
+
+def test_raw_summary_includes_archived_rows(db):
+    now = datetime.utcnow()
+    start = now - timedelta(hours=20)
+    _seed(db, "SUMMARY-ARCHIVED", start, 200)
+
+    # Primeiras 10h do período vão para um arquivo (como um mês fechado)
+    part = MetricPartition(
+        name="device_metrics_test_summary",
+        period_start=start - timedelta(minutes=1),
+        period_end=start + timedelta(hours=10),
+        storage="hot",
+        status="open",
+    )
+    db.add(part)
+    db.commit()
+    metric_partitions.close(db, part)
+    assert part.storage == "archive"
+
+    svc = MetricsService(db)
+    assert svc.plan_resolution(now - timedelta(hours=24), now) == "raw"
+    summary = svc.get_metrics_summary("SUMMARY-ARCHIVED", hours=24)
+
+    assert summary["resolution"] == "raw"
+    assert summary["total_samples"] == 200
+    assert summary["traffic"]["total_rx_bytes"] == 200 * 1000
+    # Mesma base das agregações: % de amostras com perda de 100%
+    assert summary["packet_loss_avg"] == 25.0
+    assert summary["wifi_clients"]["max"] == 3
@@ -0,0 +1,47 @@
+# tests/test_ml_thresholds.py
+# Limiares de POST /ml/thresholds usados por /ml/batch/score
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.database.models import DeviceHealth, DeviceMetric
+from app.routers.ml_router import router
+from app.services.health_scoring import DEFAULT_THRESHOLDS, save_thresholds
+from app.services.metrics_service import MetricsService
+
+
+@pytest.fixture
+def client(db):
+    app = FastAPI()
+    app.include_router(router)
+    yield TestClient(app)
+    save_thresholds(db, DEFAULT_THRESHOLDS)
+
+
+def _score(db, device_pk):
+    db.expire_all()
+    return db.query(DeviceHealth).filter(DeviceHealth.device_id == device_pk).one().health_score
+
+
+def test_batch_score_uses_updated_thresholds(db, client):
+    device = MetricsService(db).upsert_device("THRESHOLDS-LATENCY", {})
+    now = datetime.utcnow()
+    db.add_all([
+        DeviceMetric(device_id=device.id, collected_at=now - timedelta(minutes=5 * i), ping_latency_ms=150.0)
+        for i in range(6)
+    ])
+    db.commit()
+
+    assert client.post("/ml/batch/score").status_code == 200
+    # 150 ms passa de latency_critical (100) no padrão
+    assert _score(db, device.id) == 75.0
+
+    resp = client.post("/ml/thresholds", json={"latency_warning": 200, "latency_critical": 400, "bogus": 1})
+    assert resp.json()["updated"] == {"latency_warning": 200, "latency_critical": 400}
+    assert client.get("/ml/thresholds").json()["latency_critical"] == 400
+
+    assert client.post("/ml/batch/score").status_code == 200
+    assert _score(db, device.id) == 100.0